@@ -0,0 +1,196 @@
+"""
+Analysis Snapshot
+The whole coins + latest EMA analysis dataset (about 200 coins x 5 timeframes) held in the
+API process with every screener response pre-rendered. A listener thread rebuilds it when
+the worker NOTIFYs after a tick and swaps it in with one assignment, so requests read
+`store.current` without locks or database round-trips
+
+Bodies are encoded with fast_json, the encoder jsonify uses under FastJSONProvider, so they
+parse to the same documents the database path returns. Each coin is encoded once and the
+/api/coins listing spliced from those fragments
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from api_queries import COINS_SQL, shape_all_ema_analysis, shape_ema_analysis
+from fast_json import dumps, splice_array, splice_object
+from screener import ScreenTable, strategic_summary
+from watermarks import ANALYSIS_CHANNEL, TIMEFRAMES, read_watermarks
+
+# Seconds between watermark checks (the only trigger on SQLite, a safety net on Postgres)
+SNAPSHOT_REFRESH_SECONDS = float(os.getenv('SNAPSHOT_REFRESH_SECONDS', 15))
+
+# A tick NOTIFYs from several processes, wait this long for the burst to settle
+SNAPSHOT_DEBOUNCE_SECONDS = float(os.getenv('SNAPSHOT_DEBOUNCE_SECONDS', 0.5))
+
+LATEST_ANALYSIS_SQL = """
+    SELECT symbol, timeframe, current_price, ema50, pct_from_ema50, above_ema50, analysis_date
+    FROM (
+        SELECT *, ROW_NUMBER() OVER (PARTITION BY symbol, timeframe ORDER BY analysis_date DESC) AS rn
+        FROM ema_analysis
+    ) latest
+    WHERE rn = 1
+    ORDER BY symbol, timeframe
+"""
+
+def snapshot_watermark_names():
+    return ['coins'] + [f"ema_analysis:{tf}" for tf in TIMEFRAMES]
+
+def render(payload):
+    """Response body bytes, as FastJSONProvider.response() would send them"""
+    return dumps(payload) + b'\n'
+
+class AnalysisSnapshot:
+    """Immutable once built, `bodies` holds the exact response body bytes"""
+
+    def __init__(self, coins, analysis, watermarks):
+        self.coins = coins
+        self.coins_by_symbol = {coin['symbol']: coin for coin in coins}
+        self.watermarks = watermarks
+        self.built_at = datetime.now(timezone.utc)
+
+        # Same rows, columns and order as the per-endpoint queries in api_queries
+        by_symbol = {}
+        by_timeframe = {}
+        for row in analysis:
+            by_symbol.setdefault(row['symbol'], []).append(row)
+            coin = self.coins_by_symbol.get(row['symbol'])
+            if coin:
+                by_timeframe.setdefault(row['timeframe'], []).append({
+                    **row,
+                    'name': coin['name'],
+                    'market_cap_rank': coin['market_cap_rank']
+                })
+
+        fragments = [dumps(coin) for coin in coins]
+        bodies = {'coins': splice_object([('coins', splice_array(fragments)), ('total', dumps(len(coins)))]) + b'\n'}
+
+        for coin, fragment in zip(coins, fragments):
+            bodies[('coin', coin['symbol'])] = fragment + b'\n'
+
+        for symbol, rows in by_symbol.items():
+            bodies[('ema_analysis', symbol)] = render(shape_ema_analysis(symbol, rows))
+
+        for timeframe in set(TIMEFRAMES) | set(by_timeframe):
+            bodies[('ema_analysis_all', timeframe)] = render(
+                shape_all_ema_analysis(timeframe, by_timeframe.get(timeframe, []))
+            )
+
+        # Screener columns, the strategic summary is its presets
+        self.screen = ScreenTable.from_analysis(coins, analysis)
+        bodies['strategic_summary'] = render(strategic_summary(self.screen))
+
+        self.bodies = bodies
+
+    @classmethod
+    def build(cls, conn):
+        # Watermarks first, the data read after them is at least this new
+        try:
+            watermarks = read_watermarks(conn, snapshot_watermark_names())
+        except Exception:
+            conn.rollback()
+            watermarks = {}
+
+        cur = conn.cursor()
+        cur.execute(COINS_SQL)
+        coins = cur.fetchall()
+        cur.execute(LATEST_ANALYSIS_SQL)
+        analysis = cur.fetchall()
+        cur.close()
+        conn.commit()
+
+        return cls(coins, analysis, watermarks)
+
+    def body(self, key):
+        """Pre-rendered response body, None when the snapshot has no such resource"""
+        body = self.bodies.get(key)
+        if body is None and key[0] == 'ema_analysis_all':
+            # Timeframes nobody analyses still get their (empty) listing
+            body = render(shape_all_ema_analysis(key[1], []))
+        return body
+
+class AnalysisSnapshotStore(threading.Thread):
+    """Keeps `current` fresh: LISTEN on Postgres, watermark polling everywhere"""
+
+    def __init__(self, backend, refresh_seconds=SNAPSHOT_REFRESH_SECONDS):
+        super().__init__(daemon=True)
+        self.backend = backend
+        self.refresh_seconds = refresh_seconds
+        self.current = None
+        self.stats = {'builds': 0, 'notifications': 0, 'last_build_ms': None, 'last_reason': None}
+
+    def refresh(self, reason):
+        start = time.perf_counter()
+        conn = self.backend.connect(dict_rows=True)
+        try:
+            snapshot = AnalysisSnapshot.build(conn)
+        finally:
+            conn.close()
+
+        # Atomic swap, in-flight requests keep the snapshot they already hold
+        self.current = snapshot
+
+        self.stats['builds'] += 1
+        self.stats['last_build_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        self.stats['last_reason'] = reason
+        print(f"📸 Analysis snapshot rebuilt ({reason}): {len(snapshot.coins)} coins in {self.stats['last_build_ms']}ms")
+
+    def is_stale(self):
+        if self.current is None:
+            return True
+
+        conn = self.backend.connect()
+        try:
+            watermarks = read_watermarks(conn, snapshot_watermark_names())
+        except Exception as e:
+            print(f"⚠️  Watermarks unavailable: {e}")
+            return False
+        finally:
+            conn.close()
+
+        return watermarks != self.current.watermarks
+
+    def run(self):
+        while True:
+            try:
+                if self.backend.name == 'postgres':
+                    self.listen()
+                else:
+                    self.poll()
+            except Exception as e:
+                print(f"⚠️  Analysis snapshot listener error: {e}")
+                time.sleep(5)
+
+    def listen(self):
+        import psycopg
+        from psycopg import sql
+
+        with psycopg.connect(self.backend.database_url, autocommit=True) as conn:
+            conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(ANALYSIS_CHANNEL)))
+
+            # Build after LISTEN so a tick finishing in between isn't missed (also covers reconnects)
+            self.refresh('startup')
+
+            while True:
+                notified = False
+                for _ in conn.notifies(timeout=self.refresh_seconds, stop_after=1):
+                    notified = True
+
+                if notified:
+                    self.stats['notifications'] += 1
+                    for _ in conn.notifies(timeout=SNAPSHOT_DEBOUNCE_SECONDS):
+                        self.stats['notifications'] += 1
+                    self.refresh('notify')
+                elif self.is_stale():
+                    self.refresh('watermark')
+
+    def poll(self):
+        self.refresh('startup')
+
+        while True:
+            time.sleep(self.refresh_seconds)
+            if self.is_stale():
+                self.refresh('watermark')
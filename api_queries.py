@@ -0,0 +1,324 @@
+"""
+API Queries
+SQL and response shaping shared by the Flask (api_server_with_db) and ASGI (api_server_async)
+servers, so both return identical JSON for the same rows
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from retention import retained_candles
+
+COINS_SQL = """
+    SELECT * FROM coins
+    ORDER BY market_cap_rank ASC
+"""
+
+COIN_SQL = """
+    SELECT * FROM coins WHERE symbol = %s
+"""
+
+EMA_ANALYSIS_SQL = """
+    SELECT symbol, timeframe, current_price, ema50, pct_from_ema50, above_ema50, analysis_date
+    FROM (
+        SELECT *, ROW_NUMBER() OVER (PARTITION BY timeframe ORDER BY analysis_date DESC) AS rn
+        FROM ema_analysis
+        WHERE symbol = %s
+    ) latest
+    WHERE rn = 1
+    ORDER BY timeframe
+"""
+
+ALL_EMA_ANALYSIS_SQL = """
+    SELECT symbol, name, market_cap_rank, timeframe, current_price, ema50,
+           pct_from_ema50, above_ema50, analysis_date
+    FROM (
+        SELECT
+            ea.symbol,
+            c.name,
+            c.market_cap_rank,
+            ea.timeframe,
+            ea.current_price,
+            ea.ema50,
+            ea.pct_from_ema50,
+            ea.above_ema50,
+            ea.analysis_date,
+            ROW_NUMBER() OVER (PARTITION BY ea.symbol ORDER BY ea.analysis_date DESC) AS rn
+        FROM ema_analysis ea
+        JOIN coins c ON ea.symbol = c.symbol
+        WHERE ea.timeframe = %s
+    ) latest
+    WHERE rn = 1
+    ORDER BY symbol
+"""
+
+COIN_INFO_SQL = """
+    SELECT symbol, name, market_cap_rank, current_price,
+           market_cap, binance_symbol, data_source, last_updated
+    FROM coins
+    WHERE symbol = %s
+"""
+
+COVERAGE_SQL = """
+    SELECT
+        timeframe,
+        COUNT(*) as candle_count,
+        MIN(time) as earliest_candle,
+        MAX(time) as latest_candle
+    FROM candles
+    WHERE symbol = %s
+    GROUP BY timeframe
+    ORDER BY
+        CASE timeframe
+            WHEN '15m' THEN 1
+            WHEN '1h' THEN 2
+            WHEN '4h' THEN 3
+            WHEN '1d' THEN 4
+            WHEN '1w' THEN 5
+        END
+"""
+
+DETAILS_EMA_SQL = """
+    SELECT timeframe, current_price, ema50, pct_from_ema50, above_ema50, analysis_date
+    FROM (
+        SELECT *, ROW_NUMBER() OVER (PARTITION BY timeframe ORDER BY analysis_date DESC) AS rn
+        FROM ema_analysis
+        WHERE symbol = %s
+    ) latest
+    WHERE rn = 1
+    ORDER BY timeframe
+"""
+
+PRICE_RANGE_SQL = """
+    SELECT
+        MIN(low) as all_time_low,
+        MAX(high) as all_time_high,
+        MIN(CASE WHEN time >= %s THEN low END) as five_year_low,
+        MAX(CASE WHEN time >= %s THEN high END) as five_year_high,
+        MIN(CASE WHEN time >= %s THEN low END) as one_year_low,
+        MAX(CASE WHEN time >= %s THEN high END) as one_year_high
+    FROM candles
+    WHERE symbol = %s AND timeframe = '1d'
+"""
+
+SCAN_HISTORY_SQL = """
+    SELECT * FROM scan_history
+    ORDER BY scan_date DESC
+    LIMIT %s
+"""
+
+CURRENT_PRICES_SQL = """
+    SELECT * FROM current_prices
+    ORDER BY last_updated DESC
+"""
+
+# (stats key, query, column) run in order by /api/database-stats
+DATABASE_STATS_SQL = [
+    ('candles', "SELECT COUNT(*) as count FROM candles", 'count'),
+    ('coins', "SELECT COUNT(*) as count FROM coins", 'count'),
+    ('ema_analysis', "SELECT COUNT(*) as count FROM ema_analysis", 'count'),
+    ('scans', "SELECT COUNT(*) as count FROM scan_history", 'count'),
+    ('latest_scan', "SELECT MAX(scan_date) as latest FROM scan_history", 'latest'),
+    ('oldest_candle', "SELECT MIN(time) as oldest FROM candles", 'oldest')
+]
+
+# Expected candles for a full 5 years, the data quality score is coverage against this
+EXPECTED_CANDLES = {
+    '15m': 175200,  # 5 years
+    '1h': 43800,
+    '4h': 10950,
+    '1d': 1825,
+    '1w': 260
+}
+
+def shape_ema_analysis(symbol, results):
+    """/api/ema-analysis/<symbol> body from the latest row per timeframe"""
+    analysis = {}
+    for row in results:
+        analysis[row['timeframe']] = {
+            'current_price': row['current_price'],
+            'ema50': row['ema50'],
+            'pct_from_ema50': row['pct_from_ema50'],
+            'above_ema50': row['above_ema50'],
+            'analysis_date': row['analysis_date'].isoformat()
+        }
+
+    return {
+        'symbol': symbol.upper(),
+        'analysis': analysis
+    }
+
+def shape_all_ema_analysis(timeframe, results):
+    """/api/ema-analysis/all body, coins split by side of the EMA"""
+    above_ema = [r for r in results if r['above_ema50']]
+    below_ema = [r for r in results if not r['above_ema50']]
+
+    return {
+        'timeframe': timeframe,
+        'total': len(results),
+        'above_ema50': {
+            'count': len(above_ema),
+            'coins': above_ema
+        },
+        'below_ema50': {
+            'count': len(below_ema),
+            'coins': below_ema
+        }
+    }
+
+def price_range_params(symbol, now=None):
+    """Parameters for PRICE_RANGE_SQL"""
+    now = now or datetime.now(timezone.utc)
+    five_years_ago = now - timedelta(days=round(5 * 365.25))
+    one_year_ago = now - timedelta(days=365)
+    return (five_years_ago, five_years_ago, one_year_ago, one_year_ago, symbol)
+
+def shape_coin_details(coin_info, coverage, ema_analysis, price_range):
+    """
+    /api/coins/<symbol>/details body:
+    - Data coverage (candles per timeframe) and quality score
+    - EMA analysis across all timeframes
+    - Historical price range (5-year high/low)
+    - Trading confidence
+    """
+    # Calculate years of coverage and quality for each timeframe
+    coverage_data = []
+    total_quality = 0
+
+    for tf in coverage:
+        earliest = tf['earliest_candle']
+        latest = tf['latest_candle']
+        candle_count = tf['candle_count']
+
+        # Calculate years of data
+        if earliest and latest:
+            time_span = latest - earliest
+            years = time_span.days / 365.25
+        else:
+            years = 0
+
+        # Calculate quality score (0-100), how close to 5 years of data we have
+        # Timeframes under a retention policy only keep their window
+        expected = retained_candles(tf['timeframe'], EXPECTED_CANDLES.get(tf['timeframe'], 1000))
+        quality = min(100, int((candle_count / expected) * 100))
+        total_quality += quality
+
+        # Quality label
+        if quality >= 90:
+            quality_label = "Excellent"
+            quality_color = "green"
+        elif quality >= 70:
+            quality_label = "Good"
+            quality_color = "cyan"
+        elif quality >= 50:
+            quality_label = "Fair"
+            quality_color = "yellow"
+        else:
+            quality_label = "Limited"
+            quality_color = "orange"
+
+        coverage_data.append({
+            'timeframe': tf['timeframe'],
+            'candle_count': candle_count,
+            'earliest_candle': earliest.isoformat() if earliest else None,
+            'latest_candle': latest.isoformat() if latest else None,
+            'years_of_data': round(years, 2),
+            'quality_score': quality,
+            'quality_label': quality_label,
+            'quality_color': quality_color
+        })
+
+    # Overall data quality score
+    overall_quality = int(total_quality / len(coverage)) if coverage else 0
+
+    # Calculate current price position
+    current_price = float(coin_info['current_price']) if coin_info['current_price'] else 0
+
+    if price_range and price_range['five_year_low'] and price_range['five_year_high']:
+        five_year_range = float(price_range['five_year_high']) - float(price_range['five_year_low'])
+        if five_year_range > 0:
+            price_position = ((current_price - float(price_range['five_year_low'])) / five_year_range) * 100
+        else:
+            price_position = 50
+    else:
+        price_position = None
+
+    # Trading confidence score
+    # Based on: data quality + EMA trend alignment + price position
+    confidence_factors = []
+
+    if overall_quality >= 80:
+        confidence_factors.append("Excellent data coverage")
+    elif overall_quality >= 60:
+        confidence_factors.append("Good data coverage")
+    else:
+        confidence_factors.append("Limited historical data")
+
+    # Check EMA alignment across timeframes
+    if ema_analysis:
+        above_count = sum(1 for e in ema_analysis if e['above_ema50'])
+        ema_alignment = (above_count / len(ema_analysis)) * 100
+
+        if ema_alignment >= 80:
+            confidence_factors.append("Strong bullish trend")
+        elif ema_alignment >= 60:
+            confidence_factors.append("Bullish momentum")
+        elif ema_alignment <= 20:
+            confidence_factors.append("Strong bearish trend")
+        elif ema_alignment <= 40:
+            confidence_factors.append("Bearish momentum")
+        else:
+            confidence_factors.append("Mixed signals")
+
+    # Overall confidence
+    if overall_quality >= 80 and len(ema_analysis) >= 4:
+        confidence = "HIGH"
+        confidence_color = "green"
+    elif overall_quality >= 60 and len(ema_analysis) >= 3:
+        confidence = "MEDIUM"
+        confidence_color = "cyan"
+    else:
+        confidence = "LOW"
+        confidence_color = "orange"
+
+    def price(key):
+        return float(price_range[key]) if price_range and price_range[key] else None
+
+    return {
+        'coin_info': coin_info,
+        'data_coverage': coverage_data,
+        'overall_quality': overall_quality,
+        'ema_analysis': ema_analysis,
+        'price_range': {
+            'all_time_low': price('all_time_low'),
+            'all_time_high': price('all_time_high'),
+            'five_year_low': price('five_year_low'),
+            'five_year_high': price('five_year_high'),
+            'one_year_low': price('one_year_low'),
+            'one_year_high': price('one_year_high'),
+            'current_price': current_price,
+            'price_position_5y': round(price_position, 1) if price_position else None
+        },
+        'trading_confidence': {
+            'level': confidence,
+            'color': confidence_color,
+            'factors': confidence_factors
+        }
+    }
+
+def shape_candles(symbol, timeframe, candles, next_cursor=None):
+    """/api/candles/<symbol> body, `candles` oldest first"""
+    return {
+        'symbol': symbol.upper(),
+        'timeframe': timeframe,
+        'candles': candles,
+        'count': len(candles),
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None
+    }
+
+def shape_database_stat(key, row, column):
+    """One /api/database-stats value, timestamps as ISO strings"""
+    value = row[column]
+    if key in ('latest_scan', 'oldest_candle'):
+        return value.isoformat() if value else None
+    return value
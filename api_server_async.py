@@ -0,0 +1,294 @@
+"""
+Async ASGI API Server
+Same routes and JSON as api_server_with_db, served by Quart on a pool of async psycopg
+connections so a slow query doesn't hold a thread per dashboard user
+
+    python api_server_async.py
+    hypercorn api_server_async:app --bind 0.0.0.0:5001
+"""
+
+import asyncio
+import os
+from datetime import datetime
+
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from quart import Quart, jsonify, request
+from quart_cors import cors
+
+from api_queries import (
+    ALL_EMA_ANALYSIS_SQL, COIN_INFO_SQL, COIN_SQL, COINS_SQL, COVERAGE_SQL,
+    CURRENT_PRICES_SQL, DETAILS_EMA_SQL, EMA_ANALYSIS_SQL,
+    PRICE_RANGE_SQL, SCAN_HISTORY_SQL, price_range_params, shape_all_ema_analysis,
+    shape_candles, shape_coin_details, shape_ema_analysis
+)
+from candle_pages import PageError, finish_page, page_records, page_sql, parse_page
+from database_stats import DatabaseStats
+from fast_json import FastJSONProvider
+from mmap_candle_store import get_candle_store, records_to_dicts
+from screener import SCREEN_TABLE_SQL, ScreenTable, strategic_summary
+from storage import get_backend
+
+app = Quart(__name__)
+app.json = FastJSONProvider(app)  # orjson for every jsonify, see fast_json
+app = cors(app, allow_origin="*")  # Enable CORS for all routes
+
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+# Connections kept open per process (one event loop serves every request)
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 2))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 20))
+
+# The async pool is Postgres-only, SQLite deployments use api_server_with_db
+storage_backend = get_backend()
+
+# Memory-mapped candle files kept by the worker (CANDLE_STORE_DIR), read before Postgres
+candle_store = get_candle_store()
+
+pool = None
+
+# Global scan status
+scan_status = {
+    'running': False,
+    'progress': 0,
+    'total': 0,
+    'current_coin': '',
+    'status_message': 'Ready',
+    'start_time': None,
+    'error': None
+}
+
+@app.before_serving
+async def open_pool():
+    global pool
+    if storage_backend.name != 'postgres' or not DATABASE_URL:
+        raise RuntimeError(f"api_server_async needs PostgreSQL (DATABASE_URL), not {storage_backend.describe()}")
+
+    pool = AsyncConnectionPool(
+        DATABASE_URL,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        kwargs={'row_factory': dict_row},
+        open=False
+    )
+    await pool.open()
+
+@app.after_serving
+async def close_pool():
+    if pool is not None:
+        await pool.close()
+
+async def fetchall(query, params=()):
+    async with pool.connection() as conn:
+        cur = await conn.execute(query, params)
+        return await cur.fetchall()
+
+async def fetchone(query, params=()):
+    async with pool.connection() as conn:
+        cur = await conn.execute(query, params)
+        return await cur.fetchone()
+
+@app.route('/health')
+async def health():
+    """Health check endpoint"""
+    try:
+        await fetchone("SELECT 1")
+
+        return jsonify({
+            'status': 'ok',
+            'database': 'connected',
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception as e:
+        print(f"❌ Health check failed: {e}")
+        return jsonify({
+            'status': 'error',
+            'database': 'disconnected',
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+@app.route('/api/coins')
+async def get_coins():
+    """Get all coins from database"""
+    try:
+        coins = await fetchall(COINS_SQL)
+
+        return jsonify({
+            'coins': coins,
+            'total': len(coins)
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/coins/<symbol>')
+async def get_coin(symbol):
+    """Get specific coin data"""
+    try:
+        coin = await fetchone(COIN_SQL, (symbol.upper(),))
+
+        if not coin:
+            return jsonify({'error': 'Coin not found'}), 404
+
+        return jsonify(coin)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/ema-analysis/<symbol>')
+async def get_ema_analysis(symbol):
+    """Get latest EMA analysis for a coin across all timeframes"""
+    try:
+        results = await fetchall(EMA_ANALYSIS_SQL, (symbol.upper(),))
+
+        if not results:
+            return jsonify({'error': 'No analysis data found'}), 404
+
+        return jsonify(shape_ema_analysis(symbol, results))
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/ema-analysis/all')
+async def get_all_ema_analysis():
+    """Get latest EMA analysis for all coins"""
+    try:
+        timeframe = request.args.get('timeframe', '1w')  # default to weekly
+
+        results = await fetchall(ALL_EMA_ANALYSIS_SQL, (timeframe,))
+
+        return jsonify(shape_all_ema_analysis(timeframe, results))
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/coins/<symbol>/details')
+async def get_coin_details(symbol):
+    """Coin info, data coverage, EMA analysis and price range (queries run concurrently)"""
+    try:
+        symbol = symbol.upper()
+
+        coin_info, coverage, ema_analysis, price_range = await asyncio.gather(
+            fetchone(COIN_INFO_SQL, (symbol,)),
+            fetchall(COVERAGE_SQL, (symbol,)),
+            fetchall(DETAILS_EMA_SQL, (symbol,)),
+            fetchone(PRICE_RANGE_SQL, price_range_params(symbol))
+        )
+
+        if not coin_info:
+            return jsonify({'error': 'Coin not found'}), 404
+
+        return jsonify(shape_coin_details(coin_info, coverage, ema_analysis, price_range))
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/candles/<symbol>')
+async def get_candles(symbol):
+    """Get candle data for a symbol, paged like the Flask server (see candle_pages)"""
+    try:
+        timeframe = request.args.get('timeframe', '1d')
+
+        try:
+            page = parse_page(request.args, symbol.upper(), timeframe)
+        except PageError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Chart windows straight from the page cache, no DB round-trip
+        records = page_records(candle_store, symbol, timeframe, page)
+        if records is not None and (len(records) or page['paged']):
+            records, next_cursor = finish_page(records, page, symbol.upper(), timeframe)
+            return jsonify(shape_candles(symbol, timeframe, records_to_dicts(records), next_cursor))
+
+        candles = await fetchall(*page_sql(symbol.upper(), timeframe, page))
+
+        if not candles and not page['paged']:
+            return jsonify({'error': 'No candle data found'}), 404
+
+        # Chronological order
+        candles, next_cursor = finish_page(candles, page, symbol.upper(), timeframe)
+        return jsonify(shape_candles(symbol, timeframe, candles, next_cursor))
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/strategic-summary')
+async def get_strategic_summary():
+    """Get strategic investment summary (EVALUATE, TRADE NOW, AVOID)"""
+    try:
+        table = ScreenTable(await fetchall(SCREEN_TABLE_SQL))
+
+        return jsonify(strategic_summary(table))
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/scan-history')
+async def get_scan_history():
+    """Get scan history"""
+    try:
+        limit = int(request.args.get('limit', 10))
+
+        history = await fetchall(SCAN_HISTORY_SQL, (limit,))
+
+        return jsonify({
+            'history': history,
+            'count': len(history)
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/status')
+async def get_status():
+    """Get current scan status"""
+    return jsonify(scan_status)
+
+@app.route('/api/current-prices')
+async def get_current_prices():
+    """Get current prices from database"""
+    try:
+        prices = await fetchall(CURRENT_PRICES_SQL)
+
+        return jsonify({
+            'prices': prices,
+            'count': len(prices)
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Planner estimates by default, ?exact=1 counts in the background (see database_stats)
+database_stats = DatabaseStats(storage_backend)
+
+@app.route('/api/database-stats')
+async def get_database_stats():
+    """Get database statistics"""
+    try:
+        exact = request.args.get('exact') == '1'
+        return jsonify(await asyncio.to_thread(database_stats.get, exact))
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+if __name__ == '__main__':
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    port = int(os.getenv('PORT', 5001))
+
+    print("=" * 60)
+    print("⚡ CRYPTO SCANNER ASYNC API WITH DATABASE")
+    print("=" * 60)
+    print(f"📡 API Server: http://localhost:{port}")
+    print(f"🐘 Database: {storage_backend.describe() if DATABASE_URL else 'Not configured'}")
+    print(f"🔌 Pool: {DB_POOL_MIN_SIZE}-{DB_POOL_MAX_SIZE} async connections")
+    print("=" * 60)
+
+    config = Config()
+    config.bind = [f"0.0.0.0:{port}"]
+    config.accesslog = None
+    asyncio.run(serve(app, config))
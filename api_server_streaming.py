@@ -7,20 +7,29 @@ from flask import Flask, jsonify, request, Response
 from flask_cors import CORS
 import sys
 import os
-import json
-import glob
 from datetime import datetime
 import threading
 import time
-import queue
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from compression import ResponseCompressor
 from crypto_ema_scanner import CryptoEMAScanner
+from event_hub import EventHub, frame
+from fast_json import FastJSONProvider
 from multi_timeframe_scanner import MultiTimeframeEMAScanner
+from scan_cache import get_scan_cache
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)  # orjson for every jsonify, see fast_json
 CORS(app)
 
+# gzip/br/zstd by Accept-Encoding, each scan body compressed once
+compressor = ResponseCompressor()
+compressor.install(app)
+
+# Manifest-indexed scan results shared with the scanners
+scan_cache = get_scan_cache()
+
 # Global state
 scan_status = {
     'running': False,
@@ -32,9 +41,11 @@ scan_status = {
     'error': None
 }
 
-# Queue for streaming results
-results_queue = queue.Queue()
-active_streams = []
+# Scan events fanned out to every /api/stream subscriber, with replay (see event_hub)
+event_hub = EventHub()
+
+# Seconds between heartbeats on an idle stream
+HEARTBEAT_SECONDS = 1
 
 def run_scan_thread(top_n, use_cache):
     """Run scan in background thread"""
@@ -65,24 +76,22 @@ def run_scan_thread(top_n, use_cache):
         
         # Fetch coins
         scan_status['status_message'] = 'Fetching top coins...'
-        coins = scanner.get_top_n_coins()
+        coins = scanner.get_coins()
         
         scan_status['total'] = len(coins)
         scan_status['status_message'] = 'Analyzing coins...'
         
+        # Series whose latest candle hasn't closed since the last scan are reused
+        # and series the worker already has in Postgres are read from there
+        previous_index = scanner.index_previous_scan(scanner.get_last_scan())
+        db_results = scanner.load_db_results(coins)
+        
         all_results = []
         for i, coin in enumerate(coins, 1):
             scan_status['progress'] = i
             scan_status['current_coin'] = f"{coin['name']} ({coin['symbol']})"
             
-            results = scanner.analyze_coin_all_timeframes(coin)
-            
-            coin_result = {
-                'coin_info': coin,
-                'weekly': results['weekly'],
-                'daily': results['daily'],
-                '4h': results['4h']
-            }
+            coin_result, refetched = scanner.scan_coin(coin, previous_index, db_results=db_results)
             all_results.append(coin_result)
             
             # Stream this result immediately
@@ -92,9 +101,10 @@ def run_scan_thread(top_n, use_cache):
                 'progress': i,
                 'total': len(coins)
             }
-            results_queue.put(stream_data)
+            event_hub.publish(stream_data)
             
-            time.sleep(0.5)
+            if refetched:
+                time.sleep(0.5)
         
         # Categorize and save
         scan_status['status_message'] = 'Processing results...'
@@ -104,10 +114,11 @@ def run_scan_thread(top_n, use_cache):
         
         scanner.save_results(results_above_weekly, results_below_weekly,
                            results_above_daily, results_below_daily, 
-                           results_4h, failed_coins)
+                           results_4h, failed_coins,
+                           all_coin_results=all_results)
         
         # Stream completion
-        results_queue.put({
+        event_hub.publish({
             'type': 'complete',
             'message': 'Scan completed successfully'
         })
@@ -119,7 +130,7 @@ def run_scan_thread(top_n, use_cache):
         scan_status['running'] = False
         scan_status['error'] = str(e)
         scan_status['status_message'] = f'Error: {str(e)}'
-        results_queue.put({
+        event_hub.publish({
             'type': 'error',
             'error': str(e)
         })
@@ -141,9 +152,8 @@ def start_scan():
     top_n = data.get('top_n', 10)
     use_cache = data.get('use_cache', True)
     
-    # Clear queue
-    while not results_queue.empty():
-        results_queue.get()
+    # Subscribers from here on are replayed this scan's events
+    event_hub.start_scan()
     
     # Start scan in background thread
     thread = threading.Thread(target=run_scan_thread, args=(top_n, use_cache))
@@ -154,45 +164,61 @@ def start_scan():
 
 @app.route('/api/stream')
 def stream_results():
-    """Server-Sent Events stream for real-time results"""
+    """Server-Sent Events stream for real-time results, resumable with Last-Event-ID"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    subscriber, backlog = event_hub.subscribe(last_event_id)
+    
     def event_stream():
-        # Send initial connection message
-        yield f"data: {json.dumps({'type': 'connected'})}\n\n"
-        
-        while True:
-            try:
-                # Get result from queue (timeout to allow checking if scan is done)
-                result = results_queue.get(timeout=1)
-                yield f"data: {json.dumps(result)}\n\n"
+        try:
+            # Send initial connection message
+            yield frame({'type': 'connected'})
+            
+            # Whatever this scan emitted before we joined (or since the client's last event)
+            for event in backlog:
+                yield event.frame
+                if event.final:
+                    return
+            
+            while True:
+                event = subscriber.get(timeout=HEARTBEAT_SECONDS)
                 
-                # If scan complete, close stream
-                if result.get('type') == 'complete' or result.get('type') == 'error':
+                if subscriber.dropped:
+                    # Fell too far behind, the client reconnects and resumes from the replay log
                     break
-                    
-            except queue.Empty:
-                # Send heartbeat to keep connection alive
-                if not scan_status['running']:
+                
+                if event is None:
+                    # Send heartbeat to keep connection alive
+                    if not scan_status['running']:
+                        break
+                    yield frame({'type': 'heartbeat'})
+                    continue
+                
+                yield event.frame
+                
+                # If scan complete, close stream
+                if event.final:
                     break
-                yield f"data: {json.dumps({'type': 'heartbeat'})}\n\n"
+        finally:
+            event_hub.unsubscribe(subscriber)
     
     return Response(event_stream(), mimetype='text/event-stream')
 
+@app.route('/api/stream/stats')
+def stream_stats():
+    """Subscribers, replayed and dropped streams"""
+    return jsonify(event_hub.get_stats())
+
 @app.route('/api/results/latest')
 def get_latest_results():
     """Get latest scan results"""
     try:
-        pattern = 'crypto_ema_scan_top*_*.json'
-        files = glob.glob(pattern)
+        # Encoded once per result file
+        body, entry = scan_cache.body(kind='ema_scan')
         
-        if not files:
+        if not body:
             return jsonify({'error': 'No scan results found'}), 404
         
-        latest_file = max(files, key=os.path.getctime)
-        
-        with open(latest_file, 'r') as f:
-            data = json.load(f)
-        
-        return jsonify(data)
+        return Response(body, mimetype=app.json.mimetype)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -201,19 +227,15 @@ def get_latest_results():
 def list_results():
     """List all available scan results"""
     try:
-        pattern = 'crypto_ema_scan_top*_*.json'
-        files = glob.glob(pattern)
-        
-        results = []
-        for file in files:
-            stat = os.stat(file)
-            results.append({
-                'filename': file,
-                'created': datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                'size': stat.st_size
-            })
-        
-        results.sort(key=lambda x: x['created'], reverse=True)
+        # Served from the manifest, newest first
+        results = [
+            {
+                'filename': entry['filename'],
+                'created': datetime.fromtimestamp(entry['created']).isoformat(),
+                'size': entry['size']
+            }
+            for entry in scan_cache.list(kind='ema_scan')
+        ]
         return jsonify(results)
         
     except Exception as e:
@@ -287,7 +309,7 @@ def start_multi_scan():
             scan_status['status_message'] = 'Running multi-timeframe scan...'
             
             scanner = MultiTimeframeEMAScanner(top_n=top_n, cache_duration_minutes=0)
-            all_results = scanner.scan_all_coins()
+            all_results = scanner.scan_all_coins(previous=scanner.get_last_scan())
             scanner.save_results(all_results)
             
             scan_status['running'] = False
@@ -307,18 +329,12 @@ def start_multi_scan():
 def get_latest_multi_results():
     """Get latest multi-timeframe scan results"""
     try:
-        pattern = 'crypto_ema_multi_scan_top*_*.json'
-        files = glob.glob(pattern)
+        body, entry = scan_cache.body(kind='multi_scan')
         
-        if not files:
+        if not body:
             return jsonify({'error': 'No multi-timeframe scan results found'}), 404
         
-        latest_file = max(files, key=os.path.getctime)
-        
-        with open(latest_file, 'r') as f:
-            data = json.load(f)
-        
-        return jsonify(data)
+        return Response(body, mimetype=app.json.mimetype)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -336,6 +352,7 @@ if __name__ == '__main__':
     print("  GET  /api/status          - Get scan status")
     print("  POST /api/scan            - Start new scan")
     print("  GET  /api/stream          - Real-time results stream (SSE)")
+    print("  GET  /api/stream/stats    - Stream subscribers and drops")
     print("  GET  /api/results/latest  - Get latest results")
     print("  GET  /api/results/list    - List all results")
     print("  GET  /api/demo            - Run demo scan")
@@ -3,27 +3,157 @@ Enhanced Flask API Server with PostgreSQL Database
 Serves candle data instantly from database
 """
 
-from flask import Flask, jsonify, request, Response
+from flask import Flask, jsonify, request, Response, stream_with_context
 from flask_cors import CORS
 from flask_cors import CORS
-import psycopg
-from psycopg.rows import dict_row
 import os
 import json
 from datetime import datetime, timedelta
 import threading
 import time
+from functools import wraps
+
+from analysis_snapshot import AnalysisSnapshotStore
+from api_queries import (
+    ALL_EMA_ANALYSIS_SQL, COIN_INFO_SQL, COIN_SQL, COINS_SQL, COVERAGE_SQL,
+    CURRENT_PRICES_SQL, DETAILS_EMA_SQL, EMA_ANALYSIS_SQL,
+    PRICE_RANGE_SQL, SCAN_HISTORY_SQL, price_range_params, shape_all_ema_analysis,
+    shape_candles, shape_coin_details, shape_ema_analysis
+)
+from batch_queries import (
+    BATCH_FETCH_ROWS, BatchError, batch_analysis_query, batch_candles_query, grouped,
+    parse_candle_batch, parse_symbols, request_order, split_arg, stream_items
+)
+from candle_pages import PageError, finish_page, page_records, page_slice, page_sql, parse_page
+from candle_series import SeriesCache, load_series, parse_series, series_payload
+from candle_formats import (
+    COLUMNS, MIMETYPES, columnar_payload, encode_arrow, encode_msgpack, negotiate, records_to_columns, rows_to_columns
+)
+from compression import ResponseCompressor, matching_etag
+from database_stats import DatabaseStats
+from derived_timeframes import DERIVED_CACHE_ENTRIES, is_derived, load_derived, source_timeframe
+from fast_json import FastJSONProvider
+from mmap_candle_store import get_candle_store, range_of, records_to_dicts
+from screener import (
+    PRESETS, SCREEN_DEFAULT_LIMIT, SCREEN_TABLE_SQL, ScreenError, ScreenTable,
+    parse, parse_sort, screen_payload, screen_query, strategic_summary
+)
+from single_flight import SingleFlight
+from storage import get_backend
+from watermarks import TIMEFRAMES, WatermarkReader, validators
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)  # orjson for every jsonify, see fast_json
 CORS(app)  # Enable CORS for all routes
 CORS(app)
 
 # Database connection pool
 DATABASE_URL = os.getenv('DATABASE_URL')
 
+# Postgres, or SQLite for single-node deployments (STORAGE_BACKEND=sqlite)
+storage_backend = get_backend()
+
 def get_db_connection():
     """Get database connection"""
-    return psycopg.connect(DATABASE_URL, row_factory=dict_row)
+    return storage_backend.connect(dict_rows=True)
+
+# gzip/br/zstd by Accept-Encoding, compressed once per ETag (counters at /api/compression-stats)
+compressor = ResponseCompressor()
+compressor.install(app)
+
+# Version tokens for conditional responses, bumped by the worker with every write
+watermark_reader = WatermarkReader(storage_backend)
+
+def conditional(resources):
+    """
+    ETag / Last-Modified from the data watermarks `resources()` names for this request
+    A matching If-None-Match (or If-Modified-Since) gets a 304 before any query runs
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            names = resources(**kwargs)
+            # Read before the view queries, so the body is never older than its ETag
+            snapshot = get_snapshot()
+            if snapshot and all(name in snapshot.watermarks for name in names):
+                watermarks = snapshot.watermarks  # Exactly the versions the snapshot was built from
+            else:
+                watermarks = watermark_reader.get(names)
+            # The Accept header picks the representation on negotiated endpoints
+            key = f"{request.full_path}|{request.headers.get('Accept', '')}"
+            etag, last_modified = validators(watermarks, names, key)
+            if etag is None:
+                return view(*args, **kwargs)
+            
+            if request.if_none_match:
+                # The client may hold any coding of this version, see compression.encoded_etag
+                matched = matching_etag(request.if_none_match, etag)
+                not_modified = matched is not None
+            else:
+                matched = etag
+                not_modified = bool(request.if_modified_since) and \
+                    last_modified.replace(microsecond=0) <= request.if_modified_since
+            
+            if not_modified:
+                response = Response(status=304)
+                response.set_etag(matched)
+            else:
+                # Already compressed for this ETag and Accept-Encoding: the view needn't run
+                response = compressor.cached_response(etag)
+                if response is None:
+                    response = app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    response.set_etag(etag)  # Suffixed with the coding once compressed
+            
+            response.last_modified = last_modified
+            response.cache_control.no_cache = True  # Always revalidate, it's a 304 when unchanged
+            return response
+        return wrapper
+    return decorator
+
+# Identical concurrent requests share one execution (counters at /api/coalescing-stats)
+single_flight = SingleFlight()
+
+def coalesce(view):
+    """Concurrent requests for the same route and arguments share one run of `view` and its bytes"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = (
+            request.endpoint,
+            tuple(sorted(kwargs.items())),
+            tuple(sorted(request.args.items(multi=True))),
+            request.headers.get('Accept', '')
+        )
+        
+        def run():
+            response = app.make_response(view(*args, **kwargs))
+            return response.get_data(), response.status_code, list(response.headers)
+        
+        (body, status, headers), shared = single_flight.do(key, run, group=request.endpoint)
+        return Response(body, status=status, headers=headers)
+    return wrapper
+
+def timeframe_arg():
+    return request.args.get('timeframe', '1w')
+
+# Coins + latest analysis held in memory, rebuilt on the worker's NOTIFY (API_SNAPSHOT=0 disables)
+API_SNAPSHOT = os.getenv('API_SNAPSHOT', '1') != '0'
+
+analysis_snapshot = None
+if API_SNAPSHOT and storage_backend.configured:
+    analysis_snapshot = AnalysisSnapshotStore(storage_backend)
+    analysis_snapshot.start()
+
+def get_snapshot():
+    """Current analysis snapshot, None until the first build (requests then go to the database)"""
+    return analysis_snapshot.current if analysis_snapshot else None
+
+def snapshot_response(body):
+    return Response(body, mimetype=app.json.mimetype)
+
+# Memory-mapped candle files kept by the worker (CANDLE_STORE_DIR), read before Postgres
+candle_store = get_candle_store()
 
 # Global scan status
 scan_status = {
@@ -40,7 +170,7 @@ scan_status = {
 def health():
     """Health check endpoint"""
     print("🔍 Health check called")
-    print(f"DATABASE_URL present: {DATABASE_URL is not None}")
+    print(f"Storage: {storage_backend.describe()}, configured: {storage_backend.configured}")
     
     try:
         print("Attempting database connection...")
@@ -71,16 +201,19 @@ def health():
         }), 500
 
 @app.route('/api/coins')
+@conditional(lambda: ['coins'])
+@coalesce
 def get_coins():
     """Get all coins from database"""
+    snapshot = get_snapshot()
+    if snapshot:
+        return snapshot_response(snapshot.body('coins'))
+    
     try:
         conn = get_db_connection()
         cur = conn.cursor()
         
-        cur.execute("""
-            SELECT * FROM coins 
-            ORDER BY market_cap_rank ASC
-        """)
+        cur.execute(COINS_SQL)
         
         coins = cur.fetchall()
         
@@ -96,16 +229,21 @@ def get_coins():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/coins/<symbol>')
+@conditional(lambda symbol: ['coins'])
+@coalesce
 def get_coin(symbol):
     """Get specific coin data"""
+    snapshot = get_snapshot()
+    if snapshot:
+        body = snapshot.body(('coin', symbol.upper()))
+        return snapshot_response(body) if body else (jsonify({'error': 'Coin not found'}), 404)
+    
     try:
         conn = get_db_connection()
         cur = conn.cursor()
         
         # Get coin info
-        cur.execute("""
-            SELECT * FROM coins WHERE symbol = %s
-        """, (symbol.upper(),))
+        cur.execute(COIN_SQL, (symbol.upper(),))
         
         coin = cur.fetchone()
         
@@ -121,106 +259,100 @@ def get_coin(symbol):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/ema-analysis/<symbol>')
+@conditional(lambda symbol: [f"ema_analysis:{tf}" for tf in TIMEFRAMES])
+@coalesce
 def get_ema_analysis(symbol):
     """Get latest EMA analysis for a coin across all timeframes"""
+    snapshot = get_snapshot()
+    if snapshot:
+        body = snapshot.body(('ema_analysis', symbol.upper()))
+        return snapshot_response(body) if body else (jsonify({'error': 'No analysis data found'}), 404)
+    
     try:
         conn = get_db_connection()
         cur = conn.cursor()
         
         # Get latest analysis for each timeframe
-        cur.execute("""
-            SELECT DISTINCT ON (timeframe)
-                symbol,
-                timeframe,
-                current_price,
-                ema50,
-                pct_from_ema50,
-                above_ema50,
-                analysis_date
-            FROM ema_analysis
-            WHERE symbol = %s
-            ORDER BY timeframe, analysis_date DESC
-        """, (symbol.upper(),))
+        cur.execute(EMA_ANALYSIS_SQL, (symbol.upper(),))
         
         results = cur.fetchall()
         
         if not results:
             return jsonify({'error': 'No analysis data found'}), 404
         
-        # Organize by timeframe
-        analysis = {}
-        for row in results:
-            analysis[row['timeframe']] = {
-                'current_price': row['current_price'],
-                'ema50': row['ema50'],
-                'pct_from_ema50': row['pct_from_ema50'],
-                'above_ema50': row['above_ema50'],
-                'analysis_date': row['analysis_date'].isoformat()
-            }
+        cur.close()
+        conn.close()
+        
+        return jsonify(shape_ema_analysis(symbol, results))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/ema-analysis/batch')
+@conditional(lambda: [f"ema_analysis:{tf}" for tf in TIMEFRAMES])
+def get_ema_analysis_batch():
+    """Latest EMA analysis for ?symbols=BTC,ETH,... in one request, see batch_queries"""
+    try:
+        symbols = parse_symbols(request.args)
+    except BatchError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    snapshot = get_snapshot()
+    if snapshot:
+        # The same pre-rendered bodies /api/ema-analysis/<symbol> serves
+        items = [(symbol, snapshot.body(('ema_analysis', symbol))) for symbol in symbols]
+        return Response(stream_items('analysis', items), mimetype=app.json.mimetype)
+    
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute(*batch_analysis_query(storage_backend.name, symbols))
+        
+        results = request_order(cur.fetchall(), symbols, key=lambda row: row['symbol'])
         
         cur.close()
         conn.close()
         
-        return jsonify({
-            'symbol': symbol.upper(),
-            'analysis': analysis
-        })
+        items = [
+            (symbol, app.json.dumps(shape_ema_analysis(symbol, rows)).encode() if rows else None)
+            for symbol, rows in grouped(results, symbols, key=lambda row: row['symbol'])
+        ]
+        return Response(stream_items('analysis', items), mimetype=app.json.mimetype)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/ema-analysis/all')
+@conditional(lambda: ['coins', f"ema_analysis:{timeframe_arg()}"])
+@coalesce
 def get_all_ema_analysis():
     """Get latest EMA analysis for all coins"""
     try:
         timeframe = request.args.get('timeframe', '1w')  # default to weekly
         
+        snapshot = get_snapshot()
+        if snapshot:
+            return snapshot_response(snapshot.body(('ema_analysis_all', timeframe)))
+        
         conn = get_db_connection()
         cur = conn.cursor()
         
-        cur.execute("""
-            SELECT DISTINCT ON (symbol)
-                ea.symbol,
-                c.name,
-                c.market_cap_rank,
-                ea.timeframe,
-                ea.current_price,
-                ea.ema50,
-                ea.pct_from_ema50,
-                ea.above_ema50,
-                ea.analysis_date
-            FROM ema_analysis ea
-            JOIN coins c ON ea.symbol = c.symbol
-            WHERE ea.timeframe = %s
-            ORDER BY ea.symbol, ea.analysis_date DESC
-        """, (timeframe,))
+        cur.execute(ALL_EMA_ANALYSIS_SQL, (timeframe,))
         
         results = cur.fetchall()
         
         cur.close()
         conn.close()
         
-        # Categorize results
-        above_ema = [r for r in results if r['above_ema50']]
-        below_ema = [r for r in results if not r['above_ema50']]
-        
-        return jsonify({
-            'timeframe': timeframe,
-            'total': len(results),
-            'above_ema50': {
-                'count': len(above_ema),
-                'coins': above_ema
-            },
-            'below_ema50': {
-                'count': len(below_ema),
-                'coins': below_ema
-            }
-        })
+        return jsonify(shape_all_ema_analysis(timeframe, results))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/coins/<symbol>/details')
+@conditional(lambda symbol: ['coins'] + [f"{kind}:{tf}" for kind in ('candles', 'ema_analysis') for tf in TIMEFRAMES])
+@coalesce
 def get_coin_details(symbol):
     """
     Get comprehensive coin details including:
@@ -236,12 +368,7 @@ def get_coin_details(symbol):
         cur = conn.cursor()
         
         # 1. Get coin basic info
-        cur.execute("""
-            SELECT symbol, name, market_cap_rank, current_price, 
-                   market_cap, binance_symbol, data_source, last_updated
-            FROM coins
-            WHERE symbol = %s
-        """, (symbol,))
+        cur.execute(COIN_INFO_SQL, (symbol,))
         
         coin_info = cur.fetchone()
         
@@ -251,330 +378,301 @@ def get_coin_details(symbol):
             return jsonify({'error': 'Coin not found'}), 404
         
         # 2. Get data coverage per timeframe
-        cur.execute("""
-            SELECT 
-                timeframe,
-                COUNT(*) as candle_count,
-                MIN(time) as earliest_candle,
-                MAX(time) as latest_candle
-            FROM candles
-            WHERE symbol = %s
-            GROUP BY timeframe
-            ORDER BY 
-                CASE timeframe
-                    WHEN '15m' THEN 1
-                    WHEN '1h' THEN 2
-                    WHEN '4h' THEN 3
-                    WHEN '1d' THEN 4
-                    WHEN '1w' THEN 5
-                END
-        """, (symbol,))
-        
+        cur.execute(COVERAGE_SQL, (symbol,))
         coverage = cur.fetchall()
         
-        # Calculate years of coverage and quality for each timeframe
-        coverage_data = []
-        total_quality = 0
-        
-        for tf in coverage:
-            earliest = tf['earliest_candle']
-            latest = tf['latest_candle']
-            candle_count = tf['candle_count']
-            
-            # Calculate years of data
-            if earliest and latest:
-                time_span = latest - earliest
-                years = time_span.days / 365.25
-            else:
-                years = 0
-            
-            # Calculate quality score (0-100)
-            # Based on how close to 5 years of data we have
-            expected_candles = {
-                '15m': 175200,  # 5 years
-                '1h': 43800,
-                '4h': 10950,
-                '1d': 1825,
-                '1w': 260
-            }
-            
-            expected = expected_candles.get(tf['timeframe'], 1000)
-            quality = min(100, int((candle_count / expected) * 100))
-            total_quality += quality
-            
-            # Quality label
-            if quality >= 90:
-                quality_label = "Excellent"
-                quality_color = "green"
-            elif quality >= 70:
-                quality_label = "Good"
-                quality_color = "cyan"
-            elif quality >= 50:
-                quality_label = "Fair"
-                quality_color = "yellow"
-            else:
-                quality_label = "Limited"
-                quality_color = "orange"
-            
-            coverage_data.append({
-                'timeframe': tf['timeframe'],
-                'candle_count': candle_count,
-                'earliest_candle': earliest.isoformat() if earliest else None,
-                'latest_candle': latest.isoformat() if latest else None,
-                'years_of_data': round(years, 2),
-                'quality_score': quality,
-                'quality_label': quality_label,
-                'quality_color': quality_color
-            })
-        
-        # Overall data quality score
-        overall_quality = int(total_quality / len(coverage)) if coverage else 0
-        
         # 3. Get EMA analysis for all timeframes
-        cur.execute("""
-            SELECT DISTINCT ON (timeframe)
-                timeframe,
-                current_price,
-                ema50,
-                pct_from_ema50,
-                above_ema50,
-                analysis_date
-            FROM ema_analysis
-            WHERE symbol = %s
-            ORDER BY timeframe, analysis_date DESC
-        """, (symbol,))
-        
+        cur.execute(DETAILS_EMA_SQL, (symbol,))
         ema_analysis = cur.fetchall()
         
         # 4. Get historical price range (all-time or 5 years)
-        cur.execute("""
-            SELECT 
-                MIN(low) as all_time_low,
-                MAX(high) as all_time_high,
-                MIN(CASE WHEN time >= NOW() - INTERVAL '5 years' THEN low END) as five_year_low,
-                MAX(CASE WHEN time >= NOW() - INTERVAL '5 years' THEN high END) as five_year_high,
-                MIN(CASE WHEN time >= NOW() - INTERVAL '1 year' THEN low END) as one_year_low,
-                MAX(CASE WHEN time >= NOW() - INTERVAL '1 year' THEN high END) as one_year_high
-            FROM candles
-            WHERE symbol = %s AND timeframe = '1d'
-        """, (symbol,))
-        
+        cur.execute(PRICE_RANGE_SQL, price_range_params(symbol))
         price_range = cur.fetchone()
         
-        # Calculate current price position
-        current_price = float(coin_info['current_price']) if coin_info['current_price'] else 0
-        
-        if price_range and price_range['five_year_low'] and price_range['five_year_high']:
-            five_year_range = float(price_range['five_year_high']) - float(price_range['five_year_low'])
-            if five_year_range > 0:
-                price_position = ((current_price - float(price_range['five_year_low'])) / five_year_range) * 100
-            else:
-                price_position = 50
-        else:
-            price_position = None
-        
-        # 5. Trading confidence score
-        # Based on: data quality + EMA trend alignment + price position
-        confidence_factors = []
-        
-        if overall_quality >= 80:
-            confidence_factors.append("Excellent data coverage")
-        elif overall_quality >= 60:
-            confidence_factors.append("Good data coverage")
-        else:
-            confidence_factors.append("Limited historical data")
-        
-        # Check EMA alignment across timeframes
-        if ema_analysis:
-            above_count = sum(1 for e in ema_analysis if e['above_ema50'])
-            ema_alignment = (above_count / len(ema_analysis)) * 100
-            
-            if ema_alignment >= 80:
-                confidence_factors.append("Strong bullish trend")
-            elif ema_alignment >= 60:
-                confidence_factors.append("Bullish momentum")
-            elif ema_alignment <= 20:
-                confidence_factors.append("Strong bearish trend")
-            elif ema_alignment <= 40:
-                confidence_factors.append("Bearish momentum")
-            else:
-                confidence_factors.append("Mixed signals")
-        
-        # Overall confidence
-        if overall_quality >= 80 and len(ema_analysis) >= 4:
-            confidence = "HIGH"
-            confidence_color = "green"
-        elif overall_quality >= 60 and len(ema_analysis) >= 3:
-            confidence = "MEDIUM"
-            confidence_color = "cyan"
-        else:
-            confidence = "LOW"
-            confidence_color = "orange"
-        
         cur.close()
         conn.close()
         
-        return jsonify({
-            'coin_info': coin_info,
-            'data_coverage': coverage_data,
-            'overall_quality': overall_quality,
-            'ema_analysis': ema_analysis,
-            'price_range': {
-                'all_time_low': float(price_range['all_time_low']) if price_range and price_range['all_time_low'] else None,
-                'all_time_high': float(price_range['all_time_high']) if price_range and price_range['all_time_high'] else None,
-                'five_year_low': float(price_range['five_year_low']) if price_range and price_range['five_year_low'] else None,
-                'five_year_high': float(price_range['five_year_high']) if price_range and price_range['five_year_high'] else None,
-                'one_year_low': float(price_range['one_year_low']) if price_range and price_range['one_year_low'] else None,
-                'one_year_high': float(price_range['one_year_high']) if price_range and price_range['one_year_high'] else None,
-                'current_price': current_price,
-                'price_position_5y': round(price_position, 1) if price_position else None
-            },
-            'trading_confidence': {
-                'level': confidence,
-                'color': confidence_color,
-                'factors': confidence_factors
-            }
-        })
+        return jsonify(shape_coin_details(coin_info, coverage, ema_analysis, price_range))
         
     except Exception as e:
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+def candles_resource():
+    """Watermark of the candles behind ?timeframe=, derived timeframes follow their source"""
+    timeframe = request.args.get('timeframe', '1d')
+    return f"candles:{source_timeframe(timeframe) or timeframe}"
+
+# Derived timeframes (2h, 3d, ...) aggregated over the full history, see derived_timeframes
+derived_cache = SeriesCache(max_entries=DERIVED_CACHE_ENTRIES)
+
+def derived_records(symbol, timeframe):
+    """Cached derived series, rebuilt once the source timeframe has new candles"""
+    resource = candles_resource()
+    watermark = watermark_reader.get([resource]).get(resource)
+    key = (symbol.upper(), timeframe, watermark[0] if watermark else None)
+    
+    records = derived_cache.get(key) if watermark else None
+    if records is None:
+        conn = storage_backend.connect()
+        try:
+            records = load_derived(conn, storage_backend.name, symbol.upper(), timeframe)
+        finally:
+            conn.close()
+        if watermark:
+            derived_cache.put(key, records)
+    return records
+
 @app.route('/api/candles/<symbol>')
+@conditional(lambda symbol: [candles_resource()])
+@coalesce
 def get_candles(symbol):
-    """Get candle data for a symbol"""
+    """
+    Get candle data for a symbol
+    ?format= (or Accept) json, columnar, msgpack or arrow, see candle_formats
+    ?before= / ?after= / ?from= / ?to= / ?cursor= pages through history, see candle_pages
+    ?timeframe= beyond the stored ones (30m, 2h, 3d, 2w, ...) is aggregated on the fly
+    """
     try:
         timeframe = request.args.get('timeframe', '1d')
-        limit = int(request.args.get('limit', 100))
         
-        conn = get_db_connection()
+        try:
+            page = parse_page(request.args, symbol.upper(), timeframe)
+        except PageError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        fmt, error = negotiate(request.args.get('format'), request.accept_mimetypes)
+        if error:
+            return jsonify({'error': error}), 406
+        
+        # Chart windows straight from the page cache, no DB round-trip
+        if is_derived(timeframe):
+            records = page_slice(derived_records(symbol, timeframe), page)
+            if not len(records) and not page['paged']:
+                return jsonify({'error': 'No candle data found'}), 404
+        else:
+            records = page_records(candle_store, symbol, timeframe, page)
+        
+        if records is not None and (len(records) or page['paged']):
+            records, next_cursor = finish_page(records, page, symbol.upper(), timeframe)
+            if fmt == 'json':
+                return candles_response(fmt, symbol, timeframe, records_to_dicts(records), next_cursor)
+            return candles_response(fmt, symbol, timeframe, records_to_columns(records), next_cursor)
+        
+        # Columnar formats skip the per-row dicts
+        conn = storage_backend.connect(dict_rows=fmt == 'json')
         cur = conn.cursor()
         
-        cur.execute("""
-            SELECT 
-                time,
-                open,
-                high,
-                low,
-                close,
-                volume,
-                ema50
-            FROM candles
-            WHERE symbol = %s AND timeframe = %s
-            ORDER BY time DESC
-            LIMIT %s
-        """, (symbol.upper(), timeframe, limit))
+        cur.execute(*page_sql(symbol.upper(), timeframe, page))
         
         candles = cur.fetchall()
         
         cur.close()
         conn.close()
         
-        if not candles:
+        # An empty page past either end of the history is still a page
+        if not candles and not page['paged']:
             return jsonify({'error': 'No candle data found'}), 404
         
-        # Reverse to get chronological order
-        candles = list(reversed(candles))
+        # Chronological order
+        candles, next_cursor = finish_page(candles, page, symbol.upper(), timeframe)
         
-        return jsonify({
-            'symbol': symbol.upper(),
-            'timeframe': timeframe,
-            'candles': candles,
-            'count': len(candles)
-        })
+        if fmt != 'json':
+            return candles_response(fmt, symbol, timeframe, rows_to_columns(candles), next_cursor)
+        
+        return candles_response(fmt, symbol, timeframe, candles, next_cursor)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def candles_response(fmt, symbol, timeframe, columns, next_cursor=None):
+    """`columns` is the per-candle dict list for json, column lists otherwise"""
+    if fmt == 'json':
+        response = jsonify(shape_candles(symbol, timeframe, columns, next_cursor))
+    elif fmt == 'columnar':
+        response = jsonify(columnar_payload(symbol, timeframe, columns, next_cursor))
+    elif fmt == 'msgpack':
+        response = Response(encode_msgpack(symbol, timeframe, columns, next_cursor), mimetype=MIMETYPES['msgpack'])
+    else:
+        response = Response(encode_arrow(symbol, timeframe, columns, next_cursor), mimetype=MIMETYPES['arrow'])
+    
+    response.vary.add('Accept')
+    return response
+
+@app.route('/api/candles/batch')
+@conditional(lambda: [f"candles:{tf}" for tf in split_arg(request.args.get('timeframes') or request.args.get('timeframe') or '1d')])
+def get_candles_batch():
+    """
+    Newest ?limit= candles for every ?symbols= x ?timeframes= pair in one query
+    Streamed series by series as the rows arrive, see batch_queries
+    """
+    try:
+        symbols, timeframes, limit = parse_candle_batch(request.args)
+    except BatchError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    pairs = [(symbol, timeframe) for symbol in symbols for timeframe in timeframes]
+    query, params = batch_candles_query(storage_backend.name, symbols, timeframes, limit)
+    
+    try:
+        conn = storage_backend.connect()
+        if storage_backend.name == 'postgres':
+            # Server-side cursor, rows are read as the response is written
+            cur = conn.cursor(name='candles_batch')
+            cur.itersize = BATCH_FETCH_ROWS
+            cur.execute(query, params)
+            rows = iter(cur)
+        else:
+            cur = conn.cursor()
+            cur.execute(query, params)
+            rows = request_order(cur.fetchall(), pairs, key=lambda row: (row[0], row[1]))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    def items():
+        try:
+            for (symbol, timeframe), series in grouped(rows, pairs, key=lambda row: (row[0], row[1])):
+                if not series:
+                    yield [symbol, timeframe], None
+                    continue
+                yield [symbol, timeframe], app.json.dumps({
+                    'symbol': symbol,
+                    'timeframe': timeframe,
+                    'candles': [dict(zip(COLUMNS, row[2:])) for row in series],
+                    'count': len(series)
+                }).encode()
+        finally:
+            cur.close()
+            conn.close()
+    
+    return Response(stream_with_context(stream_items('series', items())), mimetype=app.json.mimetype)
+
+# Downsampled chart series by range and point count, see candle_series
+series_cache = SeriesCache()
+
+@app.route('/api/candles/<symbol>/series')
+@conditional(lambda symbol: [candles_resource()])
+@coalesce
+def get_candle_series(symbol):
+    """
+    Chart series downsampled to ?points= (OHLC buckets, or ?mode=lttb for close + EMA)
+    Wide zooms over years of 15m candles without shipping every candle
+    """
+    try:
+        timeframe = request.args.get('timeframe', '1d')
+        
+        try:
+            start, end, points, mode = parse_series(request.args)
+        except PageError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Candle writes bump the watermark (a derived timeframe's source), so a new tick never hits an old entry
+        resource = candles_resource()
+        watermark = watermark_reader.get([resource]).get(resource)
+        key = (
+            symbol.upper(), timeframe, start, end, points, mode,
+            watermark[0] if watermark else None
+        )
+        
+        body = series_cache.get(key) if watermark else None
+        if body is None:
+            if is_derived(timeframe):
+                records = range_of(derived_records(symbol, timeframe), start, end)
+            else:
+                conn = storage_backend.connect()
+                try:
+                    records = load_series(conn, candle_store, symbol, timeframe, start, end)
+                finally:
+                    conn.close()
+            
+            if not len(records):
+                return jsonify({'error': 'No candle data found'}), 404
+            
+            body = app.json.response(series_payload(symbol, timeframe, mode, points, records)).get_data()
+            if watermark:
+                series_cache.put(key, body)
+        
+        return snapshot_response(body)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/strategic-summary')
+@conditional(lambda: ['coins', 'ema_analysis:1w', 'ema_analysis:4h'])
+@coalesce
 def get_strategic_summary():
     """Get strategic investment summary (EVALUATE, TRADE NOW, AVOID)"""
+    snapshot = get_snapshot()
+    if snapshot:
+        return snapshot_response(snapshot.body('strategic_summary'))
+    
     try:
         conn = get_db_connection()
         cur = conn.cursor()
         
-        # Get latest weekly analysis
-        cur.execute("""
-            SELECT DISTINCT ON (symbol)
-                ea.symbol,
-                c.name,
-                c.market_cap_rank,
-                ea.current_price,
-                ea.ema50,
-                ea.pct_from_ema50,
-                ea.above_ema50
-            FROM ema_analysis ea
-            JOIN coins c ON ea.symbol = c.symbol
-            WHERE ea.timeframe = '1w'
-            ORDER BY ea.symbol, ea.analysis_date DESC
-        """)
-        
-        weekly_results = cur.fetchall()
-        
-        # Get 4H analysis for "trade now" opportunities
-        cur.execute("""
-            SELECT DISTINCT ON (symbol)
-                ea.symbol,
-                c.name,
-                ea.pct_from_ema50
-            FROM ema_analysis ea
-            JOIN coins c ON ea.symbol = c.symbol
-            WHERE ea.timeframe = '4h'
-            ORDER BY ea.symbol, ea.analysis_date DESC
-        """)
-        
-        four_h_results = {r['symbol']: r for r in cur.fetchall()}
+        # Every coin's latest analysis in one query, the lists are screener presets
+        cur.execute(SCREEN_TABLE_SQL)
+        table = ScreenTable(cur.fetchall())
         
         cur.close()
         conn.close()
         
-        # Categorize coins
-        coins_to_evaluate = []  # Above EMA or within 10% below
-        coins_to_avoid = []     # More than 10% below EMA
-        coins_to_trade_now = [] # 4H within ±5% of EMA
+        return jsonify(strategic_summary(table))
         
-        for coin in weekly_results:
-            symbol = coin['symbol']
-            pct = coin['pct_from_ema50']
-            
-            # EVALUATE: Above EMA OR within 10% below
-            if pct >= -10:
-                coins_to_evaluate.append(coin)
-            else:
-                coins_to_avoid.append(coin)
-            
-            # TRADE NOW: 4H within ±5% of EMA
-            if symbol in four_h_results:
-                four_h_pct = four_h_results[symbol]['pct_from_ema50']
-                if -5 <= four_h_pct <= 5:
-                    coins_to_trade_now.append({
-                        **coin,
-                        'four_h_pct_from_ema': four_h_pct
-                    })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/screener')
+@conditional(lambda: ['coins'] + [f"ema_analysis:{tf}" for tf in TIMEFRAMES])
+@coalesce
+def get_screener():
+    """
+    Coins matching ?where= (or a saved ?preset=), ordered by ?sort= -pct_1w,rank
+    Expression language in screener, evaluated on the snapshot when it's up
+    """
+    preset = request.args.get('preset')
+    try:
+        if preset:
+            if preset not in PRESETS:
+                raise ScreenError(f"Unknown preset '{preset}', use one of: {', '.join(PRESETS)}")
+            where = PRESETS[preset]['where']
+        else:
+            where = request.args.get('where', '')
+        node = parse(where)
+        sort_keys = parse_sort(request.args.get('sort'))
+        limit = int(request.args.get('limit', SCREEN_DEFAULT_LIMIT))
+    except ScreenError as e:
+        return jsonify({'error': str(e)}), 400
+    except ValueError:
+        return jsonify({'error': f"Invalid limit: {request.args.get('limit')}"}), 400
+    
+    snapshot = get_snapshot()
+    if snapshot:
+        return jsonify(screen_payload(where, sort_keys, snapshot.screen.select(node, sort_keys, limit), preset))
+    
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
         
-        return jsonify({
-            'evaluate_long_term': {
-                'count': len(coins_to_evaluate),
-                'coins': coins_to_evaluate,
-                'description': 'Above Weekly EMA50 OR within 10% below'
-            },
-            'trade_now_short_term': {
-                'count': len(coins_to_trade_now),
-                'coins': coins_to_trade_now,
-                'description': '4H chart within ±5% of EMA50'
-            },
-            'avoid': {
-                'count': len(coins_to_avoid),
-                'coins': coins_to_avoid,
-                'description': 'More than 10% below Weekly EMA50'
-            }
-        })
+        cur.execute(*screen_query(node, sort_keys, limit))
+        rows = cur.fetchall()
+        
+        cur.close()
+        conn.close()
+        
+        return jsonify(screen_payload(where, sort_keys, rows, preset))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/screener/presets')
+def get_screener_presets():
+    """Saved screens usable as ?preset="""
+    return jsonify(PRESETS)
+
 @app.route('/api/scan-history')
+@coalesce
 def get_scan_history():
     """Get scan history"""
     try:
@@ -583,11 +681,7 @@ def get_scan_history():
         conn = get_db_connection()
         cur = conn.cursor()
         
-        cur.execute("""
-            SELECT * FROM scan_history
-            ORDER BY scan_date DESC
-            LIMIT %s
-        """, (limit,))
+        cur.execute(SCAN_HISTORY_SQL, (limit,))
         
         history = cur.fetchall()
         
@@ -608,16 +702,14 @@ def get_status():
     return jsonify(scan_status)
 
 @app.route('/api/current-prices')
+@coalesce
 def get_current_prices():
     """Get current prices from database"""
     try:
         conn = get_db_connection()
         cur = conn.cursor()
         
-        cur.execute("""
-            SELECT * FROM current_prices
-            ORDER BY last_updated DESC
-        """)
+        cur.execute(CURRENT_PRICES_SQL)
         
         prices = cur.fetchall()
         
@@ -632,45 +724,25 @@ def get_current_prices():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/coalescing-stats')
+def get_coalescing_stats():
+    """How many requests shared another request's execution"""
+    return jsonify(single_flight.get_stats())
+
+@app.route('/api/compression-stats')
+def get_compression_stats():
+    """Bodies compressed, served from the compressed cache, and bytes saved"""
+    return jsonify(compressor.get_stats())
+
+# Planner estimates by default, ?exact=1 counts in the background (see database_stats)
+database_stats = DatabaseStats(storage_backend)
+
 @app.route('/api/database-stats')
+@coalesce
 def get_database_stats():
     """Get database statistics"""
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        stats = {}
-        
-        # Count candles
-        cur.execute("SELECT COUNT(*) as count FROM candles")
-        stats['candles'] = cur.fetchone()['count']
-        
-        # Count coins
-        cur.execute("SELECT COUNT(*) as count FROM coins")
-        stats['coins'] = cur.fetchone()['count']
-        
-        # Count EMA analysis
-        cur.execute("SELECT COUNT(*) as count FROM ema_analysis")
-        stats['ema_analysis'] = cur.fetchone()['count']
-        
-        # Count scans
-        cur.execute("SELECT COUNT(*) as count FROM scan_history")
-        stats['scans'] = cur.fetchone()['count']
-        
-        # Get latest scan date
-        cur.execute("SELECT MAX(scan_date) as latest FROM scan_history")
-        latest = cur.fetchone()
-        stats['latest_scan'] = latest['latest'].isoformat() if latest['latest'] else None
-        
-        # Get oldest candle data
-        cur.execute("SELECT MIN(time) as oldest FROM candles")
-        oldest = cur.fetchone()
-        stats['oldest_candle'] = oldest['oldest'].isoformat() if oldest['oldest'] else None
-        
-        cur.close()
-        conn.close()
-        
-        return jsonify(stats)
+        return jsonify(database_stats.get(exact=request.args.get('exact') == '1'))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -680,7 +752,7 @@ if __name__ == '__main__':
     print("🚀 CRYPTO SCANNER API WITH DATABASE")
     print("=" * 60)
     print(f"📡 API Server: http://localhost:5001")
-    print(f"🐘 Database: {'Connected' if DATABASE_URL else 'Not configured'}")
+    print(f"🐘 Database: {storage_backend.describe() if storage_backend.configured else 'Not configured'}")
     print("=" * 60)
     print("\n📊 Endpoints:")
     print("  GET  /health                    - Health check + DB status")
@@ -689,11 +761,17 @@ if __name__ == '__main__':
     print("  GET  /api/ema-analysis/<symbol> - EMA analysis for coin")
     print("  GET  /api/ema-analysis/all      - All EMA analysis")
     print("  GET  /api/candles/<symbol>      - Candle data")
+    print("  GET  /api/candles/<symbol>/series - Downsampled chart series")
+    print("  GET  /api/candles/batch         - Candles for many symbols")
+    print("  GET  /api/ema-analysis/batch    - EMA analysis for many symbols")
     print("  GET  /api/strategic-summary     - EVALUATE/TRADE/AVOID lists")
+    print("  GET  /api/screener              - Filter coins by EMA expressions")
     print("  GET  /api/scan-history          - Scan history")
     print("  GET  /api/current-prices        - Current prices")
     print("  GET  /api/database-stats        - Database statistics")
     print("  GET  /api/status                - Scan status")
+    print("  GET  /api/coalescing-stats      - Single-flight request coalescing")
+    print("  GET  /api/compression-stats     - gzip/br/zstd response compression")
     print("=" * 60)
     
     port = int(os.getenv('PORT', 5001))
@@ -3,20 +3,56 @@ Incremental Background Worker - Smart Candle Updates
 Only fetches NEW data, not duplicates
 """
 
-import psycopg
-from psycopg import sql
-import requests
 import pandas as pd
 import time
 from datetime import datetime, timedelta, timezone
 import os
 import sys
 
+from market_data_client import MarketDataClient
+from market_health import failure_counters
+from storage import get_backend
+from mmap_candle_store import get_candle_store, rows_to_records
+from watermarks import ANALYSIS_CHANNEL, bump_watermarks, ensure_table
+from retention import RetentionSchedule, retained_candles, run_retention
+
 DATABASE_URL = os.getenv('DATABASE_URL')
 
+# Postgres, or SQLite for single-node deployments (STORAGE_BACKEND=sqlite)
+storage_backend = get_backend()
+
+# Pooled keep-alive sessions shared by every fetch in this process
+market_data = MarketDataClient.default()
+
+# Optional memory-mapped copy of the candles (CANDLE_STORE_DIR), written through after every store
+candle_store = get_candle_store()
+
+TIMEFRAME_MINUTES = {
+    '15m': 15,
+    '1h': 60,
+    '4h': 240,
+    '1d': 1440,
+    '1w': 10080
+}
+
 def get_db_connection():
     """Get database connection"""
-    return psycopg.connect(DATABASE_URL)
+    return storage_backend.connect()
+
+def notify_analysis_updated(payload=''):
+    """NOTIFY API processes that a tick finished so they rebuild their analysis snapshot"""
+    if storage_backend.name != 'postgres':
+        return  # SQLite API processes poll the watermarks instead
+    
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute("SELECT pg_notify(%s, %s)", (ANALYSIS_CHANNEL, payload))
+        conn.commit()
+        cur.close()
+        conn.close()
+    except Exception as e:
+        print(f"   ⚠️  Error sending {ANALYSIS_CHANNEL} notification: {e}")
 
 def get_top_coins(limit=200):
     """Get top coins that are guaranteed to be on Binance"""
@@ -267,11 +303,13 @@ def store_coins(coins):
             print(f"   ⚠️  Error storing {coin['symbol']}: {e}")
             continue
     
+    bump_watermarks(cur, ['coins'])
     conn.commit()
     cur.close()
     conn.close()
     
     print(f"   ✅ Stored {len(coins)} coins")
+    notify_analysis_updated('coins')
 
 def get_last_candle_time(symbol, timeframe):
     """Get the timestamp of the most recent candle for this symbol/timeframe"""
@@ -292,21 +330,41 @@ def get_last_candle_time(symbol, timeframe):
     except:
         return None
 
+def get_coin_market(symbol):
+    """The (binance_symbol, data_source) a coin's candles come from, (None, None) until known"""
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute("""
+            SELECT binance_symbol, data_source FROM coins
+            WHERE symbol = %s
+        """, (symbol,))
+        
+        result = cur.fetchone()
+        cur.close()
+        conn.close()
+        
+        return (result[0], result[1]) if result else (None, None)
+    except:
+        return None, None
+
 def calculate_candles_needed(timeframe, last_time=None):
     """
     Calculate how many candles to fetch
-    - If no last_time: fetch 5 years of history (initial population)
+    - If no last_time: fetch 5 years of history (initial population),
+      capped at the timeframe's retention window
     - If last_time exists: fetch only missing candles
     """
     if last_time is None:
         # Initial population - fetch 5 YEARS for all timeframes
-        return {
+        return retained_candles(timeframe, {
             '15m': 175200,  # 5 years (365 * 5 * 24 * 4)
             '1h': 43800,    # 5 years (365 * 5 * 24)
             '4h': 10950,    # 5 years (365 * 5 * 6)
             '1d': 1825,     # 5 years (365 * 5)
             '1w': 260       # 5 years (52 * 5)
-        }.get(timeframe, 1000)
+        }.get(timeframe, 1000))
     
     # -----------------------------
     # ✅ FIX: Ensure last_time is timezone-aware
@@ -319,96 +377,40 @@ def calculate_candles_needed(timeframe, last_time=None):
     time_diff = now - last_time
     
     # Add buffer to account for incomplete candles
-    timeframe_minutes = {
-        '15m': 15,
-        '1h': 60,
-        '4h': 240,
-        '1d': 1440,
-        '1w': 10080
-    }
-    
     minutes_elapsed = time_diff.total_seconds() / 60
-    candles_behind = int(minutes_elapsed / timeframe_minutes.get(timeframe, 60))
+    candles_behind = int(minutes_elapsed / TIMEFRAME_MINUTES.get(timeframe, 60))
     
     # Add 2 candle buffer to ensure we don't miss any
     return max(candles_behind + 2, 2)
 
-def get_binance_candles(symbol, interval='1d', limit=100, start_time=None, end_time=None):
+def get_binance_candles(symbol, interval='1d', limit=100, start_time=None, end_time=None,
+                        binance_symbol=None, data_source=None):
     """
     Fetch candles from Binance
     If start_time provided, only fetch candles after that time
     If end_time provided, fetch candles before that time (for historical batching)
+    With a known binance_symbol/data_source only that market is asked, otherwise spot and
+    futures are asked in parallel per quote pair (spot preferred)
     """
-    base_url = "https://api.binance.com/api/v3/klines"
-    
-    symbol_formats = [
-        f"{symbol}USDT",
-        f"{symbol}BUSD",
-        f"{symbol}FDUSD"
-    ]
-    
-    for binance_symbol in symbol_formats:
-        try:
-            params = {
-                'symbol': binance_symbol,
-                'interval': interval,
-                'limit': min(limit, 1000)  # Binance max is 1000
-            }
-            
-            if start_time:
-                # Convert to milliseconds timestamp
-                params['startTime'] = int(start_time.timestamp() * 1000)
-            
-            if end_time:
-                params['endTime'] = int(end_time.timestamp() * 1000)
-            
-            response = requests.get(base_url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            if data and len(data) >= 10:  # Need at least 10 candles
-                return data, binance_symbol, 'Binance Spot'
-                
-        except:
-            continue
-    
-    # Try futures
-    futures_url = "https://fapi.binance.com/fapi/v1/klines"
-    
-    for binance_symbol in symbol_formats:
-        try:
-            params = {
-                'symbol': binance_symbol,
-                'interval': interval,
-                'limit': min(limit, 1000)
-            }
-            
-            if start_time:
-                params['startTime'] = int(start_time.timestamp() * 1000)
-                
-            if end_time:
-                params['endTime'] = int(end_time.timestamp() * 1000)
-            
-            response = requests.get(futures_url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            if data and len(data) >= 10:
-                return data, binance_symbol, 'Binance Futures'
-                
-        except:
-            continue
-    
-    return None, None, None
+    return market_data.find_klines(
+        symbol,
+        ['USDT', 'BUSD', 'FDUSD'],
+        interval,
+        limit,
+        min_candles=10,  # Need at least 10 candles
+        start_time=start_time,
+        end_time=end_time,
+        binance_symbol=binance_symbol,
+        data_source=data_source
+    )
 
-def fetch_historical_batches(symbol, timeframe_config, total_candles_needed):
+def fetch_historical_batches(symbol, timeframe_config, total_candles_needed, binance_symbol=None, data_source=None):
     """
     Fetch historical data in batches of 1000 (Binance limit)
-    Works backwards from current time
+    Works backwards from current time, every batch from the same market: the coin's
+    stored one, or whichever the first batch found
     """
     all_candles = []
-    binance_symbol = None
-    data_source = None
     
     end_time = datetime.now(timezone.utc)
     batches_needed = (total_candles_needed + 999) // 1000  # Round up
@@ -421,14 +423,16 @@ def fetch_historical_batches(symbol, timeframe_config, total_candles_needed):
                 symbol,
                 interval=timeframe_config['binance'],
                 limit=1000,
-                end_time=end_time
+                end_time=end_time,
+                binance_symbol=binance_symbol,
+                data_source=data_source
             )
             
             if not candles:
                 print(f"         ⚠️  No more data available after {len(all_candles)} candles")
                 break
             
-            # Store binance_symbol and data_source from first successful fetch
+            # Later batches stay on the first successful fetch's market
             if binance_symbol is None:
                 binance_symbol = bs
                 data_source = ds
@@ -508,14 +512,17 @@ def recalculate_ema_for_symbol(symbol, timeframe):
             conn.close()
             return
         
-        # Update each candle with its EMA
-        for i, row in enumerate(rows):
-            if i < len(ema_values) and ema_values[i]:
-                cur.execute("""
-                    UPDATE candles SET ema50 = %s
-                    WHERE time = %s AND symbol = %s AND timeframe = %s
-                """, (ema_values[i], row[0], symbol, timeframe))
-        
+        # Update each candle with its EMA (one batched statement)
+        cur.executemany("""
+            UPDATE candles SET ema50 = %s
+            WHERE time = %s AND symbol = %s AND timeframe = %s
+        """, [
+            (ema_values[i], row[0], symbol, timeframe)
+            for i, row in enumerate(rows)
+            if i < len(ema_values) and ema_values[i]
+        ])
+        
+        bump_watermarks(cur, [f"candles:{timeframe}"])
         conn.commit()
         cur.close()
         conn.close()
@@ -567,19 +574,47 @@ def store_candles(symbol, timeframe, candles, binance_symbol, data_source):
             chunk
         )
     
-    # Update coin with binance symbol
+    # Update coin with binance symbol (only when it changed, so /api/coins stays cacheable)
     cur.execute("""
         UPDATE coins 
         SET binance_symbol = %s, data_source = %s
         WHERE symbol = %s
-    """, (binance_symbol, data_source, symbol))
+          AND (binance_symbol IS NULL OR binance_symbol <> %s OR data_source IS NULL OR data_source <> %s)
+    """, (binance_symbol, data_source, symbol, binance_symbol, data_source))
     
+    bump_watermarks(cur, [f"candles:{timeframe}"] + (['coins'] if cur.rowcount > 0 else []))
     conn.commit()
     cur.close()
     conn.close()
     
     # Recalculate EMA for all candles
     recalculate_ema_for_symbol(symbol, timeframe)
+    
+    write_through_candle_store(symbol, timeframe, min(row[0] for row in rows))
+
+def write_through_candle_store(symbol, timeframe, since):
+    """Mirror candles from `since` on (with their recalculated EMA) into the memory-mapped store"""
+    if not candle_store.enabled:
+        return
+    
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute("""
+            SELECT time, open, high, low, close, volume, ema50 FROM candles
+            WHERE symbol = %s AND timeframe = %s AND time >= %s
+            ORDER BY time ASC
+        """, (symbol, timeframe, since))
+        
+        rows = cur.fetchall()
+        cur.close()
+        conn.close()
+        
+        candle_store.write(symbol, timeframe, rows_to_records(rows))
+        
+    except Exception as e:
+        print(f"      ⚠️  Error writing candle store: {e}")
 
 def update_ema_analysis(symbol, timeframe):
     """Update EMA analysis table with latest data"""
@@ -626,6 +661,7 @@ def update_ema_analysis(symbol, timeframe):
             datetime.now(timezone.utc).date()
         ))
         
+        bump_watermarks(cur, [f"ema_analysis:{timeframe}"])
         conn.commit()
         cur.close()
         conn.close()
@@ -633,8 +669,12 @@ def update_ema_analysis(symbol, timeframe):
     except Exception as e:
         print(f"      ⚠️  Error updating EMA analysis: {e}")
 
-def process_coin_incremental(coin, timeframe_config):
-    """Process a single coin for a single timeframe (incremental update)"""
+def process_coin_incremental(coin, timeframe_config, raise_errors=False):
+    """
+    Process a single coin for a single timeframe (incremental update)
+    False when there was nothing to store; errors are printed and give False too, unless
+    raise_errors (the job queue records them on the job)
+    """
     symbol = coin['symbol'].upper()
     tf_key = timeframe_config['key']
     
@@ -647,6 +687,9 @@ def process_coin_incremental(coin, timeframe_config):
         
         is_initial = last_time is None
         
+        # Once known, a coin's market is kept: racing spot/futures per fetch would mix them
+        known_symbol, known_source = get_coin_market(symbol)
+        
         if is_initial:
             print(f"      🆕 Initial population: fetching {candles_needed:,} candles")
             
@@ -654,7 +697,9 @@ def process_coin_incremental(coin, timeframe_config):
             candles, binance_symbol, data_source = fetch_historical_batches(
                 symbol,
                 timeframe_config,
-                candles_needed
+                candles_needed,
+                binance_symbol=known_symbol,
+                data_source=known_source
             )
         else:
             print(f"      ➕ Incremental update: fetching {candles_needed} new candles")
@@ -664,7 +709,9 @@ def process_coin_incremental(coin, timeframe_config):
                 symbol,
                 interval=timeframe_config['binance'],
                 limit=candles_needed,
-                start_time=last_time
+                start_time=last_time,
+                binance_symbol=known_symbol,
+                data_source=known_source
             )
         
         if not candles or len(candles) == 0:
@@ -681,6 +728,8 @@ def process_coin_incremental(coin, timeframe_config):
         return True
         
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"      ❌ Error: {e}")
         import traceback
         traceback.print_exc()
@@ -763,6 +812,8 @@ def run_smart_update(coins, force_all=False):
         
         time.sleep(0.5)
     
+    notify_analysis_updated(','.join(timeframes_to_update))
+    
     return total_success, len(timeframes_to_update)
 
 def run_continuous_smart(top_n=200, check_interval_seconds=60):
@@ -794,8 +845,11 @@ def run_continuous_smart(top_n=200, check_interval_seconds=60):
     print(f"   Timeframes: {tf_count}")
     print(f"   Duration: {duration // 3600}h {(duration % 3600) // 60}m {duration % 60}s")
     print(f"   Future updates will take only 5-30 seconds!")
+    failure_counters.print_report()
     print()
     
+    retention_schedule = RetentionSchedule()
+    
     while True:
         try:
             # Wait until next check
@@ -811,6 +865,12 @@ def run_continuous_smart(top_n=200, check_interval_seconds=60):
             if success > 0:
                 duration = int(time.time() - start_time)
                 print(f"✅ Update complete: {success}/{len(coins)} coins, {tf_count} timeframes ({duration}s)")
+                failure_counters.print_report()
+            
+            # Daily compaction of expired high-resolution candles (after the update, however long it took)
+            if retention_schedule.due(datetime.now(timezone.utc)):
+                print(f"\n🧹 Retention at {current_time.strftime('%H:%M')}")
+                run_retention()
             
         except KeyboardInterrupt:
             print("\n\n👋 Stopping worker...")
@@ -821,11 +881,34 @@ def run_continuous_smart(top_n=200, check_interval_seconds=60):
             time.sleep(300)
 
 if __name__ == "__main__":
-    if not DATABASE_URL:
+    if not storage_backend.configured:
         print("❌ DATABASE_URL not found in environment")
         sys.exit(1)
     
     TOP_N = int(os.getenv('TOP_N_COINS', 200))
+    WORKER_MODE = os.getenv('WORKER_MODE', 'poll')
+    
+    if WORKER_MODE in ('scheduler', 'queue') and not storage_backend.supports_job_queue:
+        print(f"❌ WORKER_MODE={WORKER_MODE} needs PostgreSQL, {storage_backend.describe()} is single-node")
+        sys.exit(1)
     
-    # Run smart worker (checks every 60 seconds)
-    run_continuous_smart(top_n=TOP_N, check_interval_seconds=60)
\ No newline at end of file
+    # Databases set up before data_watermarks existed
+    conn = get_db_connection()
+    ensure_table(conn)
+    conn.close()
+    
+    if WORKER_MODE == 'stream':
+        # WebSocket kline streams, REST only for gap-fill
+        from kline_stream import run_continuous_stream
+        run_continuous_stream(top_n=TOP_N)
+    elif WORKER_MODE == 'scheduler':
+        # Enqueue jobs only, WORKER_MODE=queue processes do the fetching
+        from job_queue import run_queue_scheduler
+        run_queue_scheduler(top_n=TOP_N)
+    elif WORKER_MODE == 'queue':
+        # Claim jobs from the shared queue (run as many as needed)
+        from job_queue import run_queue_worker
+        run_queue_worker()
+    else:
+        # Run smart worker (checks every 60 seconds)
+        run_continuous_smart(top_n=TOP_N, check_interval_seconds=60)
\ No newline at end of file
@@ -0,0 +1,145 @@
+"""
+Batch Queries
+Many symbols in one request and one query, for the dashboard grid (200 sparklines or analysis
+rows) instead of one round-trip and connection per coin
+
+    /api/candles/batch?symbols=BTC,ETH,...&timeframes=1d,4h&limit=50
+    /api/ema-analysis/batch?symbols=BTC,ETH,...
+
+Rows come back grouped in request order, so the API streams each series as it's read
+"""
+
+import itertools
+import json
+import os
+
+from candle_pages import CANDLE_PAGE_MAX
+from watermarks import TIMEFRAMES
+
+BATCH_MAX_SYMBOLS = int(os.getenv('BATCH_MAX_SYMBOLS', 500))
+
+# Rows per round-trip of the Postgres server-side cursor
+BATCH_FETCH_ROWS = 2000
+
+# Newest `limit` candles per (symbol, timeframe): one index range scan per series
+BATCH_CANDLES_SQL = """
+    SELECT s.symbol, t.timeframe, c.time, c.open, c.high, c.low, c.close, c.volume, c.ema50
+    FROM unnest(%s::text[]) WITH ORDINALITY AS s(symbol, n)
+    CROSS JOIN unnest(%s::text[]) WITH ORDINALITY AS t(timeframe, m)
+    CROSS JOIN LATERAL (
+        SELECT time, open, high, low, close, volume, ema50
+        FROM candles
+        WHERE candles.symbol = s.symbol AND candles.timeframe = t.timeframe
+        ORDER BY time DESC
+        LIMIT %s
+    ) c
+    ORDER BY s.n, t.m, c.time
+"""
+
+# SQLite has no arrays or LATERAL, rank within each series instead
+BATCH_CANDLES_SQLITE_SQL = """
+    SELECT symbol, timeframe, time, open, high, low, close, volume, ema50
+    FROM (
+        SELECT *, ROW_NUMBER() OVER (PARTITION BY symbol, timeframe ORDER BY time DESC) AS rn
+        FROM candles
+        WHERE symbol IN ({symbols}) AND timeframe IN ({timeframes})
+    ) latest
+    WHERE rn <= %s
+    ORDER BY symbol, timeframe, time
+"""
+
+BATCH_EMA_ANALYSIS_SQL = """
+    SELECT symbol, timeframe, current_price, ema50, pct_from_ema50, above_ema50, analysis_date
+    FROM (
+        SELECT *, ROW_NUMBER() OVER (PARTITION BY symbol, timeframe ORDER BY analysis_date DESC) AS rn
+        FROM ema_analysis
+        WHERE symbol {condition}
+    ) latest
+    WHERE rn = 1
+    ORDER BY symbol, timeframe
+"""
+
+class BatchError(ValueError):
+    """Bad batch arguments, answered with a 400"""
+
+def split_arg(value):
+    """'BTC, eth,BTC' -> ['BTC', 'eth'] (order kept, duplicates dropped)"""
+    items = [item.strip() for item in (value or '').split(',')]
+    return list(dict.fromkeys(item for item in items if item))
+
+def parse_symbols(args):
+    symbols = split_arg((args.get('symbols') or '').upper())
+    if not symbols:
+        raise BatchError("symbols is required, e.g. ?symbols=BTC,ETH")
+    if len(symbols) > BATCH_MAX_SYMBOLS:
+        raise BatchError(f"At most {BATCH_MAX_SYMBOLS} symbols per request")
+    return symbols
+
+def parse_candle_batch(args):
+    """(symbols, timeframes, limit) from request args, raises BatchError"""
+    symbols = parse_symbols(args)
+
+    timeframes = split_arg(args.get('timeframes') or args.get('timeframe') or '1d')
+    unknown = [tf for tf in timeframes if tf not in TIMEFRAMES]
+    if unknown:
+        raise BatchError(f"Unknown timeframes {', '.join(unknown)}, use: {', '.join(TIMEFRAMES)}")
+
+    try:
+        limit = int(args.get('limit', 100))
+    except ValueError:
+        raise BatchError(f"Invalid limit: {args.get('limit')}")
+    if limit < 1:
+        raise BatchError("limit must be at least 1")
+
+    return symbols, timeframes, min(limit, CANDLE_PAGE_MAX)
+
+def placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+def batch_candles_query(backend_name, symbols, timeframes, limit):
+    """(query, params), rows are (symbol, timeframe, time, open, high, low, close, volume, ema50)"""
+    if backend_name == 'postgres':
+        return BATCH_CANDLES_SQL, (symbols, timeframes, limit)
+
+    query = BATCH_CANDLES_SQLITE_SQL.format(symbols=placeholders(symbols), timeframes=placeholders(timeframes))
+    return query, (*symbols, *timeframes, limit)
+
+def batch_analysis_query(backend_name, symbols):
+    if backend_name == 'postgres':
+        return BATCH_EMA_ANALYSIS_SQL.format(condition="= ANY(%s)"), (symbols,)
+    return BATCH_EMA_ANALYSIS_SQL.format(condition=f"IN ({placeholders(symbols)})"), tuple(symbols)
+
+def request_order(rows, keys, key):
+    """Rows sorted so their groups follow `keys`, stable so each group keeps its query order"""
+    position = {value: index for index, value in enumerate(keys)}
+    return sorted(rows, key=lambda row: position[key(row)])
+
+def grouped(rows, keys, key):
+    """
+    (key, rows) for every requested key in order, empty where nothing matched
+    `rows` must already be grouped in `keys` order, it's consumed lazily
+    """
+    groups = itertools.groupby(rows, key=key)
+    current = next(groups, None)
+    for wanted in keys:
+        if current is not None and current[0] == wanted:
+            yield wanted, list(current[1])
+            current = next(groups, None)
+        else:
+            yield wanted, []
+
+def stream_items(name, items):
+    """
+    Response body chunks for {name: [...], "missing": [...], "count": n}
+    `items` yields (key, rendered JSON bytes or None when there's no data for key)
+    """
+    missing = []
+    count = 0
+    yield f'{{"{name}": ['.encode()
+    for key, body in items:
+        if body is None:
+            missing.append(key)
+            continue
+        yield body if count == 0 else b',' + body
+        count += 1
+    yield f'], "missing": {json.dumps(missing)}, "count": {count}}}\n'.encode()
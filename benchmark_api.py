@@ -0,0 +1,154 @@
+"""
+API Server Benchmark
+Starts api_server_with_db (Flask) and api_server_async (ASGI) side by side against the same
+Postgres, checks they return identical JSON, then measures throughput and latency
+
+    DATABASE_URL=postgresql://... python benchmark_api.py
+
+BENCH_CONCURRENCY sets the client thread counts, BENCH_SECONDS the duration of each run
+"""
+
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+CONCURRENCY = [int(n) for n in os.getenv('BENCH_CONCURRENCY', '1,16,64').split(',')]
+SECONDS = float(os.getenv('BENCH_SECONDS', 10))
+FLASK_PORT = int(os.getenv('BENCH_FLASK_PORT', 5101))
+ASYNC_PORT = int(os.getenv('BENCH_ASYNC_PORT', 5102))
+
+# A dashboard page load worth of requests, cycled by every client
+PATHS = [
+    '/api/coins',
+    '/api/ema-analysis/all?timeframe=1w',
+    '/api/strategic-summary',
+    '/api/current-prices',
+    '/api/database-stats'
+]
+
+SERVERS = {
+    'Flask (api_server_with_db)': ('api_server_with_db.py', FLASK_PORT),
+    'ASGI (api_server_async)': ('api_server_async.py', ASYNC_PORT)
+}
+
+def start_server(script, port):
+    env = dict(os.environ, PORT=str(port))
+    process = subprocess.Popen(
+        [sys.executable, script],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/health", timeout=1).ok:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+
+    process.terminate()
+    raise RuntimeError(f"{script} did not become healthy on port {port}")
+
+def symbol_paths(port):
+    """Per-coin endpoints for the first few coins, so both servers are checked on the same symbols"""
+    coins = requests.get(f"http://127.0.0.1:{port}/api/coins", timeout=10).json()['coins'][:3]
+    paths = []
+    for coin in coins:
+        symbol = coin['symbol']
+        paths += [
+            f'/api/coins/{symbol}',
+            f'/api/coins/{symbol}/details',
+            f'/api/ema-analysis/{symbol}',
+            f'/api/candles/{symbol}?timeframe=1d&limit=200'
+        ]
+    return paths
+
+def check_parity(paths):
+    """Same status and JSON from both servers for every path"""
+    mismatches = []
+    for path in paths:
+        responses = [
+            requests.get(f"http://127.0.0.1:{port}{path}", timeout=30)
+            for _, port in SERVERS.values()
+        ]
+        if len({r.status_code for r in responses}) > 1 or responses[0].json() != responses[1].json():
+            mismatches.append(path)
+    return mismatches
+
+def run_load(port, paths, concurrency):
+    """(requests/sec, p50 ms, p95 ms, errors) for `concurrency` clients looping over `paths`"""
+    deadline = time.time() + SECONDS
+
+    def client(offset):
+        session = requests.Session()
+        latencies = []
+        errors = 0
+        i = offset
+        while time.time() < deadline:
+            start = time.perf_counter()
+            try:
+                response = session.get(f"http://127.0.0.1:{port}{paths[i % len(paths)]}", timeout=30)
+                response.content
+                if response.status_code >= 500:
+                    errors += 1
+            except requests.RequestException:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+            i += 1
+        return latencies, errors
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(client, range(concurrency)))
+    elapsed = time.time() - started
+
+    latencies = sorted(latency for result in results for latency in result[0])
+    errors = sum(result[1] for result in results)
+    if not latencies:
+        return 0, 0, 0, errors
+
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000
+    return len(latencies) / elapsed, p50, p95, errors
+
+if __name__ == "__main__":
+    if not os.getenv('DATABASE_URL'):
+        print("❌ DATABASE_URL not found in environment (the ASGI server is Postgres-only)")
+        exit(1)
+
+    print("=" * 60)
+    print("⏱️  API SERVER BENCHMARK")
+    print(f"   Concurrency {', '.join(map(str, CONCURRENCY))}, {SECONDS:.0f}s per run")
+    print("=" * 60)
+
+    processes = []
+    try:
+        for script, port in SERVERS.values():
+            processes.append(start_server(script, port))
+
+        paths = PATHS + symbol_paths(FLASK_PORT)
+
+        mismatches = check_parity(paths)
+        if mismatches:
+            print(f"\n❌ JSON differs between servers: {', '.join(mismatches)}")
+        else:
+            print(f"\n✅ Identical JSON on {len(paths)} endpoints")
+
+        print(f"\n{'Server':<28} {'Clients':>8} {'Req/sec':>10} {'p50 ms':>9} {'p95 ms':>9} {'Errors':>7}")
+        print("-" * 76)
+        for concurrency in CONCURRENCY:
+            for name, (_, port) in SERVERS.items():
+                rate, p50, p95, errors = run_load(port, paths, concurrency)
+                print(f"{name:<28} {concurrency:>8} {rate:>10,.0f} {p50:>9.1f} {p95:>9.1f} {errors:>7}")
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
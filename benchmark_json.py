@@ -0,0 +1,92 @@
+"""
+JSON Encoding Benchmark
+Encodes the saved scans in data_from_coins (or BENCH_JSON_DIR) the ways the API can serve them:
+Flask's default stdlib provider, fast_json, and bodies spliced from per-coin fragments.
+Checks every path parses to the same document first (the bodies differ in spelling, see fast_json)
+
+    python benchmark_json.py
+
+BENCH_ROUNDS sets how many times each file is encoded per measurement
+"""
+
+import glob
+import json
+import os
+import time
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+import fast_json
+from fast_json import dumps, splice_array, splice_object
+
+DATA_DIR = os.getenv('BENCH_JSON_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data_from_coins'))
+ROUNDS = int(os.getenv('BENCH_ROUNDS', 2000))
+
+# Scan fields holding one entry per coin
+COIN_LISTS = ('coins', 'analysis', 'coins_above_weekly_ema50', 'coins_below_weekly_ema50',
+              'coins_above_daily_ema50', 'coins_below_daily_ema50', 'coins_4h_ema50', 'failed_coins')
+
+def coin_fragments(data):
+    """{field: [encoded coin, ...]} for the per-coin lists, as a snapshot would hold them"""
+    return {field: [dumps(item) for item in data[field]] for field in COIN_LISTS if field in data}
+
+def splice_scan(data, fragments):
+    fields = []
+    for key in sorted(data):
+        if key in fragments:
+            fields.append((key, splice_array(fragments[key])))
+        else:
+            fields.append((key, dumps(data[key])))
+    return splice_object(fields)
+
+def timed(fn):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    return (time.perf_counter() - start) / ROUNDS * 1e6
+
+def benchmark_file(path, stdlib):
+    with open(path, 'rb') as f:
+        raw = f.read()
+    data = json.loads(raw)
+    fragments = coin_fragments(data)
+
+    bodies = {
+        'stdlib': stdlib.dumps(data, separators=(',', ':')).encode(),
+        'fast_json': dumps(data),
+        'spliced': splice_scan(data, fragments)
+    }
+    documents = [json.loads(body) for body in bodies.values()]
+    if any(document != documents[0] for document in documents):
+        raise RuntimeError(f"{os.path.basename(path)}: encoders disagree")
+
+    return len(raw), sum(map(len, fragments.values())), [
+        ('parse + stdlib encode', timed(lambda: stdlib.dumps(json.loads(raw), separators=(',', ':')))),
+        ('parse + fast_json', timed(lambda: dumps(fast_json.loads(raw)))),
+        ('stdlib encode', timed(lambda: stdlib.dumps(data, separators=(',', ':')))),
+        ('fast_json encode', timed(lambda: dumps(data))),
+        ('splice fragments', timed(lambda: splice_scan(data, fragments)))
+    ]
+
+def print_results(name, size, coins, results):
+    print(f"\n{name} ({size:,} bytes, {coins} coin entries)")
+    print(f"{'Path':<24} {'µs/body':>10} {'vs stdlib':>10}")
+    print("-" * 46)
+    baseline = results[2][1]
+    for path, micros in results:
+        print(f"{path:<24} {micros:>10.1f} {baseline / micros:>9.1f}x")
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("⏱️  JSON ENCODING BENCHMARK")
+    print(f"   {'orjson' if fast_json.orjson else 'stdlib (orjson not installed)'}, {ROUNDS} rounds per path")
+    print("=" * 60)
+
+    stdlib = DefaultJSONProvider(Flask(__name__))
+    paths = sorted(glob.glob(os.path.join(DATA_DIR, '*.json')))
+    if not paths:
+        print(f"\n💡 No scan JSON files in {DATA_DIR}")
+
+    for path in paths:
+        print_results(os.path.basename(path), *benchmark_file(path, stdlib))
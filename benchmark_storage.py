@@ -0,0 +1,141 @@
+"""
+Storage Backend Benchmark
+Runs the same candle workload against SQLite and (when BENCH_DATABASE_URL is set) Postgres
+
+    BENCH_DATABASE_URL=postgresql://... python benchmark_storage.py
+
+Rows are written under BENCH* symbols and deleted afterwards
+"""
+
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from storage import PostgresBackend, SQLiteBackend
+
+SYMBOLS = int(os.getenv('BENCH_SYMBOLS', 50))
+CANDLES = int(os.getenv('BENCH_CANDLES', 2000))
+TICKS = int(os.getenv('BENCH_TICKS', 20))
+READS = int(os.getenv('BENCH_READS', 5))
+CHUNK_SIZE = 1000
+
+UPSERT_CANDLE = """
+    INSERT INTO candles (time, symbol, timeframe, open, high, low, close, volume, ema50)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (time, symbol, timeframe) DO UPDATE SET
+        open = EXCLUDED.open,
+        high = EXCLUDED.high,
+        low = EXCLUDED.low,
+        close = EXCLUDED.close,
+        volume = EXCLUDED.volume
+"""
+
+def make_rows(symbol, start, count):
+    rows = []
+    for i in range(count):
+        price = 100 + (i % 50)
+        rows.append((start + timedelta(hours=i), symbol, '1h', price, price + 1, price - 1, price + 0.5, 1000.0, None))
+    return rows
+
+def timed(results, name, operations, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    results.append((name, elapsed, operations / elapsed if elapsed else 0))
+
+def run_workload(backend):
+    symbols = [f"BENCH{i}" for i in range(SYMBOLS)]
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    results = []
+
+    conn = backend.connect()
+    cur = conn.cursor()
+
+    def bulk_insert():
+        # Same shape as background_worker.store_candles: 1000-row batches, one commit per series
+        for symbol in symbols:
+            rows = make_rows(symbol, start, CANDLES)
+            for i in range(0, len(rows), CHUNK_SIZE):
+                cur.executemany(UPSERT_CANDLE, rows[i:i + CHUNK_SIZE])
+            conn.commit()
+
+    def incremental_ticks():
+        # One new candle per series per tick, like the worker's scheduled updates
+        for tick in range(TICKS):
+            for symbol in symbols:
+                cur.executemany(UPSERT_CANDLE, make_rows(symbol, start + timedelta(hours=CANDLES + tick), 1))
+            conn.commit()
+
+    def ema_updates():
+        for symbol in symbols:
+            cur.execute("""
+                SELECT time, close FROM candles
+                WHERE symbol = %s AND timeframe = %s
+                ORDER BY time ASC
+            """, (symbol, '1h'))
+            rows = cur.fetchall()
+            cur.executemany("""
+                UPDATE candles SET ema50 = %s
+                WHERE time = %s AND symbol = %s AND timeframe = %s
+            """, [(float(row[1]), row[0], symbol, '1h') for row in rows])
+            conn.commit()
+
+    def chart_reads():
+        for _ in range(READS):
+            for symbol in symbols:
+                cur.execute("""
+                    SELECT time, open, high, low, close, volume, ema50
+                    FROM candles
+                    WHERE symbol = %s AND timeframe = %s
+                    ORDER BY time DESC
+                    LIMIT 200
+                """, (symbol, '1h'))
+                cur.fetchall()
+
+    def last_candle_lookups():
+        for _ in range(READS):
+            for symbol in symbols:
+                cur.execute("""
+                    SELECT MAX(time) FROM candles
+                    WHERE symbol = %s AND timeframe = %s
+                """, (symbol, '1h'))
+                cur.fetchone()
+
+    total_candles = SYMBOLS * CANDLES
+    timed(results, 'bulk insert', total_candles, bulk_insert)
+    timed(results, 'incremental ticks', SYMBOLS * TICKS, incremental_ticks)
+    timed(results, 'ema updates', total_candles + SYMBOLS * TICKS, ema_updates)
+    timed(results, 'chart reads (200)', SYMBOLS * READS, chart_reads)
+    timed(results, 'last candle lookups', SYMBOLS * READS, last_candle_lookups)
+
+    cur.execute("DELETE FROM candles WHERE symbol LIKE %s", ('BENCH%',))
+    conn.commit()
+    cur.close()
+    conn.close()
+
+    return results
+
+def print_results(name, results):
+    print(f"\n{name}")
+    print(f"{'Operation':<24} {'Seconds':>10} {'Ops/sec':>14}")
+    print("-" * 50)
+    for operation, elapsed, rate in results:
+        print(f"{operation:<24} {elapsed:>10.3f} {rate:>14,.0f}")
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("⏱️  STORAGE BACKEND BENCHMARK")
+    print(f"   {SYMBOLS} series x {CANDLES} candles, {TICKS} ticks, {READS} read passes")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sqlite_backend = SQLiteBackend(os.path.join(tmp_dir, 'benchmark.db'))
+        sqlite_backend.setup()
+        print_results(sqlite_backend.describe(), run_workload(sqlite_backend))
+
+    bench_url = os.getenv('BENCH_DATABASE_URL')
+    if bench_url:
+        print_results('PostgreSQL', run_workload(PostgresBackend(bench_url)))
+    else:
+        print("\n💡 Set BENCH_DATABASE_URL (with setup_database.py applied) to compare against Postgres")
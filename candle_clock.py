@@ -0,0 +1,43 @@
+"""
+Candle Clock
+Candle boundary math for Binance intervals (UTC aligned, weekly candles open Monday 00:00)
+"""
+
+from datetime import datetime, timedelta, timezone
+
+INTERVAL_MINUTES = {
+    '15m': 15,
+    '30m': 30,
+    '1h': 60,
+    '4h': 240,
+    '12h': 720,
+    '1d': 1440,
+    '1w': 10080
+}
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+WEEK_ORIGIN = datetime(1970, 1, 5, tzinfo=timezone.utc)  # First Monday after the epoch
+
+def as_utc(value):
+    """Accept aware/naive datetimes or ISO strings, naive values are taken as UTC"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+def candle_open_time(interval, at):
+    """Open time of the candle that contains `at`"""
+    at = as_utc(at)
+    minutes = INTERVAL_MINUTES[interval]
+    origin = WEEK_ORIGIN if interval == '1w' else EPOCH
+
+    elapsed = int((at - origin).total_seconds() // 60)
+    return origin + timedelta(minutes=elapsed - elapsed % minutes)
+
+def has_closed_since(interval, fetched_at, now=None):
+    """True when the candle that was open at `fetched_at` has closed by `now`"""
+    if not fetched_at:
+        return True
+    now = now or datetime.now(timezone.utc)
+    return candle_open_time(interval, now) > candle_open_time(interval, fetched_at)
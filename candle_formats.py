@@ -0,0 +1,115 @@
+"""
+Candle Response Formats
+Columnar encodings for chart payloads: one array per field instead of one dict per candle,
+built straight from DB tuples or the memory-mapped store's arrays
+
+    json       [{time, open, ...}, ...]                     (default, unchanged)
+    columnar   {"candles": {"time": [...], "open": [...]}}  times in ms since epoch
+    msgpack    the columnar payload as MessagePack
+    arrow      Arrow IPC stream, timestamp[ms, UTC] + float64 columns
+"""
+
+import numpy as np
+
+from mmap_candle_store import to_ms
+
+try:
+    import msgpack
+except ImportError:  # Optional, format=msgpack answers 406 without it
+    msgpack = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:  # Optional, format=arrow answers 406 without it
+    pa = None
+
+COLUMNS = ['time', 'open', 'high', 'low', 'close', 'volume', 'ema50']
+
+MIMETYPES = {
+    'json': 'application/json',
+    'columnar': 'application/json',
+    'msgpack': 'application/msgpack',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+
+# Accept header values -> format, in order of preference on ties
+ACCEPTED = [
+    ('application/json', 'json'),
+    ('application/vnd.apache.arrow.stream', 'arrow'),
+    ('application/msgpack', 'msgpack'),
+    ('application/x-msgpack', 'msgpack')
+]
+
+def available(fmt):
+    if fmt == 'msgpack':
+        return msgpack is not None
+    if fmt == 'arrow':
+        return pa is not None
+    return fmt in MIMETYPES
+
+def negotiate(format_arg, accept_mimetypes):
+    """
+    Format from ?format= or the Accept header (werkzeug MIMEAccept)
+    Returns (format, error), error is set when the requested format can't be served
+    """
+    if format_arg:
+        fmt = format_arg.lower()
+        if fmt not in MIMETYPES:
+            return None, f"Unknown format '{format_arg}', use one of: {', '.join(MIMETYPES)}"
+    else:
+        best = accept_mimetypes.best_match([mimetype for mimetype, _ in ACCEPTED], default='application/json')
+        fmt = dict(ACCEPTED)[best]
+
+    if not available(fmt):
+        return None, f"Format '{fmt}' is not available on this server"
+    return fmt, None
+
+def rows_to_columns(rows):
+    """(time, open, high, low, close, volume, ema50) DB tuples, oldest first -> column lists"""
+    if not rows:
+        return {name: [] for name in COLUMNS}
+
+    columns = dict(zip(COLUMNS, (list(values) for values in zip(*rows))))
+    columns['time'] = [to_ms(value) for value in columns['time']]
+    return columns
+
+def records_to_columns(records):
+    """Memory-mapped store records -> column lists (NaN EMA becomes null)"""
+    columns = {name: records[name].tolist() for name in COLUMNS if name != 'ema50'}
+    ema50 = records['ema50']
+    columns['ema50'] = np.where(np.isnan(ema50), None, ema50).tolist()
+    return columns
+
+def columnar_payload(symbol, timeframe, columns, next_cursor=None):
+    return {
+        'symbol': symbol.upper(),
+        'timeframe': timeframe,
+        'candles': columns,
+        'count': len(columns['time']),
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None
+    }
+
+def encode_msgpack(symbol, timeframe, columns, next_cursor=None):
+    return msgpack.packb(columnar_payload(symbol, timeframe, columns, next_cursor), use_bin_type=True)
+
+def encode_arrow(symbol, timeframe, columns, next_cursor=None):
+    """Arrow IPC stream, nulls where the EMA isn't known yet"""
+    arrays = [pa.array(columns['time'], type=pa.int64()).cast(pa.timestamp('ms', tz='UTC'))]
+    arrays += [pa.array(columns[name], type=pa.float64()) for name in COLUMNS[1:]]
+
+    metadata = {'symbol': symbol.upper(), 'timeframe': timeframe}
+    if next_cursor:
+        metadata['next_cursor'] = next_cursor
+
+    schema = pa.schema(
+        [pa.field(name, array.type) for name, array in zip(COLUMNS, arrays)],
+        metadata=metadata
+    )
+    batch = pa.record_batch(arrays, schema=schema)
+
+    sink = pa.BufferOutputStream()
+    with ipc.new_stream(sink, schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
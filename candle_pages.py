@@ -0,0 +1,166 @@
+"""
+Candle Pagination
+Keyset pages over (symbol, timeframe, time) for /api/candles/<symbol>, so scrolling five
+years back costs one index range scan per page
+
+    ?before=<time>  newest candles strictly older than <time> (default: from the latest)
+    ?after=<time>   oldest candles strictly newer than <time>
+    ?from=<time>&to=<time>  inclusive bounds, combine with either direction
+    ?cursor=<next_cursor>   continue where the previous page stopped
+
+Times are ISO 8601 or ms since epoch. Pages come back oldest first either way
+"""
+
+import base64
+import json
+import os
+from datetime import datetime, timezone
+
+from candle_clock import as_utc
+from mmap_candle_store import range_of, to_ms
+
+CANDLE_PAGE_DEFAULT = 100
+CANDLE_PAGE_MAX = int(os.getenv('CANDLE_PAGE_MAX', 5000))
+
+class PageError(ValueError):
+    """Bad pagination arguments, answered with a 400"""
+
+def parse_time(value, name):
+    try:
+        if value.lstrip('-').isdigit():
+            return datetime.fromtimestamp(int(value) / 1000, tz=timezone.utc)
+        return as_utc(value.replace('Z', '+00:00'))
+    except (ValueError, OverflowError, OSError):
+        raise PageError(f"Invalid '{name}' time: {value}")
+
+def from_ms(value):
+    return None if value is None else datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+
+def encode_cursor(symbol, timeframe, page, key_time):
+    state = {
+        's': symbol,
+        'tf': timeframe,
+        'dir': 'f' if page['forward'] else 'b',
+        'k': to_ms(key_time),
+        'lo': to_ms(page['from']) if page['from'] else None,
+        'hi': to_ms(page['to']) if page['to'] else None
+    }
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(',', ':')).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, symbol, timeframe):
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        forward = state['dir'] == 'f'
+        key = from_ms(state['k'])
+        bounds = from_ms(state['lo']), from_ms(state['hi'])
+    except (ValueError, KeyError, TypeError):
+        raise PageError("Invalid cursor")
+
+    if state.get('s') != symbol or state.get('tf') != timeframe:
+        raise PageError("Cursor belongs to a different symbol or timeframe")
+
+    return {
+        'forward': forward,
+        'after': key if forward else None,
+        'before': None if forward else key,
+        'from': bounds[0],
+        'to': bounds[1]
+    }
+
+def parse_page(args, symbol, timeframe):
+    """Page spec from request args, raises PageError"""
+    try:
+        limit = int(args.get('limit', CANDLE_PAGE_DEFAULT))
+    except ValueError:
+        raise PageError(f"Invalid limit: {args.get('limit')}")
+    if limit < 1:
+        raise PageError("limit must be at least 1")
+
+    if args.get('cursor'):
+        page = decode_cursor(args['cursor'], symbol, timeframe)
+    else:
+        page = {
+            name: parse_time(args[name], name) if args.get(name) else None
+            for name in ('before', 'after', 'from', 'to')
+        }
+        if page['before'] and page['after']:
+            raise PageError("Use either 'before' or 'after', not both")
+        # Walk forward from `after` / `from`, otherwise back from the newest end
+        page['forward'] = bool(page['after'] or (page['from'] and not page['to'] and not page['before']))
+
+    page['limit'] = min(limit, CANDLE_PAGE_MAX)
+    page['paged'] = any(args.get(name) for name in ('cursor', 'before', 'after', 'from', 'to'))
+    return page
+
+def page_sql(symbol, timeframe, page):
+    """(query, params) fetching one row past the page to tell whether there's more"""
+    conditions = ["symbol = %s", "timeframe = %s"]
+    params = [symbol, timeframe]
+
+    for name, operator in (('after', '>'), ('from', '>='), ('before', '<'), ('to', '<=')):
+        if page[name]:
+            conditions.append(f"time {operator} %s")
+            params.append(page[name])
+
+    query = f"""
+        SELECT time, open, high, low, close, volume, ema50
+        FROM candles
+        WHERE {' AND '.join(conditions)}
+        ORDER BY time {'ASC' if page['forward'] else 'DESC'}
+        LIMIT %s
+    """
+    params.append(page['limit'] + 1)
+    return query, tuple(params)
+
+def page_records(store, symbol, timeframe, page):
+    """
+    The same page from the memory-mapped store, in fetch order like page_sql
+    None when the store (the recent tail of the history) can't answer it on its own
+    """
+    if not store.exists(symbol, timeframe):
+        return None
+    records = store.read(symbol, timeframe)
+
+    start, _ = page_bounds(page)
+    reaches_start = len(records) > 0 and start is not None and int(records['time'][0]) <= start
+
+    rows = page_slice(records, page)
+    # A full backward page never reaches past the store's first candle
+    if reaches_start or (not page['forward'] and len(rows) > page['limit']):
+        return rows
+    return None
+
+def page_bounds(page):
+    """Inclusive (start, end) ms of the page's range, None where unbounded"""
+    lower = [to_ms(page['from'])] if page['from'] else []
+    if page['after']:
+        lower.append(to_ms(page['after']) + 1)
+    upper = [to_ms(page['to'])] if page['to'] else []
+    if page['before']:
+        upper.append(to_ms(page['before']) - 1)
+
+    return (max(lower) if lower else None), (min(upper) if upper else None)
+
+def page_slice(records, page):
+    """The page from a complete time-sorted structured array, in fetch order like page_sql"""
+    start, end = page_bounds(page)
+    if page['forward']:
+        return range_of(records, start, end)[:page['limit'] + 1]
+    return range_of(records, start, end, limit=page['limit'] + 1)[::-1]
+
+def finish_page(rows, page, symbol, timeframe):
+    """(rows oldest first, next_cursor) from rows in fetch order, None when there are no more"""
+    has_more = len(rows) > page['limit']
+    rows = rows[:page['limit']]
+    if not page['forward']:
+        rows = rows[::-1]
+
+    if not has_more:
+        return rows, None
+
+    # Continue past the last candle in the direction of travel
+    edge = rows[-1] if page['forward'] else rows[0]
+    key_time = edge['time'] if isinstance(edge, dict) else edge[0]
+    if not isinstance(key_time, datetime):
+        key_time = from_ms(int(key_time))  # Store records hold ms
+    return rows, encode_cursor(symbol, timeframe, page, key_time)
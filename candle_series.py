@@ -0,0 +1,181 @@
+"""
+Chart Series
+Downsampled candles for /api/candles/<symbol>/series: a target point count instead of
+every candle, so a five-year 15m chart ships a thousand points rather than 175k rows
+
+    ?mode=ohlc   candles re-bucketed into `points` groups (default)
+    ?mode=lttb   Largest-Triangle-Three-Buckets on the close, EMA at the same candles
+    ?points=     target point count (default 1000, at most SERIES_MAX_POINTS)
+    ?from= / ?to=  time range, ISO 8601 or ms (default: the whole history)
+
+Results are cached per (symbol, timeframe, range, points, mode) and candle watermark,
+so a zoom level is computed once per tick
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from candle_pages import PageError, parse_time
+from mmap_candle_store import rows_to_records, to_ms
+
+SERIES_DEFAULT_POINTS = 1000
+SERIES_MAX_POINTS = int(os.getenv('SERIES_MAX_POINTS', 5000))
+
+# Downsampled series kept in memory (each is at most SERIES_MAX_POINTS points)
+SERIES_CACHE_ENTRIES = int(os.getenv('SERIES_CACHE_ENTRIES', 256))
+
+MODES = ('ohlc', 'lttb')
+
+def parse_series(args):
+    """(start, end, points, mode) from request args, raises PageError"""
+    start = parse_time(args['from'], 'from') if args.get('from') else None
+    end = parse_time(args['to'], 'to') if args.get('to') else None
+    if start and end and start > end:
+        raise PageError("'from' is after 'to'")
+
+    try:
+        points = int(args.get('points', SERIES_DEFAULT_POINTS))
+    except ValueError:
+        raise PageError(f"Invalid points: {args.get('points')}")
+    if points < 3:
+        raise PageError("points must be at least 3")
+
+    mode = args.get('mode', 'ohlc').lower()
+    if mode not in MODES:
+        raise PageError(f"Unknown mode '{mode}', use one of: {', '.join(MODES)}")
+
+    return start, end, min(points, SERIES_MAX_POINTS), mode
+
+def series_sql(symbol, timeframe, start, end):
+    """(query, params) for every candle in the range, oldest first"""
+    conditions = ["symbol = %s", "timeframe = %s"]
+    params = [symbol, timeframe]
+    if start:
+        conditions.append("time >= %s")
+        params.append(start)
+    if end:
+        conditions.append("time <= %s")
+        params.append(end)
+
+    query = f"""
+        SELECT time, open, high, low, close, volume, ema50
+        FROM candles
+        WHERE {' AND '.join(conditions)}
+        ORDER BY time ASC
+    """
+    return query, tuple(params)
+
+def load_series(conn, store, symbol, timeframe, start, end):
+    """Candles in the range as a store-format structured array (ms times, NaN EMA)"""
+    if store.exists(symbol, timeframe) and start is not None:
+        # The store holds the recent tail, it answers ranges that start inside it
+        times = store.read(symbol, timeframe)['time']
+        if len(times) and int(times[0]) <= to_ms(start):
+            return store.range(symbol, timeframe, start, end)
+
+    cur = conn.cursor()
+    cur.execute(*series_sql(symbol, timeframe, start, end))
+    rows = cur.fetchall()
+    cur.close()
+    return rows_to_records(rows)
+
+def ohlc_buckets(records, points):
+    """Re-bucket into `points` runs of consecutive candles: first open, max high, min low, last close"""
+    n = len(records)
+    if n <= points:
+        return records
+
+    starts = np.arange(points) * n // points
+    ends = np.append(starts[1:], n) - 1
+
+    buckets = np.empty(points, dtype=records.dtype)
+    buckets['time'] = records['time'][starts]
+    buckets['open'] = records['open'][starts]
+    buckets['high'] = np.maximum.reduceat(records['high'], starts)
+    buckets['low'] = np.minimum.reduceat(records['low'], starts)
+    buckets['close'] = records['close'][ends]
+    buckets['volume'] = np.add.reduceat(records['volume'], starts)
+    buckets['ema50'] = records['ema50'][ends]
+    return buckets
+
+def lttb_indices(x, y, points):
+    """
+    Indices of the `points` samples Largest-Triangle-Three-Buckets keeps: the first and last,
+    then per bucket the one forming the largest triangle with the previous pick and the
+    next bucket's average
+    """
+    n = len(y)
+    if n <= points:
+        return np.arange(n)
+
+    x = x.astype(np.float64)
+    # Bucket i covers [edges[i], edges[i + 1]), the last point is its own bucket
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    edges = np.append(edges, n)
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = edges[i + 1], edges[i + 2]
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
+
+def downsample(records, points, mode):
+    """Column lists for the response (NaN EMA becomes null)"""
+    if mode == 'lttb':
+        picked = records[lttb_indices(records['time'], records['close'], points)]
+        names = ('time', 'close', 'ema50')
+    else:
+        picked = ohlc_buckets(records, points)
+        names = ('time', 'open', 'high', 'low', 'close', 'volume', 'ema50')
+
+    columns = {name: picked[name].tolist() for name in names if name != 'ema50'}
+    columns['ema50'] = np.where(np.isnan(picked['ema50']), None, picked['ema50']).tolist()
+    return columns
+
+def series_payload(symbol, timeframe, mode, points, records):
+    columns = downsample(records, points, mode)
+    return {
+        'symbol': symbol.upper(),
+        'timeframe': timeframe,
+        'mode': mode,
+        'points': len(columns['time']),
+        'source_candles': len(records),
+        'series': columns
+    }
+
+class SeriesCache:
+    """LRU of computed payloads, keys carry the candle watermark version so a tick invalidates them"""
+
+    def __init__(self, max_entries=SERIES_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            payload = self.entries.get(key)
+            if payload is not None:
+                self.entries.move_to_end(key)
+            return payload
+
+    def put(self, key, payload):
+        with self.lock:
+            self.entries[key] = payload
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
@@ -0,0 +1,157 @@
+"""
+Database Candle Source
+Reads the candles background_worker keeps in Postgres so the scanners only go to
+the network for coins and timeframes the database doesn't cover
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import psycopg
+
+from candle_clock import INTERVAL_MINUTES, candle_open_time
+
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+# 'db' reads the database first, 'rest' always goes to the network,
+# 'auto' uses the database whenever DATABASE_URL is set
+SCAN_DATA_SOURCE = os.getenv('SCAN_DATA_SOURCE', 'auto')
+
+class DatabaseCandleSource:
+    """Set-based reads of coins and latest closed candles"""
+
+    def __init__(self, database_url=DATABASE_URL):
+        self.database_url = database_url
+
+    @classmethod
+    def from_mode(cls, mode=None, database_url=DATABASE_URL):
+        """Source for a scanner's data source mode, None when the scanner should use REST only"""
+        mode = mode or SCAN_DATA_SOURCE
+
+        if mode == 'rest':
+            return None
+        if database_url and database_url.startswith('sqlite:'):
+            # The set-based query is Postgres-only (unnest + LATERAL)
+            return None
+        if not database_url:
+            if mode == 'db':
+                print("⚠️  SCAN_DATA_SOURCE=db but DATABASE_URL is not set, using REST")
+            return None
+
+        return cls(database_url)
+
+    def get_connection(self):
+        return psycopg.connect(self.database_url)
+
+    def get_top_coins(self, limit):
+        """
+        Top coins by market cap rank, shaped like CoinGecko /coins/markets rows
+        None when the database doesn't have `limit` ranked coins
+        """
+        conn = self.get_connection()
+        cur = conn.cursor()
+
+        cur.execute("""
+            SELECT symbol, name, market_cap_rank, market_cap, current_price, binance_symbol
+            FROM coins
+            WHERE market_cap_rank > 0
+            ORDER BY market_cap_rank
+            LIMIT %s
+        """, (limit,))
+        rows = cur.fetchall()
+
+        cur.close()
+        conn.close()
+
+        if len(rows) < limit:
+            return None
+
+        return [
+            {
+                'symbol': row[0].lower(),
+                'name': row[1],
+                'market_cap_rank': row[2],
+                'market_cap': row[3] or 0,
+                'current_price': row[4],
+                'binance_symbol': row[5]
+            }
+            for row in rows
+        ]
+
+    def get_latest_candles(self, symbols, limits, now=None):
+        """
+        Latest closed candles for every symbol and interval in one query
+        `limits` maps interval -> number of candles wanted
+
+        Returns {(symbol, interval): [(time, close, ema50), ...]} oldest first, only for
+        series whose most recent closed candle is already in the database
+        """
+        now = now or datetime.now(timezone.utc)
+        intervals = [interval for interval in limits if interval in INTERVAL_MINUTES]
+        if not symbols or not intervals:
+            return {}
+
+        open_times = [candle_open_time(interval, now) for interval in intervals]
+
+        conn = self.get_connection()
+        cur = conn.cursor()
+
+        cur.execute("""
+            SELECT s.symbol, t.timeframe, c.time, c.close, c.ema50
+            FROM unnest(%s::text[]) AS s(symbol)
+            CROSS JOIN unnest(%s::text[], %s::timestamptz[], %s::int[]) AS t(timeframe, open_before, wanted)
+            CROSS JOIN LATERAL (
+                SELECT time, close, ema50 FROM candles
+                WHERE candles.symbol = s.symbol
+                  AND candles.timeframe = t.timeframe
+                  AND candles.time < t.open_before
+                ORDER BY time DESC
+                LIMIT t.wanted
+            ) c
+            ORDER BY s.symbol, t.timeframe, c.time
+        """, (
+            [symbol.upper() for symbol in symbols],
+            intervals,
+            open_times,
+            [limits[interval] for interval in intervals]
+        ))
+        rows = cur.fetchall()
+
+        cur.close()
+        conn.close()
+
+        series = {}
+        for symbol, interval, time, close, ema50 in rows:
+            series.setdefault((symbol, interval), []).append((time, close, ema50))
+
+        # A series that stops before the last closed candle is stale, let REST fill it
+        last_closed = {
+            interval: open_time - timedelta(minutes=INTERVAL_MINUTES[interval])
+            for interval, open_time in zip(intervals, open_times)
+        }
+        return {
+            (symbol, interval): candles
+            for (symbol, interval), candles in series.items()
+            if candles[-1][0] >= last_closed[interval]
+        }
+
+def summarize_series(candles, period=50):
+    """
+    (current_price, ema50) from a series of (time, close, ema50) rows
+    Uses the worker's stored EMA (computed over full history) and only falls back to
+    computing it from the loaded closes; None when neither is possible
+    """
+    if not candles:
+        return None
+
+    current_price = float(candles[-1][1])
+    ema50 = candles[-1][2]
+
+    if ema50 is None:
+        if len(candles) < period:
+            return None
+        closes = pd.Series([float(candle[1]) for candle in candles])
+        ema50 = closes.ewm(span=period, adjust=False).mean().iloc[-1]
+
+    return current_price, float(ema50)
@@ -0,0 +1,186 @@
+"""
+Response Compression
+Content-Encoding negotiation (br, zstd, gzip) for the Flask apps' JSON, msgpack and Arrow
+bodies. Each representation is compressed once: the encoded bytes are kept by ETag (by a digest
+of the body for responses without one), so polling an unchanged resource costs a lookup.
+Each coding goes out under its own ETag ("<etag>-br"), with Vary: Accept-Encoding
+
+    compressor = ResponseCompressor()
+    compressor.install(app)
+
+Streamed responses (the batch endpoints, SSE) go out uncompressed
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # Optional, br isn't offered without it
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # Optional, zstd isn't offered without it
+    zstandard = None
+
+# Bodies under this many bytes gain less than the header costs
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+
+# Compressed bodies kept in memory, oldest dropped first
+COMPRESSED_CACHE_BYTES = int(os.getenv('COMPRESSED_CACHE_BYTES', 64 * 1024 * 1024))
+
+COMPRESSIBLE = {
+    'application/json',
+    'application/msgpack',
+    'application/vnd.apache.arrow.stream',
+    'text/csv'
+}
+
+# A body is compressed once and served many times, so the levels lean towards size
+CODECS = {}
+if brotli is not None:
+    CODECS['br'] = lambda body: brotli.compress(body, quality=7)
+if zstandard is not None:
+    CODECS['zstd'] = lambda body: zstandard.ZstdCompressor(level=9).compress(body)
+CODECS['gzip'] = lambda body: gzip.compress(body, compresslevel=6, mtime=0)
+
+def negotiate_encoding(accept_encodings):
+    """
+    Content coding for a werkzeug Accept-Encoding header, None for identity
+    Highest q-value wins, ties go to the first in CODECS (best ratio)
+    """
+    return accept_encodings.best_match(list(CODECS))
+
+def encoded_etag(etag, encoding):
+    """
+    Strong validator of `etag`'s body in `encoding`: each coding is different bytes, so it gets
+    its own tag ("<etag>-gzip") and caches never serve one coding's ranges against another
+    """
+    return f"{etag}-{encoding}"
+
+def matching_etag(if_none_match, etag):
+    """The tag of `etag`, in any coding, that If-None-Match holds, None when it holds none"""
+    for tag in [etag] + [encoded_etag(etag, encoding) for encoding in CODECS]:
+        if if_none_match.contains(tag):
+            return tag
+    return None
+
+def compressible(response):
+    return (
+        response.status_code == 200
+        and not response.is_streamed
+        and not response.direct_passthrough
+        and 'Content-Encoding' not in response.headers
+        and response.mimetype in COMPRESSIBLE
+    )
+
+class CompressedBodies:
+    """LRU of (body, mimetype, uncompressed size) by (validator, encoding), bounded by compressed bytes"""
+
+    def __init__(self, max_bytes=COMPRESSED_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, body, mimetype, size):
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[0])
+            self.entries[key] = (body, mimetype, size)
+            self.size += len(body)
+            while self.size > self.max_bytes and self.entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted[0])
+
+class ResponseCompressor:
+    """after_request hook compressing eligible responses, with counters for /api/compression-stats"""
+
+    def __init__(self, min_bytes=COMPRESS_MIN_BYTES, cache=None):
+        self.min_bytes = min_bytes
+        self.cache = cache or CompressedBodies()
+        self.lock = threading.Lock()
+        self.stats = {'compressed': 0, 'cache_hits': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+    def count(self, hit, size_in, size_out):
+        with self.lock:
+            self.stats['cache_hits' if hit else 'compressed'] += 1
+            self.stats['bytes_in'] += size_in
+            self.stats['bytes_out'] += size_out
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats['codecs'] = list(CODECS)
+        stats['cached_bodies'] = len(self.cache.entries)
+        stats['cached_bytes'] = self.cache.size
+        stats['ratio'] = round(stats['bytes_in'] / stats['bytes_out'], 2) if stats['bytes_out'] else None
+        return stats
+
+    def cached_response(self, etag):
+        """
+        The compressed 200 already encoded for `etag` and this request's Accept-Encoding, or None
+        Lets an ETag'd view be skipped entirely when its representation is cached
+        """
+        encoding = negotiate_encoding(request.accept_encodings)
+        entry = self.cache.get((etag, encoding)) if encoding else None
+        if entry is None:
+            return None
+
+        body, mimetype, size = entry
+        self.count(True, size, len(body))
+        response = Response(body, mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.set_etag(encoded_etag(etag, encoding))
+        return response
+
+    def compress(self, response):
+        if response.status_code == 304:
+            response.vary.add('Accept-Encoding')
+            return response
+        if not compressible(response):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        body = response.get_data()
+        if len(body) < self.min_bytes:
+            return response
+
+        etag, _ = response.get_etag()
+        key = (etag or hashlib.blake2b(body, digest_size=16).digest(), encoding)
+        entry = self.cache.get(key)
+        hit = entry is not None
+        if hit:
+            compressed = entry[0]
+        else:
+            compressed = CODECS[encoding](body)
+            self.cache.put(key, compressed, response.mimetype, len(body))
+        self.count(hit, len(body), len(compressed))
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            response.set_etag(encoded_etag(etag, encoding))
+        return response
+
+    def install(self, app):
+        app.after_request(self.compress)
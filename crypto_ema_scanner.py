@@ -1,118 +1,38 @@
-import requests
 import pandas as pd
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import json
-import os
-import glob
 
-class CryptoEMAScanner:
-    def __init__(self, cmc_api_key=None, top_n=200, cache_duration_minutes=60):
+from candle_source import DatabaseCandleSource
+from kline_store import get_kline_store
+from market_data_client import MarketDataClient, MARKET_LABELS
+from market_health import failure_counters
+from scan_cache import get_scan_cache
+from scanner_base import ScannerBase
+
+class CryptoEMAScanner(ScannerBase):
+    scan_kind = 'ema_scan'
+    results_field = 'coin_results'
+    
+    def __init__(self, cmc_api_key=None, top_n=200, cache_duration_minutes=60, client=None, cache=None,
+                 data_source=None, kline_store=None):
+        self.client = client or MarketDataClient.default()
+        self.kline_store = kline_store or get_kline_store()
+        self.db_source = DatabaseCandleSource.from_mode(data_source)
         self.coingecko_base = "https://api.coingecko.com/api/v3"
-        self.binance_base = "https://api.binance.com/api/v3"
-        self.binance_futures_base = "https://fapi.binance.com/fapi/v1"
         self.cmc_api_key = cmc_api_key
         self.cmc_base = "https://pro-api.coinmarketcap.com/v1"
         self.top_n = top_n
         self.cache_duration_minutes = cache_duration_minutes
-        self.cache_file_pattern = f'crypto_ema_scan_top{top_n}_*.json'
-        
-    def get_recent_scan(self):
-        """Check if there's a recent scan within the cache duration"""
-        try:
-            scan_files = glob.glob(self.cache_file_pattern)
-            
-            if not scan_files:
-                return None
-            
-            most_recent_file = max(scan_files, key=os.path.getctime)
-            file_time = datetime.fromtimestamp(os.path.getctime(most_recent_file))
-            time_diff = datetime.now() - file_time
-            
-            if time_diff < timedelta(minutes=self.cache_duration_minutes):
-                print(f"\n🔄 Found recent scan from {file_time.strftime('%Y-%m-%d %H:%M:%S')}")
-                print(f"   ({int(time_diff.total_seconds() / 60)} minutes ago)")
-                print(f"   Loading cached data: {most_recent_file}")
-                
-                with open(most_recent_file, 'r') as f:
-                    data = json.load(f)
-                return data
-            else:
-                print(f"\n⏰ Last scan was {int(time_diff.total_seconds() / 60)} minutes ago")
-                print(f"   Cache expired (>{self.cache_duration_minutes} minutes), running new scan...")
-                return None
-                
-        except Exception as e:
-            print(f"Error checking cache: {e}")
-            return None
-    
-    def get_top_n_coins(self):
-        """Fetch top N cryptocurrencies by market cap from CoinGecko"""
-        print(f"Fetching top {self.top_n} coins by market cap...")
-        url = f"{self.coingecko_base}/coins/markets"
-        
-        all_coins = []
-        pages_needed = (self.top_n + 49) // 50
-        
-        for page in range(1, pages_needed + 1):
-            params = {
-                'vs_currency': 'usd',
-                'order': 'market_cap_desc',
-                'per_page': 50,
-                'page': page,
-                'sparkline': False
-            }
-            
-            try:
-                response = requests.get(url, params=params, timeout=10)
-                response.raise_for_status()
-                coins = response.json()
-                all_coins.extend(coins)
-                print(f"  Fetched page {page}/{pages_needed}...")
-                time.sleep(1)
-                
-            except Exception as e:
-                print(f"Error fetching page {page}: {e}")
-                continue
+        self.cache = cache or get_scan_cache()
         
-        all_coins = all_coins[:self.top_n]
-        print(f"Successfully fetched {len(all_coins)} coins")
-        return all_coins
-    
-    def get_binance_spot_data(self, symbol, interval='1w', limit=60):
-        """Fetch SPOT candlestick data from Binance"""
-        url = f"{self.binance_base}/klines"
-        params = {
-            'symbol': symbol,
-            'interval': interval,
-            'limit': limit
-        }
-        
-        try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            return data, 'spot'
-        except:
-            return None, None
-    
-    def get_binance_futures_data(self, symbol, interval='1w', limit=60):
-        """Fetch FUTURES candlestick data from Binance"""
-        url = f"{self.binance_futures_base}/klines"
-        params = {
-            'symbol': symbol,
-            'interval': interval,
-            'limit': limit
+        # Result key -> Binance interval, candles and label, a result is refetched once its candle closes
+        self.timeframes = {
+            'weekly': {'binance': '1w', 'limit': 60, 'label': 'Weekly'},
+            'daily': {'binance': '1d', 'limit': 60, 'label': 'Daily'},
+            '4h': {'binance': '4h', 'limit': 60, 'label': '4-Hour'}
         }
         
-        try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            return data, 'futures'
-        except:
-            return None, None
-    
     def get_cmc_data(self, symbol, interval='weekly', limit=60):
         """Fetch OHLCV data from CoinMarketCap"""
         if not self.cmc_api_key:
@@ -125,7 +45,7 @@ class CryptoEMAScanner:
         }
         
         try:
-            response = requests.get(url, headers=headers, params={'symbol': symbol}, timeout=10)
+            response = self.client.get(url, headers=headers, params={'symbol': symbol})
             response.raise_for_status()
             data = response.json()
             
@@ -155,7 +75,7 @@ class CryptoEMAScanner:
                 'convert': 'USD'
             }
             
-            response = requests.get(ohlcv_url, headers=headers, params=params, timeout=10)
+            response = self.client.get(ohlcv_url, headers=headers, params=params)
             response.raise_for_status()
             ohlcv_data = response.json()
             
@@ -200,37 +120,11 @@ class CryptoEMAScanner:
         ]
         
         for base_symbol in symbol_formats:
-            klines, market_type = self.get_binance_spot_data(base_symbol, interval=interval, limit=limit)
-            
-            if klines and len(klines) >= 50:
-                closes = [float(candle[4]) for candle in klines]
-                ema_values = self.calculate_ema(closes, period=50)
-                
-                current_price = closes[-1]
-                current_ema50 = ema_values[-1]
-                pct_diff = ((current_price - current_ema50) / current_ema50) * 100
-                
-                timeframe_label = "Weekly" if interval == '1w' else "Daily" if interval == '1d' else "4-Hour"
-                
-                return {
-                    'rank': coin_data['market_cap_rank'],
-                    'name': coin_data['name'],
-                    'symbol': symbol,
-                    'binance_symbol': base_symbol,
-                    'current_price': current_price,
-                    'ema50': current_ema50,
-                    'above_ema50': current_price > current_ema50,
-                    'pct_from_ema50': pct_diff,
-                    'market_cap': coin_data.get('market_cap', 0),
-                    'timeframe': timeframe_label,
-                    'data_source': 'Binance Spot',
-                    'candle_count': len(klines)
-                }
-            
-            if klines and verbose:
-                print(f"      → {base_symbol} (Spot): Only {len(klines)} candles")
-            
-            klines, market_type = self.get_binance_futures_data(base_symbol, interval=interval, limit=limit)
+            # Spot and futures are asked in parallel, the first with enough candles wins
+            # (stored series only fetch candles newer than their tail)
+            klines, market_type = self.kline_store.get_klines(
+                self.client, base_symbol, interval, limit, min_candles=50, symbol=symbol
+            )
             
             if klines and len(klines) >= 50:
                 closes = [float(candle[4]) for candle in klines]
@@ -253,12 +147,12 @@ class CryptoEMAScanner:
                     'pct_from_ema50': pct_diff,
                     'market_cap': coin_data.get('market_cap', 0),
                     'timeframe': timeframe_label,
-                    'data_source': 'Binance Futures',
+                    'data_source': MARKET_LABELS[market_type],
                     'candle_count': len(klines)
                 }
             
             if klines and verbose:
-                print(f"      → {base_symbol} (Futures): Only {len(klines)} candles")
+                print(f"      → {base_symbol} ({market_type.title()}): Only {len(klines)} candles")
         
         return None
     
@@ -297,35 +191,70 @@ class CryptoEMAScanner:
         
         return None
     
-    def analyze_coin_all_timeframes(self, coin_data, verbose=False):
-        """Analyze a coin across all timeframes: Weekly, Daily, and 4-Hour"""
+    def analyze_coin_all_timeframes(self, coin_data, verbose=False, reuse=None):
+        """
+        Analyze a coin across all timeframes: Weekly, Daily, and 4-Hour
+        Timeframes present in `reuse` are taken from there instead of being refetched
+        """
+        reuse = reuse or {}
         results = {}
         
         # Weekly analysis
-        result = self.analyze_coin_binance(coin_data, interval='1w', limit=60, verbose=verbose)
-        if not result and self.cmc_api_key:
-            result = self.analyze_coin_cmc(coin_data, interval='weekly', limit=60)
+        if 'weekly' in reuse:
+            result = reuse['weekly']
+        else:
+            result = self.analyze_coin_binance(coin_data, interval='1w', limit=60, verbose=verbose)
+            if not result and self.cmc_api_key:
+                result = self.analyze_coin_cmc(coin_data, interval='weekly', limit=60)
         results['weekly'] = result
         
         # Daily analysis
-        result = self.analyze_coin_binance(coin_data, interval='1d', limit=60, verbose=verbose)
-        if not result and self.cmc_api_key:
-            result = self.analyze_coin_cmc(coin_data, interval='daily', limit=60)
+        if 'daily' in reuse:
+            result = reuse['daily']
+        else:
+            result = self.analyze_coin_binance(coin_data, interval='1d', limit=60, verbose=verbose)
+            if not result and self.cmc_api_key:
+                result = self.analyze_coin_cmc(coin_data, interval='daily', limit=60)
         results['daily'] = result
         
         # 4-Hour analysis
-        result = self.analyze_coin_binance(coin_data, interval='4h', limit=60, verbose=verbose)
-        if not result and self.cmc_api_key:
-            result = self.analyze_coin_cmc(coin_data, interval='hourly', limit=60)
+        if '4h' in reuse:
+            result = reuse['4h']
+        else:
+            result = self.analyze_coin_binance(coin_data, interval='4h', limit=60, verbose=verbose)
+            if not result and self.cmc_api_key:
+                result = self.analyze_coin_cmc(coin_data, interval='hourly', limit=60)
         results['4h'] = result
         
         return results
     
-    def scan_all_coins(self, verbose=False):
-        """Main function to scan all top N coins across all timeframes"""
-        coins = self.get_top_n_coins()
+    def timeframe_fields(self, key):
+        return {'timeframe': self.timeframes[key]['label']}
+    
+    def previous_result(self, coin_result, key):
+        return coin_result.get(key)
+    
+    def build_coin_result(self, coin, results, fetched_at):
+        return {
+            'coin_info': coin,
+            'weekly': results['weekly'],
+            'daily': results['daily'],
+            '4h': results['4h'],
+            'fetched_at': fetched_at
+        }
+    
+    def scan_all_coins(self, verbose=False, previous=None):
+        """
+        Main function to scan all top N coins across all timeframes
+        With a previous scan, only series whose latest candle has closed since are refetched
+        """
+        coins = self.get_coins()
+        previous_index = self.index_previous_scan(previous)
+        now = datetime.now(timezone.utc)
+        db_results = self.load_db_results(coins, now=now)
         
         all_coin_results = []
+        refetched_total = 0
         
         print(f"\nAnalyzing coins across all timeframes (Weekly, Daily, 4H)...")
         print("-" * 80)
@@ -337,16 +266,11 @@ class CryptoEMAScanner:
             
             print(f"[{i}/{total_coins}] Analyzing {name} ({symbol})...")
             
-            results = self.analyze_coin_all_timeframes(coin, verbose=verbose)
-            
             # Store complete result
-            coin_result = {
-                'coin_info': coin,
-                'weekly': results['weekly'],
-                'daily': results['daily'],
-                '4h': results['4h']
-            }
-            all_coin_results.append(coin_result)
+            results, refetched = self.scan_coin(coin, previous_index, verbose=verbose, now=now,
+                                                db_results=db_results)
+            refetched_total += refetched
+            all_coin_results.append(results)
             
             # Display summary
             weekly_status = f"Weekly: {results['weekly']['pct_from_ema50']:+.2f}%" if results['weekly'] else "Weekly: N/A"
@@ -355,7 +279,13 @@ class CryptoEMAScanner:
             
             print(f"   {weekly_status} | {daily_status} | {four_h_status}")
             
-            time.sleep(0.5)
+            if refetched:
+                time.sleep(0.5)
+        
+        if previous_index or db_results:
+            total_series = len(coins) * len(self.timeframes)
+            print(f"\n♻️  Incremental rescan: refetched {refetched_total}/{total_series} series, "
+                  f"the rest came from the database or the previous scan")
         
         return all_coin_results
     
@@ -599,7 +529,8 @@ class CryptoEMAScanner:
         print("=" * 100)
     
     def save_results(self, results_above_weekly, results_below_weekly,
-                    results_above_daily, results_below_daily, results_4h, failed_coins):
+                    results_above_daily, results_below_daily, results_4h, failed_coins,
+                    all_coin_results=None):
         """Save results to JSON and CSV files"""
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         
@@ -618,6 +549,7 @@ class CryptoEMAScanner:
             'coins_below_daily_ema50': results_below_daily,
             'coins_4h_ema50': results_4h,
             'failed_coins': failed_coins,
+            'coin_results': all_coin_results or [],
             'strategic_summary': {
                 'coins_to_evaluate_long_term': coins_to_evaluate,
                 'coins_to_trade_now_short_term': coins_to_trade_now,
@@ -640,29 +572,37 @@ class CryptoEMAScanner:
         }
         
         json_filename = f'crypto_ema_scan_top{self.top_n}_{timestamp}.json'
-        with open(json_filename, 'w') as f:
+        with open(self.cache.path(json_filename), 'w') as f:
             json.dump(output, f, indent=2)
         print(f"\n💾 Results saved to: {json_filename}")
         
+        saved_files = [json_filename]
+        
         # Save strategic lists to CSV
         if coins_to_evaluate:
             df_evaluate = pd.DataFrame(coins_to_evaluate)
             csv_evaluate = f'coins_LONGTERM_top{self.top_n}_{timestamp}.csv'
-            df_evaluate.to_csv(csv_evaluate, index=False)
+            df_evaluate.to_csv(self.cache.path(csv_evaluate), index=False)
+            saved_files.append(csv_evaluate)
             print(f"💾 Long-term coins saved to: {csv_evaluate}")
         
         if coins_to_trade_now:
             df_trade = pd.DataFrame(coins_to_trade_now)
             csv_trade = f'coins_TRADE_NOW_top{self.top_n}_{timestamp}.csv'
-            df_trade.to_csv(csv_trade, index=False)
+            df_trade.to_csv(self.cache.path(csv_trade), index=False)
+            saved_files.append(csv_trade)
             print(f"💾 Trade NOW coins (4H) saved to: {csv_trade}")
         
         if coins_to_avoid:
             df_avoid = pd.DataFrame(coins_to_avoid)
             csv_avoid = f'coins_AVOID_top{self.top_n}_{timestamp}.csv'
-            df_avoid.to_csv(csv_avoid, index=False)
+            df_avoid.to_csv(self.cache.path(csv_avoid), index=False)
+            saved_files.append(csv_avoid)
             print(f"💾 Coins to AVOID saved to: {csv_avoid}")
         
+        # Index the scan (and evict old ones) so lookups never glob the directory
+        self.cache.put(self.cache_key(), 'ema_scan', self.top_n, saved_files)
+        
         return json_filename
     
     def run(self):
@@ -671,6 +611,8 @@ class CryptoEMAScanner:
         print(f"CRYPTOCURRENCY EMA50 SCANNER - TOP {self.top_n}")
         print("Timeframes: Weekly + Daily + 4-Hour")
         print("Sources: Binance Spot + Binance Futures + CoinMarketCap")
+        if self.db_source:
+            print("Database: Postgres candles first, Binance for anything missing")
         print(f"Cache Duration: {self.cache_duration_minutes} minutes")
         print("=" * 100)
         
@@ -698,13 +640,16 @@ class CryptoEMAScanner:
         
         start_time = time.time()
         
-        all_coin_results = self.scan_all_coins()
+        all_coin_results = self.scan_all_coins(previous=self.get_last_scan())
         results_above_weekly, results_below_weekly, results_above_daily, results_below_daily, results_4h, failed_coins = self.categorize_results(all_coin_results)
         
         self.display_results(results_above_weekly, results_below_weekly,
                            results_above_daily, results_below_daily, results_4h, failed_coins)
         self.save_results(results_above_weekly, results_below_weekly,
-                         results_above_daily, results_below_daily, results_4h, failed_coins)
+                         results_above_daily, results_below_daily, results_4h, failed_coins,
+                         all_coin_results=all_coin_results)
+        
+        failure_counters.print_report()
         
         elapsed_time = time.time() - start_time
         print(f"\n⏱️  Scan completed in {elapsed_time/60:.2f} minutes ({elapsed_time:.1f} seconds)")
@@ -0,0 +1,192 @@
+"""
+Database Stats
+/api/database-stats without COUNT(*) over the candles table: row counts come from the planner's
+statistics (pg_class.reltuples, pg_stats for the per-timeframe split), per-timeframe write
+activity from the watermarks. ?exact=1 runs the real counts in a background thread and
+serves them from cache until they're EXACT_STATS_MAX_AGE old
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from api_queries import DATABASE_STATS_SQL, shape_database_stat
+from watermarks import TIMEFRAMES, read_watermarks
+
+# Seconds an exact count is served before ?exact=1 recounts
+EXACT_STATS_MAX_AGE = float(os.getenv('EXACT_STATS_MAX_AGE', 3600))
+
+COUNTED_TABLES = {'candles': 'candles', 'coins': 'coins', 'ema_analysis': 'ema_analysis', 'scans': 'scan_history'}
+
+# Both are index lookups, not scans (oldest_candle reads the time index)
+CHEAP_STATS_SQL = [
+    (key, query, column) for key, query, column in DATABASE_STATS_SQL
+    if key not in COUNTED_TABLES
+]
+
+# The tables' schema is the first on the search_path, where setup_database created them
+ESTIMATED_COUNTS_SQL = """
+    SELECT c.relname,
+           CASE WHEN c.reltuples >= 0 THEN c.reltuples::BIGINT ELSE s.n_live_tup END
+    FROM pg_class c
+    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+    WHERE c.relname = ANY(%s) AND c.relkind = 'r' AND c.relnamespace = current_schema()::regnamespace
+"""
+
+# Share of each timeframe in the planner's most-common-values sample
+TIMEFRAME_SHARES_SQL = """
+    SELECT most_common_vals::text::text[], most_common_freqs
+    FROM pg_stats
+    WHERE schemaname = current_schema() AND tablename = 'candles' AND attname = 'timeframe'
+"""
+
+EXACT_TIMEFRAMES_SQL = """
+    SELECT timeframe, COUNT(*), MIN(time), MAX(time)
+    FROM candles
+    GROUP BY timeframe
+"""
+
+def estimated_counts(conn, backend_name):
+    """{stats key: approximate rows}, exact on SQLite (no planner row counts, small databases)"""
+    cur = conn.cursor()
+    counts = {}
+    if backend_name == 'postgres':
+        cur.execute(ESTIMATED_COUNTS_SQL, (list(COUNTED_TABLES.values()),))
+        by_table = dict(cur.fetchall())
+        for key, table in COUNTED_TABLES.items():
+            counts[key] = int(by_table.get(table) or 0)
+    else:
+        for key, table in COUNTED_TABLES.items():
+            cur.execute(f"SELECT COUNT(*) FROM {table}")
+            counts[key] = cur.fetchone()[0]
+    cur.close()
+    return counts
+
+def timeframe_shares(conn, backend_name):
+    """{timeframe: fraction of candles} from pg_stats, empty until the table has been analysed"""
+    if backend_name != 'postgres':
+        return {}
+    cur = conn.cursor()
+    cur.execute(TIMEFRAME_SHARES_SQL)
+    row = cur.fetchone()
+    cur.close()
+    if not row or not row[0]:
+        return {}
+    return dict(zip(row[0], row[1]))
+
+def exact_stats(conn):
+    """Full counts plus per-timeframe counts and ranges, scans the candles table"""
+    cur = conn.cursor()
+    stats = {}
+    for key, query, column in DATABASE_STATS_SQL:
+        cur.execute(query)
+        stats[key] = shape_database_stat(key, {column: cur.fetchone()[0]}, column)
+
+    cur.execute(EXACT_TIMEFRAMES_SQL)
+    timeframes = {
+        timeframe: {
+            'candles': count,
+            'oldest': oldest.isoformat() if oldest else None,
+            'newest': newest.isoformat() if newest else None
+        }
+        for timeframe, count, oldest, newest in cur.fetchall()
+    }
+    cur.close()
+    conn.commit()
+    return stats, timeframes
+
+class DatabaseStats:
+    """Estimated stats on request, exact ones computed at most one at a time in the background"""
+
+    def __init__(self, backend, max_age=EXACT_STATS_MAX_AGE):
+        self.backend = backend
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.exact = None          # (stats, timeframes, computed_at, monotonic time)
+        self.running_since = None
+        self.last_error = None
+
+    def start_exact(self):
+        with self.lock:
+            if self.running_since is not None:
+                return
+            self.running_since = datetime.now(timezone.utc)
+        threading.Thread(target=self.count_exact, daemon=True).start()
+
+    def count_exact(self):
+        start = time.monotonic()
+        try:
+            conn = self.backend.connect()
+            try:
+                stats, timeframes = exact_stats(conn)
+            finally:
+                conn.close()
+            with self.lock:
+                self.exact = (stats, timeframes, datetime.now(timezone.utc), time.monotonic())
+                self.last_error = None
+            print(f"📊 Exact database stats counted in {time.monotonic() - start:.1f}s")
+        except Exception as e:
+            print(f"⚠️  Exact database stats failed: {e}")
+            with self.lock:
+                self.last_error = str(e)
+        finally:
+            with self.lock:
+                self.running_since = None
+
+    def exact_status(self):
+        with self.lock:
+            exact, running_since, last_error = self.exact, self.running_since, self.last_error
+        fresh = exact is not None and time.monotonic() - exact[3] <= self.max_age
+        return exact, fresh, {
+            'status': 'running' if running_since else ('ready' if fresh else 'idle'),
+            'computed_at': exact[2].isoformat() if exact else None,
+            'started_at': running_since.isoformat() if running_since else None,
+            'error': last_error
+        }
+
+    def get(self, exact=False):
+        """The /api/database-stats body, starts an exact count when asked for one that isn't fresh"""
+        cached, fresh, status = self.exact_status()
+        if exact and not fresh:
+            self.start_exact()
+            cached, fresh, status = self.exact_status()
+
+        conn = self.backend.connect()
+        try:
+            cur = conn.cursor()
+            stats = {}
+            for key, query, column in CHEAP_STATS_SQL:
+                cur.execute(query)
+                stats[key] = shape_database_stat(key, {column: cur.fetchone()[0]}, column)
+            cur.close()
+
+            if exact and fresh:
+                stats.update({key: cached[0][key] for key in COUNTED_TABLES})
+            else:
+                stats.update(estimated_counts(conn, self.backend.name))
+            shares = timeframe_shares(conn, self.backend.name)
+
+            try:
+                watermarks = read_watermarks(conn, [f"candles:{tf}" for tf in TIMEFRAMES])
+            except Exception:
+                conn.rollback()
+                watermarks = {}
+        finally:
+            conn.close()
+
+        counted = cached[1] if cached else {}
+        timeframes = {}
+        for tf in TIMEFRAMES:
+            watermark = watermarks.get(f"candles:{tf}")
+            timeframes[tf] = {
+                'estimated_candles': int(shares[tf] * stats['candles']) if tf in shares else None,
+                'counted_candles': counted.get(tf, {}).get('candles'),
+                'writes': watermark[0] if watermark else None,
+                'last_write': watermark[1].isoformat() if watermark else None
+            }
+
+        stats['estimated'] = not (exact and fresh)
+        stats['timeframes'] = timeframes
+        stats['exact'] = status
+        return stats
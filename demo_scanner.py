@@ -9,8 +9,12 @@ from datetime import datetime
 import json
 import random
 
+from kline_store import get_kline_store
+
 class CryptoEMAScannerDemo:
-    def __init__(self):
+    def __init__(self, kline_store=None):
+        # Candles left behind by live scans, used instead of simulated numbers when present
+        self.kline_store = kline_store or get_kline_store()
         self.demo_coins = [
             {'rank': 1, 'name': 'Bitcoin', 'symbol': 'BTC', 'market_cap': 1000000000000},
             {'rank': 2, 'name': 'Ethereum', 'symbol': 'ETH', 'market_cap': 500000000000},
@@ -117,8 +121,40 @@ class CryptoEMAScannerDemo:
             'candle_count': 60
         }
         
+        for key, interval, label in (('weekly', '1w', 'Weekly'), ('daily', '1d', 'Daily'), ('4h', '4h', '4-Hour')):
+            stored = self.analyze_stored(coin, interval, label)
+            if stored:
+                results[key] = stored
+        
         return results
     
+    def analyze_stored(self, coin, interval, label):
+        """Real EMA50 from stored closed candles (no API calls), None when there aren't enough"""
+        table, market = self.kline_store.read(f"{coin['symbol']}USDT", interval, limit=60)
+        
+        if table is None or table.num_rows < 50:
+            return None
+        
+        closes = table.column('close').to_pylist()
+        current_price = closes[-1]
+        ema50 = float(pd.Series(closes).ewm(span=50, adjust=False).mean().iloc[-1])
+        pct_diff = ((current_price - ema50) / ema50) * 100
+        
+        return {
+            'rank': coin['rank'],
+            'name': coin['name'],
+            'symbol': coin['symbol'],
+            'binance_symbol': f"{coin['symbol']}USDT",
+            'current_price': current_price,
+            'ema50': ema50,
+            'above_ema50': current_price > ema50,
+            'pct_from_ema50': pct_diff,
+            'market_cap': coin['market_cap'],
+            'timeframe': label,
+            'data_source': 'Kline Store',
+            'candle_count': table.num_rows
+        }
+    
     def categorize_results(self, all_coin_results):
         """Categorize coins into different lists"""
         results_above_weekly = []
@@ -256,6 +292,8 @@ class CryptoEMAScannerDemo:
         print("=" * 100)
         print("CRYPTOCURRENCY EMA50 SCANNER - DEMO MODE")
         print("Showing simulated data to demonstrate bot functionality")
+        if self.kline_store.enabled:
+            print(f"Coins with stored candles in {self.kline_store.directory}/ use real (offline) data")
         print("=" * 100)
         
         print(f"\nAnalyzing {len(self.demo_coins)} coins across all timeframes...")
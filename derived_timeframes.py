@@ -0,0 +1,126 @@
+"""
+Derived Timeframes
+Candles for timeframes the worker doesn't store (30m, 2h, 3d, 2w, ...) aggregated on request
+from the coarsest stored timeframe that divides them, so the servable set grows without
+another ingestion stream
+
+    /api/candles/BTC?timeframe=2h   -> 1h candles binned with date_bin, EMA50 over the 2h closes
+
+A derived series covers the whole stored history (so its EMA matches what the worker would
+compute) and is cached until the source timeframe's watermark moves
+
+Binning in SQL needs date_bin, PostgreSQL 14+. SQLite has no date_bin, there the source
+candles are read and binned with numpy (bin_records) instead
+"""
+
+import os
+import re
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from mmap_candle_store import DTYPE, rows_to_records, to_ms
+from watermarks import TIMEFRAMES
+
+# Derived series kept in memory, a 30m series over 5 years is about 5 MB
+DERIVED_CACHE_ENTRIES = int(os.getenv('DERIVED_CACHE_ENTRIES', 64))
+
+UNIT_MS = {'m': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000}
+
+# Bins start at the epoch, weeks on a Monday like the exchange's weekly candles
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+WEEK_ORIGIN = datetime(1970, 1, 5, tzinfo=timezone.utc)
+
+DERIVED_SQL = """
+    SELECT
+        (EXTRACT(EPOCH FROM date_bin(%s, time, %s)) * 1000)::BIGINT AS bucket,
+        (array_agg(open ORDER BY time))[1] AS open,
+        MAX(high) AS high,
+        MIN(low) AS low,
+        (array_agg(close ORDER BY time DESC))[1] AS close,
+        SUM(volume) AS volume,
+        'NaN'::DOUBLE PRECISION AS ema50
+    FROM candles
+    WHERE symbol = %s AND timeframe = %s
+    GROUP BY bucket
+    ORDER BY bucket
+"""
+
+SOURCE_SQL = """
+    SELECT time, open, high, low, close, volume, ema50
+    FROM candles
+    WHERE symbol = %s AND timeframe = %s
+    ORDER BY time ASC
+"""
+
+def timeframe_ms(timeframe):
+    """'2h' -> 7200000, None when it isn't <count><m|h|d|w>"""
+    match = re.fullmatch(r'(\d+)([mhdw])', timeframe or '')
+    if not match or int(match.group(1)) == 0:
+        return None
+    return int(match.group(1)) * UNIT_MS[match.group(2)]
+
+def source_timeframe(timeframe):
+    """Stored timeframe `timeframe` is built from (itself when stored), None when it can't be"""
+    if timeframe in TIMEFRAMES:
+        return timeframe
+
+    width = timeframe_ms(timeframe)
+    if width is None:
+        return None
+
+    for stored in sorted(TIMEFRAMES, key=timeframe_ms, reverse=True):
+        if width % timeframe_ms(stored) == 0:
+            return stored
+    return None
+
+def is_derived(timeframe):
+    return timeframe not in TIMEFRAMES and source_timeframe(timeframe) is not None
+
+def bin_origin(timeframe):
+    return WEEK_ORIGIN if timeframe.endswith('w') else EPOCH
+
+def bin_records(records, width, origin_ms):
+    """Numpy date_bin: consecutive source candles in the same bucket become one candle"""
+    if not len(records):
+        return np.empty(0, dtype=DTYPE)
+
+    buckets = (records['time'] - origin_ms) // width
+    starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+    ends = np.append(starts[1:], len(records)) - 1
+
+    binned = np.empty(len(starts), dtype=DTYPE)
+    binned['time'] = buckets[starts] * width + origin_ms
+    binned['open'] = records['open'][starts]
+    binned['high'] = np.maximum.reduceat(records['high'], starts)
+    binned['low'] = np.minimum.reduceat(records['low'], starts)
+    binned['close'] = records['close'][ends]
+    binned['volume'] = np.add.reduceat(records['volume'], starts)
+    binned['ema50'] = np.nan
+    return binned
+
+def with_ema(records, period=50):
+    """EMA50 over the derived closes, same as the worker's calculate_ema (none under `period` candles)"""
+    if len(records) >= period:
+        records['ema50'] = pd.Series(records['close']).ewm(span=period, adjust=False).mean().to_numpy()
+    return records
+
+def load_derived(conn, backend_name, symbol, timeframe):
+    """Every candle of a derived timeframe as a store-format structured array, oldest first"""
+    source = source_timeframe(timeframe)
+    width = timeframe_ms(timeframe)
+    origin = bin_origin(timeframe)
+
+    cur = conn.cursor()
+    if backend_name == 'postgres':
+        # Only the binned rows leave the database
+        cur.execute(DERIVED_SQL, (timedelta(milliseconds=width), origin, symbol, source))
+        records = np.fromiter(cur.fetchall(), dtype=DTYPE)
+    else:
+        # No date_bin on SQLite, bin the source candles here
+        cur.execute(SOURCE_SQL, (symbol, source))
+        records = bin_records(rows_to_records(cur.fetchall()), width, to_ms(origin))
+    cur.close()
+
+    return with_ema(records)
@@ -0,0 +1,153 @@
+"""
+Scan Event Hub
+Fan-out of scan progress to every /api/stream subscriber. Each event is encoded once into its
+SSE frame, appended to the current scan's replay log and pushed to every subscriber's bounded
+buffer, so publishing never waits on a client
+
+  - a subscriber joining mid-scan (or reconnecting with Last-Event-ID) is replayed the log
+  - a subscriber whose buffer fills is dropped; its EventSource reconnects and resumes from
+    the log with the last id it received
+  - when events it hasn't seen have already left the capped log, its replay opens with a
+    {"type": "reset"} event: the client drops what it has and reloads (/api/status, the
+    scan's results once it completes) instead of showing a scan with holes in it
+
+Event ids are "<scan>-<seq>", an id from an earlier scan replays the current scan from its start
+"""
+
+import itertools
+import os
+import threading
+import time
+from collections import deque
+
+from fast_json import dumps
+
+# Events a subscriber may fall behind by before it's dropped
+SUBSCRIBER_BUFFER_EVENTS = int(os.getenv('SSE_SUBSCRIBER_BUFFER', 256))
+
+# Events of the current scan kept for replay (one per coin plus a few)
+REPLAY_MAX_EVENTS = int(os.getenv('SSE_REPLAY_MAX_EVENTS', 10000))
+
+FINAL_TYPES = ('complete', 'error')
+
+class Event:
+    """One published message and its SSE frame, shared by every subscriber"""
+
+    def __init__(self, scan_id, seq, payload):
+        self.scan_id = scan_id
+        self.seq = seq
+        self.final = payload.get('type') in FINAL_TYPES
+        self.frame = f"id: {scan_id}-{seq}\n".encode() + b"data: " + dumps(payload) + b"\n\n"
+
+def frame(payload):
+    """SSE frame without an id (connection notices and heartbeats aren't replayed)"""
+    return b"data: " + dumps(payload) + b"\n\n"
+
+def parse_event_id(value):
+    """'3-41' -> (3, 41), None for anything else"""
+    try:
+        scan_id, seq = (value or '').split('-')
+        return int(scan_id), int(seq)
+    except ValueError:
+        return None
+
+class Subscriber:
+    """Bounded buffer between the hub and one stream"""
+
+    def __init__(self, max_events=SUBSCRIBER_BUFFER_EVENTS):
+        self.max_events = max_events
+        self.events = deque()
+        self.condition = threading.Condition()
+        self.dropped = False
+        self.connected_at = time.time()
+
+    def push(self, event):
+        """False (and the subscriber is dropped) when the buffer is full"""
+        with self.condition:
+            if self.dropped:
+                return False
+            if len(self.events) >= self.max_events:
+                self.dropped = True
+                self.events.clear()
+                self.condition.notify()
+                return False
+            self.events.append(event)
+            self.condition.notify()
+            return True
+
+    def get(self, timeout):
+        """Next event, None on timeout or once dropped"""
+        with self.condition:
+            if not self.events and not self.dropped:
+                self.condition.wait(timeout)
+            if self.dropped or not self.events:
+                return None
+            return self.events.popleft()
+
+class EventHub:
+    """Replay log of the current scan plus the live subscribers, counters at /api/stream/stats"""
+
+    def __init__(self, buffer_events=SUBSCRIBER_BUFFER_EVENTS, replay_events=REPLAY_MAX_EVENTS):
+        self.buffer_events = buffer_events
+        self.lock = threading.Lock()
+        self.scan_ids = itertools.count(1)
+        self.scan_id = 0
+        self.seq = 0
+        self.log = deque(maxlen=replay_events)
+        self.subscribers = set()
+        self.stats = {'published': 0, 'subscribed': 0, 'replayed': 0, 'dropped': 0, 'resets': 0}
+
+    def start_scan(self):
+        """New scan: later subscribers are replayed from here"""
+        with self.lock:
+            self.scan_id = next(self.scan_ids)
+            self.seq = 0
+            self.log.clear()
+
+    def publish(self, payload):
+        with self.lock:
+            self.seq += 1
+            event = Event(self.scan_id, self.seq, payload)
+            self.log.append(event)
+            self.stats['published'] += 1
+
+            # Pushes only append to a deque, a slow client costs its own buffer and nothing else
+            for subscriber in list(self.subscribers):
+                if not subscriber.push(event):
+                    self.subscribers.discard(subscriber)
+                    self.stats['dropped'] += 1
+        return event
+
+    def subscribe(self, last_event_id=None):
+        """
+        (subscriber, backlog): the logged events after `last_event_id`, then everything
+        published from here on through the subscriber, with no gap or repeat in between
+        The backlog starts with a reset event when some of those events were already evicted
+        """
+        resume = parse_event_id(last_event_id)
+        subscriber = Subscriber(self.buffer_events)
+        with self.lock:
+            after = resume[1] if resume and resume[0] == self.scan_id else 0
+            backlog = [event for event in self.log if event.seq > after]
+            if self.log and self.log[0].seq > after + 1:
+                # Its id resumes from the start of the log, a reconnect doesn't reset again
+                missed = self.log[0].seq - after - 1
+                backlog.insert(0, Event(self.scan_id, self.log[0].seq - 1, {'type': 'reset', 'missed': missed}))
+                self.stats['resets'] += 1
+            self.subscribers.add(subscriber)
+            self.stats['subscribed'] += 1
+            self.stats['replayed'] += len(backlog)
+        return subscriber, backlog
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                **self.stats,
+                'subscribers': len(self.subscribers),
+                'scan_id': self.scan_id,
+                'logged_events': len(self.log)
+            }
@@ -0,0 +1,97 @@
+"""
+Fast JSON
+orjson behind Flask's JSON provider (Quart uses the same one), so every jsonify, app.json.dumps
+and snapshot render skips the stdlib encoder, plus splicing of already-encoded fragments into
+larger bodies
+
+    app.json = FastJSONProvider(app)
+
+The output parses to what the default provider produces for the same data (sorted keys,
+compact separators, datetimes as HTTP dates) but isn't the same bytes: number spelling
+differs between encoders (and orjson versions), non-ASCII text is UTF-8 instead of \\u
+escapes, and NaN/Infinity become null where the stdlib emits invalid JSON. Without orjson,
+or for integers past 64 bits, the stdlib encoder runs. Compare parsed documents, not
+bodies. NumPy arrays and scalars encode directly
+"""
+
+import dataclasses
+import decimal
+import json
+import uuid
+from datetime import date
+
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:  # Optional, the stdlib encoder (Flask's default) is used without it
+    orjson = None
+
+if orjson is not None:
+    OPTIONS = (
+        orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        | orjson.OPT_PASSTHROUGH_DATETIME
+    )
+
+def default(o):
+    """Flask's conversions for types JSON has no notation for, NumPy scalars as Python ones"""
+    if isinstance(o, date):
+        return http_date(o)
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if dataclasses.is_dataclass(o):
+        return dataclasses.asdict(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    if hasattr(o, 'tolist'):
+        return o.tolist()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+def stdlib_dumps(obj):
+    return json.dumps(obj, default=default, sort_keys=True, separators=(',', ':')).encode()
+
+def dumps(obj):
+    """Compact UTF-8 JSON bytes"""
+    if orjson is None:
+        return stdlib_dumps(obj)
+    try:
+        return orjson.dumps(obj, default=default, option=OPTIONS)
+    except orjson.JSONEncodeError:
+        # Integers past 64 bits, or a type nothing handles (which raises again here)
+        return stdlib_dumps(obj)
+
+def loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+def splice_array(fragments):
+    """JSON array from encoded elements"""
+    return b'[' + b','.join(fragments) + b']'
+
+def splice_object(fields):
+    """
+    JSON object from (key, encoded value) pairs, given in sorted key order so the result
+    matches dumps() of the same dict (when the values were encoded by dumps too)
+    """
+    return b'{' + b','.join(dumps(key) + b':' + value for key, value in fields) + b'}'
+
+class FastJSONProvider(DefaultJSONProvider):
+    """DefaultJSONProvider with orjson for the compact output served outside debug mode"""
+
+    def dumps(self, obj, **kwargs):
+        # Callers asking for indent, separators etc. get the stdlib encoder with their options
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj) + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,375 @@
+"""
+Distributed Worker Job Queue
+Scheduler enqueues (symbol, timeframe, window) jobs, any number of workers claim them
+with FOR UPDATE SKIP LOCKED
+"""
+
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+
+import background_worker as worker
+from candle_clock import candle_open_time
+from retention import RetentionSchedule, run_retention
+
+LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 600))
+MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 5))
+RETRY_BASE_SECONDS = 30
+DONE_RETENTION_DAYS = 7
+
+TIMEFRAMES = {
+    '15m': {'key': '15m', 'binance': '15m'},
+    '1h': {'key': '1h', 'binance': '1h'},
+    '4h': {'key': '4h', 'binance': '4h'},
+    '1d': {'key': '1d', 'binance': '1d'},
+    '1w': {'key': '1w', 'binance': '1w'}
+}
+
+def get_worker_id():
+    """Identify this worker process across nodes"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def enqueue_jobs(coins, timeframes, now=None):
+    """Enqueue one job per coin/timeframe for the current window (duplicates are ignored)"""
+    now = now or datetime.now(timezone.utc)
+
+    rows = []
+    for tf_key in timeframes:
+        window = candle_open_time(tf_key, now)
+        for coin in coins:
+            rows.append((coin['symbol'].upper(), tf_key, window, MAX_ATTEMPTS))
+
+    conn = worker.get_db_connection()
+    cur = conn.cursor()
+
+    cur.executemany("""
+        INSERT INTO worker_jobs (symbol, timeframe, window_start, max_attempts)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (symbol, timeframe, window_start) DO NOTHING
+    """, rows)
+
+    conn.commit()
+    cur.close()
+    conn.close()
+
+    return len(rows)
+
+def fail_expired_jobs(conn):
+    """
+    Mark running jobs whose lease expired on their last attempt as failed
+    (the worker died mid-job every time, reclaiming them again would retry forever)
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE worker_jobs SET
+            status = 'failed',
+            finished_at = NOW(),
+            lease_expires_at = NULL,
+            last_error = 'Lease expired on attempt ' || attempts || ' of ' || max_attempts
+        WHERE status = 'running' AND lease_expires_at < NOW() AND attempts >= max_attempts
+    """)
+    failed = cur.rowcount
+    conn.commit()
+    cur.close()
+    return failed
+
+def claim_job(conn, worker_id):
+    """
+    Claim the next runnable job
+    Pending jobs whose run_after has passed, or running jobs whose lease expired with
+    attempts left (those without any are failed first)
+    """
+    fail_expired_jobs(conn)
+
+    cur = conn.cursor()
+
+    cur.execute("""
+        UPDATE worker_jobs SET
+            status = 'running',
+            attempts = attempts + 1,
+            locked_by = %s,
+            lease_expires_at = NOW() + make_interval(secs => %s),
+            started_at = NOW(),
+            finished_at = NULL
+        WHERE id = (
+            SELECT id FROM worker_jobs
+            WHERE (status = 'pending' AND run_after <= NOW())
+               OR (status = 'running' AND lease_expires_at < NOW() AND attempts < max_attempts)
+            ORDER BY run_after
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING id, symbol, timeframe, window_start, attempts, max_attempts
+    """, (worker_id, LEASE_SECONDS))
+
+    row = cur.fetchone()
+    conn.commit()
+    cur.close()
+
+    if not row:
+        return None
+
+    return {
+        'id': row[0],
+        'symbol': row[1],
+        'timeframe': row[2],
+        'window_start': row[3],
+        'attempts': row[4],
+        'max_attempts': row[5]
+    }
+
+def try_lock_series(conn, symbol, timeframe):
+    """Session advisory lock so two workers never touch the same series at once"""
+    cur = conn.cursor()
+    cur.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (f"{symbol}:{timeframe}",))
+    locked = cur.fetchone()[0]
+    conn.commit()
+    cur.close()
+    return locked
+
+def unlock_series(conn, symbol, timeframe):
+    cur = conn.cursor()
+    cur.execute("SELECT pg_advisory_unlock(hashtext(%s))", (f"{symbol}:{timeframe}",))
+    conn.commit()
+    cur.close()
+
+def release_job(conn, job, delay_seconds=5):
+    """Hand a claimed job back without counting the attempt (series busy elsewhere)"""
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE worker_jobs SET
+            status = 'pending',
+            attempts = attempts - 1,
+            locked_by = NULL,
+            lease_expires_at = NULL,
+            run_after = NOW() + make_interval(secs => %s)
+        WHERE id = %s
+    """, (delay_seconds, job['id']))
+    conn.commit()
+    cur.close()
+
+def complete_job(conn, job, duration_ms):
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE worker_jobs SET
+            status = 'done',
+            finished_at = NOW(),
+            duration_ms = %s,
+            lease_expires_at = NULL,
+            last_error = NULL
+        WHERE id = %s
+    """, (duration_ms, job['id']))
+    conn.commit()
+    cur.close()
+
+def fail_job(conn, job, duration_ms, error):
+    """Retry with exponential backoff until max_attempts, then mark failed"""
+    retry = job['attempts'] < job['max_attempts']
+    delay = RETRY_BASE_SECONDS * (2 ** (job['attempts'] - 1))
+
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE worker_jobs SET
+            status = %s,
+            finished_at = NOW(),
+            duration_ms = %s,
+            lease_expires_at = NULL,
+            run_after = NOW() + make_interval(secs => %s),
+            last_error = %s
+        WHERE id = %s
+    """, ('pending' if retry else 'failed', duration_ms, delay, error[:1000], job['id']))
+    conn.commit()
+    cur.close()
+
+class LeaseKeeper(threading.Thread):
+    """Extends a running job's lease so long backfills aren't reclaimed by other workers"""
+
+    def __init__(self, job_id, worker_id):
+        super().__init__(daemon=True)
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(LEASE_SECONDS / 3):
+            try:
+                conn = worker.get_db_connection()
+                cur = conn.cursor()
+                cur.execute("""
+                    UPDATE worker_jobs
+                    SET lease_expires_at = NOW() + make_interval(secs => %s)
+                    WHERE id = %s AND locked_by = %s AND status = 'running'
+                """, (LEASE_SECONDS, self.job_id, self.worker_id))
+                conn.commit()
+                cur.close()
+                conn.close()
+            except Exception as e:
+                print(f"      ⚠️  Lease renewal failed: {e}")
+
+    def stop(self):
+        self.stopped.set()
+
+def run_job(conn, job, worker_id):
+    """Process one claimed job under the series advisory lock"""
+    symbol = job['symbol']
+    tf_key = job['timeframe']
+
+    if not try_lock_series(conn, symbol, tf_key):
+        print(f"   🔒 {symbol} {tf_key} busy on another worker, releasing job {job['id']}")
+        release_job(conn, job)
+        return
+
+    print(f"   ▶️  Job {job['id']}: {symbol} {tf_key} (attempt {job['attempts']}/{job['max_attempts']})")
+
+    lease = LeaseKeeper(job['id'], worker_id)
+    lease.start()
+    start_time = time.time()
+
+    try:
+        ok = worker.process_coin_incremental({'symbol': symbol}, TIMEFRAMES[tf_key], raise_errors=True)
+        duration_ms = int((time.time() - start_time) * 1000)
+
+        if ok:
+            complete_job(conn, job, duration_ms)
+        else:
+            fail_job(conn, job, duration_ms, 'No data available')
+
+    except Exception as e:
+        duration_ms = int((time.time() - start_time) * 1000)
+        print(f"      ❌ Error: {e}")
+        fail_job(conn, job, duration_ms, f"{type(e).__name__}: {e}")
+
+    finally:
+        lease.stop()
+        unlock_series(conn, symbol, tf_key)
+
+def run_queue_worker(idle_sleep_seconds=2):
+    """Claim and run jobs forever, run as many of these as you like on any node"""
+    worker_id = get_worker_id()
+
+    print("\n🧵 STARTING QUEUE WORKER")
+    print(f"   Worker ID: {worker_id}")
+    print(f"   Lease: {LEASE_SECONDS}s, max attempts: {MAX_ATTEMPTS}")
+    print(f"   Press Ctrl+C to stop\n")
+
+    conn = worker.get_db_connection()
+    processed = False
+
+    while True:
+        try:
+            job = claim_job(conn, worker_id)
+
+            if not job:
+                if processed:
+                    # Queue drained, the tick's analysis is in
+                    worker.notify_analysis_updated()
+                    processed = False
+                time.sleep(idle_sleep_seconds)
+                continue
+
+            run_job(conn, job, worker_id)
+            processed = True
+            time.sleep(0.3)  # Rate limiting
+
+        except KeyboardInterrupt:
+            print("\n\n👋 Stopping queue worker...")
+            break
+        except Exception as e:
+            print(f"\n❌ Queue worker error: {e}")
+            print("   Reconnecting in 10 seconds...")
+            time.sleep(10)
+            try:
+                conn.close()
+            except Exception:
+                pass
+            conn = worker.get_db_connection()
+
+    conn.close()
+
+def purge_finished_jobs():
+    """Bound the job table, finished jobs are only kept for timing history"""
+    conn = worker.get_db_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        DELETE FROM worker_jobs
+        WHERE status IN ('done', 'failed')
+          AND finished_at < NOW() - make_interval(days => %s)
+    """, (DONE_RETENTION_DAYS,))
+    deleted = cur.rowcount
+    conn.commit()
+    cur.close()
+    conn.close()
+    return deleted
+
+def get_queue_stats():
+    """Job counts per status plus average timing per timeframe over the last hour"""
+    conn = worker.get_db_connection()
+    cur = conn.cursor()
+
+    cur.execute("SELECT status, COUNT(*) FROM worker_jobs GROUP BY status")
+    by_status = dict(cur.fetchall())
+
+    cur.execute("""
+        SELECT timeframe, COUNT(*), AVG(duration_ms), MAX(duration_ms)
+        FROM worker_jobs
+        WHERE status = 'done' AND finished_at >= NOW() - INTERVAL '1 hour'
+        GROUP BY timeframe
+    """)
+    timing = {
+        row[0]: {'jobs': row[1], 'avg_ms': int(row[2] or 0), 'max_ms': row[3]}
+        for row in cur.fetchall()
+    }
+
+    cur.close()
+    conn.close()
+
+    return {'by_status': by_status, 'timing_last_hour': timing}
+
+def run_queue_scheduler(top_n=200, check_interval_seconds=60):
+    """
+    Enqueue jobs on the same smart schedule as run_continuous_smart
+    Workers started with WORKER_MODE=queue do the actual fetching
+    """
+    print("\n🗓️  STARTING QUEUE SCHEDULER")
+    print(f"   Check interval: Every {check_interval_seconds} seconds")
+    print(f"   Top N coins: {top_n}")
+    print(f"   Press Ctrl+C to stop\n")
+
+    coins = worker.get_top_coins(limit=top_n)
+    worker.store_coins(coins)
+
+    # First run enqueues everything (initial population / catch-up)
+    count = enqueue_jobs(coins, list(TIMEFRAMES.keys()))
+    print(f"\n📥 Enqueued {count} initial jobs")
+
+    retention_schedule = RetentionSchedule()
+
+    while True:
+        try:
+            time.sleep(check_interval_seconds)
+
+            current_time = datetime.now(timezone.utc)
+            due = [tf for tf in TIMEFRAMES if worker.should_update_timeframe(tf, current_time)]
+
+            if due:
+                count = enqueue_jobs(coins, due, now=current_time)
+                print(f"\n📥 {current_time.strftime('%H:%M')} enqueued {count} jobs ({', '.join(due)})")
+
+            if current_time.minute == 0:
+                purged = purge_finished_jobs()
+                stats = get_queue_stats()
+                print(f"   📊 Queue: {stats['by_status']} (purged {purged} old jobs)")
+
+            if retention_schedule.due(current_time):
+                print(f"\n🧹 Retention at {current_time.strftime('%H:%M')}")
+                run_retention()
+
+        except KeyboardInterrupt:
+            print("\n\n👋 Stopping scheduler...")
+            break
+        except Exception as e:
+            print(f"\n❌ Scheduler error: {e}")
+            print("   Retrying in 1 minute...")
+            time.sleep(60)
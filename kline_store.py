@@ -0,0 +1,231 @@
+"""
+Columnar Kline Store
+Keeps fetched OHLCV per (pair, interval) on disk as append-only Arrow IPC segments,
+so rescans only download candles newer than the stored tail
+"""
+
+import glob
+import os
+import threading
+from datetime import datetime, timezone
+
+from candle_clock import INTERVAL_MINUTES, candle_open_time
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:  # Optional, scanners fall back to plain REST fetches
+    pa = None
+
+KLINE_STORE_DIR = os.getenv('KLINE_STORE_DIR', 'kline_store')
+
+# Compact a series into one segment once it has this many, keeping at most MAX_ROWS candles
+MAX_SEGMENTS = 16
+MAX_ROWS = int(os.getenv('KLINE_STORE_MAX_ROWS', 1000))
+
+COLUMNS = ['open_time', 'open', 'high', 'low', 'close', 'volume']
+
+if pa is not None:
+    SCHEMA = pa.schema([
+        ('open_time', pa.int64()),
+        ('open', pa.float64()),
+        ('high', pa.float64()),
+        ('low', pa.float64()),
+        ('close', pa.float64()),
+        ('volume', pa.float64())
+    ])
+
+def to_rows(table):
+    """Arrow table -> kline lists [open_time, open, high, low, close, volume]"""
+    columns = [table.column(name).to_pylist() for name in COLUMNS]
+    return [list(row) for row in zip(*columns)]
+
+class KlineStore:
+    """
+    Layout: <directory>/<PAIR>_<interval>/seg_<first open_time>.arrow
+    Only closed candles are written, the live candle is always fetched
+    Segments record which market (spot/futures) the series came from
+    """
+
+    def __init__(self, directory=KLINE_STORE_DIR, max_segments=MAX_SEGMENTS, max_rows=MAX_ROWS):
+        self.directory = directory
+        self.max_segments = max_segments
+        self.max_rows = max_rows
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return pa is not None and bool(self.directory)
+
+    def series_dir(self, pair, interval):
+        return os.path.join(self.directory, f"{pair}_{interval}")
+
+    def series_lock(self, pair, interval):
+        """Guards every change to a series' segments, re-entrant so append can clear/compact"""
+        with self.locks_lock:
+            return self.locks.setdefault((pair, interval), threading.RLock())
+
+    def segments(self, pair, interval):
+        return sorted(glob.glob(os.path.join(self.series_dir(pair, interval), 'seg_*.arrow')))
+
+    def read_segment(self, path):
+        """Memory-mapped read, no copies or parsing of the candle data"""
+        with pa.memory_map(path, 'r') as source:
+            reader = ipc.open_file(source)
+            table = reader.read_all()
+        market = (reader.schema.metadata or {}).get(b'market', b'spot').decode()
+        return table, market
+
+    def read(self, pair, interval, limit=None):
+        """
+        Latest `limit` stored candles (all when None) as (table, market), (None, None) when empty
+        Segments are read newest first and only until `limit` rows are covered
+        """
+        if not self.enabled:
+            return None, None
+
+        tables = []
+        market = None
+        rows = 0
+
+        for path in reversed(self.segments(pair, interval)):
+            try:
+                table, segment_market = self.read_segment(path)
+            except (OSError, pa.ArrowInvalid):
+                # Compacted away by another process mid-read, the next read sees the new segment
+                continue
+
+            market = market or segment_market
+            tables.append(table)
+            rows += table.num_rows
+            if limit and rows >= limit:
+                break
+
+        if not tables:
+            return None, None
+
+        table = pa.concat_tables(tables[::-1])
+        if limit and table.num_rows > limit:
+            table = table.slice(table.num_rows - limit)
+
+        return table, market
+
+    def write_segment(self, pair, interval, market, table):
+        series_dir = self.series_dir(pair, interval)
+        os.makedirs(series_dir, exist_ok=True)
+
+        first_open = table.column('open_time')[0].as_py()
+        path = os.path.join(series_dir, f"seg_{first_open:013d}.arrow")
+        tmp_path = f"{path}.tmp"
+
+        schema = SCHEMA.with_metadata({'market': market})
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with ipc.new_file(sink, schema) as writer:
+                writer.write_table(table.cast(schema))
+        os.replace(tmp_path, path)
+
+        return path
+
+    def append(self, pair, interval, market, klines):
+        """Append closed klines newer than the stored tail, compacting when segments pile up"""
+        if not self.enabled or not klines:
+            return 0
+
+        with self.series_lock(pair, interval):
+            stored, stored_market = self.read(pair, interval, limit=1)
+            tail = stored.column('open_time')[-1].as_py() if stored is not None else None
+
+            if stored is not None and stored_market != market:
+                # Pair moved between spot and futures, start the series over
+                self.clear(pair, interval)
+                tail = None
+
+            new = [k for k in klines if tail is None or int(k[0]) > tail]
+            if not new:
+                return 0
+
+            table = pa.table(
+                {name: [int(k[0]) if i == 0 else float(k[i]) for k in new] for i, name in enumerate(COLUMNS)},
+                schema=SCHEMA
+            )
+            self.write_segment(pair, interval, market, table)
+
+            if len(self.segments(pair, interval)) > self.max_segments:
+                self.compact(pair, interval)
+
+            return len(new)
+
+    def compact(self, pair, interval):
+        """Rewrite a series as one segment holding its newest max_rows candles"""
+        with self.series_lock(pair, interval):
+            segments = self.segments(pair, interval)
+            table, market = self.read(pair, interval, limit=self.max_rows)
+            if table is None:
+                return
+
+            path = self.write_segment(pair, interval, market, table)
+            for segment in segments:
+                if segment != path:
+                    try:
+                        os.remove(segment)
+                    except OSError:
+                        pass
+
+    def clear(self, pair, interval):
+        with self.series_lock(pair, interval):
+            for segment in self.segments(pair, interval):
+                try:
+                    os.remove(segment)
+                except OSError:
+                    pass
+
+    def get_klines(self, client, pair, interval, limit, min_candles=1, symbol=None, now=None):
+        """
+        Drop-in for client.get_klines_hedged: returns (klines, market)
+        With a stored series only candles after its tail are fetched (from the market it
+        came from); anything else does a full hedged fetch and stores the closed candles
+        """
+        if not self.enabled:
+            return client.get_klines_hedged(pair, interval, limit, min_candles=min_candles, symbol=symbol)
+
+        now = now or datetime.now(timezone.utc)
+        live_open_ms = int(candle_open_time(interval, now).timestamp() * 1000)
+        interval_ms = INTERVAL_MINUTES[interval] * 60 * 1000
+
+        stored, market = self.read(pair, interval, limit)
+        klines = None
+
+        if stored is not None and stored.num_rows >= min(min_candles, limit):
+            tail = stored.column('open_time')[-1].as_py()
+            start_time = datetime.fromtimestamp((tail + interval_ms) / 1000, tz=timezone.utc)
+            fresh = client.get_klines(pair, interval, limit, market=market, start_time=start_time, symbol=symbol)
+
+            # A full page that doesn't reach the live candle leaves a gap, refetch everything instead
+            gap = bool(fresh) and len(fresh) >= min(limit, 1000) and int(fresh[-1][0]) < live_open_ms
+
+            if gap:
+                self.clear(pair, interval)
+            else:
+                # None is an empty window: nothing newer than the stored tail yet
+                klines = (to_rows(stored) + [list(k) for k in fresh or []])[-limit:]
+
+        if klines is None:
+            klines, market = client.get_klines_hedged(pair, interval, limit, min_candles=min_candles, symbol=symbol)
+            if not klines:
+                return klines, market
+
+        self.append(pair, interval, market, [k for k in klines if int(k[0]) < live_open_ms])
+
+        return klines, market
+
+_default_store = None
+_default_lock = threading.Lock()
+
+def get_kline_store():
+    """Process-wide store over KLINE_STORE_DIR"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = KlineStore()
+        return _default_store
@@ -0,0 +1,417 @@
+"""
+WebSocket Kline Stream Ingestion
+Subscribes to Binance combined kline streams instead of polling REST
+"""
+
+import asyncio
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+import websockets
+
+import background_worker as worker
+from mmap_candle_store import rows_to_records
+from retention import RetentionThread
+from watermarks import bump_watermarks
+
+# Combined stream endpoints (override BINANCE_WS_URL to point at a local fake server)
+SPOT_WS_URL = os.getenv('BINANCE_WS_URL', 'wss://stream.binance.com:9443/stream')
+FUTURES_WS_URL = os.getenv('BINANCE_FUTURES_WS_URL', 'wss://fstream.binance.com/stream')
+
+# Binance allows 1024 streams per connection, stay well below it
+STREAMS_PER_CONNECTION = int(os.getenv('STREAMS_PER_CONNECTION', 200))
+
+EMA_PERIOD = 50
+EMA_ALPHA = 2 / (EMA_PERIOD + 1)
+
+TIMEFRAMES = {
+    '15m': {'key': '15m', 'binance': '15m'},
+    '1h': {'key': '1h', 'binance': '1h'},
+    '4h': {'key': '4h', 'binance': '4h'},
+    '1d': {'key': '1d', 'binance': '1d'},
+    '1w': {'key': '1w', 'binance': '1w'}
+}
+
+def get_coin_markets(coins):
+    """
+    Resolve the Binance pair and market for each coin
+    Uses what the REST worker stored in the coins table, defaults to <SYMBOL>USDT spot
+    """
+    markets = {}
+
+    try:
+        conn = worker.get_db_connection()
+        cur = conn.cursor()
+        cur.execute("SELECT symbol, binance_symbol, data_source FROM coins")
+        known = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+        cur.close()
+        conn.close()
+    except Exception as e:
+        print(f"   ⚠️  Could not read coin markets: {e}")
+        known = {}
+
+    for coin in coins:
+        symbol = coin['symbol'].upper()
+        binance_symbol, data_source = known.get(symbol, (None, None))
+
+        markets[symbol] = {
+            'binance_symbol': binance_symbol or f"{symbol}USDT",
+            'futures': data_source == 'Binance Futures'
+        }
+
+    return markets
+
+def build_stream_groups(markets, timeframes):
+    """Split all symbol x interval streams into connection-sized groups per market"""
+    groups = []
+
+    for futures in (False, True):
+        streams = []
+        for symbol, market in markets.items():
+            if market['futures'] != futures:
+                continue
+            for tf_key in timeframes:
+                interval = TIMEFRAMES[tf_key]['binance']
+                streams.append(f"{market['binance_symbol'].lower()}@kline_{interval}")
+
+        for i in range(0, len(streams), STREAMS_PER_CONNECTION):
+            groups.append({
+                'url': FUTURES_WS_URL if futures else SPOT_WS_URL,
+                'streams': streams[i:i + STREAMS_PER_CONNECTION]
+            })
+
+    return groups
+
+def parse_kline_message(raw):
+    """
+    Parse a combined-stream kline message
+    Returns (binance_symbol, interval, candle, is_closed) with candle in REST kline layout
+    """
+    message = json.loads(raw)
+    data = message.get('data', message)
+
+    if data.get('e') != 'kline':
+        return None
+
+    k = data['k']
+    candle = [k['t'], k['o'], k['h'], k['l'], k['c'], k['v'], k['T']]
+
+    return k['s'], k['i'], candle, k['x']
+
+class EmaState:
+    """
+    Last two stored EMA50s and candle times per (symbol, timeframe)
+    The one before the last is kept because the last may be a candle that was still open
+    when it was stored (REST gap-fill saves it), its closed version is recomputed from it
+    """
+
+    def __init__(self):
+        self.series = {}
+
+    def load(self, cur, symbol, timeframe):
+        """Reload state for one series from the database"""
+        cur.execute("""
+            SELECT time, ema50 FROM candles
+            WHERE symbol = %s AND timeframe = %s AND ema50 IS NOT NULL
+            ORDER BY time DESC LIMIT 2
+        """, (symbol, timeframe))
+
+        rows = [(as_utc(row[0]), float(row[1])) for row in cur.fetchall()]
+        if rows:
+            self.series[(symbol, timeframe)] = (rows[0], rows[1] if len(rows) > 1 else None)
+        else:
+            self.series.pop((symbol, timeframe), None)
+
+    def next_ema(self, symbol, timeframe, candle_time, close, interval_minutes):
+        """
+        EMA for a closed candle, advancing the state
+        Returns None when the candle does not follow (or replace) the stored one
+        """
+        state = self.series.get((symbol, timeframe))
+        if not state:
+            return None
+
+        last, previous = state
+        gap_minutes = (candle_time - last[0]).total_seconds() / 60
+        if gap_minutes == 0:
+            # Same candle again: stored open, or re-delivered. Recompute from the candle before it
+            if not previous or (last[0] - previous[0]).total_seconds() / 60 != interval_minutes:
+                return None
+            base = previous
+        elif gap_minutes == interval_minutes:
+            base = last
+        else:
+            return None
+
+        ema = close * EMA_ALPHA + base[1] * (1 - EMA_ALPHA)
+        self.series[(symbol, timeframe)] = ((candle_time, ema), base)
+        return ema
+
+def as_utc(value):
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+class GapFiller(threading.Thread):
+    """
+    Catches series up over REST, off the writer thread so streamed candles keep being written
+    Each finished series is handed back to the writer to reload its EMA state
+    """
+
+    def __init__(self, coins_by_symbol, writer, rate_limit_seconds=0.3):
+        super().__init__(daemon=True)
+        self.inbox = queue.Queue()
+        self.coins_by_symbol = coins_by_symbol
+        self.writer = writer
+        self.rate_limit_seconds = rate_limit_seconds
+        self.pending = set()
+        self.pending_lock = threading.Lock()
+        self.stats = {'gap_fills': 0}
+
+    def submit(self, series):
+        """Queue series not already waiting, one still being filled is queued again"""
+        new = []
+        with self.pending_lock:
+            for item in series:
+                if item not in self.pending:
+                    self.pending.add(item)
+                    new.append(item)
+
+        if new:
+            print(f"\n🩹 Gap-filling {len(new)} series over REST...")
+        for item in new:
+            self.inbox.put(item)
+
+    def run(self):
+        while True:
+            symbol, tf_key = self.inbox.get()
+            with self.pending_lock:
+                self.pending.discard((symbol, tf_key))
+
+            try:
+                self.fill(symbol, tf_key)
+            except Exception as e:
+                print(f"   ❌ Gap-fill error ({symbol} {tf_key}): {e}")
+
+            time.sleep(self.rate_limit_seconds)  # Rate limiting
+
+    def fill(self, symbol, tf_key):
+        coin = self.coins_by_symbol.get(symbol)
+        if not coin:
+            return
+
+        worker.process_coin_incremental(coin, TIMEFRAMES[tf_key])
+        self.writer.submit_reload(symbol, tf_key)
+        self.stats['gap_fills'] += 1
+
+class CandleWriter(threading.Thread):
+    """
+    Drains closed candles from the stream readers and writes them in batches
+    Gap fills run on their own GapFiller thread, which queues an EMA state reload here
+    when a series is done
+    """
+
+    def __init__(self, coins_by_symbol, batch_window_seconds=1.0):
+        super().__init__(daemon=True)
+        self.inbox = queue.Queue()
+        self.batch_window_seconds = batch_window_seconds
+        self.state = EmaState()
+        self.gap_filler = GapFiller(coins_by_symbol, self)
+        self.stats = {'candles_written': 0, 'last_write': None}
+
+    def submit_candle(self, symbol, timeframe, candle):
+        self.inbox.put(('candle', symbol, timeframe, candle))
+
+    def submit_gap_fill(self, series):
+        self.gap_filler.submit(series)
+
+    def submit_reload(self, symbol, timeframe):
+        self.inbox.put(('reload', symbol, timeframe))
+
+    def run(self):
+        self.gap_filler.start()
+
+        while True:
+            items = [self.inbox.get()]
+            deadline = time.time() + self.batch_window_seconds
+
+            # Candles closing on the same boundary arrive together, batch them
+            while time.time() < deadline:
+                try:
+                    items.append(self.inbox.get(timeout=max(deadline - time.time(), 0)))
+                except queue.Empty:
+                    break
+
+            try:
+                self.process(items)
+            except Exception as e:
+                print(f"   ❌ Stream writer error: {e}")
+
+    def process(self, items):
+        # Reloads first: the database already holds everything their gap fill fetched
+        self.reload([item[1:] for item in items if item[0] == 'reload'])
+        self.write_candles([item[1:] for item in items if item[0] == 'candle'])
+
+    def reload(self, series):
+        """Pick up the EMA state a gap fill left in the database"""
+        if not series:
+            return
+
+        conn = worker.get_db_connection()
+        cur = conn.cursor()
+        for symbol, tf_key in series:
+            self.state.load(cur, symbol, tf_key)
+        cur.close()
+        conn.close()
+
+    def write_candles(self, candles):
+        if not candles:
+            return
+
+        conn = worker.get_db_connection()
+        cur = conn.cursor()
+
+        needs_gap_fill = []
+        touched = set()
+        written = 0
+        store_rows = {}
+
+        for symbol, tf_key, candle in candles:
+            candle_time = datetime.fromtimestamp(candle[0] / 1000, tz=timezone.utc)
+            close = float(candle[4])
+            interval_minutes = worker.TIMEFRAME_MINUTES[tf_key]
+
+            ema = self.state.next_ema(symbol, tf_key, candle_time, close, interval_minutes)
+            if ema is None:
+                needs_gap_fill.append((symbol, tf_key))
+                continue
+
+            cur.execute("""
+                INSERT INTO candles (time, symbol, timeframe, open, high, low, close, volume, ema50)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (time, symbol, timeframe) DO UPDATE SET
+                    open = EXCLUDED.open,
+                    high = EXCLUDED.high,
+                    low = EXCLUDED.low,
+                    close = EXCLUDED.close,
+                    volume = EXCLUDED.volume,
+                    ema50 = EXCLUDED.ema50
+            """, (
+                datetime.fromtimestamp(candle[0] / 1000),
+                symbol,
+                tf_key,
+                float(candle[1]),
+                float(candle[2]),
+                float(candle[3]),
+                close,
+                float(candle[5]),
+                ema
+            ))
+            touched.add((symbol, tf_key))
+            written += 1
+            store_rows.setdefault((symbol, tf_key), []).append((
+                candle_time, float(candle[1]), float(candle[2]), float(candle[3]), close, float(candle[5]), ema
+            ))
+
+        if touched:
+            bump_watermarks(cur, [f"candles:{tf_key}" for _, tf_key in touched])
+        conn.commit()
+        cur.close()
+        conn.close()
+
+        for symbol, tf_key in touched:
+            worker.update_ema_analysis(symbol, tf_key)
+
+        if touched:
+            worker.notify_analysis_updated(','.join(sorted({tf_key for _, tf_key in touched})))
+
+        if worker.candle_store.enabled:
+            for (symbol, tf_key), rows in store_rows.items():
+                worker.candle_store.write(symbol, tf_key, rows_to_records(rows))
+
+        self.stats['candles_written'] += written
+        self.stats['last_write'] = datetime.now(timezone.utc)
+
+        if written:
+            print(f"   ✅ Stored {written} closed candles from stream")
+
+        if needs_gap_fill:
+            self.submit_gap_fill(needs_gap_fill)
+
+async def consume_group(group, series_by_stream, writer):
+    """Keep one combined-stream connection alive, gap-filling after every (re)connect"""
+    url = f"{group['url']}?streams={'/'.join(group['streams'])}"
+    series = [series_by_stream[s] for s in group['streams']]
+    backoff = 1
+
+    while True:
+        try:
+            async with websockets.connect(url, ping_interval=20, max_queue=None) as ws:
+                print(f"   🔌 Connected: {len(group['streams'])} streams ({group['url']})")
+                backoff = 1
+
+                # Anything closed while we were disconnected comes from REST
+                writer.submit_gap_fill(series)
+
+                async for raw in ws:
+                    parsed = parse_kline_message(raw)
+                    if not parsed:
+                        continue
+
+                    binance_symbol, interval, candle, is_closed = parsed
+                    if not is_closed:
+                        continue
+
+                    stream = f"{binance_symbol.lower()}@kline_{interval}"
+                    if stream in series_by_stream:
+                        symbol, tf_key = series_by_stream[stream]
+                        writer.submit_candle(symbol, tf_key, candle)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"   ⚠️  Stream disconnected ({e}), reconnecting in {backoff}s...")
+
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, 60)
+
+async def run_stream_groups(groups, series_by_stream, writer):
+    await asyncio.gather(*(consume_group(g, series_by_stream, writer) for g in groups))
+
+def run_continuous_stream(top_n=200, timeframes=None):
+    """
+    Run the worker in WebSocket mode
+    Closed candles are written as they arrive, REST is only used for gap-fill
+    """
+    timeframes = timeframes or list(TIMEFRAMES.keys())
+
+    print("\n📡 STARTING STREAMING KLINE WORKER")
+    print(f"   Top N coins: {top_n}")
+    print(f"   Timeframes: {', '.join(timeframes)}")
+    print(f"   Mode: WebSocket kline streams + REST gap-fill")
+    print(f"   Press Ctrl+C to stop\n")
+
+    coins = worker.get_top_coins(limit=top_n)
+    worker.store_coins(coins)
+
+    markets = get_coin_markets(coins)
+    groups = build_stream_groups(markets, timeframes)
+
+    series_by_stream = {}
+    for symbol, market in markets.items():
+        for tf_key in timeframes:
+            stream = f"{market['binance_symbol'].lower()}@kline_{TIMEFRAMES[tf_key]['binance']}"
+            series_by_stream[stream] = (symbol, tf_key)
+
+    print(f"   {len(series_by_stream)} streams over {len(groups)} connections")
+
+    writer = CandleWriter({c['symbol'].upper(): c for c in coins})
+    writer.start()
+    RetentionThread().start()
+
+    try:
+        asyncio.run(run_stream_groups(groups, series_by_stream, writer))
+    except KeyboardInterrupt:
+        print("\n\n👋 Stopping stream worker...")
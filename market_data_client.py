@@ -0,0 +1,208 @@
+"""
+Shared Market Data Client
+Keep-alive session pools per host, jittered retries and hedged spot/futures kline requests
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from market_health import fetch_klines
+
+BINANCE_SPOT_BASE = "https://api.binance.com/api/v3"
+BINANCE_FUTURES_BASE = "https://fapi.binance.com/fapi/v1"
+
+MARKET_LABELS = {
+    'spot': 'Binance Spot',
+    'futures': 'Binance Futures'
+}
+
+# coins.data_source back to the market it names
+LABEL_MARKETS = {label: market for market, label in MARKET_LABELS.items()}
+
+# Worth retrying: the request may succeed on a second attempt
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+class MarketDataClient:
+    """One place for every exchange/CoinGecko/CMC HTTP call"""
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, pool_size=20, max_retries=2, backoff_base_seconds=0.25, max_backoff_seconds=30,
+                 timeout=10, hedge=True):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.timeout = timeout
+        self.hedge = hedge
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='market-data')
+
+    @classmethod
+    def default(cls):
+        """Process-wide client so every caller shares the same connection pools"""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def session_for(self, url):
+        """Keep-alive session per host, reused across requests and threads"""
+        host = urlparse(url).netloc
+
+        with self.sessions_lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self.sessions[host] = session
+            return session
+
+    def backoff(self, attempt, response=None):
+        """
+        Full-jitter exponential backoff, honouring Retry-After when the server sends it
+        Never longer than max_backoff_seconds: a Retry-After past that (a ban, an HTTP date,
+        garbage) gets the jittered delay, and the caller falls back once the retries run out
+        """
+        if response is not None and response.headers.get('Retry-After'):
+            try:
+                retry_after = float(response.headers['Retry-After'])
+            except ValueError:
+                retry_after = None
+            if retry_after is not None and 0 <= retry_after <= self.max_backoff_seconds:
+                return retry_after
+        return min(random.uniform(0, self.backoff_base_seconds * (2 ** attempt)), self.max_backoff_seconds)
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        """
+        GET with retries on connection errors and retryable status codes
+        Returns the last response (callers decide what a bad status means)
+        """
+        session = self.session_for(url)
+        timeout = timeout or self.timeout
+
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+
+            try:
+                response = session.get(url, params=params, headers=headers, timeout=timeout)
+            except requests.RequestException:
+                if last_attempt:
+                    raise
+                time.sleep(self.backoff(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES and not last_attempt:
+                time.sleep(self.backoff(attempt, response))
+                continue
+
+            return response
+
+    def get_json(self, url, params=None, headers=None, timeout=None):
+        response = self.get(url, params=params, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def get_klines(self, pair, interval, limit, market='spot', start_time=None, end_time=None, symbol=None):
+        """Fetch klines from one market, None for dead pairs, open circuits and errors"""
+        base = BINANCE_FUTURES_BASE if market == 'futures' else BINANCE_SPOT_BASE
+        params = {
+            'symbol': pair,
+            'interval': interval,
+            'limit': min(limit, 1000)  # Binance max is 1000
+        }
+
+        if start_time:
+            params['startTime'] = int(start_time.timestamp() * 1000)
+        if end_time:
+            params['endTime'] = int(end_time.timestamp() * 1000)
+
+        return fetch_klines(f"{base}/klines", params, market, symbol=symbol, timeout=self.timeout,
+                            http_get=self.get)
+
+    def get_klines_hedged(self, pair, interval, limit, min_candles=1, start_time=None, end_time=None,
+                          symbol=None):
+        """
+        Ask spot and futures in parallel, for a pair whose market isn't known yet
+        Spot wins whenever it has at least `min_candles`: a futures answer that comes first
+        waits for spot, so the same pair always lands on the same market. Returns
+        (klines, market); when neither qualifies, the longer partial answer is returned
+        so callers can still report how many candles were available
+        """
+        kwargs = {'start_time': start_time, 'end_time': end_time, 'symbol': symbol}
+
+        if not self.hedge:
+            best = (None, None)
+            for market in ('spot', 'futures'):
+                klines = self.get_klines(pair, interval, limit, market=market, **kwargs)
+                if klines and len(klines) >= min_candles:
+                    return klines, market
+                if klines and (not best[0] or len(klines) > len(best[0])):
+                    best = (klines, market)
+            return best
+
+        futures = {
+            self.executor.submit(self.get_klines, pair, interval, limit, market, **kwargs): market
+            for market in ('spot', 'futures')
+        }
+
+        best = (None, None)
+        qualified = None
+        for future in as_completed(futures):
+            market = futures[future]
+            try:
+                klines = future.result()
+            except Exception:
+                continue
+
+            if klines and len(klines) >= min_candles:
+                if market == 'spot':
+                    # A slower futures request finishes in the background and is ignored
+                    return klines, market
+                qualified = (klines, market)
+            elif klines and (not best[0] or len(klines) > len(best[0])):
+                best = (klines, market)
+
+        return qualified or best
+
+    def find_klines(self, symbol, quotes, interval, limit, min_candles=1, start_time=None, end_time=None,
+                    binance_symbol=None, data_source=None):
+        """
+        Try each quote currency for a coin until a market has enough candles
+        With a known binance_symbol/data_source (stored on the coin, or the first batch of a
+        backfill) only that pair on that market is asked: any answer counts, `min_candles`
+        is only there to pick a market
+        Returns (klines, binance_symbol, data_source) or (None, None, None)
+        """
+        market = LABEL_MARKETS.get(data_source)
+        if binance_symbol and market:
+            klines = self.get_klines(binance_symbol, interval, limit, market=market, start_time=start_time,
+                                     end_time=end_time, symbol=symbol)
+            if klines:
+                return klines, binance_symbol, data_source
+            return None, None, None
+
+        for quote in quotes:
+            pair = f"{symbol}{quote}"
+            klines, market = self.get_klines_hedged(
+                pair, interval, limit,
+                min_candles=min_candles,
+                start_time=start_time,
+                end_time=end_time,
+                symbol=symbol
+            )
+
+            if klines and len(klines) >= min_candles:
+                return klines, pair, MARKET_LABELS[market]
+
+        return None, None, None
@@ -0,0 +1,257 @@
+"""
+Market Health Tracking
+Persistent negative cache of dead (pair, market) combinations, per-host circuit
+breakers and per-symbol failure counters for Binance kline requests
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+NEGATIVE_CACHE_FILE = os.getenv('NEGATIVE_CACHE_FILE', 'negative_cache.json')
+
+# Re-check a dead pair after 1h, doubling on every confirmed miss up to 7 days
+NEGATIVE_TTL_BASE_SECONDS = 3600
+NEGATIVE_TTL_MAX_SECONDS = 7 * 24 * 3600
+
+# Binance error code for "Invalid symbol."
+BINANCE_INVALID_SYMBOL = -1121
+
+class NegativeCache:
+    """Remembers (pair, market) combinations that have no market, with exponential re-check TTLs"""
+
+    def __init__(self, path=NEGATIVE_CACHE_FILE, save_interval_seconds=5):
+        self.path = path
+        self.save_interval_seconds = save_interval_seconds
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.dirty = False
+        self.last_save = 0
+        self.load()
+
+    @staticmethod
+    def key(pair, market):
+        return f"{market}:{pair}"
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+        except Exception as e:
+            print(f"⚠️  Ignoring unreadable negative cache {self.path}: {e}")
+            self.entries = {}
+
+    def save(self, force=False):
+        """Write atomically, throttled so a scan full of misses doesn't rewrite the file each time"""
+        with self.lock:
+            if not self.dirty:
+                return
+            if not force and time.time() - self.last_save < self.save_interval_seconds:
+                return
+
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+
+            self.dirty = False
+            self.last_save = time.time()
+
+    def is_dead(self, pair, market):
+        """True while a known-dead combination is still inside its re-check TTL"""
+        entry = self.entries.get(self.key(pair, market))
+        return bool(entry) and time.time() < entry['retry_after']
+
+    def record_miss(self, pair, market):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(self.key(pair, market), {'misses': 0})
+            entry['misses'] += 1
+            ttl = min(NEGATIVE_TTL_BASE_SECONDS * 2 ** (entry['misses'] - 1), NEGATIVE_TTL_MAX_SECONDS)
+            entry['last_checked'] = now
+            entry['retry_after'] = now + ttl
+            self.entries[self.key(pair, market)] = entry
+            self.dirty = True
+        self.save()
+
+    def record_hit(self, pair, market):
+        with self.lock:
+            if self.entries.pop(self.key(pair, market), None) is not None:
+                self.dirty = True
+        self.save()
+
+class CircuitBreaker:
+    """
+    Stops calling a host after repeated transient failures
+    closed -> open after `failure_threshold` failures in a row, half-open after the cooldown
+    lets one trial request through; the cooldown doubles every time the trial fails
+    """
+
+    def __init__(self, host, failure_threshold=5, cooldown_seconds=30, max_cooldown_seconds=600):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown_seconds
+        self.max_cooldown = max_cooldown_seconds
+        self.cooldown = cooldown_seconds
+        self.lock = threading.Lock()
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = 0
+        self.trial_in_flight = False
+
+    def allow(self):
+        with self.lock:
+            if self.state == 'closed':
+                return True
+
+            if self.state == 'open' and time.time() - self.opened_at >= self.cooldown:
+                self.state = 'half_open'
+                self.trial_in_flight = False
+
+            if self.state == 'half_open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.state = 'closed'
+            self.consecutive_failures = 0
+            self.cooldown = self.base_cooldown
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+
+            if self.state == 'half_open':
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                self.open()
+            elif self.consecutive_failures >= self.failure_threshold:
+                self.open()
+
+    def open(self):
+        if self.state != 'open':
+            print(f"🚧 Circuit OPEN for {self.host} ({self.consecutive_failures} failures, "
+                  f"cooling down {self.cooldown}s)")
+        self.state = 'open'
+        self.opened_at = time.time()
+        self.trial_in_flight = False
+
+class FailureCounters:
+    """Per-symbol counters so dead or flaky coins show up in scan/worker reports"""
+
+    FIELDS = ('misses', 'errors', 'skipped_dead', 'short_circuited')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+
+    def incr(self, symbol, field):
+        with self.lock:
+            counts = self.counters.setdefault(symbol, dict.fromkeys(self.FIELDS, 0))
+            counts[field] += 1
+
+    def report(self):
+        with self.lock:
+            return {symbol: dict(counts) for symbol, counts in self.counters.items()}
+
+    def print_report(self, limit=20):
+        report = self.report()
+        if not report:
+            return
+
+        worst = sorted(report.items(), key=lambda item: sum(item[1].values()), reverse=True)[:limit]
+
+        print(f"\n🩺 Market data failures ({len(report)} symbols):")
+        print(f"   {'Symbol':<10} {'Misses':<8} {'Errors':<8} {'Dead':<8} {'Circuit':<8}")
+        for symbol, counts in worst:
+            print(f"   {symbol:<10} {counts['misses']:<8} {counts['errors']:<8} "
+                  f"{counts['skipped_dead']:<8} {counts['short_circuited']:<8}")
+
+negative_cache = NegativeCache()
+failure_counters = FailureCounters()
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+atexit.register(lambda: negative_cache.save(force=True))
+
+def get_breaker(url):
+    host = urlparse(url).netloc
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
+
+def is_invalid_symbol(response):
+    """Binance answers unknown pairs with HTTP 400 and code -1121"""
+    if response.status_code != 400:
+        return False
+    try:
+        return response.json().get('code') == BINANCE_INVALID_SYMBOL
+    except ValueError:
+        return False
+
+def fetch_klines(url, params, market, symbol=None, timeout=10, http_get=requests.get):
+    """
+    Fetch klines for params['symbol'] on `market` ('spot' or 'futures')
+    Returns the kline list, or None for dead pairs, open circuits and errors
+    """
+    pair = params['symbol']
+    symbol = symbol or pair
+
+    if negative_cache.is_dead(pair, market):
+        failure_counters.incr(symbol, 'skipped_dead')
+        return None
+
+    breaker = get_breaker(url)
+    if not breaker.allow():
+        failure_counters.incr(symbol, 'short_circuited')
+        return None
+
+    try:
+        response = http_get(url, params=params, timeout=timeout)
+    except requests.RequestException:
+        breaker.record_failure()
+        failure_counters.incr(symbol, 'errors')
+        return None
+
+    if is_invalid_symbol(response):
+        # The host is healthy, the pair just doesn't exist
+        breaker.record_success()
+        negative_cache.record_miss(pair, market)
+        failure_counters.incr(symbol, 'misses')
+        return None
+
+    if response.status_code in (418, 429) or response.status_code >= 500:
+        # Rate limited / banned / outage: back off the whole host
+        breaker.record_failure()
+        failure_counters.incr(symbol, 'errors')
+        return None
+
+    breaker.record_success()
+
+    try:
+        response.raise_for_status()
+        data = response.json()
+    except (requests.RequestException, ValueError):
+        failure_counters.incr(symbol, 'errors')
+        return None
+
+    if not data:
+        # An empty window (startTime/endTime) is normal, only an empty latest window means no market
+        if 'startTime' not in params and 'endTime' not in params:
+            negative_cache.record_miss(pair, market)
+            failure_counters.incr(symbol, 'misses')
+        return None
+
+    negative_cache.record_hit(pair, market)
+    return data
@@ -0,0 +1,207 @@
+"""
+Memory-Mapped Candle Store
+One fixed-width binary file per (symbol, timeframe): a 64 byte header followed by
+int64 time + float64 OHLCV/EMA50 records, read as zero-copy NumPy structured arrays
+"""
+
+import fcntl
+import os
+import struct
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Unset disables the store (the API reads Postgres, the worker doesn't write through)
+CANDLE_STORE_DIR = os.getenv('CANDLE_STORE_DIR')
+
+MAGIC = b'EMACNDL1'
+VERSION = 1
+
+# magic, version, record size, committed record count
+HEADER = struct.Struct('<8sIIq')
+HEADER_SIZE = 64
+COUNT_OFFSET = 16
+
+DTYPE = np.dtype([
+    ('time', '<i8'),  # Candle open time, ms since epoch
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+    ('ema50', '<f8')  # NaN until there are 50 candles
+])
+
+def to_ms(value):
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+def rows_to_records(rows):
+    """(time, open, high, low, close, volume, ema50) DB rows -> structured array"""
+    return np.array([
+        (to_ms(row[0]), row[1], row[2], row[3], row[4], row[5], np.nan if row[6] is None else row[6])
+        for row in rows
+    ], dtype=DTYPE)
+
+def records_to_dicts(records):
+    """Structured array -> the candle dicts the API returns for DB rows"""
+    return [
+        {
+            'time': datetime.fromtimestamp(int(r['time']) / 1000, tz=timezone.utc),
+            'open': float(r['open']),
+            'high': float(r['high']),
+            'low': float(r['low']),
+            'close': float(r['close']),
+            'volume': float(r['volume']),
+            'ema50': None if np.isnan(r['ema50']) else float(r['ema50'])
+        }
+        for r in records
+    ]
+
+def range_of(records, start=None, end=None, limit=None):
+    """MmapCandleStore.range over any time-sorted structured array"""
+    times = records['time']
+
+    lo = 0 if start is None else int(np.searchsorted(times, start if isinstance(start, int) else to_ms(start), 'left'))
+    hi = len(records) if end is None else int(np.searchsorted(times, end if isinstance(end, int) else to_ms(end), 'right'))
+
+    if limit is not None:
+        lo = max(lo, hi - limit)
+
+    return records[lo:hi]
+
+class MmapCandleStore:
+    """
+    Appends are atomic at the tail: records are written and synced past the committed
+    count, then the count in the header is bumped, so readers never see a partial record
+    """
+
+    def __init__(self, directory=CANDLE_STORE_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    def path(self, symbol, timeframe):
+        return os.path.join(self.directory, symbol.upper(), f"{timeframe}.candles")
+
+    def exists(self, symbol, timeframe):
+        return self.enabled and os.path.exists(self.path(symbol, timeframe))
+
+    def read_count(self, f):
+        f.seek(0)
+        magic, version, record_size, count = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or record_size != DTYPE.itemsize:
+            raise ValueError(f"Not a candle file (version {version})")
+        return count
+
+    def write_header(self, f, count):
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, DTYPE.itemsize, count).ljust(HEADER_SIZE, b'\0'))
+
+    def read(self, symbol, timeframe):
+        """Every committed candle as a read-only memory-mapped array (empty when missing)"""
+        path = self.path(symbol, timeframe)
+        try:
+            with open(path, 'rb') as f:
+                count = self.read_count(f)
+        except FileNotFoundError:
+            return np.empty(0, dtype=DTYPE)
+
+        if count == 0:
+            return np.empty(0, dtype=DTYPE)
+
+        return np.memmap(path, dtype=DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+
+    def range(self, symbol, timeframe, start=None, end=None, limit=None):
+        """
+        Candles with start <= time <= end (ms or datetimes), found by binary search
+        With a limit, the newest `limit` candles of that range are returned
+        """
+        return range_of(self.read(symbol, timeframe), start, end, limit)
+
+    def write(self, symbol, timeframe, records):
+        """
+        Upsert candles sorted by time
+        Newer than the tail: appended; existing times: overwritten in place;
+        anything that would land between existing candles rewrites the file
+        """
+        if not self.enabled or len(records) == 0:
+            return 0
+
+        records = np.sort(np.asarray(records, dtype=DTYPE), order='time')
+        path = self.path(symbol, timeframe)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with self.lock:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            with os.fdopen(fd, 'r+b') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+
+                if os.fstat(f.fileno()).st_size < HEADER_SIZE:
+                    self.write_header(f, 0)
+                    f.flush()
+
+                count = self.read_count(f)
+                existing = self.read(symbol, timeframe) if count else np.empty(0, dtype=DTYPE)
+                times = existing['time']
+                tail = times[-1] if count else None
+
+                newer = records if tail is None else records[records['time'] > tail]
+                older = records[:0] if tail is None else records[records['time'] <= tail]
+
+                if len(older):
+                    positions = np.searchsorted(times, older['time'])
+                    if not np.array_equal(times[positions], older['time']):
+                        # Backfill between existing candles, only happens on gap repair
+                        self.rewrite(path, merge_records(existing, records))
+                        return len(records)
+
+                    for position, record in zip(positions, older):
+                        f.seek(HEADER_SIZE + int(position) * DTYPE.itemsize)
+                        f.write(record.tobytes())
+
+                if len(newer):
+                    f.seek(HEADER_SIZE + count * DTYPE.itemsize)
+                    f.write(newer.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                    f.seek(COUNT_OFFSET)
+                    f.write(struct.pack('<q', count + len(newer)))
+
+                f.flush()
+                os.fsync(f.fileno())
+
+        return len(records)
+
+    def rewrite(self, path, records):
+        """Replace a series' contents through a temp file, readers keep their old mapping"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as tmp:
+            self.write_header(tmp, len(records))
+            tmp.write(records.tobytes())
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp_path, path)
+
+def merge_records(existing, records):
+    """Union by time, `records` win on conflicts"""
+    merged = np.concatenate([records, existing])
+    _, first = np.unique(merged['time'], return_index=True)
+    return merged[first]
+
+_default_store = None
+_default_lock = threading.Lock()
+
+def get_candle_store():
+    """Process-wide store over CANDLE_STORE_DIR"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = MmapCandleStore()
+        return _default_store
@@ -3,24 +3,33 @@ Enhanced Crypto EMA Scanner with Multi-Timeframe Analysis
 Supports: 15m, 30m, 1h, 4h, 12h, 1D, 1W
 """
 
-import requests
 import pandas as pd
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
 import json
-import os
-import glob
 
-class MultiTimeframeEMAScanner:
-    def __init__(self, cmc_api_key=None, top_n=200, cache_duration_minutes=60):
+from candle_source import DatabaseCandleSource
+from kline_store import get_kline_store
+from market_data_client import MarketDataClient, MARKET_LABELS
+from market_health import failure_counters
+from scan_cache import get_scan_cache
+from scanner_base import ScannerBase
+
+class MultiTimeframeEMAScanner(ScannerBase):
+    scan_kind = 'multi_scan'
+    results_field = 'coins'
+    
+    def __init__(self, cmc_api_key=None, top_n=200, cache_duration_minutes=60, client=None, cache=None,
+                 data_source=None, kline_store=None):
+        self.client = client or MarketDataClient.default()
+        self.kline_store = kline_store or get_kline_store()
+        self.db_source = DatabaseCandleSource.from_mode(data_source)
         self.coingecko_base = "https://api.coingecko.com/api/v3"
-        self.binance_base = "https://api.binance.com/api/v3"
-        self.binance_futures_base = "https://fapi.binance.com/fapi/v1"
         self.cmc_api_key = cmc_api_key
         self.cmc_base = "https://pro-api.coinmarketcap.com/v1"
         self.top_n = top_n
         self.cache_duration_minutes = cache_duration_minutes
-        self.cache_file_pattern = f'crypto_ema_multi_scan_top{top_n}_*.json'
+        self.cache = cache or get_scan_cache()
         
         # All timeframes we support
         self.timeframes = {
@@ -33,86 +42,6 @@ class MultiTimeframeEMAScanner:
             '1w': {'binance': '1w', 'limit': 60, 'label': 'Weekly'}
         }
     
-    def get_recent_scan(self):
-        """Check if there's a recent scan within the cache duration"""
-        try:
-            scan_files = glob.glob(self.cache_file_pattern)
-            
-            if not scan_files:
-                return None
-            
-            most_recent_file = max(scan_files, key=os.path.getctime)
-            file_time = datetime.fromtimestamp(os.path.getctime(most_recent_file))
-            time_diff = datetime.now() - file_time
-            
-            if time_diff < timedelta(minutes=self.cache_duration_minutes):
-                print(f"\n🔄 Found recent scan from {file_time.strftime('%Y-%m-%d %H:%M:%S')}")
-                print(f"   ({int(time_diff.total_seconds() / 60)} minutes ago)")
-                print(f"   Loading cached data: {most_recent_file}")
-                
-                with open(most_recent_file, 'r') as f:
-                    data = json.load(f)
-                return data
-            else:
-                print(f"\n⏰ Last scan was {int(time_diff.total_seconds() / 60)} minutes ago")
-                print(f"   Cache expired (>{self.cache_duration_minutes} minutes), running new scan...")
-                return None
-                
-        except Exception as e:
-            print(f"Error checking cache: {e}")
-            return None
-    
-    def get_top_n_coins(self):
-        """Fetch top N cryptocurrencies by market cap from CoinGecko"""
-        print(f"Fetching top {self.top_n} coins by market cap...")
-        url = f"{self.coingecko_base}/coins/markets"
-        
-        all_coins = []
-        pages_needed = (self.top_n + 49) // 50
-        
-        for page in range(1, pages_needed + 1):
-            params = {
-                'vs_currency': 'usd',
-                'order': 'market_cap_desc',
-                'per_page': 50,
-                'page': page,
-                'sparkline': False
-            }
-            
-            try:
-                response = requests.get(url, params=params, timeout=10)
-                response.raise_for_status()
-                coins = response.json()
-                all_coins.extend(coins)
-                print(f"  Fetched page {page}/{pages_needed}...")
-                time.sleep(1)
-                
-            except Exception as e:
-                print(f"Error fetching page {page}: {e}")
-                continue
-        
-        all_coins = all_coins[:self.top_n]
-        print(f"Successfully fetched {len(all_coins)} coins")
-        return all_coins
-    
-    def get_binance_data(self, symbol, interval='1h', limit=200, use_futures=False):
-        """Fetch candlestick data from Binance"""
-        base_url = self.binance_futures_base if use_futures else self.binance_base
-        url = f"{base_url}/klines"
-        params = {
-            'symbol': symbol,
-            'interval': interval,
-            'limit': limit
-        }
-        
-        try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            return data
-        except:
-            return None
-    
     def calculate_ema(self, prices, period=50):
         """Calculate Exponential Moving Average"""
         if len(prices) < period:
@@ -135,47 +64,15 @@ class MultiTimeframeEMAScanner:
         ]
         
         for base_symbol in symbol_formats:
-            # Try spot first
-            klines = self.get_binance_data(
-                base_symbol, 
-                interval=tf_config['binance'],
-                limit=tf_config['limit'],
-                use_futures=False
-            )
-            
-            if klines and len(klines) >= 50:
-                closes = [float(candle[4]) for candle in klines]
-                ema_values = self.calculate_ema(closes, period=50)
-                
-                if not ema_values:
-                    continue
-                
-                current_price = closes[-1]
-                current_ema50 = ema_values[-1]
-                pct_diff = ((current_price - current_ema50) / current_ema50) * 100
-                
-                return {
-                    'timeframe': timeframe_key,
-                    'timeframe_label': tf_config['label'],
-                    'rank': coin_data['market_cap_rank'],
-                    'name': coin_data['name'],
-                    'symbol': symbol,
-                    'binance_symbol': base_symbol,
-                    'current_price': current_price,
-                    'ema50': current_ema50,
-                    'above_ema50': current_price > current_ema50,
-                    'pct_from_ema50': pct_diff,
-                    'market_cap': coin_data.get('market_cap', 0),
-                    'data_source': 'Binance Spot',
-                    'candle_count': len(klines)
-                }
-            
-            # Try futures
-            klines = self.get_binance_data(
+            # Spot and futures are asked in parallel, the first with enough candles wins
+            # (stored series only fetch candles newer than their tail)
+            klines, market_type = self.kline_store.get_klines(
+                self.client,
                 base_symbol,
-                interval=tf_config['binance'],
-                limit=tf_config['limit'],
-                use_futures=True
+                tf_config['binance'],
+                tf_config['limit'],
+                min_candles=50,
+                symbol=symbol
             )
             
             if klines and len(klines) >= 50:
@@ -201,22 +98,43 @@ class MultiTimeframeEMAScanner:
                     'above_ema50': current_price > current_ema50,
                     'pct_from_ema50': pct_diff,
                     'market_cap': coin_data.get('market_cap', 0),
-                    'data_source': 'Binance Futures',
+                    'data_source': MARKET_LABELS[market_type],
                     'candle_count': len(klines)
                 }
         
         return None
     
-    def analyze_coin_all_timeframes(self, coin_data, verbose=False):
-        """Analyze a coin across all 7 timeframes"""
+    def analyze_coin_all_timeframes(self, coin_data, verbose=False, reuse=None):
+        """
+        Analyze a coin across all 7 timeframes
+        Timeframes present in `reuse` are taken from there instead of being refetched
+        """
+        reuse = reuse or {}
         results = {}
         
         for tf_key in self.timeframes.keys():
+            if tf_key in reuse:
+                results[tf_key] = reuse[tf_key]
+                continue
+            
             result = self.analyze_timeframe(coin_data, tf_key, verbose)
             results[tf_key] = result
         
         return results
     
+    def timeframe_fields(self, key):
+        return {'timeframe': key, 'timeframe_label': self.timeframes[key]['label']}
+    
+    def previous_result(self, coin_result, key):
+        return coin_result.get('timeframes', {}).get(key)
+    
+    def build_coin_result(self, coin, results, fetched_at):
+        return {
+            'coin_info': coin,
+            'timeframes': results,
+            'fetched_at': fetched_at
+        }
+    
     def get_timeframe_trend(self, pct_from_ema):
         """Get trend strength based on % from EMA"""
         if pct_from_ema is None:
@@ -237,11 +155,18 @@ class MultiTimeframeEMAScanner:
         else:
             return 'Very Bearish'
     
-    def scan_all_coins(self, verbose=False):
-        """Main function to scan all top N coins across all timeframes"""
-        coins = self.get_top_n_coins()
+    def scan_all_coins(self, verbose=False, previous=None):
+        """
+        Main function to scan all top N coins across all timeframes
+        With a previous scan, only series whose latest candle has closed since are refetched
+        """
+        coins = self.get_coins()
+        previous_index = self.index_previous_scan(previous)
+        now = datetime.now(timezone.utc)
+        db_results = self.load_db_results(coins, now=now)
         
         all_coin_results = []
+        refetched_total = 0
         
         print(f"\nAnalyzing coins across 7 timeframes (15m, 30m, 1h, 4h, 12h, 1D, 1W)...")
         print("-" * 100)
@@ -253,14 +178,12 @@ class MultiTimeframeEMAScanner:
             
             print(f"[{i}/{total_coins}] Analyzing {name} ({symbol})...")
             
-            results = self.analyze_coin_all_timeframes(coin, verbose=verbose)
-            
             # Store complete result
-            coin_result = {
-                'coin_info': coin,
-                'timeframes': results
-            }
+            coin_result, refetched = self.scan_coin(coin, previous_index, verbose=verbose, now=now,
+                                                    db_results=db_results)
+            refetched_total += refetched
             all_coin_results.append(coin_result)
+            results = coin_result['timeframes']
             
             # Display summary (compact)
             summary_parts = []
@@ -273,7 +196,13 @@ class MultiTimeframeEMAScanner:
             
             print(f"   {' | '.join(summary_parts)}")
             
-            time.sleep(0.3)  # Slightly faster for more timeframes
+            if refetched:
+                time.sleep(0.3)  # Slightly faster for more timeframes
+        
+        if previous_index or db_results:
+            total_series = len(coins) * len(self.timeframes)
+            print(f"\n♻️  Incremental rescan: refetched {refetched_total}/{total_series} series, "
+                  f"the rest came from the database or the previous scan")
         
         return all_coin_results
     
@@ -387,10 +316,12 @@ class MultiTimeframeEMAScanner:
         }
         
         json_filename = f'crypto_ema_multi_scan_top{self.top_n}_{timestamp}.json'
-        with open(json_filename, 'w') as f:
+        with open(self.cache.path(json_filename), 'w') as f:
             json.dump(output, f, indent=2)
         print(f"\n💾 Results saved to: {json_filename}")
         
+        saved_files = [json_filename]
+        
         # Save CSV with alignment analysis
         if analysis:
             df = pd.DataFrame(analysis)
@@ -421,9 +352,13 @@ class MultiTimeframeEMAScanner:
                 rows.append(row)
             
             df_export = pd.DataFrame(rows)
-            df_export.to_csv(csv_filename, index=False)
+            df_export.to_csv(self.cache.path(csv_filename), index=False)
+            saved_files.append(csv_filename)
             print(f"💾 CSV analysis saved to: {csv_filename}")
         
+        # Index the scan (and evict old ones) so lookups never glob the directory
+        self.cache.put(self.cache_key(), 'multi_scan', self.top_n, saved_files)
+        
         return json_filename
     
     def run(self):
@@ -432,6 +367,8 @@ class MultiTimeframeEMAScanner:
         print(f"CRYPTOCURRENCY MULTI-TIMEFRAME EMA50 SCANNER - TOP {self.top_n}")
         print("Timeframes: 15m, 30m, 1h, 4h, 12h, 1D, 1W")
         print("Sources: Binance Spot + Binance Futures")
+        if self.db_source:
+            print("Database: Postgres candles first, Binance for anything missing")
         print(f"Cache Duration: {self.cache_duration_minutes} minutes")
         print("=" * 120)
         
@@ -449,11 +386,13 @@ class MultiTimeframeEMAScanner:
         
         start_time = time.time()
         
-        all_coin_results = self.scan_all_coins()
+        all_coin_results = self.scan_all_coins(previous=self.get_last_scan())
         
         self.display_results(all_coin_results)
         self.save_results(all_coin_results)
         
+        failure_counters.print_report()
+        
         elapsed_time = time.time() - start_time
         print(f"\n⏱️  Scan completed in {elapsed_time/60:.2f} minutes ({elapsed_time:.1f} seconds)")
         print(f"✅ Results cached for {self.cache_duration_minutes} minutes")
@@ -3,17 +3,20 @@ Populate EMA Analysis Table from Existing Candle Data
 Run this once to fill the ema_analysis table
 """
 
-import psycopg
 import os
 from datetime import datetime
 
+from storage import get_backend
+from watermarks import bump_watermarks
+
 DATABASE_URL = os.getenv('DATABASE_URL')
+storage_backend = get_backend()
 
 def populate_ema_analysis():
     """Populate ema_analysis from candles table"""
     
     print("🔄 Connecting to database...")
-    conn = psycopg.connect(DATABASE_URL)
+    conn = storage_backend.connect()
     cur = conn.cursor()
     
     # Get all unique symbol/timeframe combinations
@@ -28,6 +31,7 @@ def populate_ema_analysis():
     print(f"📊 Found {len(combinations)} symbol/timeframe combinations")
     
     analysis_count = 0
+    analysis_date = datetime.now().date()
     
     for symbol, timeframe in combinations:
         # Get latest candle data for this symbol/timeframe
@@ -67,12 +71,13 @@ def populate_ema_analysis():
                     ema50,
                     pct_from_ema,
                     above_ema,
-                    datetime.now().date()
+                    analysis_date
                 ))
                 
                 analysis_count += 1
                 print(f"   [{analysis_count}/{len(combinations)}] {symbol} ({timeframe}): {pct_from_ema:+.2f}%")
     
+    bump_watermarks(cur, [f"ema_analysis:{timeframe}" for _, timeframe in combinations])
     conn.commit()
     
     # Verify results
@@ -82,10 +87,10 @@ def populate_ema_analysis():
     cur.execute("""
         SELECT timeframe, COUNT(*) as count
         FROM ema_analysis
-        WHERE analysis_date = CURRENT_DATE
+        WHERE analysis_date = %s
         GROUP BY timeframe
         ORDER BY timeframe
-    """)
+    """, (analysis_date,))
     
     by_timeframe = cur.fetchall()
     
@@ -101,7 +106,7 @@ def populate_ema_analysis():
     conn.close()
 
 if __name__ == "__main__":
-    if not DATABASE_URL:
+    if not storage_backend.configured:
         print("❌ DATABASE_URL not found in environment")
         print("Run: export DATABASE_URL='your-connection-string'")
         exit(1)
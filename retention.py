@@ -0,0 +1,297 @@
+"""
+Candle Retention
+Per-timeframe retention policies: high-resolution candles older than their window are
+rolled up into a coarser timeframe (when that bucket is missing) and deleted in bounded
+batches, so the candles table and its indexes stop growing with history
+
+    CANDLE_RETENTION="15m:90:1h"        keep 15m for 90 days, older history lives on as 1h
+    CANDLE_RETENTION="15m:90:1h,1h:1825:4h"
+
+Off unless CANDLE_RETENTION is set: it deletes candle rows, so a deployment opts in
+
+Each batch is its own short transaction over one symbol and time window, the worker
+keeps writing new candles while a compaction runs
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from candle_clock import INTERVAL_MINUTES, candle_open_time
+from storage import get_backend
+from watermarks import bump_watermarks
+
+# timeframe:keep_days[:rollup_timeframe], comma separated (unset, empty or 'off': no retention)
+CANDLE_RETENTION = os.getenv('CANDLE_RETENTION', 'off')
+
+# Candles per batch (one symbol, one contiguous window) and the pause between batches
+RETENTION_BATCH_ROWS = int(os.getenv('RETENTION_BATCH_ROWS', 5000))
+RETENTION_BATCH_PAUSE = float(os.getenv('RETENTION_BATCH_PAUSE', 0.05))
+
+# Hour (UTC) the worker runs the daily compaction
+RETENTION_HOUR = int(os.getenv('RETENTION_HOUR', 3))
+
+def parse_policies(spec):
+    """{timeframe: {'keep_days': int, 'rollup': timeframe or None}} from a CANDLE_RETENTION string"""
+    policies = {}
+    if not spec or spec.strip().lower() == 'off':
+        return policies
+
+    for part in spec.split(','):
+        fields = [field.strip() for field in part.split(':')]
+        if len(fields) < 2 or fields[0] not in INTERVAL_MINUTES:
+            print(f"⚠️  Ignoring retention policy '{part}'")
+            continue
+
+        rollup = fields[2] if len(fields) > 2 and fields[2] else None
+        if rollup and (rollup not in INTERVAL_MINUTES or INTERVAL_MINUTES[rollup] <= INTERVAL_MINUTES[fields[0]]):
+            print(f"⚠️  Retention rollup {fields[0]} -> {rollup} must go to a coarser timeframe, deleting only")
+            rollup = None
+
+        policies[fields[0]] = {'keep_days': int(fields[1]), 'rollup': rollup}
+
+    return policies
+
+RETENTION_POLICIES = parse_policies(CANDLE_RETENTION)
+
+def retained_candles(timeframe, default):
+    """Cap a candle count (initial population, data quality) at what the policy keeps"""
+    policy = RETENTION_POLICIES.get(timeframe)
+    if not policy:
+        return default
+    return min(default, policy['keep_days'] * 1440 // INTERVAL_MINUTES[timeframe])
+
+def retention_cutoff(timeframe, policy, now=None):
+    """Candles opening before this are expired, aligned to the rollup bucket so every bucket is whole"""
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=policy['keep_days'])
+    return candle_open_time(policy['rollup'] or timeframe, cutoff)
+
+def aggregate_candles(rows, timeframe):
+    """Roll (time, open, high, low, close, volume) rows, oldest first, into `timeframe` buckets"""
+    buckets = {}
+    for time_, open_, high, low, close, volume in rows:
+        bucket_time = candle_open_time(timeframe, time_)
+        bucket = buckets.get(bucket_time)
+        if bucket is None:
+            buckets[bucket_time] = [open_, high, low, close, volume or 0]
+            continue
+        bucket[1] = max(bucket[1], high)
+        bucket[2] = min(bucket[2], low)
+        bucket[3] = close
+        bucket[4] += volume or 0
+
+    return buckets
+
+def compact_series(conn, symbol, timeframe, policy, now=None):
+    """
+    Roll up and delete expired candles of one series, one bounded window per transaction
+    Returns (deleted, rolled_up)
+    """
+    cutoff = retention_cutoff(timeframe, policy, now)
+    rollup = policy['rollup']
+    cur = conn.cursor()
+
+    cur.execute("""
+        SELECT MIN(time) FROM candles
+        WHERE symbol = %s AND timeframe = %s AND time < %s
+    """, (symbol, timeframe, cutoff))
+    result = cur.fetchone()
+    oldest = result[0] if result else None
+    conn.commit()
+
+    deleted = 0
+    rolled_up = 0
+    window = timedelta(minutes=RETENTION_BATCH_ROWS * INTERVAL_MINUTES[timeframe])
+    start = candle_open_time(rollup or timeframe, oldest) if oldest else cutoff
+
+    while start < cutoff:
+        end = min(start + window, cutoff)
+        if rollup:
+            # Keep rollup buckets whole across batches
+            end = max(candle_open_time(rollup, end), start + timedelta(minutes=INTERVAL_MINUTES[rollup]))
+            end = min(end, cutoff)
+
+        if rollup:
+            cur.execute("""
+                SELECT time, open, high, low, close, volume FROM candles
+                WHERE symbol = %s AND timeframe = %s AND time >= %s AND time < %s
+                ORDER BY time ASC
+            """, (symbol, timeframe, start, end))
+            buckets = aggregate_candles(cur.fetchall(), rollup)
+
+            # Exchange-native candles win, only fill buckets the coarser series is missing
+            cur.execute("""
+                SELECT time FROM candles
+                WHERE symbol = %s AND timeframe = %s AND time >= %s AND time < %s
+            """, (symbol, rollup, start, end))
+            existing = {row[0] for row in cur.fetchall()}
+
+            missing = [
+                (bucket_time, symbol, rollup, *values, None)
+                for bucket_time, values in buckets.items()
+                if bucket_time not in existing
+            ]
+            if missing:
+                cur.executemany("""
+                    INSERT INTO candles (time, symbol, timeframe, open, high, low, close, volume, ema50)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (time, symbol, timeframe) DO NOTHING
+                """, missing)
+                rolled_up += len(missing)
+
+        cur.execute("""
+            DELETE FROM candles
+            WHERE symbol = %s AND timeframe = %s AND time >= %s AND time < %s
+        """, (symbol, timeframe, start, end))
+        deleted += max(cur.rowcount, 0)
+        bump_watermarks(cur, [f"candles:{timeframe}"] + ([f"candles:{rollup}"] if rollup else []))
+        conn.commit()
+
+        start = end
+        if RETENTION_BATCH_PAUSE:
+            time.sleep(RETENTION_BATCH_PAUSE)
+
+    cur.close()
+    return deleted, rolled_up
+
+def get_table_sizes(conn):
+    """Postgres heap/index size of the candles table and when it was last vacuumed"""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT pg_table_size('candles'), pg_indexes_size('candles'),
+               n_live_tup, n_dead_tup, GREATEST(last_vacuum, last_autovacuum)
+        FROM pg_stat_user_tables
+        WHERE relname = 'candles'
+    """)
+    row = cur.fetchone()
+    cur.close()
+    conn.commit()
+
+    if not row:
+        return None
+    return {
+        'table_bytes': row[0],
+        'index_bytes': row[1],
+        'live_rows': row[2],
+        'dead_rows': row[3],
+        'last_vacuum': row[4]
+    }
+
+def run_retention(backend=None, policies=None, now=None, verbose=True):
+    """
+    Apply every retention policy to every coin
+    Returns {timeframe: {'deleted': n, 'rolled_up': n}}
+    """
+    import background_worker as worker
+
+    backend = backend or get_backend()
+    policies = RETENTION_POLICIES if policies is None else policies
+    now = now or datetime.now(timezone.utc)
+    report = {}
+
+    if not policies:
+        return report
+
+    conn = backend.connect()
+    cur = conn.cursor()
+    cur.execute("SELECT symbol FROM coins ORDER BY symbol")
+    symbols = [row[0] for row in cur.fetchall()]
+    cur.close()
+    conn.commit()
+
+    start_time = time.time()
+
+    for timeframe, policy in policies.items():
+        totals = {'deleted': 0, 'rolled_up': 0}
+
+        for symbol in symbols:
+            try:
+                deleted, rolled_up = compact_series(conn, symbol, timeframe, policy, now)
+            except Exception as e:
+                conn.rollback()
+                print(f"   ⚠️  Retention {symbol} {timeframe}: {e}")
+                continue
+
+            totals['deleted'] += deleted
+            totals['rolled_up'] += rolled_up
+
+            if rolled_up:
+                # Filled buckets need the coarser series' EMA recomputed
+                worker.recalculate_ema_for_symbol(symbol, policy['rollup'])
+
+        report[timeframe] = totals
+        if verbose:
+            target = f", {totals['rolled_up']:,} rolled up into {policy['rollup']}" if policy['rollup'] else ""
+            print(f"   🧹 {timeframe}: kept {policy['keep_days']} days, deleted {totals['deleted']:,}{target}")
+
+    if verbose:
+        print(f"   ⏱️  Retention took {int(time.time() - start_time)}s")
+        if backend.name == 'postgres':
+            sizes = get_table_sizes(conn)
+            if sizes:
+                print(f"   📦 candles: {sizes['table_bytes'] / 1e6:,.0f} MB table, "
+                      f"{sizes['index_bytes'] / 1e6:,.0f} MB indexes, "
+                      f"{sizes['live_rows']:,} live / {sizes['dead_rows']:,} dead rows")
+
+    conn.close()
+    return report
+
+class RetentionSchedule:
+    """
+    Once per UTC day, at the first check from RETENTION_HOUR:30 on (clear of the 00:0x
+    daily/weekly updates), never when no policy is configured. A check that comes late,
+    after a long update, still runs that day's compaction
+    """
+
+    def __init__(self):
+        self.last_run = None
+
+    def due(self, current_time):
+        """True at most once a day, the caller runs retention when it is"""
+        if not RETENTION_POLICIES:
+            return False
+        current_time = current_time.astimezone(timezone.utc)
+        if (current_time.hour, current_time.minute) < (RETENTION_HOUR, 30):
+            return False
+        if self.last_run == current_time.date():
+            return False
+        # Recorded before the run, a failing compaction waits for the next day
+        self.last_run = current_time.date()
+        return True
+
+class RetentionThread(threading.Thread):
+    """Daily retention for worker modes without their own minute loop (WebSocket streams)"""
+
+    def __init__(self, check_interval_seconds=60):
+        super().__init__(daemon=True)
+        self.check_interval_seconds = check_interval_seconds
+        self.schedule = RetentionSchedule()
+
+    def run(self):
+        while True:
+            time.sleep(self.check_interval_seconds)
+            current_time = datetime.now(timezone.utc)
+            if not self.schedule.due(current_time):
+                continue
+            try:
+                print(f"\n🧹 Retention at {current_time.strftime('%H:%M')}")
+                run_retention()
+            except Exception as e:
+                print(f"   ❌ Retention error: {e}")
+
+if __name__ == "__main__":
+    backend = get_backend()
+    if not backend.configured:
+        print("❌ DATABASE_URL not found in environment")
+        exit(1)
+
+    print("=" * 60)
+    print("🧹 CANDLE RETENTION")
+    for timeframe, policy in RETENTION_POLICIES.items():
+        rollup = f" (older history as {policy['rollup']})" if policy['rollup'] else ""
+        print(f"   {timeframe}: keep {policy['keep_days']} days{rollup}")
+    print("=" * 60)
+
+    run_retention(backend)
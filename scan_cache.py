@@ -0,0 +1,319 @@
+"""
+Scan Result Cache
+Manifest index of saved scans keyed by scan parameters, with TTL lookup and
+LRU / disk-size eviction of old result files, plus the encoded response body of
+recently served scans
+"""
+
+import glob
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from fast_json import dumps, loads
+
+SCAN_RESULTS_DIR = os.getenv('SCAN_RESULTS_DIR', '.')
+MANIFEST_FILE = 'scan_manifest.json'
+
+# Keep at most this many scans per key, and this many bytes across all scans
+MAX_SCANS_PER_KEY = int(os.getenv('SCAN_CACHE_MAX_PER_KEY', 10))
+MAX_CACHE_BYTES = int(os.getenv('SCAN_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# Encoded scans kept in memory for the API (a top-200 multi-timeframe scan is about 1 MB)
+BODY_CACHE_ENTRIES = int(os.getenv('SCAN_BODY_CACHE_ENTRIES', 8))
+
+# Access times are only written back this often, reads shouldn't rewrite the manifest
+ACCESS_FLUSH_SECONDS = 30
+
+# Files written before the manifest existed, registered once by rebuild()
+LEGACY_PATTERNS = {
+    'ema_scan': {
+        'json': r'crypto_ema_scan_top(\d+)_(\d{8}_\d{6})\.json$',
+        'companions': ['coins_LONGTERM_top{n}_{ts}.csv', 'coins_TRADE_NOW_top{n}_{ts}.csv',
+                       'coins_AVOID_top{n}_{ts}.csv'],
+        'timeframes': ['1w', '1d', '4h']
+    },
+    'multi_scan': {
+        'json': r'crypto_ema_multi_scan_top(\d+)_(\d{8}_\d{6})\.json$',
+        'companions': ['crypto_multi_timeframe_top{n}_{ts}.csv'],
+        'timeframes': ['15m', '30m', '1h', '4h', '12h', '1d', '1w']
+    }
+}
+
+def make_key(kind, top_n, timeframes, source='binance'):
+    """Cache key from the parameters that determine a scan's content"""
+    return f"{kind}|top{top_n}|{','.join(sorted(timeframes))}|{source}"
+
+class ScanCache:
+    """
+    Manifest layout:
+      entries: filename -> {key, kind, top_n, files, size, created, last_access}
+      latest: key -> filename           (O(1) TTL lookup per scan parameters)
+      latest_by_kind: kind -> filename  (newest scan of any size, for the API)
+    """
+
+    def __init__(self, directory=SCAN_RESULTS_DIR, max_per_key=MAX_SCANS_PER_KEY, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_per_key = max_per_key
+        self.max_bytes = max_bytes
+        self.manifest_path = os.path.join(directory, MANIFEST_FILE)
+        self.lock = threading.RLock()
+        self.manifest = None
+        self.manifest_mtime = None
+        self.access_dirty = False
+        self.last_flush = 0
+        self.bodies = OrderedDict()
+
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def load(self):
+        """(Re)load the manifest when another process has rewritten it"""
+        with self.lock:
+            try:
+                mtime = os.path.getmtime(self.manifest_path)
+            except OSError:
+                mtime = None
+
+            if self.manifest is not None and mtime == self.manifest_mtime:
+                return self.manifest
+
+            if mtime is None:
+                self.manifest = {'entries': {}, 'latest': {}, 'latest_by_kind': {}}
+                self.rebuild()
+            else:
+                with open(self.manifest_path, 'r') as f:
+                    self.manifest = json.load(f)
+                self.manifest_mtime = mtime
+
+            return self.manifest
+
+    def save(self):
+        with self.lock:
+            tmp_path = f"{self.manifest_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.manifest, f)
+            os.replace(tmp_path, self.manifest_path)
+
+            self.manifest_mtime = os.path.getmtime(self.manifest_path)
+            self.access_dirty = False
+            self.last_flush = time.time()
+
+    def rebuild(self):
+        """Register result files that predate the manifest"""
+        registered = 0
+
+        for kind, pattern in LEGACY_PATTERNS.items():
+            for json_path in glob.glob(os.path.join(self.directory, '*.json')):
+                match = re.search(pattern['json'], os.path.basename(json_path))
+                if not match:
+                    continue
+
+                top_n, ts = int(match.group(1)), match.group(2)
+                companions = [c.format(n=top_n, ts=ts) for c in pattern['companions']]
+                files = [os.path.basename(json_path)] + [c for c in companions if os.path.exists(self.path(c))]
+                created = datetime.strptime(ts, '%Y%m%d_%H%M%S').timestamp()
+
+                self.register(make_key(kind, top_n, pattern['timeframes']), kind, top_n, files, created=created)
+                registered += 1
+
+        if registered:
+            print(f"🗂️  Registered {registered} existing scan files in {self.manifest_path}")
+
+        self.evict()
+        self.save()
+
+    def register(self, key, kind, top_n, files, created=None):
+        with self.lock:
+            manifest = self.manifest
+            created = created or time.time()
+            filename = files[0]
+
+            manifest['entries'][filename] = {
+                'key': key,
+                'kind': kind,
+                'top_n': top_n,
+                'files': files,
+                'size': sum(os.path.getsize(self.path(f)) for f in files if os.path.exists(self.path(f))),
+                'created': created,
+                'last_access': created
+            }
+
+            for index, index_key in (('latest', key), ('latest_by_kind', kind)):
+                current = manifest[index].get(index_key)
+                if not current or manifest['entries'][current]['created'] <= created:
+                    manifest[index][index_key] = filename
+
+    def put(self, key, kind, top_n, files):
+        """Register a freshly written scan (JSON first, then companion CSVs) and evict old ones"""
+        with self.lock:
+            self.load()
+            self.register(key, kind, top_n, files)
+            self.evict()
+            self.save()
+
+    def lookup(self, key=None, kind=None, max_age_minutes=None):
+        """Newest entry for a key (or for a kind), None when missing or older than max_age_minutes"""
+        with self.lock:
+            manifest = self.load()
+            filename = manifest['latest'].get(key) if key else manifest['latest_by_kind'].get(kind)
+            entry = manifest['entries'].get(filename) if filename else None
+
+            if not entry:
+                return None
+            if max_age_minutes is not None and time.time() - entry['created'] >= max_age_minutes * 60:
+                return None
+
+            return {'filename': filename, **entry}
+
+    def touch(self, filename):
+        """Record an access for LRU eviction"""
+        with self.lock:
+            stored = self.manifest['entries'].get(filename)
+            if stored:
+                stored['last_access'] = time.time()
+                self.access_dirty = True
+            if self.access_dirty and time.time() - self.last_flush >= ACCESS_FLUSH_SECONDS:
+                self.save()
+
+    def read(self, entry):
+        """Load a scan's JSON and record the access"""
+        with open(self.path(entry['filename']), 'rb') as f:
+            data = loads(f.read())
+
+        self.touch(entry['filename'])
+        return data
+
+    def get(self, key=None, kind=None, max_age_minutes=None):
+        """Returns (data, entry) for the newest matching scan, or (None, None)"""
+        entry = self.lookup(key=key, kind=kind, max_age_minutes=max_age_minutes)
+        if not entry:
+            return None, None
+
+        try:
+            return self.read(entry), entry
+        except (OSError, ValueError):
+            # File removed or truncated behind our back, forget it
+            self.forget(entry['filename'])
+            return None, None
+
+    def body(self, key=None, kind=None, max_age_minutes=None):
+        """
+        (response body bytes, entry) for the newest matching scan, or (None, None)
+        Result files don't change once written, so each is encoded once while it's being served
+        """
+        entry = self.lookup(key=key, kind=kind, max_age_minutes=max_age_minutes)
+        if not entry:
+            return None, None
+
+        with self.lock:
+            body = self.bodies.get(entry['filename'])
+            if body is not None:
+                self.bodies.move_to_end(entry['filename'])
+        if body is not None:
+            self.touch(entry['filename'])
+            return body, entry
+
+        data, entry = self.get(key=key, kind=kind, max_age_minutes=max_age_minutes)
+        if not data:
+            return None, None
+
+        body = dumps(data) + b'\n'
+        with self.lock:
+            self.bodies[entry['filename']] = body
+            while len(self.bodies) > BODY_CACHE_ENTRIES:
+                self.bodies.popitem(last=False)
+        return body, entry
+
+    def list(self, kind=None):
+        with self.lock:
+            manifest = self.load()
+            entries = [
+                {'filename': filename, **entry}
+                for filename, entry in manifest['entries'].items()
+                if kind is None or entry['kind'] == kind
+            ]
+        entries.sort(key=lambda e: e['created'], reverse=True)
+        return entries
+
+    def forget(self, filename, delete_files=False):
+        with self.lock:
+            manifest = self.load()
+            entry = manifest['entries'].pop(filename, None)
+            self.bodies.pop(filename, None)
+            if not entry:
+                return
+
+            if delete_files:
+                for f in entry['files']:
+                    try:
+                        os.remove(self.path(f))
+                    except OSError:
+                        pass
+
+            # Re-point the latest indexes at the next newest entry
+            for index, index_key, field in (('latest', entry['key'], 'key'), ('latest_by_kind', entry['kind'], 'kind')):
+                if manifest[index].get(index_key) != filename:
+                    continue
+                candidates = [(e['created'], name) for name, e in manifest['entries'].items() if e[field] == index_key]
+                if candidates:
+                    manifest[index][index_key] = max(candidates)[1]
+                else:
+                    manifest[index].pop(index_key)
+
+            self.save()
+
+    def evict(self):
+        """Drop scans beyond max_per_key (oldest first), then least recently used until under max_bytes"""
+        with self.lock:
+            entries = self.manifest['entries']
+            doomed = set()
+
+            by_key = {}
+            for filename, entry in entries.items():
+                by_key.setdefault(entry['key'], []).append((entry['created'], filename))
+            for scans in by_key.values():
+                scans.sort(reverse=True)
+                doomed.update(filename for _, filename in scans[self.max_per_key:])
+
+            # The newest scan of every key is never evicted for size
+            protected = set(self.manifest['latest'].values())
+            total = sum(e['size'] for name, e in entries.items() if name not in doomed)
+            for _, filename in sorted((e['last_access'], name) for name, e in entries.items()):
+                if total <= self.max_bytes:
+                    break
+                if filename in doomed or filename in protected:
+                    continue
+                doomed.add(filename)
+                total -= entries[filename]['size']
+
+            for filename in doomed:
+                for f in entries[filename]['files']:
+                    try:
+                        os.remove(self.path(f))
+                    except OSError:
+                        pass
+                del entries[filename]
+                self.bodies.pop(filename, None)
+
+            if doomed:
+                print(f"🧹 Evicted {len(doomed)} old scans from {self.directory}")
+
+            return len(doomed)
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+def get_scan_cache():
+    """Process-wide cache over SCAN_RESULTS_DIR"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ScanCache()
+        return _default_cache
@@ -0,0 +1,227 @@
+"""
+Scanner Base
+What CryptoEMAScanner and MultiTimeframeEMAScanner share: the coin list, the scan cache, the
+series read from the database (one set-based query per scan) and incremental rescans, where a
+series is refetched only once its latest candle has closed since the last fetch
+
+A scanner sets `scan_kind`, `results_field` and `self.timeframes`
+({result key: {'binance': interval, 'limit': candles, 'label': label}}), and says how its
+results name a timeframe and where they sit in its coin results (timeframe_fields,
+previous_result, build_coin_result)
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+
+from candle_clock import has_closed_since
+from candle_source import summarize_series
+from scan_cache import make_key
+
+class ScannerBase:
+    scan_kind = None  # Manifest kind, see scan_cache
+    results_field = None  # Field of a saved scan holding the coin results
+
+    def cache_key(self):
+        """Manifest key for this scanner's parameters"""
+        intervals = [tf_config['binance'] for tf_config in self.timeframes.values()]
+        return make_key(self.scan_kind, self.top_n, intervals, self.source_name())
+
+    def source_name(self):
+        sources = ['hybrid' if self.db_source else 'binance']
+        if self.cmc_api_key:
+            sources.append('cmc')
+        return '+'.join(sources)
+
+    def get_recent_scan(self):
+        """Check if there's a recent scan within the cache duration"""
+        try:
+            entry = self.cache.lookup(key=self.cache_key())
+
+            if not entry:
+                return None
+
+            file_time = datetime.fromtimestamp(entry['created'])
+            time_diff = datetime.now() - file_time
+
+            if time_diff < timedelta(minutes=self.cache_duration_minutes):
+                print(f"\n🔄 Found recent scan from {file_time.strftime('%Y-%m-%d %H:%M:%S')}")
+                print(f"   ({int(time_diff.total_seconds() / 60)} minutes ago)")
+                print(f"   Loading cached data: {entry['filename']}")
+
+                return self.cache.read(entry)
+            else:
+                print(f"\n⏰ Last scan was {int(time_diff.total_seconds() / 60)} minutes ago")
+                print(f"   Cache expired (>{self.cache_duration_minutes} minutes), running new scan...")
+                return None
+
+        except Exception as e:
+            print(f"Error checking cache: {e}")
+            return None
+
+    def get_last_scan(self):
+        """Load the most recent scan regardless of age (used to merge incremental rescans)"""
+        try:
+            data, entry = self.cache.get(key=self.cache_key())
+            return data
+        except Exception as e:
+            print(f"Error loading previous scan: {e}")
+            return None
+
+    def index_previous_scan(self, previous):
+        """Map symbol -> coin result (with per-timeframe fetch times) from a saved scan"""
+        if not previous:
+            return {}
+
+        return {
+            coin_result['coin_info']['symbol'].upper(): coin_result
+            for coin_result in previous.get(self.results_field, [])
+        }
+
+    def get_top_n_coins(self):
+        """Fetch top N cryptocurrencies by market cap from CoinGecko"""
+        print(f"Fetching top {self.top_n} coins by market cap...")
+        url = f"{self.coingecko_base}/coins/markets"
+
+        all_coins = []
+        pages_needed = (self.top_n + 49) // 50
+
+        for page in range(1, pages_needed + 1):
+            params = {
+                'vs_currency': 'usd',
+                'order': 'market_cap_desc',
+                'per_page': 50,
+                'page': page,
+                'sparkline': False
+            }
+
+            try:
+                response = self.client.get(url, params=params)
+                response.raise_for_status()
+                coins = response.json()
+                all_coins.extend(coins)
+                print(f"  Fetched page {page}/{pages_needed}...")
+                time.sleep(1)
+
+            except Exception as e:
+                print(f"Error fetching page {page}: {e}")
+                continue
+
+        all_coins = all_coins[:self.top_n]
+        print(f"Successfully fetched {len(all_coins)} coins")
+        return all_coins
+
+    def get_coins(self):
+        """Top N coins from the database when it has them, otherwise from CoinGecko"""
+        if self.db_source:
+            try:
+                coins = self.db_source.get_top_coins(self.top_n)
+                if coins:
+                    print(f"Loaded top {len(coins)} coins from database")
+                    return coins
+            except Exception as e:
+                print(f"⚠️  Could not load coins from database: {e}")
+
+        return self.get_top_n_coins()
+
+    def load_db_results(self, coins, now=None):
+        """
+        Analyze every coin/timeframe the database has up to date, in one query
+        Returns symbol -> {result key: result}; anything missing (30m/12h, which the worker
+        doesn't store, or stale series) is fetched over REST
+        """
+        if not self.db_source or not coins:
+            return {}
+
+        coins_by_symbol = {coin['symbol'].upper(): coin for coin in coins}
+        result_keys = {tf_config['binance']: key for key, tf_config in self.timeframes.items()}
+
+        try:
+            series = self.db_source.get_latest_candles(
+                list(coins_by_symbol),
+                {tf_config['binance']: tf_config['limit'] for tf_config in self.timeframes.values()},
+                now=now
+            )
+        except Exception as e:
+            print(f"⚠️  Database unavailable, fetching everything from Binance: {e}")
+            return {}
+
+        db_results = {}
+        for (symbol, interval), candles in series.items():
+            summary = summarize_series(candles)
+            if not summary:
+                continue
+
+            coin_data = coins_by_symbol[symbol]
+            current_price, current_ema50 = summary
+            pct_diff = ((current_price - current_ema50) / current_ema50) * 100
+            key = result_keys[interval]
+
+            db_results.setdefault(symbol, {})[key] = {
+                'rank': coin_data['market_cap_rank'],
+                'name': coin_data['name'],
+                'symbol': symbol,
+                'binance_symbol': coin_data.get('binance_symbol') or 'N/A',
+                'current_price': current_price,
+                'ema50': current_ema50,
+                'above_ema50': current_price > current_ema50,
+                'pct_from_ema50': pct_diff,
+                'market_cap': coin_data.get('market_cap', 0),
+                **self.timeframe_fields(key),
+                'data_source': 'Database',
+                'candle_count': len(candles)
+            }
+
+        series_count = sum(len(results) for results in db_results.values())
+        print(f"🐘 Loaded {series_count}/{len(coins) * len(self.timeframes)} series from database")
+
+        return db_results
+
+    def timeframe_fields(self, key):
+        """Fields naming the timeframe in a result"""
+        raise NotImplementedError
+
+    def previous_result(self, coin_result, key):
+        """A timeframe's result in a saved coin result"""
+        raise NotImplementedError
+
+    def build_coin_result(self, coin, results, fetched_at):
+        """Coin result as the scanner saves it, from {result key: result}"""
+        raise NotImplementedError
+
+    def scan_coin(self, coin, previous_index=None, verbose=False, now=None, db_results=None):
+        """
+        Analyze one coin, refetching only timeframes whose latest candle closed since the last fetch
+        Timeframes in `db_results` (from load_db_results) are never fetched
+        Returns (coin result with a per-timeframe 'fetched_at' map, number of series refetched)
+        """
+        now = now or datetime.now(timezone.utc)
+        previous = (previous_index or {}).get(coin['symbol'].upper())
+        from_db = (db_results or {}).get(coin['symbol'].upper(), {})
+
+        reuse = {}
+        fetched_at = {}
+
+        if previous:
+            for key, tf_config in self.timeframes.items():
+                result = self.previous_result(previous, key)
+                last_fetch = previous.get('fetched_at', {}).get(key)
+
+                # Missing results are always retried, they may have been a transient failure
+                if result and not has_closed_since(tf_config['binance'], last_fetch, now):
+                    reuse[key] = {
+                        **result,
+                        'rank': coin['market_cap_rank'],
+                        'market_cap': coin.get('market_cap', 0)
+                    }
+                    fetched_at[key] = last_fetch
+
+        for key, result in from_db.items():
+            reuse[key] = result
+            fetched_at[key] = now.isoformat()
+
+        results = self.analyze_coin_all_timeframes(coin, verbose=verbose, reuse=reuse)
+
+        for key in self.timeframes:
+            fetched_at.setdefault(key, now.isoformat())
+
+        return self.build_coin_result(coin, results, fetched_at), len(self.timeframes) - len(reuse)
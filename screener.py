@@ -0,0 +1,358 @@
+"""
+Screener
+Filter expressions over each coin's latest EMA analysis, compiled into one SQL query or
+evaluated with NumPy over the in-memory analysis snapshot
+
+    /api/screener?where=pct_1w >= -10 and aligned >= 3&sort=-pct_1w,rank&limit=50
+    /api/screener?preset=trade_now
+
+Fields (per timeframe: 15m, 1h, 4h, 1d, 1w):
+    pct_1w      % from EMA50          ema_1w     EMA50
+    price_1w    price at analysis     rank       market cap rank
+    price       coin price            aligned    timeframes above EMA50
+    below       timeframes below EMA50
+Flags: above_1w, below_1w (price vs EMA50), has_1w (analysed on that timeframe)
+
+    expr   := term ('or' term)*
+    term   := factor ('and' factor)*
+    factor := '(' expr ')' | flag | field op number | field 'between' number 'and' number
+    op     := < | <= | > | >= | = | !=
+
+A coin without analysis on a timeframe matches no condition on it. The strategic summary's
+EVALUATE / TRADE NOW / AVOID lists are the presets below
+"""
+
+import operator
+import re
+
+import numpy as np
+
+from watermarks import TIMEFRAMES
+
+SCREEN_DEFAULT_LIMIT = 200
+
+PRESETS = {
+    'evaluate': {
+        'where': 'pct_1w >= -10',
+        'description': 'Above Weekly EMA50 OR within 10% below'
+    },
+    'trade_now': {
+        'where': 'has_1w and pct_4h between -5 and 5',
+        'description': '4H chart within ±5% of EMA50'
+    },
+    'avoid': {
+        'where': 'pct_1w < -10',
+        'description': 'More than 10% below Weekly EMA50'
+    }
+}
+
+# Numeric fields -> pivot column
+FIELDS = {'rank': 'market_cap_rank', 'price': 'current_price', 'aligned': 'aligned', 'below': 'below'}
+for _tf in TIMEFRAMES:
+    FIELDS.update({f"pct_{_tf}": f"pct_{_tf}", f"ema_{_tf}": f"ema_{_tf}", f"price_{_tf}": f"price_{_tf}"})
+
+FLAGS = {f"{flag}_{tf}" for flag in ('above', 'below', 'has') for tf in TIMEFRAMES}
+
+OPERATORS = {
+    '<': operator.lt, '<=': operator.le, '>': operator.gt,
+    '>=': operator.ge, '=': operator.eq, '!=': operator.ne
+}
+
+TOKEN = re.compile(r'\s*(?:(<=|>=|!=|<|>|=|\(|\))|(-?\d+(?:\.\d+)?)|([A-Za-z_][A-Za-z0-9_]*))')
+
+def pivot_columns(tf):
+    return [
+        f"MAX(CASE WHEN latest.timeframe = '{tf}' THEN latest.pct_from_ema50 END) AS pct_{tf}",
+        f"MAX(CASE WHEN latest.timeframe = '{tf}' THEN latest.ema50 END) AS ema_{tf}",
+        f"MAX(CASE WHEN latest.timeframe = '{tf}' THEN latest.current_price END) AS price_{tf}",
+        f"MAX(CASE WHEN latest.timeframe = '{tf}' THEN CASE WHEN latest.above_ema50 THEN 1 ELSE 0 END END) AS above_{tf}"
+    ]
+
+PIVOT_COLUMNS = ',\n        '.join(column for tf in TIMEFRAMES for column in pivot_columns(tf))
+
+# One row per coin with its latest analysis on every timeframe side by side
+SCREEN_SQL = f"""
+    SELECT
+        c.symbol,
+        c.name,
+        c.market_cap_rank,
+        c.current_price,
+        SUM(CASE WHEN latest.above_ema50 THEN 1 ELSE 0 END) AS aligned,
+        COUNT(latest.timeframe) - SUM(CASE WHEN latest.above_ema50 THEN 1 ELSE 0 END) AS below,
+        {PIVOT_COLUMNS}
+    FROM coins c
+    LEFT JOIN (
+        SELECT symbol, timeframe, current_price, ema50, pct_from_ema50, above_ema50,
+               ROW_NUMBER() OVER (PARTITION BY symbol, timeframe ORDER BY analysis_date DESC) AS rn
+        FROM ema_analysis
+    ) latest ON latest.symbol = c.symbol AND latest.rn = 1
+    GROUP BY c.symbol, c.name, c.market_cap_rank, c.current_price
+"""
+
+SCREEN_TABLE_SQL = f"SELECT * FROM ({SCREEN_SQL}) screen ORDER BY symbol"
+
+class ScreenError(ValueError):
+    """Bad screener expression, answered with a 400"""
+
+def tokenize(text):
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = TOKEN.match(text, position)
+        if not match or match.end() == position:
+            raise ScreenError(f"Unexpected input at position {position}: {text[position:position + 10]!r}")
+        symbol, number, word = match.groups()
+        if number is not None:
+            tokens.append(('number', float(number)))
+        elif word is not None:
+            tokens.append(('word', word.lower()))
+        else:
+            tokens.append(('symbol', symbol))
+        position = match.end()
+    return tokens
+
+class Parser:
+    """Recursive descent over the tokens, builds tuples: ('or' | 'and', [nodes]), ('cmp', field, op, value),
+    ('between', field, low, high), ('flag', name)"""
+
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None):
+        token = self.peek()
+        if token[0] is None or (kind and token[0] != kind) or (value is not None and token[1] != value):
+            expected = value or kind or 'more input'
+            found = token[1] if token[0] else 'end of expression'
+            raise ScreenError(f"Expected {expected}, found {found}")
+        self.position += 1
+        return token[1]
+
+    def parse(self):
+        if not self.tokens:
+            raise ScreenError("Empty expression")
+        node = self.expr()
+        if self.position < len(self.tokens):
+            raise ScreenError(f"Unexpected {self.peek()[1]}")
+        return node
+
+    def expr(self):
+        nodes = [self.term()]
+        while self.peek() == ('word', 'or'):
+            self.take()
+            nodes.append(self.term())
+        return nodes[0] if len(nodes) == 1 else ('or', nodes)
+
+    def term(self):
+        nodes = [self.factor()]
+        while self.peek() == ('word', 'and'):
+            self.take()
+            nodes.append(self.factor())
+        return nodes[0] if len(nodes) == 1 else ('and', nodes)
+
+    def factor(self):
+        if self.peek() == ('symbol', '('):
+            self.take()
+            node = self.expr()
+            self.take('symbol', ')')
+            return node
+
+        if self.peek()[0] != 'word':
+            found = self.peek()[1] if self.peek()[0] else 'end of expression'
+            raise ScreenError(f"Expected a field, found {found}")
+        name = self.take()
+        if name in FLAGS:
+            return ('flag', name)
+        if name not in FIELDS:
+            raise ScreenError(f"Unknown field '{name}'")
+
+        if self.peek() == ('word', 'between'):
+            self.take()
+            low = self.take('number')
+            self.take('word', 'and')
+            return ('between', name, low, self.take('number'))
+
+        op = self.take('symbol')
+        if op not in OPERATORS:
+            raise ScreenError(f"Expected a comparison after {name}, found {op}")
+        return ('cmp', name, op, self.take('number'))
+
+def parse(text):
+    return Parser(text).parse()
+
+def parse_sort(text):
+    """'-pct_1w,rank' -> [('pct_1w', True), ('rank', False)], (field, descending)"""
+    keys = []
+    for item in (text or '').split(','):
+        item = item.strip().lower()
+        if not item:
+            continue
+        descending = item.startswith('-')
+        field = item.lstrip('-+')
+        if field not in FIELDS:
+            raise ScreenError(f"Unknown sort field '{field}'")
+        keys.append((field, descending))
+    return keys
+
+def compile_sql(node, params):
+    """WHERE clause for `node` over SCREEN_SQL's columns, values appended to `params`"""
+    kind = node[0]
+    if kind in ('and', 'or'):
+        return '(' + f' {kind.upper()} '.join(compile_sql(child, params) for child in node[1]) + ')'
+    if kind == 'flag':
+        flag, tf = node[1].split('_', 1)
+        if flag == 'has':
+            return f"above_{tf} IS NOT NULL"
+        return f"above_{tf} = {1 if flag == 'above' else 0}"
+    if kind == 'between':
+        params.extend([node[2], node[3]])
+        return f"{FIELDS[node[1]]} BETWEEN %s AND %s"
+    params.append(node[3])
+    return f"{FIELDS[node[1]]} {'<>' if node[2] == '!=' else node[2]} %s"
+
+def screen_query(node, sort_keys, limit):
+    """(query, params) running a screen in the database"""
+    params = []
+    where = compile_sql(node, params)
+    order = [f"{FIELDS[field]} {'DESC' if descending else 'ASC'} NULLS LAST" for field, descending in sort_keys]
+    query = f"""
+        SELECT * FROM ({SCREEN_SQL}) screen
+        WHERE {where}
+        ORDER BY {', '.join(order + ['symbol'])}
+        LIMIT %s
+    """
+    params.append(limit)
+    return query, tuple(params)
+
+class ScreenTable:
+    """The SCREEN_SQL rows as NumPy columns (NaN for missing analysis), evaluated without the database"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.columns = {}
+        for column in set(FIELDS.values()) | {f"above_{tf}" for tf in TIMEFRAMES}:
+            self.columns[column] = np.array(
+                [np.nan if row[column] is None else row[column] for row in rows], dtype=np.float64
+            )
+
+    @classmethod
+    def from_analysis(cls, coins, analysis):
+        """Pivot rows from the snapshot's coins and latest analysis, like SCREEN_SQL"""
+        coins_by_symbol = {coin['symbol']: coin for coin in coins}
+        pivots = {}
+        for row in analysis:
+            coin = coins_by_symbol.get(row['symbol'])
+            if coin is None:
+                continue
+            pivot = pivots.get(row['symbol'])
+            if pivot is None:
+                pivot = pivots[row['symbol']] = cls.empty_row(coin)
+            tf = row['timeframe']
+            if tf not in TIMEFRAMES:
+                continue
+            pivot[f"pct_{tf}"] = row['pct_from_ema50']
+            pivot[f"ema_{tf}"] = row['ema50']
+            pivot[f"price_{tf}"] = row['current_price']
+            pivot[f"above_{tf}"] = 1 if row['above_ema50'] else 0
+            pivot['aligned' if row['above_ema50'] else 'below'] += 1
+
+        # Analysis arrives ordered by symbol, coins without any follow in rank order
+        rows = list(pivots.values()) + [cls.empty_row(coin) for coin in coins if coin['symbol'] not in pivots]
+        return cls(rows)
+
+    @staticmethod
+    def empty_row(coin):
+        row = {
+            'symbol': coin['symbol'],
+            'name': coin['name'],
+            'market_cap_rank': coin['market_cap_rank'],
+            'current_price': coin['current_price'],
+            'aligned': 0,
+            'below': 0
+        }
+        for tf in TIMEFRAMES:
+            row.update({f"pct_{tf}": None, f"ema_{tf}": None, f"price_{tf}": None, f"above_{tf}": None})
+        return row
+
+    def mask(self, node):
+        kind = node[0]
+        if kind == 'and':
+            return np.logical_and.reduce([self.mask(child) for child in node[1]])
+        if kind == 'or':
+            return np.logical_or.reduce([self.mask(child) for child in node[1]])
+        if kind == 'flag':
+            flag, tf = node[1].split('_', 1)
+            above = self.columns[f"above_{tf}"]
+            if flag == 'has':
+                return ~np.isnan(above)
+            return above == (1 if flag == 'above' else 0)
+
+        values = self.columns[FIELDS[node[1]]]
+        # NaN compares False, except with != which has to be excluded explicitly
+        known = ~np.isnan(values)
+        if kind == 'between':
+            return known & (values >= node[2]) & (values <= node[3])
+        return known & OPERATORS[node[2]](values, node[3])
+
+    def select(self, node, sort_keys=(), limit=None):
+        """Matching rows in table order, or by `sort_keys` then symbol"""
+        indices = np.flatnonzero(self.mask(node))
+        if sort_keys:
+            # lexsort takes the primary key last, missing values sort last either way
+            keys = [np.array([self.rows[i]['symbol'] for i in indices])]
+            for field, descending in reversed(sort_keys):
+                values = self.columns[FIELDS[field]][indices]
+                keys.append(-values if descending else values)
+                keys.append(np.isnan(values))
+            indices = indices[np.lexsort(keys)]
+        if limit is not None:
+            indices = indices[:limit]
+        return [self.rows[i] for i in indices]
+
+def screen_row(row):
+    """Response dict for a SCREEN_SQL / ScreenTable row, above_* as booleans"""
+    shaped = dict(row)
+    for tf in TIMEFRAMES:
+        above = shaped[f"above_{tf}"]
+        shaped[f"above_{tf}"] = None if above is None else bool(above)
+    return shaped
+
+def screen_payload(where, sort_keys, rows, preset=None):
+    return {
+        'preset': preset,
+        'where': where,
+        'sort': [('-' if descending else '') + field for field, descending in sort_keys],
+        'count': len(rows),
+        'coins': [screen_row(row) for row in rows]
+    }
+
+def weekly_coin(row):
+    above = row['above_1w']
+    return {
+        'symbol': row['symbol'],
+        'name': row['name'],
+        'market_cap_rank': row['market_cap_rank'],
+        'current_price': row['price_1w'],
+        'ema50': row['ema_1w'],
+        'pct_from_ema50': row['pct_1w'],
+        'above_ema50': None if above is None else bool(above)
+    }
+
+def strategic_summary(table):
+    """/api/strategic-summary body: the EVALUATE / TRADE NOW / AVOID presets, coins by symbol"""
+    lists = {name: table.select(parse(preset['where'])) for name, preset in PRESETS.items()}
+
+    def section(name, coins):
+        return {'count': len(coins), 'coins': coins, 'description': PRESETS[name]['description']}
+
+    return {
+        'evaluate_long_term': section('evaluate', [weekly_coin(row) for row in lists['evaluate']]),
+        'trade_now_short_term': section('trade_now', [
+            {**weekly_coin(row), 'four_h_pct_from_ema': row['pct_4h']} for row in lists['trade_now']
+        ]),
+        'avoid': section('avoid', [weekly_coin(row) for row in lists['avoid']])
+    }
@@ -7,6 +7,9 @@ import psycopg
 import os
 from datetime import datetime
 
+from storage import get_backend
+from watermarks import WATERMARKS_TABLE
+
 def setup_database(database_url):
     """Setup PostgreSQL database with all required tables"""
     
@@ -123,6 +126,39 @@ def setup_database(database_url):
             ON ema_analysis (symbol, timeframe, analysis_date DESC);
         """)
         
+        # Create worker job queue table (distributed workers)
+        print("\n🧵 Creating 'worker_jobs' table...")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS worker_jobs (
+                id BIGSERIAL PRIMARY KEY,
+                symbol TEXT NOT NULL,
+                timeframe TEXT NOT NULL,
+                window_start TIMESTAMPTZ NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 5,
+                run_after TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                locked_by TEXT,
+                lease_expires_at TIMESTAMPTZ,
+                started_at TIMESTAMPTZ,
+                finished_at TIMESTAMPTZ,
+                duration_ms INTEGER,
+                last_error TEXT,
+                created_at TIMESTAMPTZ DEFAULT NOW(),
+                UNIQUE(symbol, timeframe, window_start)
+            );
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_worker_jobs_claim 
+            ON worker_jobs (run_after) WHERE status IN ('pending', 'running');
+        """)
+        print("   ✅ Worker jobs table created")
+        
+        # Create data watermarks table (API ETag / Last-Modified)
+        print("\n🔖 Creating 'data_watermarks' table...")
+        cur.execute(WATERMARKS_TABLE)
+        print("   ✅ Data watermarks table created")
+        
         # Get table counts
         print("\n📊 Database Statistics:")
         cur.execute("SELECT COUNT(*) FROM candles;")
@@ -152,6 +188,15 @@ def setup_database(database_url):
 if __name__ == "__main__":
     # Get DATABASE_URL from environment or use default
     DATABASE_URL = os.getenv('DATABASE_URL')
+    backend = get_backend()
+    
+    if backend.name == 'sqlite':
+        print("=" * 60)
+        print(f"🪶 CRYPTO SCANNER DATABASE SETUP - {backend.describe()}")
+        print("=" * 60)
+        backend.setup()
+        print("\n✅ Database setup complete!")
+        exit(0)
     
     if not DATABASE_URL:
         print("❌ DATABASE_URL environment variable not found")
@@ -0,0 +1,80 @@
+"""
+Single-Flight Request Coalescing
+Concurrent calls with the same key share one execution: the first caller runs it, the
+rest wait for its result. Used by the API so a burst of identical requests (dashboards
+opening together, everyone polling right after a tick) costs one set of queries
+"""
+
+import threading
+
+class Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """In-flight calls by key, plus per-group counters of executions and coalesced callers"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.stats = {}
+        self.max_waiters = 0
+
+    def do(self, key, fn, group=None):
+        """(result, shared), `shared` is True when another caller's execution was reused"""
+        group = group or key
+
+        with self.lock:
+            stats = self.stats.setdefault(group, {'requests': 0, 'executions': 0, 'coalesced': 0})
+            stats['requests'] += 1
+
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = Call()
+                self.calls[key] = call
+                stats['executions'] += 1
+            else:
+                call.waiters += 1
+                stats['coalesced'] += 1
+                self.max_waiters = max(self.max_waiters, call.waiters)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            # Later arrivals start a fresh execution, they may need newer data
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+        return call.result, False
+
+    def get_stats(self):
+        with self.lock:
+            groups = {group: dict(stats) for group, stats in self.stats.items()}
+            in_flight = len(self.calls)
+
+        requests = sum(stats['requests'] for stats in groups.values())
+        coalesced = sum(stats['coalesced'] for stats in groups.values())
+
+        return {
+            'requests': requests,
+            'executions': sum(stats['executions'] for stats in groups.values()),
+            'coalesced': coalesced,
+            'coalesced_pct': round(coalesced / requests * 100, 1) if requests else 0,
+            'in_flight': in_flight,
+            'max_waiters': self.max_waiters,
+            'by_route': groups
+        }
@@ -0,0 +1,260 @@
+"""
+Storage Backends
+Postgres (DATABASE_URL) or an embedded SQLite file behind the same connect() interface,
+so the worker and API run on a single node without a database server
+"""
+
+import os
+import re
+import sqlite3
+from datetime import date, datetime, timezone
+
+from watermarks import WATERMARKS_TABLE
+
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+# 'postgres' or 'sqlite', defaults to sqlite when DATABASE_URL is a sqlite:/// URL
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND')
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'crypto_scanner.db')
+
+SQLITE_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",        # Readers never block the writer
+    "PRAGMA synchronous = NORMAL",      # Durable at checkpoints, plenty for re-fetchable candles
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",       # 64MB page cache
+    "PRAGMA mmap_size = 268435456",     # 256MB memory-mapped reads
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA foreign_keys = OFF"
+]
+
+# Fixed-width UTC text so timestamps compare correctly as strings
+SQLITE_NOW = "(strftime('%Y-%m-%d %H:%M:%S', 'now') || '.000000+00:00')"
+
+SQLITE_SCHEMA = [
+    # Clustered by series, a chart window is one contiguous range scan
+    # (the primary key also serves ON CONFLICT (time, symbol, timeframe))
+    """
+    CREATE TABLE IF NOT EXISTS candles (
+        time TIMESTAMPTZ NOT NULL,
+        symbol TEXT NOT NULL,
+        timeframe TEXT NOT NULL,
+        open DOUBLE PRECISION,
+        high DOUBLE PRECISION,
+        low DOUBLE PRECISION,
+        close DOUBLE PRECISION,
+        volume DOUBLE PRECISION,
+        ema50 DOUBLE PRECISION,
+        created_at TIMESTAMPTZ DEFAULT {now},
+        PRIMARY KEY (symbol, timeframe, time)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_candles_time ON candles (time DESC)",
+    """
+    CREATE TABLE IF NOT EXISTS coins (
+        symbol TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        market_cap_rank INTEGER,
+        market_cap DOUBLE PRECISION,
+        current_price DOUBLE PRECISION,
+        binance_symbol TEXT,
+        data_source TEXT,
+        last_updated TIMESTAMPTZ DEFAULT {now},
+        created_at TIMESTAMPTZ DEFAULT {now}
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS current_prices (
+        symbol TEXT PRIMARY KEY,
+        price DOUBLE PRECISION NOT NULL,
+        price_change_24h DOUBLE PRECISION,
+        volume_24h DOUBLE PRECISION,
+        last_updated TIMESTAMPTZ DEFAULT {now}
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS scan_history (
+        id INTEGER PRIMARY KEY,
+        scan_date TIMESTAMPTZ NOT NULL,
+        top_n INTEGER NOT NULL,
+        coins_scanned INTEGER NOT NULL,
+        coins_above_weekly INTEGER,
+        coins_below_weekly INTEGER,
+        coins_above_daily INTEGER,
+        coins_below_daily INTEGER,
+        scan_duration_seconds INTEGER,
+        created_at TIMESTAMPTZ DEFAULT {now}
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ema_analysis (
+        id INTEGER PRIMARY KEY,
+        symbol TEXT NOT NULL,
+        timeframe TEXT NOT NULL,
+        current_price DOUBLE PRECISION,
+        ema50 DOUBLE PRECISION,
+        pct_from_ema50 DOUBLE PRECISION,
+        above_ema50 BOOLEAN,
+        analysis_date TIMESTAMPTZ NOT NULL,
+        created_at TIMESTAMPTZ DEFAULT {now},
+        UNIQUE (symbol, timeframe, analysis_date)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_ema_analysis_lookup ON ema_analysis (symbol, timeframe, analysis_date DESC)",
+    WATERMARKS_TABLE
+]
+
+TIMESTAMP_TEXT = re.compile(r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{6}\+00:00$')
+
+def adapt_datetime(value):
+    """Naive datetimes are local time, like a Postgres session would read them"""
+    return value.astimezone(timezone.utc).isoformat(sep=' ', timespec='microseconds')
+
+def adapt_date(value):
+    return adapt_datetime(datetime(value.year, value.month, value.day, tzinfo=timezone.utc))
+
+sqlite3.register_adapter(datetime, adapt_datetime)
+sqlite3.register_adapter(date, adapt_date)
+sqlite3.register_converter('TIMESTAMPTZ', lambda raw: datetime.fromisoformat(raw.decode()))
+sqlite3.register_converter('BOOLEAN', lambda raw: raw not in (b'0', b''))
+
+def convert_value(value):
+    """Aggregates (MIN/MAX of a timestamp) lose their declared type, parse them here"""
+    if isinstance(value, str) and TIMESTAMP_TEXT.match(value):
+        return datetime.fromisoformat(value)
+    return value
+
+class SQLiteCursor:
+    """DB-API cursor that accepts the %s placeholders and NOW() the Postgres queries use"""
+
+    translations = {}
+
+    def __init__(self, cursor, dict_rows=False):
+        self.cursor = cursor
+        self.dict_rows = dict_rows
+
+    @classmethod
+    def translate(cls, query):
+        translated = cls.translations.get(query)
+        if translated is None:
+            translated = query.replace('%s', '?').replace('NOW()', SQLITE_NOW)
+            cls.translations[query] = translated
+        return translated
+
+    def execute(self, query, params=()):
+        self.cursor.execute(self.translate(query), params)
+        return self
+
+    def executemany(self, query, params_seq):
+        self.cursor.executemany(self.translate(query), params_seq)
+        return self
+
+    def convert(self, row):
+        if row is None:
+            return None
+        values = [convert_value(value) for value in row]
+        if self.dict_rows:
+            return dict(zip([column[0] for column in self.cursor.description], values))
+        return tuple(values)
+
+    def fetchone(self):
+        return self.convert(self.cursor.fetchone())
+
+    def fetchall(self):
+        return [self.convert(row) for row in self.cursor.fetchall()]
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    def close(self):
+        self.cursor.close()
+
+class SQLiteConnection:
+    def __init__(self, conn, dict_rows=False):
+        self.conn = conn
+        self.dict_rows = dict_rows
+
+    def cursor(self):
+        return SQLiteCursor(self.conn.cursor(), self.dict_rows)
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+class SQLiteBackend:
+    name = 'sqlite'
+    supports_job_queue = False  # No SKIP LOCKED / advisory locks, single node only
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+
+    @property
+    def configured(self):
+        return bool(self.path)
+
+    def describe(self):
+        return f"SQLite ({self.path})"
+
+    def connect(self, dict_rows=False):
+        # Long-lived connections (watermarks.WatermarkReader) move between request threads behind their own lock
+        conn = sqlite3.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES, timeout=30, check_same_thread=False)
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        return SQLiteConnection(conn, dict_rows)
+
+    def setup(self):
+        conn = self.connect()
+        cur = conn.cursor()
+        for statement in SQLITE_SCHEMA:
+            cur.execute(statement.format(now=SQLITE_NOW))
+        conn.commit()
+        cur.close()
+        conn.close()
+
+class PostgresBackend:
+    name = 'postgres'
+    supports_job_queue = True
+
+    def __init__(self, database_url=DATABASE_URL):
+        self.database_url = database_url
+
+    @property
+    def configured(self):
+        return bool(self.database_url)
+
+    def describe(self):
+        return "PostgreSQL"
+
+    def connect(self, dict_rows=False):
+        import psycopg
+        from psycopg.rows import dict_row
+
+        if dict_rows:
+            return psycopg.connect(self.database_url, row_factory=dict_row)
+        return psycopg.connect(self.database_url)
+
+    def setup(self):
+        from setup_database import setup_database
+        return setup_database(self.database_url)
+
+def get_backend(name=None):
+    """Backend from STORAGE_BACKEND / DATABASE_URL"""
+    name = name or STORAGE_BACKEND
+    if not name:
+        name = 'sqlite' if (DATABASE_URL or '').startswith('sqlite:') else 'postgres'
+
+    if name == 'sqlite':
+        if (DATABASE_URL or '').startswith('sqlite:'):
+            return SQLiteBackend(DATABASE_URL.split(':///', 1)[-1])
+        return SQLiteBackend()
+
+    return PostgresBackend()
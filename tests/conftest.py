@@ -0,0 +1,117 @@
+"""
+Tests import the repo's top-level modules directly. Postgres-only tests run against
+TEST_DATABASE_URL, each in a throwaway schema, and are skipped without it; API tests run
+api_server_with_db over a temporary SQLite database
+"""
+
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+
+@pytest.fixture
+def postgres_url():
+    """Connection string whose search_path is a fresh schema holding setup_database's tables"""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL not set")
+
+    import psycopg
+    from psycopg.conninfo import make_conninfo
+
+    from setup_database import setup_database
+
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    with psycopg.connect(TEST_DATABASE_URL, autocommit=True) as conn:
+        conn.execute(f"CREATE SCHEMA {schema}")
+
+    url = make_conninfo(TEST_DATABASE_URL, options=f"-c search_path={schema}")
+    try:
+        setup_database(url)
+        yield url
+    finally:
+        with psycopg.connect(TEST_DATABASE_URL, autocommit=True) as conn:
+            conn.execute(f"DROP SCHEMA {schema} CASCADE")
+
+CANDLES_START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+INSERT_CANDLE = """
+    INSERT INTO candles (time, symbol, timeframe, open, high, low, close, volume, ema50)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+def insert_hours(backend, first, count, symbol='BTC'):
+    """1h candles `first` .. `first + count` hours after CANDLES_START, bumping their watermark"""
+    from watermarks import bump_watermarks
+
+    conn = backend.connect()
+    cur = conn.cursor()
+    cur.executemany(INSERT_CANDLE, [
+        (CANDLES_START + timedelta(hours=i), symbol, '1h', 100 + i, 110 + i, 90 + i, 101 + i, 1.0, None)
+        for i in range(first, first + count)
+    ])
+    bump_watermarks(cur, ['candles:1h'])
+    conn.commit()
+    cur.close()
+    conn.close()
+
+COINS = [
+    # symbol, name, rank, price, {timeframe: pct_from_ema50}
+    ('BTC', 'Bitcoin', 1, 220.0, {'1w': 12.0, '1d': 4.0, '4h': -1.0}),
+    ('ETH', 'Ethereum', 2, 110.0, {'1w': -6.0, '1d': -2.5, '4h': 0.8}),
+    ('SOL', 'Solana', 3, 55.0, {'1w': 30.0, '1d': 9.0, '4h': 3.0}),
+]
+
+def insert_market(backend):
+    """COINS into coins, current_prices and one ema_analysis row per timeframe, bumping their watermarks"""
+    from watermarks import bump_watermarks
+
+    conn = backend.connect()
+    cur = conn.cursor()
+    for symbol, name, rank, price, pcts in COINS:
+        cur.execute(
+            "INSERT INTO coins (symbol, name, market_cap_rank, market_cap, current_price, binance_symbol, data_source) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            (symbol, name, rank, price * 1e6, price, f"{symbol}USDT", 'binance')
+        )
+        cur.execute(
+            "INSERT INTO current_prices (symbol, price, price_change_24h, volume_24h) VALUES (%s, %s, %s, %s)",
+            (symbol, price, 1.5, 1e6)
+        )
+        for timeframe, pct in pcts.items():
+            ema50 = round(price / (1 + pct / 100), 6)
+            cur.execute(
+                "INSERT INTO ema_analysis (symbol, timeframe, current_price, ema50, pct_from_ema50, above_ema50, analysis_date) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                (symbol, timeframe, price, ema50, pct, pct > 0, CANDLES_START)
+            )
+    bump_watermarks(cur, ['coins'] + [f"ema_analysis:{timeframe}" for timeframe in COINS[0][4]])
+    conn.commit()
+    cur.close()
+    conn.close()
+
+@pytest.fixture
+def sqlite_api(tmp_path, monkeypatch):
+    """api_server_with_db on a fresh SQLite database holding 120 BTC 1h candles, with empty caches"""
+    import api_server_with_db as api
+    from compression import ResponseCompressor
+    from storage import SQLiteBackend
+    from watermarks import WatermarkReader
+
+    backend = SQLiteBackend(str(tmp_path / 'candles.db'))
+    backend.setup()
+    insert_hours(backend, 0, 120)
+
+    monkeypatch.setattr(api, 'storage_backend', backend)
+    monkeypatch.setattr(api, 'watermark_reader', WatermarkReader(backend, cache_seconds=0))
+    monkeypatch.setattr(api, 'series_cache', api.SeriesCache())
+    monkeypatch.setattr(api, 'derived_cache', api.SeriesCache())
+    # The hook installed at import keeps its instance, swap its cache and counters instead
+    monkeypatch.setattr(api.compressor, 'cache', ResponseCompressor().cache)
+    monkeypatch.setattr(api.compressor, 'stats', ResponseCompressor().stats)
+    return api, backend
@@ -0,0 +1,86 @@
+"""The in-process analysis snapshot: same documents as the database path, rebuilt on new watermarks"""
+
+import json
+from datetime import timedelta
+
+import pytest
+
+from analysis_snapshot import AnalysisSnapshotStore
+from conftest import CANDLES_START, insert_market
+
+PATHS = [
+    '/api/coins',
+    '/api/coins/BTC',
+    '/api/coins/NOPE',
+    '/api/ema-analysis/BTC',
+    '/api/ema-analysis/NOPE',
+    '/api/ema-analysis/all?timeframe=1d',
+    '/api/ema-analysis/all?timeframe=15m',
+    '/api/strategic-summary',
+]
+
+@pytest.fixture
+def market(sqlite_api):
+    api, backend = sqlite_api
+    insert_market(backend)
+    # An older analysis row the snapshot must not pick
+    conn = backend.connect()
+    conn.cursor().execute(
+        "INSERT INTO ema_analysis (symbol, timeframe, current_price, ema50, pct_from_ema50, above_ema50, analysis_date) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+        ('BTC', '1d', 150.0, 200.0, -25.0, False, CANDLES_START - timedelta(days=1))
+    )
+    conn.commit()
+    conn.close()
+    return api, backend
+
+def answers(api):
+    client = api.app.test_client()
+    responses = {path: client.get(path) for path in PATHS}
+    return {path: (response.status_code, response.get_json()) for path, response in responses.items()}
+
+def test_snapshot_serves_the_database_documents(market, monkeypatch):
+    api, backend = market
+    from_database = answers(api)
+    daily = from_database['/api/ema-analysis/all?timeframe=1d'][1]['above_ema50']['coins']
+    assert {coin['symbol']: coin['pct_from_ema50'] for coin in daily}['BTC'] == 4.0
+
+    store = AnalysisSnapshotStore(backend)
+    store.refresh('test')
+    monkeypatch.setattr(api, 'analysis_snapshot', store)
+    # Nothing but the (already connected) watermark reader may reach the database now
+    monkeypatch.setattr(backend, 'connect', lambda *a, **k: pytest.fail("snapshot request hit the database"))
+
+    assert answers(api) == from_database
+
+def test_bodies_are_rendered_once(market):
+    _, backend = market
+    store = AnalysisSnapshotStore(backend)
+    store.refresh('test')
+    snapshot = store.current
+
+    assert snapshot.body(('coin', 'BTC')) is snapshot.body(('coin', 'BTC'))
+    assert json.loads(snapshot.body('coins'))['total'] == 3
+    assert snapshot.body(('coin', 'NOPE')) is None
+    # Unanalysed timeframes still list, empty
+    assert json.loads(snapshot.body(('ema_analysis_all', '15m')))['total'] == 0
+
+def test_new_watermarks_make_it_stale(market):
+    _, backend = market
+    store = AnalysisSnapshotStore(backend)
+    assert store.is_stale()
+    store.refresh('test')
+    assert not store.is_stale()
+    before = store.current
+
+    from watermarks import bump_watermarks
+    conn = backend.connect()
+    bump_watermarks(conn.cursor(), ['ema_analysis:1d'])
+    conn.commit()
+    conn.close()
+
+    assert store.is_stale()
+    store.refresh('watermark')
+    assert store.current is not before
+    assert store.stats['builds'] == 2
+    assert store.stats['last_reason'] == 'watermark'
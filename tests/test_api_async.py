@@ -0,0 +1,73 @@
+"""The Quart server answers the same documents as the Flask one, off the same PostgreSQL data"""
+
+import asyncio
+
+import pytest
+
+from conftest import insert_hours, insert_market
+
+pytest.importorskip('quart')
+
+PATHS = [
+    '/api/coins',
+    '/api/coins/BTC',
+    '/api/coins/NOPE',
+    '/api/ema-analysis/ETH',
+    '/api/ema-analysis/all?timeframe=1d',
+    '/api/coins/BTC/details',
+    '/api/candles/BTC?timeframe=1h&limit=50',
+    '/api/candles/BTC?timeframe=1h&limit=20&cursor=bad',
+    '/api/strategic-summary',
+    '/api/current-prices',
+]
+
+@pytest.fixture
+def servers(postgres_url, monkeypatch):
+    import api_server_async
+    import api_server_with_db
+    from storage import PostgresBackend
+    from watermarks import WatermarkReader
+
+    backend = PostgresBackend(postgres_url)
+    insert_hours(backend, 0, 120)
+    insert_market(backend)
+
+    monkeypatch.setattr(api_server_with_db, 'storage_backend', backend)
+    monkeypatch.setattr(api_server_with_db, 'watermark_reader', WatermarkReader(backend, cache_seconds=0))
+    monkeypatch.setattr(api_server_async, 'storage_backend', backend)
+    monkeypatch.setattr(api_server_async, 'DATABASE_URL', postgres_url)
+    return api_server_with_db.app, api_server_async.app
+
+async def fetch_async(app, paths):
+    answers = {}
+    async with app.test_app() as test_app:
+        client = test_app.test_client()
+        for path in paths:
+            response = await client.get(path)
+            answers[path] = (response.status_code, await response.get_json())
+    return answers
+
+def test_routes_match_the_flask_server(servers):
+    flask_app, quart_app = servers
+    client = flask_app.test_client()
+    expected = {}
+    for path in PATHS:
+        response = client.get(path)
+        expected[path] = (response.status_code, response.get_json())
+
+    answers = asyncio.run(fetch_async(quart_app, PATHS))
+    for path in PATHS:
+        assert answers[path] == expected[path], path
+
+    assert all(status != 500 for status, _ in answers.values())
+    assert answers['/api/coins'][1]['total'] == 3
+    assert answers['/api/coins/NOPE'][0] == 404
+    assert answers['/api/candles/BTC?timeframe=1h&limit=20&cursor=bad'][0] == 400
+
+def test_refuses_to_start_without_postgres(monkeypatch, tmp_path):
+    import api_server_async
+    from storage import SQLiteBackend
+
+    monkeypatch.setattr(api_server_async, 'storage_backend', SQLiteBackend(str(tmp_path / 'scanner.db')))
+    with pytest.raises(RuntimeError, match='needs PostgreSQL'):
+        asyncio.run(api_server_async.open_pool())
@@ -0,0 +1,87 @@
+"""Batch endpoints: argument checks, request-ordered grouping and the streamed bodies, on both backends"""
+
+import json
+
+import pytest
+
+import batch_queries
+from batch_queries import BatchError, grouped, parse_candle_batch, request_order, split_arg, stream_items
+from conftest import insert_hours, insert_market
+
+CANDLES = '/api/candles/batch?symbols=eth,BTC,NOPE,btc&timeframes=1h,4h&limit=3'
+
+def test_split_arg():
+    assert split_arg('BTC, eth,BTC,,') == ['BTC', 'eth']
+    assert split_arg(None) == []
+
+@pytest.mark.parametrize('args, message', [
+    ({}, 'symbols is required'),
+    ({'symbols': 'BTC', 'timeframes': '1h,2h'}, 'Unknown timeframes 2h'),
+    ({'symbols': 'BTC', 'limit': 'x'}, 'Invalid limit'),
+    ({'symbols': 'BTC', 'limit': '0'}, 'at least 1'),
+])
+def test_bad_arguments(args, message):
+    with pytest.raises(BatchError, match=message):
+        parse_candle_batch(args)
+
+def test_too_many_symbols(monkeypatch):
+    monkeypatch.setattr(batch_queries, 'BATCH_MAX_SYMBOLS', 2)
+    with pytest.raises(BatchError, match='At most 2'):
+        parse_candle_batch({'symbols': 'A,B,C'})
+    assert parse_candle_batch({'symbols': 'a,b', 'timeframe': '4h'}) == (['A', 'B'], ['4h'], 100)
+
+def test_grouping_follows_the_request():
+    rows = [('BTC', 1), ('BTC', 2), ('ETH', 3)]
+    ordered = request_order(rows, ['ETH', 'SOL', 'BTC'], key=lambda row: row[0])
+    assert ordered == [('ETH', 3), ('BTC', 1), ('BTC', 2)]
+    assert list(grouped(iter(ordered), ['ETH', 'SOL', 'BTC'], key=lambda row: row[0])) == [
+        ('ETH', [('ETH', 3)]), ('SOL', []), ('BTC', [('BTC', 1), ('BTC', 2)])
+    ]
+
+def test_stream_items_is_one_document():
+    body = b''.join(stream_items('series', [('a', b'{"x":1}'), ('b', None), ('c', b'{"x":2}')]))
+    assert json.loads(body) == {'series': [{'x': 1}, {'x': 2}], 'missing': ['b'], 'count': 2}
+    assert json.loads(b''.join(stream_items('series', []))) == {'series': [], 'missing': [], 'count': 0}
+
+def check_candles_batch(client):
+    body = client.get(CANDLES).get_json()
+    assert [(series['symbol'], series['timeframe']) for series in body['series']] == [('BTC', '1h')]
+    assert body['missing'] == [['ETH', '1h'], ['ETH', '4h'], ['BTC', '4h'], ['NOPE', '1h'], ['NOPE', '4h']]
+    # The newest three, oldest first, same candles as the single-series endpoint
+    single = client.get('/api/candles/BTC?timeframe=1h&limit=3').get_json()['candles']
+    assert body['series'][0]['candles'] == single
+
+def test_candles_batch_on_sqlite(sqlite_api):
+    api, backend = sqlite_api
+    insert_hours(backend, 0, 5, symbol='ETH')
+    body = api.app.test_client().get(CANDLES).get_json()
+    assert [(series['symbol'], series['timeframe']) for series in body['series']] == [('ETH', '1h'), ('BTC', '1h')]
+    assert [candle['close'] for candle in body['series'][0]['candles']] == [103, 104, 105]
+
+def test_missing_series_are_listed(sqlite_api):
+    api, _ = sqlite_api
+    check_candles_batch(api.app.test_client())
+
+def test_analysis_batch_matches_the_single_endpoint(sqlite_api):
+    api, backend = sqlite_api
+    insert_market(backend)
+    client = api.app.test_client()
+
+    body = client.get('/api/ema-analysis/batch?symbols=SOL,NOPE,BTC').get_json()
+    assert body['missing'] == ['NOPE']
+    assert body['analysis'] == [client.get(f'/api/ema-analysis/{symbol}').get_json() for symbol in ('SOL', 'BTC')]
+    assert client.get('/api/ema-analysis/batch').status_code == 400
+
+def test_candles_batch_on_postgres(postgres_url, monkeypatch):
+    import api_server_with_db as api
+    from storage import PostgresBackend
+    from watermarks import WatermarkReader
+
+    backend = PostgresBackend(postgres_url)
+    insert_hours(backend, 0, 10)
+    monkeypatch.setattr(api, 'storage_backend', backend)
+    monkeypatch.setattr(api, 'watermark_reader', WatermarkReader(backend, cache_seconds=0))
+    # Read through the server-side cursor a couple of rows at a time
+    monkeypatch.setattr(api, 'BATCH_FETCH_ROWS', 2)
+
+    check_candles_batch(api.app.test_client())
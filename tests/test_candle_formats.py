@@ -0,0 +1,98 @@
+"""Candle payload formats: negotiation, and json / columnar / msgpack / arrow carrying the same candles"""
+
+import numpy as np
+import pytest
+from werkzeug.datastructures import MIMEAccept
+
+import candle_formats
+from candle_formats import negotiate, records_to_columns, rows_to_columns
+from conftest import CANDLES_START
+from mmap_candle_store import DTYPE, to_ms
+
+PATH = '/api/candles/BTC?timeframe=1h&limit=5'
+
+def test_negotiate():
+    assert negotiate(None, MIMEAccept()) == ('json', None)
+    assert negotiate('Columnar', MIMEAccept()) == ('columnar', None)
+    assert negotiate(None, MIMEAccept([('application/vnd.apache.arrow.stream', 1)]))[0] == 'arrow'
+    assert negotiate(None, MIMEAccept([('application/x-msgpack', 1), ('application/json', 0.5)]))[0] == 'msgpack'
+    assert negotiate(None, MIMEAccept([('text/html', 1)])) == ('json', None)
+
+    fmt, error = negotiate('xml', MIMEAccept())
+    assert fmt is None and 'Unknown format' in error
+
+def test_missing_library_is_an_error(monkeypatch):
+    monkeypatch.setattr(candle_formats, 'msgpack', None)
+    assert negotiate('msgpack', MIMEAccept()) == (None, "Format 'msgpack' is not available on this server")
+
+def test_rows_and_records_to_columns():
+    rows = [(CANDLES_START, 1.0, 2.0, 0.5, 1.5, 10.0, None), (CANDLES_START.replace(hour=1), 1.5, 2.5, 1.0, 2.0, 5.0, 1.8)]
+    columns = rows_to_columns(rows)
+    assert columns['time'] == [to_ms(CANDLES_START), to_ms(CANDLES_START) + 3_600_000]
+    assert columns['close'] == [1.5, 2.0]
+    assert columns['ema50'] == [None, 1.8]
+    assert rows_to_columns([]) == {name: [] for name in candle_formats.COLUMNS}
+
+    records = np.zeros(2, dtype=DTYPE)
+    records['time'] = columns['time']
+    records['close'] = columns['close']
+    records['ema50'] = [np.nan, 1.8]
+    assert records_to_columns(records)['ema50'] == [None, 1.8]
+    assert records_to_columns(records)['time'] == columns['time']
+
+def expected_columns(api):
+    candles = api.app.test_client().get(PATH).get_json()['candles']
+    return candles, {
+        'time': [to_ms(CANDLES_START.replace(day=5)) + h * 3_600_000 for h in range(19, 24)],
+        'close': [candle['close'] for candle in candles],
+    }
+
+def test_columnar_carries_the_json_candles(sqlite_api):
+    api, _ = sqlite_api
+    candles, expected = expected_columns(api)
+    assert [candle['close'] for candle in candles] == [216, 217, 218, 219, 220]
+
+    body = api.app.test_client().get(PATH + '&format=columnar').get_json()
+    assert body['count'] == 5
+    assert body['candles']['time'] == expected['time']
+    assert body['candles']['close'] == expected['close']
+    assert body['candles']['ema50'] == [None] * 5
+
+def test_msgpack(sqlite_api):
+    msgpack = pytest.importorskip('msgpack')
+    api, _ = sqlite_api
+    _, expected = expected_columns(api)
+
+    response = api.app.test_client().get(PATH, headers={'Accept': 'application/msgpack'})
+    assert response.mimetype == 'application/msgpack'
+    assert 'Accept' in response.vary
+    payload = msgpack.unpackb(response.get_data())
+    assert payload['candles']['time'] == expected['time']
+    assert payload['candles']['close'] == expected['close']
+
+def test_arrow(sqlite_api):
+    pa = pytest.importorskip('pyarrow')
+    api, _ = sqlite_api
+    _, expected = expected_columns(api)
+
+    response = api.app.test_client().get(PATH + '&format=arrow')
+    assert response.mimetype == 'application/vnd.apache.arrow.stream'
+    table = pa.ipc.open_stream(response.get_data()).read_all()
+    assert table.schema.field('time').type == pa.timestamp('ms', tz='UTC')
+    assert table.schema.metadata[b'symbol'] == b'BTC'
+    assert table.column('time').cast(pa.int64()).to_pylist() == expected['time']
+    assert table.column('close').to_pylist() == expected['close']
+    assert table.column('ema50').null_count == 5
+
+def test_each_representation_has_its_own_etag(sqlite_api):
+    api, _ = sqlite_api
+    client = api.app.test_client()
+    json_etag = client.get(PATH).get_etag()[0]
+    arrow_etag = client.get(PATH, headers={'Accept': 'application/vnd.apache.arrow.stream'}).get_etag()[0]
+    assert json_etag != arrow_etag
+
+def test_unknown_format_is_406(sqlite_api):
+    api, _ = sqlite_api
+    response = api.app.test_client().get(PATH + '&format=xml')
+    assert response.status_code == 406
+    assert 'Unknown format' in response.get_json()['error']
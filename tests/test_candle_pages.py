@@ -0,0 +1,109 @@
+"""Keyset pagination over candles: cursors, bounds and the memory-mapped store answering the same pages"""
+
+from datetime import timedelta
+from email.utils import parsedate_to_datetime
+
+import pytest
+
+from candle_pages import PageError, encode_cursor, parse_page, parse_time
+from conftest import CANDLES_START
+from mmap_candle_store import MmapCandleStore, rows_to_records, to_ms
+
+def test_parse_time():
+    assert parse_time(str(to_ms(CANDLES_START)), 'before') == CANDLES_START
+    assert parse_time('2025-01-01T00:00:00Z', 'before') == CANDLES_START
+    with pytest.raises(PageError, match="Invalid 'to' time"):
+        parse_time('yesterday', 'to')
+
+@pytest.mark.parametrize('args, message', [
+    ({'limit': 'x'}, 'Invalid limit'),
+    ({'limit': '0'}, 'at least 1'),
+    ({'before': '0', 'after': '0'}, 'either'),
+    ({'cursor': 'not-a-cursor'}, 'Invalid cursor'),
+])
+def test_bad_arguments(args, message):
+    with pytest.raises(PageError, match=message):
+        parse_page(args, 'BTC', '1h')
+
+def test_cursor_is_bound_to_its_series():
+    page = parse_page({'before': str(to_ms(CANDLES_START))}, 'BTC', '1h')
+    cursor = encode_cursor('BTC', '1h', page, CANDLES_START)
+    assert parse_page({'cursor': cursor}, 'BTC', '1h')['before'] == CANDLES_START
+    with pytest.raises(PageError, match='different symbol'):
+        parse_page({'cursor': cursor}, 'ETH', '1h')
+
+def test_direction():
+    assert not parse_page({}, 'BTC', '1h')['forward']
+    assert parse_page({'after': '0'}, 'BTC', '1h')['forward']
+    assert parse_page({'from': '0'}, 'BTC', '1h')['forward']
+    assert not parse_page({'from': '0', 'to': '1'}, 'BTC', '1h')['forward']
+    assert not parse_page({'limit': '5'}, 'BTC', '1h')['paged']
+
+def candle_hours(body):
+    """Hours after CANDLES_START of a response's candles (times come back as HTTP dates)"""
+    return [(parsedate_to_datetime(candle['time']) - CANDLES_START) // timedelta(hours=1) for candle in body['candles']]
+
+def follow(client, url, limit):
+    """Hours of each page, following next_cursor to the end"""
+    pages = []
+    while True:
+        body = client.get(url).get_json()
+        pages.append(candle_hours(body))
+        if body['next_cursor'] is None:
+            assert not body['has_more']
+            return pages
+        url = f"/api/candles/BTC?timeframe=1h&limit={limit}&cursor={body['next_cursor']}"
+
+def test_walks_back_through_history(sqlite_api):
+    api, _ = sqlite_api
+    pages = follow(api.app.test_client(), '/api/candles/BTC?timeframe=1h&limit=50', 50)
+    assert [len(page) for page in pages] == [50, 50, 20]
+    assert pages[0] == list(range(70, 120))  # Oldest first within a page
+    assert sum(reversed(pages), []) == list(range(120))
+
+def test_walks_forward_within_bounds(sqlite_api):
+    api, _ = sqlite_api
+    start, end = (to_ms(CANDLES_START + timedelta(hours=h)) for h in (10, 44))
+    pages = follow(api.app.test_client(), f'/api/candles/BTC?timeframe=1h&limit=10&from={start}', 10)
+    assert pages[0] == list(range(10, 20))
+    assert sum(pages, []) == list(range(10, 120))
+
+    # Inclusive range, the cursor keeps both bounds
+    pages = follow(api.app.test_client(), f'/api/candles/BTC?timeframe=1h&limit=10&from={start}&to={end}', 10)
+    assert sum(reversed(pages), []) == list(range(10, 45))
+
+def test_past_the_end_is_an_empty_page(sqlite_api):
+    api, _ = sqlite_api
+    body = api.app.test_client().get(f'/api/candles/BTC?timeframe=1h&after={to_ms(CANDLES_START + timedelta(days=30))}').get_json()
+    assert body['candles'] == [] and body['next_cursor'] is None
+    assert api.app.test_client().get('/api/candles/BTC?timeframe=1h').status_code == 200
+    assert api.app.test_client().get('/api/candles/NOPE?timeframe=1h').status_code == 404
+
+def test_store_answers_the_same_pages(sqlite_api, tmp_path, monkeypatch):
+    api, backend = sqlite_api
+    client = api.app.test_client()
+    urls = [
+        '/api/candles/BTC?timeframe=1h&limit=50',
+        f'/api/candles/BTC?timeframe=1h&limit=10&before={to_ms(CANDLES_START + timedelta(hours=60))}',
+        f'/api/candles/BTC?timeframe=1h&limit=10&after={to_ms(CANDLES_START + timedelta(hours=100))}',
+    ]
+    from_database = [client.get(url).get_json() for url in urls]
+
+    # The store holds the recent tail only, older pages still go to the database
+    conn = backend.connect()
+    cur = conn.cursor()
+    cur.execute("SELECT time, open, high, low, close, volume, ema50 FROM candles WHERE time >= %s ORDER BY time",
+                (CANDLES_START + timedelta(hours=40),))
+    store = MmapCandleStore(str(tmp_path / 'mmap'))
+    store.write('BTC', '1h', rows_to_records(cur.fetchall()))
+    conn.close()
+    monkeypatch.setattr(api, 'candle_store', store)
+    connects = []
+    connect = backend.connect
+    monkeypatch.setattr(backend, 'connect', lambda *a, **k: connects.append(1) or connect(*a, **k))
+
+    assert [client.get(url).get_json() for url in urls] == from_database
+    assert connects == []
+    older = client.get(f'/api/candles/BTC?timeframe=1h&limit=10&before={to_ms(CANDLES_START + timedelta(hours=45))}').get_json()
+    assert candle_hours(older) == list(range(35, 45))
+    assert connects == [1]
@@ -0,0 +1,107 @@
+"""Downsampled chart series: OHLC buckets, LTTB, argument checks and the per-watermark cache"""
+
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from candle_pages import PageError
+from candle_series import SeriesCache, downsample, lttb_indices, ohlc_buckets, parse_series
+from conftest import CANDLES_START
+from mmap_candle_store import DTYPE, to_ms
+
+def records(closes):
+    out = np.zeros(len(closes), dtype=DTYPE)
+    out['time'] = np.arange(len(closes)) * 3_600_000
+    out['open'] = closes
+    out['high'] = np.asarray(closes) + 1
+    out['low'] = np.asarray(closes) - 1
+    out['close'] = closes
+    out['volume'] = 1.0
+    out['ema50'] = np.nan
+    return out
+
+@pytest.mark.parametrize('args, message', [
+    ({'points': 'x'}, 'Invalid points'),
+    ({'points': '2'}, 'at least 3'),
+    ({'mode': 'spline'}, 'Unknown mode'),
+    ({'from': '2000', 'to': '1000'}, 'after'),
+])
+def test_bad_arguments(args, message):
+    with pytest.raises(PageError, match=message):
+        parse_series(args)
+
+def test_points_are_capped():
+    assert parse_series({'points': '10000000', 'mode': 'LTTB'})[2:] == (5000, 'lttb')
+
+def test_ohlc_buckets():
+    buckets = ohlc_buckets(records([float(i) for i in range(10)]), 3)
+    # Runs [0..2], [3..5], [6..9]
+    assert buckets['time'].tolist() == [0, 3 * 3_600_000, 6 * 3_600_000]
+    assert buckets['open'].tolist() == [0, 3, 6]
+    assert buckets['high'].tolist() == [3, 6, 10]
+    assert buckets['low'].tolist() == [-1, 2, 5]
+    assert buckets['close'].tolist() == [2, 5, 9]
+    assert buckets['volume'].tolist() == [3, 3, 4]
+
+    short = records([1.0, 2.0])
+    assert ohlc_buckets(short, 3) is short
+
+def test_lttb_keeps_the_ends_and_the_spikes():
+    closes = np.zeros(100)
+    closes[37] = 50.0
+    closes[71] = -50.0
+    picked = lttb_indices(np.arange(100), closes, 10)
+
+    assert len(picked) == 10
+    assert picked[0] == 0 and picked[-1] == 99
+    assert {37, 71} <= set(picked.tolist())
+    assert picked.tolist() == sorted(picked.tolist())
+    assert lttb_indices(np.arange(5), np.zeros(5), 10).tolist() == [0, 1, 2, 3, 4]
+
+def test_lttb_columns():
+    columns = downsample(records([float(i % 7) for i in range(50)]), 8, 'lttb')
+    assert set(columns) == {'time', 'close', 'ema50'}
+    assert len(columns['time']) == 8
+    assert columns['ema50'] == [None] * 8
+
+def test_cache_is_lru():
+    cache = SeriesCache(max_entries=2)
+    cache.put('a', b'1')
+    cache.put('b', b'2')
+    assert cache.get('a') == b'1'
+    cache.put('c', b'3')
+    assert cache.get('b') is None
+    assert list(cache.entries) == ['a', 'c']
+
+def test_series_endpoint(sqlite_api):
+    api, _ = sqlite_api
+    client = api.app.test_client()
+
+    body = client.get('/api/candles/BTC/series?timeframe=1h&points=12').get_json()
+    assert (body['mode'], body['points'], body['source_candles']) == ('ohlc', 12, 120)
+    # Ten candles a bucket, the last one's high is the 119th candle's
+    assert body['series']['high'][-1] == 110 + 119
+    assert body['series']['volume'] == [10.0] * 12
+
+    start, end = (to_ms(CANDLES_START + timedelta(hours=h)) for h in (20, 39))
+    body = client.get(f'/api/candles/BTC/series?timeframe=1h&points=5&mode=lttb&from={start}&to={end}').get_json()
+    assert body['source_candles'] == 20
+    assert body['series']['time'][0] == start and body['series']['time'][-1] == end
+    assert 'open' not in body['series']
+
+    assert client.get('/api/candles/BTC/series?timeframe=1h&mode=spline').status_code == 400
+    assert client.get('/api/candles/NOPE/series?timeframe=1h').status_code == 404
+
+def test_series_is_computed_once_per_watermark(sqlite_api, monkeypatch):
+    api, backend = sqlite_api
+    client = api.app.test_client()
+    url = '/api/candles/BTC/series?timeframe=1h&points=12'
+    first = client.get(url).get_data()
+
+    connects = []
+    connect = backend.connect
+    monkeypatch.setattr(backend, 'connect', lambda *a, **k: connects.append(1) or connect(*a, **k))
+    assert client.get(url).get_data() == first
+    assert connects == []
+    assert len(api.series_cache.entries) == 1
@@ -0,0 +1,114 @@
+"""Content-Encoding negotiation, the compressed-body cache and per-coding validators"""
+
+import gzip
+
+from flask import Flask, Response
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header, parse_etags
+
+from compression import CODECS, CompressedBodies, ResponseCompressor, encoded_etag, matching_etag, negotiate_encoding
+
+BODY = b'{"candles":[' + b','.join(b'[%d,1.5,2.5,0.5,2.0]' % i for i in range(500)) + b']}'
+
+def accept_encoding(value):
+    return parse_accept_header(value, Accept)
+
+def make_app(compressor):
+    app = Flask(__name__)
+    compressor.install(app)
+
+    @app.route('/body')
+    def body():
+        response = Response(BODY, mimetype='application/json')
+        response.set_etag('v1')
+        return response
+
+    @app.route('/small')
+    def small():
+        return Response(b'{}', mimetype='application/json')
+
+    @app.route('/html')
+    def html():
+        return Response(BODY, mimetype='text/html')
+
+    return app
+
+def test_negotiate_encoding():
+    assert negotiate_encoding(accept_encoding('gzip')) == 'gzip'
+    assert negotiate_encoding(accept_encoding('identity')) is None
+    assert negotiate_encoding(accept_encoding('gzip;q=0')) is None
+    # Ties go to the best ratio, CODECS order
+    assert negotiate_encoding(accept_encoding(', '.join(CODECS))) == list(CODECS)[0]
+
+def test_compressed_once_per_etag_and_coding():
+    compressor = ResponseCompressor()
+    client = make_app(compressor).test_client()
+
+    for _ in range(3):
+        response = client.get('/body', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.get_data()) == BODY
+        assert 'Accept-Encoding' in response.headers['Vary']
+        # Each coding is its own strong entity
+        assert response.get_etag() == (encoded_etag('v1', 'gzip'), False)
+
+    stats = compressor.get_stats()
+    assert (stats['compressed'], stats['cache_hits']) == (1, 2)
+    assert stats['ratio'] > 1
+
+def test_identity_keeps_the_plain_etag():
+    client = make_app(ResponseCompressor()).test_client()
+    response = client.get('/body', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_data() == BODY
+    assert response.get_etag() == ('v1', False)
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+def test_small_and_uncompressible_bodies_pass_through():
+    client = make_app(ResponseCompressor()).test_client()
+    assert 'Content-Encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+    assert 'Content-Encoding' not in client.get('/html', headers={'Accept-Encoding': 'gzip'}).headers
+
+def test_matching_etag_accepts_any_coding():
+    assert matching_etag(parse_etags('"v1-gzip"'), 'v1') == 'v1-gzip'
+    assert matching_etag(parse_etags('"v0", "v1"'), 'v1') == 'v1'
+    assert matching_etag(parse_etags('"v0-gzip"'), 'v1') is None
+
+def test_cache_is_bounded_by_bytes():
+    cache = CompressedBodies(max_bytes=10)
+    cache.put(('a', 'gzip'), b'12345', 'application/json', 50)
+    cache.put(('b', 'gzip'), b'12345', 'application/json', 50)
+    cache.get(('a', 'gzip'))  # Most recently used now
+    cache.put(('c', 'gzip'), b'12345', 'application/json', 50)
+
+    assert list(cache.entries) == [('a', 'gzip'), ('c', 'gzip')]
+    assert cache.size == 10
+
+def test_conditional_views_serve_the_cached_coding(sqlite_api):
+    api, _ = sqlite_api
+    client = api.app.test_client()
+    url = '/api/candles/BTC/series?timeframe=1h&points=100'
+    headers = {'Accept-Encoding': 'gzip'}
+
+    first = client.get(url, headers=headers)
+    etag, _ = first.get_etag()
+    assert first.headers['Content-Encoding'] == 'gzip'
+    assert etag.endswith('-gzip')
+
+    # Answered from the compressed cache before the view runs, with the same validators
+    second = client.get(url, headers=headers)
+    assert api.compressor.get_stats()['cache_hits'] == 1
+    assert second.get_data() == first.get_data()
+    assert second.get_etag() == (etag, False)
+    assert 'Accept-Encoding' in second.headers['Vary']
+
+    # Revalidating the gzip tag is a 304 carrying it, and so is the identity one
+    revalidated = client.get(url, headers={**headers, 'If-None-Match': f'"{etag}"'})
+    assert revalidated.status_code == 304
+    assert revalidated.get_etag() == (etag, False)
+    assert 'Accept-Encoding' in revalidated.headers['Vary']
+
+    plain = client.get(url, headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.get_etag()[0] == etag[:-len('-gzip')]
+    assert client.get(url, headers={'If-None-Match': plain.headers['ETag']}).status_code == 304
@@ -0,0 +1,97 @@
+"""ETag / Last-Modified from data watermarks, and 304s that skip the queries"""
+
+import threading
+from datetime import datetime, timedelta, timezone
+
+from conftest import insert_hours
+from watermarks import WatermarkReader, validators
+
+CANDLES = '/api/candles/BTC?timeframe=1h&limit=24'
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+def test_validators():
+    watermarks = {'coins': (3, T0), 'candles:1h': (7, T0 + timedelta(hours=1))}
+    etag, last_modified = validators(watermarks, ['coins', 'candles:1h'], '/api/coins')
+    assert last_modified == T0 + timedelta(hours=1)
+    assert validators(dict(reversed(watermarks.items())), ['candles:1h', 'coins'], '/api/coins')[0] == etag
+
+    # Another representation or another version is another ETag
+    assert validators(watermarks, ['coins', 'candles:1h'], '/api/coins?x=1')[0] != etag
+    assert validators({**watermarks, 'coins': (4, T0)}, ['coins', 'candles:1h'], '/api/coins')[0] != etag
+    # A resource the worker never wrote: no validators at all
+    assert validators(watermarks, ['coins', 'ema_analysis:1w'], '/api/coins') == (None, None)
+
+def test_reader_caches_and_survives_a_missing_table(sqlite_api, tmp_path):
+    _, backend = sqlite_api
+    reader = WatermarkReader(backend, cache_seconds=60)
+    version = reader.get(['candles:1h'])['candles:1h'][0]
+
+    insert_hours(backend, 120, 1)
+    cached = reader.get(['candles:1h', 'coins'])
+    assert list(cached) == ['candles:1h']
+    assert cached['candles:1h'][0] == version  # Still inside the cache window
+    assert WatermarkReader(backend, cache_seconds=0).get(['candles:1h'])['candles:1h'][0] == version + 1
+
+    from storage import SQLiteBackend
+    assert WatermarkReader(SQLiteBackend(str(tmp_path / 'empty.db'))).get(['coins']) == {}
+
+def test_reader_is_shared_across_threads(sqlite_api):
+    _, backend = sqlite_api
+    reader = WatermarkReader(backend, cache_seconds=0)
+    assert 'candles:1h' in reader.get(['candles:1h'])
+
+    # Request threads take turns on its one connection
+    seen = []
+    thread = threading.Thread(target=lambda: seen.append(reader.get(['candles:1h'])))
+    thread.start()
+    thread.join(5)
+    assert 'candles:1h' in seen[0]
+
+def test_if_none_match_is_answered_before_the_query(sqlite_api, monkeypatch):
+    api, backend = sqlite_api
+    client = api.app.test_client()
+
+    response = client.get(CANDLES)
+    assert response.status_code == 200
+    assert response.cache_control.no_cache
+    etag, _ = response.get_etag()
+
+    connects = []
+    connect = backend.connect
+    monkeypatch.setattr(backend, 'connect', lambda *a, **k: connects.append(a) or connect(*a, **k))
+
+    cached = client.get(CANDLES, headers={'If-None-Match': f'"{etag}"'})
+    assert cached.status_code == 304
+    assert cached.get_etag()[0] == etag
+    assert cached.get_data() == b''
+    assert connects == []
+
+    # New candles bump the watermark: same request, new ETag and a body
+    insert_hours(backend, 120, 1)
+    fresh = client.get(CANDLES, headers={'If-None-Match': f'"{etag}"'})
+    assert fresh.status_code == 200
+    assert fresh.get_etag()[0] != etag
+    assert fresh.get_json()['candles'][-1]['close'] == 221
+
+def test_if_modified_since(sqlite_api):
+    api, _ = sqlite_api
+    client = api.app.test_client()
+    last_modified = client.get(CANDLES).last_modified
+
+    assert client.get(CANDLES, headers={'If-Modified-Since': last_modified.strftime('%a, %d %b %Y %H:%M:%S GMT')}).status_code == 304
+    earlier = last_modified - timedelta(seconds=5)
+    assert client.get(CANDLES, headers={'If-Modified-Since': earlier.strftime('%a, %d %b %Y %H:%M:%S GMT')}).status_code == 200
+
+def test_no_validators_without_a_watermark(sqlite_api):
+    api, _ = sqlite_api
+    # Nothing has written coins yet
+    response = api.app.test_client().get('/api/coins')
+    assert response.status_code == 200
+    assert response.get_etag() == (None, None)
+    assert response.last_modified is None
+
+def test_errors_carry_no_etag(sqlite_api):
+    api, _ = sqlite_api
+    response = api.app.test_client().get('/api/candles/BTC?timeframe=1h&cursor=bad')
+    assert response.status_code == 400
+    assert response.get_etag() == (None, None)
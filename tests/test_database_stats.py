@@ -0,0 +1,111 @@
+"""Database stats: estimated counts, the background exact count and its cache, per-timeframe activity"""
+
+import time
+
+import pytest
+
+from conftest import CANDLES_START, insert_hours, insert_market
+from database_stats import DatabaseStats
+
+def wait_ready(stats, timeout=5):
+    deadline = time.monotonic() + timeout
+    while stats.exact_status()[2]['status'] != 'ready':
+        assert time.monotonic() < deadline, stats.exact_status()
+        time.sleep(0.01)
+
+@pytest.fixture
+def sqlite_stats(sqlite_api):
+    _, backend = sqlite_api
+    insert_market(backend)
+    return DatabaseStats(backend), backend
+
+def test_estimated_stats_on_sqlite(sqlite_stats):
+    stats, _ = sqlite_stats
+    body = stats.get()
+
+    assert (body['candles'], body['coins'], body['ema_analysis'], body['scans']) == (120, 3, 9, 0)
+    assert body['oldest_candle'] == CANDLES_START.isoformat()
+    assert body['latest_scan'] is None
+    assert body['estimated']
+    assert body['exact']['status'] == 'idle'
+
+    hourly = body['timeframes']['1h']
+    assert hourly['writes'] == 1
+    assert hourly['last_write'] is not None
+    assert hourly['counted_candles'] is None
+    assert body['timeframes']['1d'] == {'estimated_candles': None, 'counted_candles': None, 'writes': None, 'last_write': None}
+
+def test_exact_counts_run_in_the_background(sqlite_stats):
+    stats, backend = sqlite_stats
+    first = stats.get(exact=True)
+    assert first['exact']['status'] in ('running', 'ready')
+
+    wait_ready(stats)
+    insert_hours(backend, 120, 5)  # Not seen until the next count
+    body = stats.get(exact=True)
+    assert not body['estimated']
+    assert body['candles'] == 120
+    assert body['timeframes']['1h']['counted_candles'] == 120
+    assert body['timeframes']['1h']['writes'] == 2
+    assert body['exact']['computed_at'] is not None
+
+    # Without ?exact=1 the cheap estimate is served, with the cached per-timeframe counts
+    body = stats.get()
+    assert body['estimated'] and body['candles'] == 125
+    assert body['timeframes']['1h']['counted_candles'] == 120
+
+def test_stale_exact_counts_are_recounted(sqlite_stats, monkeypatch):
+    _, backend = sqlite_stats
+    stats = DatabaseStats(backend, max_age=0)
+    stats.count_exact()
+    assert stats.exact is not None
+
+    # Already too old: estimated numbers, and another count started
+    started = []
+    monkeypatch.setattr(stats, 'start_exact', lambda: started.append(1))
+    body = stats.get(exact=True)
+    assert body['estimated']
+    assert started == [1]
+
+def test_one_count_at_a_time(sqlite_stats, monkeypatch):
+    stats, _ = sqlite_stats
+    started = []
+    monkeypatch.setattr(stats, 'count_exact', lambda: started.append(1))
+    stats.start_exact()
+    stats.start_exact()
+    assert started == [1]
+    assert stats.exact_status()[2]['status'] == 'running'
+
+def test_failed_count_is_reported(sqlite_stats, monkeypatch):
+    stats, backend = sqlite_stats
+    monkeypatch.setattr(backend, 'connect', lambda *a, **k: (_ for _ in ()).throw(RuntimeError('disk gone')))
+    stats.count_exact()
+    assert stats.exact_status()[2] == {'status': 'idle', 'computed_at': None, 'started_at': None, 'error': 'disk gone'}
+
+def test_endpoint(sqlite_api, monkeypatch):
+    api, backend = sqlite_api
+    monkeypatch.setattr(api, 'database_stats', DatabaseStats(backend))
+    body = api.app.test_client().get('/api/database-stats').get_json()
+    assert body['candles'] == 120
+    assert body['estimated']
+
+def test_planner_estimates_on_postgres(postgres_url):
+    import psycopg
+
+    from storage import PostgresBackend
+
+    backend = PostgresBackend(postgres_url)
+    insert_hours(backend, 0, 200)
+    with psycopg.connect(postgres_url, autocommit=True) as conn:
+        conn.execute("ANALYZE candles")
+
+    body = DatabaseStats(backend).get()
+    assert body['estimated']
+    assert body['candles'] == 200
+    assert body['timeframes']['1h']['estimated_candles'] == 200
+    assert body['timeframes']['1h']['writes'] == 1
+
+    stats = DatabaseStats(backend)
+    stats.get(exact=True)
+    wait_ready(stats)
+    assert stats.get(exact=True)['timeframes']['1h']['counted_candles'] == 200
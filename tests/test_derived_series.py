@@ -0,0 +1,56 @@
+"""Derived timeframes on SQLite (binned with numpy), and their chart series' validators"""
+
+from datetime import timedelta
+
+import numpy as np
+
+from conftest import CANDLES_START, insert_hours
+from derived_timeframes import bin_records, load_derived, timeframe_ms
+from mmap_candle_store import DTYPE, to_ms
+
+def test_bin_records():
+    records = np.zeros(5, dtype=DTYPE)
+    records['time'] = [to_ms(CANDLES_START + timedelta(hours=i)) for i in range(5)]
+    records['open'] = records['high'] = records['close'] = [1, 2, 3, 4, 5]
+    records['low'] = [5, 4, 3, 2, 1]
+    records['volume'] = 1
+
+    binned = bin_records(records, timeframe_ms('2h'), 0)
+    assert binned['time'].tolist() == [to_ms(CANDLES_START + timedelta(hours=h)) for h in (0, 2, 4)]
+    assert binned['open'].tolist() == [1, 3, 5]
+    assert binned['close'].tolist() == [2, 4, 5]
+    assert binned['high'].tolist() == [2, 4, 5]
+    assert binned['low'].tolist() == [4, 2, 1]
+    assert binned['volume'].tolist() == [2, 2, 1]
+
+def test_load_derived_on_sqlite(sqlite_api):
+    _, backend = sqlite_api
+    conn = backend.connect()
+    records = load_derived(conn, backend.name, 'BTC', '2h')
+    conn.close()
+
+    assert len(records) == 60
+    assert records['close'][0] == 102
+    assert not np.isnan(records['ema50'][-1])
+
+def test_derived_series_follows_source_watermark(sqlite_api):
+    api, backend = sqlite_api
+    client = api.app.test_client()
+    url = '/api/candles/BTC/series?timeframe=2h&points=10'
+
+    first = client.get(url)
+    assert first.status_code == 200
+    assert first.headers['ETag']
+    assert first.get_json()['source_candles'] == 60
+    assert first.get_json()['points'] == 10
+
+    # Cached by the source's watermark: unchanged, it's a 304 and the series is reused
+    assert client.get(url, headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    assert len(api.series_cache.entries) == 1
+
+    # New 1h candles move the 2h series' ETag and miss the old entry
+    insert_hours(backend, 120, 2)
+    second = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.headers['ETag'] != first.headers['ETag']
+    assert len(api.series_cache.entries) == 2
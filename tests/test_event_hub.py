@@ -0,0 +1,130 @@
+"""Scan event fan-out: replay, resume, slow subscribers and truncated logs"""
+
+import json
+import threading
+
+import pytest
+
+from event_hub import EventHub, Subscriber, parse_event_id
+
+def payloads(events):
+    return [json.loads(event.frame.split(b'data: ', 1)[1]) for event in events]
+
+def test_parse_event_id():
+    assert parse_event_id('3-41') == (3, 41)
+    assert parse_event_id(None) is None
+    assert parse_event_id('garbage') is None
+    assert parse_event_id('1-2-3') is None
+
+def test_every_subscriber_gets_every_event():
+    hub = EventHub()
+    hub.start_scan()
+    subscribers = [hub.subscribe()[0] for _ in range(3)]
+
+    for i in range(5):
+        hub.publish({'type': 'coin_result', 'progress': i})
+
+    for subscriber in subscribers:
+        received = [subscriber.get(timeout=0) for _ in range(5)]
+        assert [p['progress'] for p in payloads(received)] == list(range(5))
+        assert subscriber.get(timeout=0) is None
+    # Encoded once, the same frame object goes to everyone
+    assert subscribers[0].events == subscribers[1].events
+
+def test_late_subscriber_is_replayed_the_scan():
+    hub = EventHub()
+    hub.start_scan()
+    hub.publish({'type': 'coin_result', 'progress': 1})
+    hub.publish({'type': 'complete'})
+
+    _, backlog = hub.subscribe()
+    assert [p['type'] for p in payloads(backlog)] == ['coin_result', 'complete']
+    assert backlog[-1].final
+
+def test_resume_from_last_event_id():
+    hub = EventHub()
+    hub.start_scan()
+    events = [hub.publish({'progress': i}) for i in range(5)]
+
+    _, backlog = hub.subscribe(f"{events[2].scan_id}-{events[2].seq}")
+    assert [p['progress'] for p in payloads(backlog)] == [3, 4]
+
+def test_id_from_an_earlier_scan_replays_the_current_one():
+    hub = EventHub()
+    hub.start_scan()
+    old = hub.publish({'progress': 0})
+    hub.start_scan()
+    hub.publish({'progress': 1})
+
+    _, backlog = hub.subscribe(f"{old.scan_id}-{old.seq}")
+    assert payloads(backlog) == [{'progress': 1}]
+
+def test_slow_subscriber_is_dropped_without_blocking_publish():
+    hub = EventHub(buffer_events=2)
+    hub.start_scan()
+    slow, _ = hub.subscribe()
+    fast, _ = hub.subscribe()
+
+    for i in range(3):
+        hub.publish({'progress': i})
+        fast.get(timeout=0)
+
+    assert slow.dropped
+    assert slow.get(timeout=0) is None
+    assert not fast.dropped
+    assert hub.get_stats()['dropped'] == 1
+    assert hub.get_stats()['subscribers'] == 1
+
+def test_truncated_log_opens_with_a_reset():
+    hub = EventHub(replay_events=3)
+    hub.start_scan()
+    events = [hub.publish({'progress': i}) for i in range(6)]  # Log holds seq 4..6
+
+    # The client saw seq 1, seqs 2 and 3 are gone: reset first, then what's left
+    _, backlog = hub.subscribe(f"{events[0].scan_id}-{events[0].seq}")
+    assert payloads(backlog) == [{'type': 'reset', 'missed': 2}, {'progress': 3}, {'progress': 4}, {'progress': 5}]
+    assert backlog[0].frame.startswith(f"id: {hub.scan_id}-3\n".encode())
+
+    # Resuming from the reset's id (or any logged one) replays without another reset
+    _, backlog = hub.subscribe(f"{hub.scan_id}-3")
+    assert [p['progress'] for p in payloads(backlog)] == [3, 4, 5]
+    _, backlog = hub.subscribe(f"{events[4].scan_id}-{events[4].seq}")
+    assert payloads(backlog) == [{'progress': 5}]
+
+    # A fresh subscriber can't see the whole scan either
+    _, backlog = hub.subscribe()
+    assert payloads(backlog)[0] == {'type': 'reset', 'missed': 3}
+    assert hub.get_stats()['resets'] == 2
+
+def test_get_wakes_on_publish():
+    subscriber = Subscriber()
+    received = []
+    thread = threading.Thread(target=lambda: received.append(subscriber.get(timeout=5)))
+    thread.start()
+
+    hub_event = EventHub().publish({'type': 'complete'})
+    subscriber.push(hub_event)
+    thread.join(timeout=5)
+    assert received == [hub_event]
+
+@pytest.fixture
+def streaming_app(monkeypatch):
+    import api_server_streaming
+
+    hub = EventHub()
+    monkeypatch.setattr(api_server_streaming, 'event_hub', hub)
+    return api_server_streaming.app, hub
+
+def test_stream_endpoint_replays_and_closes_on_completion(streaming_app):
+    app, hub = streaming_app
+    hub.start_scan()
+    first = hub.publish({'type': 'coin_result', 'progress': 1})
+    hub.publish({'type': 'complete'})
+
+    response = app.test_client().get('/api/stream', headers={'Last-Event-ID': f"{first.scan_id}-{first.seq}"})
+    body = response.get_data()
+
+    assert response.mimetype == 'text/event-stream'
+    assert body.startswith(b'data: {"type":"connected"}\n\n')
+    assert b'"coin_result"' not in body
+    assert body.endswith(f'id: {hub.scan_id}-2\ndata: {{"type":"complete"}}\n\n'.encode())
@@ -0,0 +1,63 @@
+"""fast_json against Flask's default provider: same documents, compared parsed"""
+
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+import fast_json
+from fast_json import FastJSONProvider, dumps, splice_array, splice_object, stdlib_dumps
+
+DOCUMENT = {
+    'symbol': 'BTC',
+    'price': 97123.45,
+    'tiny': 1e-7,
+    'huge': 1e20,
+    'name': 'Bitcoin ₿',
+    'updated': datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc),
+    'timeframes': {'1w': {'above': True, 'distance': -2.5}, '15m': None}
+}
+
+@pytest.fixture
+def stdlib():
+    return DefaultJSONProvider(Flask(__name__))
+
+def test_parses_to_the_default_providers_document(stdlib):
+    expected = json.loads(stdlib.dumps(DOCUMENT, separators=(',', ':')))
+    assert json.loads(dumps(DOCUMENT)) == expected
+    assert json.loads(stdlib_dumps(DOCUMENT)) == expected
+
+@pytest.mark.parametrize('value', [1e20, 1e-7, 97123.45, 5e-324, 1.7976931348623157e308, -0.0, 123456789012345678])
+def test_numbers_parse_back_to_the_same_value(value):
+    # The spelling is each encoder's own, only the parsed value is promised
+    assert json.loads(dumps({'x': value}))['x'] == json.loads(stdlib_dumps({'x': value}))['x'] == value
+
+def test_non_ascii_parses_back():
+    assert json.loads(dumps('Bitcoin ₿')) == json.loads(stdlib_dumps('Bitcoin ₿')) == 'Bitcoin ₿'
+
+@pytest.mark.skipif(fast_json.orjson is None, reason="orjson not installed")
+def test_nan_becomes_null():
+    assert json.loads(dumps({'ema': float('nan')})) == {'ema': None}
+
+def test_numpy_and_big_integers():
+    assert json.loads(dumps({'closes': np.array([1.5, 2.5]), 'n': np.int64(3)})) == {'closes': [1.5, 2.5], 'n': 3}
+    # Past 64 bits orjson refuses, the stdlib encoder takes over
+    assert json.loads(dumps({'n': 2 ** 70})) == {'n': 2 ** 70}
+
+def test_splicing_matches_dumps():
+    coins = [{'symbol': 'BTC', 'price': 1.0}, {'symbol': 'ETH', 'price': 2.0}]
+    spliced = splice_object([('coins', splice_array([dumps(c) for c in coins])), ('total', dumps(2))])
+    assert spliced == dumps({'coins': coins, 'total': 2})
+
+def test_provider_serves_compact_json():
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    with app.app_context():
+        response = app.json.response({'b': 1, 'a': [1, 2]})
+    assert response.get_data() == b'{"a":[1,2],"b":1}\n'
+    assert response.mimetype == 'application/json'
+    # Callers passing options get the stdlib encoder with them
+    assert app.json.dumps({'a': 1}, indent=2) == '{\n  "a": 1\n}'
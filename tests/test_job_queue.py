@@ -0,0 +1,146 @@
+"""Job claiming, leases and retries on Postgres (FOR UPDATE SKIP LOCKED)"""
+
+import threading
+from datetime import datetime, timezone
+
+import psycopg
+import pytest
+
+import background_worker as worker
+import job_queue
+from job_queue import claim_job, complete_job, enqueue_jobs, fail_job, release_job, run_job
+
+NOW = datetime(2025, 1, 1, 12, 7, tzinfo=timezone.utc)
+
+@pytest.fixture
+def connect(postgres_url, monkeypatch):
+    connections = []
+
+    def connect():
+        conn = psycopg.connect(postgres_url)
+        connections.append(conn)
+        return conn
+
+    monkeypatch.setattr(worker, 'get_db_connection', connect)
+    yield connect
+    for conn in connections:
+        if not conn.closed:
+            conn.close()
+
+def coins(n):
+    return [{'symbol': f"c{i}"} for i in range(n)]
+
+def job_row(conn, job_id):
+    cur = conn.cursor()
+    cur.execute("SELECT status, attempts, locked_by, last_error FROM worker_jobs WHERE id = %s", (job_id,))
+    row = cur.fetchone()
+    conn.commit()
+    return row
+
+def expire_lease(conn, job_id):
+    conn.execute("UPDATE worker_jobs SET lease_expires_at = NOW() - INTERVAL '1 second' WHERE id = %s", (job_id,))
+    conn.commit()
+
+def test_enqueue_ignores_duplicates(connect):
+    assert enqueue_jobs(coins(3), ['15m', '1h'], now=NOW) == 6
+    enqueue_jobs(coins(3), ['15m', '1h'], now=NOW)
+
+    conn = connect()
+    assert conn.execute("SELECT COUNT(*) FROM worker_jobs").fetchone()[0] == 6
+
+def test_concurrent_workers_claim_each_job_once(connect):
+    enqueue_jobs(coins(40), ['15m'], now=NOW)
+    claimed = []
+    lock = threading.Lock()
+
+    def run(worker_id):
+        conn = connect()
+        while True:
+            job = claim_job(conn, worker_id)
+            if not job:
+                return
+            with lock:
+                claimed.append(job['id'])
+            complete_job(conn, job, 1)
+
+    threads = [threading.Thread(target=run, args=(f"w{i}",)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(claimed) == 40
+    assert len(set(claimed)) == 40
+
+def test_expired_lease_is_reclaimed_while_attempts_remain(connect):
+    enqueue_jobs(coins(1), ['15m'], now=NOW)
+    conn = connect()
+
+    job = claim_job(conn, 'crashed')
+    assert claim_job(conn, 'other') is None  # Lease still held
+
+    expire_lease(conn, job['id'])
+    again = claim_job(conn, 'other')
+    assert again['id'] == job['id']
+    assert again['attempts'] == 2
+    assert job_row(conn, job['id'])[2] == 'other'
+
+def test_expired_lease_on_last_attempt_fails_the_job(connect, monkeypatch):
+    monkeypatch.setattr(job_queue, 'MAX_ATTEMPTS', 2)
+    enqueue_jobs(coins(1), ['15m'], now=NOW)
+    conn = connect()
+
+    for _ in range(2):
+        job = claim_job(conn, 'crashing')
+        assert job is not None
+        expire_lease(conn, job['id'])
+
+    # Every attempt's worker died, the job ends failed instead of being retried forever
+    assert claim_job(conn, 'next') is None
+    status, attempts, _, last_error = job_row(conn, job['id'])
+    assert (status, attempts) == ('failed', 2)
+    assert 'Lease expired' in last_error
+
+def test_fail_job_retries_with_backoff_then_fails(connect, monkeypatch):
+    monkeypatch.setattr(job_queue, 'MAX_ATTEMPTS', 2)
+    enqueue_jobs(coins(1), ['15m'], now=NOW)
+    conn = connect()
+
+    job = claim_job(conn, 'w')
+    fail_job(conn, job, 5, 'boom')
+    assert job_row(conn, job['id'])[0] == 'pending'
+    assert claim_job(conn, 'w') is None  # Backing off
+
+    conn.execute("UPDATE worker_jobs SET run_after = NOW() WHERE id = %s", (job['id'],))
+    conn.commit()
+    job = claim_job(conn, 'w')
+    fail_job(conn, job, 5, 'boom again')
+    assert job_row(conn, job['id'])[:2] == ('failed', 2)
+
+def test_release_does_not_count_the_attempt(connect):
+    enqueue_jobs(coins(1), ['15m'], now=NOW)
+    conn = connect()
+
+    job = claim_job(conn, 'w')
+    release_job(conn, job, delay_seconds=0)
+    assert job_row(conn, job['id'])[:2] == ('pending', 0)
+
+@pytest.mark.parametrize('fetched, error', [
+    (RuntimeError('Binance said no'), 'RuntimeError: Binance said no'),
+    ((None, None, None), 'No data available'),
+])
+def test_run_job_records_the_real_error(connect, monkeypatch, fetched, error):
+    def get_binance_candles(*args, **kwargs):
+        if isinstance(fetched, Exception):
+            raise fetched
+        return fetched
+
+    monkeypatch.setattr(worker, 'get_last_candle_time', lambda symbol, timeframe: NOW)
+    monkeypatch.setattr(worker, 'get_coin_market', lambda symbol: (None, None))
+    monkeypatch.setattr(worker, 'get_binance_candles', get_binance_candles)
+    enqueue_jobs(coins(1), ['15m'], now=NOW)
+    conn = connect()
+
+    job = claim_job(conn, 'w')
+    run_job(conn, job, 'w')
+    assert job_row(conn, job['id'])[::3] == ('pending', error)
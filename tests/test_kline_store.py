@@ -0,0 +1,114 @@
+"""Arrow kline segments: appends past the tail, compaction and incremental fetches"""
+
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+import kline_store
+from kline_store import KlineStore, to_rows
+
+pytestmark = pytest.mark.skipif(kline_store.pa is None, reason="pyarrow not installed")
+
+HOUR_MS = 3_600_000
+NOW = datetime(2025, 1, 1, 10, 30, tzinfo=timezone.utc)  # Live 1h candle opened 10:00
+LIVE_MS = int(datetime(2025, 1, 1, 10, tzinfo=timezone.utc).timestamp() * 1000)
+
+def klines(first_hour, count):
+    """`count` 1h klines from `first_hour` hours off the live candle (negative = closed)"""
+    return [[LIVE_MS + (first_hour + i) * HOUR_MS, 1.0, 2.0, 0.5, 1.5 + i, 10.0] for i in range(count)]
+
+class FakeClient:
+    def __init__(self, hedged=None, fresh=None):
+        self.hedged = hedged
+        self.fresh = fresh
+        self.calls = []
+
+    def get_klines_hedged(self, pair, interval, limit, min_candles=1, symbol=None):
+        self.calls.append(('hedged', limit))
+        return self.hedged, 'spot'
+
+    def get_klines(self, pair, interval, limit, market='spot', start_time=None, symbol=None):
+        self.calls.append(('since', start_time))
+        return self.fresh
+
+def test_append_only_keeps_candles_past_the_tail(tmp_path):
+    store = KlineStore(str(tmp_path))
+    assert store.append('BTCUSDT', '1h', 'spot', klines(-10, 5)) == 5
+    assert store.append('BTCUSDT', '1h', 'spot', klines(-7, 5)) == 3
+
+    table, market = store.read('BTCUSDT', '1h')
+    assert market == 'spot'
+    assert [row[0] for row in to_rows(table)] == [k[0] for k in klines(-10, 8)]
+    assert [row[0] for row in to_rows(store.read('BTCUSDT', '1h', limit=2)[0])] == [k[0] for k in klines(-4, 2)]
+
+def test_market_change_restarts_the_series(tmp_path):
+    store = KlineStore(str(tmp_path))
+    store.append('BTCUSDT', '1h', 'spot', klines(-10, 5))
+    store.append('BTCUSDT', '1h', 'futures', klines(-3, 2))
+
+    table, market = store.read('BTCUSDT', '1h')
+    assert (table.num_rows, market) == (2, 'futures')
+
+def test_compaction_bounds_segments_and_rows(tmp_path):
+    store = KlineStore(str(tmp_path), max_segments=3, max_rows=4)
+    for hour in range(-10, -5):
+        store.append('BTCUSDT', '1h', 'spot', klines(hour, 1))
+
+    assert len(store.segments('BTCUSDT', '1h')) <= 3
+    assert store.read('BTCUSDT', '1h')[0].num_rows <= 4 + 3
+
+def test_first_fetch_stores_closed_candles_only(tmp_path):
+    store = KlineStore(str(tmp_path))
+    client = FakeClient(hedged=klines(-3, 4))  # Last one is the live candle
+
+    fetched, market = store.get_klines(client, 'BTCUSDT', '1h', 60, now=NOW)
+    assert fetched == klines(-3, 4)
+    assert store.read('BTCUSDT', '1h')[0].num_rows == 3
+
+def test_rescan_fetches_only_past_the_tail(tmp_path):
+    store = KlineStore(str(tmp_path))
+    store.append('BTCUSDT', '1h', 'spot', klines(-60, 59))
+    client = FakeClient(fresh=klines(-1, 2))
+
+    fetched, market = store.get_klines(client, 'BTCUSDT', '1h', 60, now=NOW)
+    assert client.calls == [('since', datetime.fromtimestamp((LIVE_MS - HOUR_MS) / 1000, tz=timezone.utc))]
+    assert len(fetched) == 60
+    assert fetched[-1][0] == LIVE_MS
+    assert [k[0] for k in fetched] == sorted({k[0] for k in fetched})
+
+def test_gap_refetches_everything(tmp_path):
+    store = KlineStore(str(tmp_path))
+    store.append('BTCUSDT', '1h', 'spot', klines(-100, 5))
+    # A full page that stops short of the live candle: the store is too old to extend
+    client = FakeClient(fresh=klines(-95, 5), hedged=klines(-4, 5))
+
+    fetched, _ = store.get_klines(client, 'BTCUSDT', '1h', 5, now=NOW)
+    assert [call[0] for call in client.calls] == ['since', 'hedged']
+    assert fetched == klines(-4, 5)
+    assert to_rows(store.read('BTCUSDT', '1h')[0]) == klines(-4, 4)
+
+def test_empty_window_is_no_new_candles(tmp_path):
+    store = KlineStore(str(tmp_path))
+    store.append('BTCUSDT', '1h', 'spot', klines(-10, 10))
+    client = FakeClient(fresh=None, hedged=klines(-4, 5))
+
+    fetched, market = store.get_klines(client, 'BTCUSDT', '1h', 5, now=NOW)
+    assert [call[0] for call in client.calls] == ['since']
+    assert (fetched, market) == (klines(-10, 10)[-5:], 'spot')
+    assert store.read('BTCUSDT', '1h')[0].num_rows == 10
+
+def test_clear_waits_for_the_series_lock(tmp_path):
+    store = KlineStore(str(tmp_path))
+    store.append('BTCUSDT', '1h', 'spot', klines(-10, 5))
+
+    with store.series_lock('BTCUSDT', '1h'):
+        clearing = threading.Thread(target=store.clear, args=('BTCUSDT', '1h'))
+        clearing.start()
+        clearing.join(0.1)
+        # Still blocked, the segments a writer is using stay put
+        assert clearing.is_alive()
+        assert store.read('BTCUSDT', '1h')[0].num_rows == 5
+
+    clearing.join(5)
+    assert store.read('BTCUSDT', '1h') == (None, None)
@@ -0,0 +1,225 @@
+"""
+kline_stream against a local fake of Binance's combined stream endpoint, plus the EMA
+state the writer keeps between closed candles
+"""
+
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+import websockets
+
+import background_worker as worker
+import kline_stream
+from kline_stream import EMA_ALPHA, CandleWriter, EmaState, GapFiller, consume_group, parse_kline_message
+
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+STEP = timedelta(minutes=15)
+
+def kline(symbol, start, close, closed, interval='15m'):
+    start_ms = int(start.timestamp() * 1000)
+    return json.dumps({
+        'stream': f"{symbol.lower()}@kline_{interval}",
+        'data': {
+            'e': 'kline',
+            'k': {
+                't': start_ms, 'T': start_ms + 899_999, 's': symbol, 'i': interval,
+                'o': '1', 'h': '2', 'l': '0.5', 'c': str(close), 'v': '10', 'x': closed
+            }
+        }
+    })
+
+class FakeCursor:
+    """Answers the EMA state query from `rows` (newest first) and records writes"""
+
+    def __init__(self, db):
+        self.db = db
+        self.result = []
+
+    def execute(self, query, params=None):
+        if query.strip().startswith('SELECT time, ema50'):
+            self.result = self.db['rows'][:2]
+        elif 'INSERT INTO candles' in query:
+            self.db['inserted'].append(params)
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+class RecordingWriter:
+    def __init__(self):
+        self.candles = []
+        self.gap_fills = 0
+
+    def submit_candle(self, symbol, timeframe, candle):
+        self.candles.append((symbol, timeframe, candle))
+
+    def submit_gap_fill(self, series):
+        self.gap_fills += 1
+
+def test_parse_kline_message():
+    symbol, interval, candle, closed = parse_kline_message(kline('BTCUSDT', T0, 101.5, True))
+    assert (symbol, interval, closed) == ('BTCUSDT', '15m', True)
+    assert candle[0] == int(T0.timestamp() * 1000) and candle[4] == '101.5'
+    assert parse_kline_message(json.dumps({'data': {'e': 'trade'}})) is None
+
+def test_next_ema_follows_and_rejects_gaps():
+    state = EmaState()
+    state.series[('BTC', '15m')] = ((T0, 100.0), None)
+
+    ema = state.next_ema('BTC', '15m', T0 + STEP, 110.0, 15)
+    assert ema == pytest.approx(110 * EMA_ALPHA + 100 * (1 - EMA_ALPHA))
+    assert state.next_ema('BTC', '15m', T0 + 3 * STEP, 110.0, 15) is None
+
+def test_same_time_candle_recomputed_from_previous_ema():
+    """A candle stored while open is replaced by its closed version, not kept"""
+    state = EmaState()
+    partial = 105 * EMA_ALPHA + 100 * (1 - EMA_ALPHA)
+    state.series[('BTC', '15m')] = ((T0 + STEP, partial), (T0, 100.0))
+
+    ema = state.next_ema('BTC', '15m', T0 + STEP, 120.0, 15)
+    assert ema == pytest.approx(120 * EMA_ALPHA + 100 * (1 - EMA_ALPHA))
+
+    following = state.next_ema('BTC', '15m', T0 + 2 * STEP, 130.0, 15)
+    assert following == pytest.approx(130 * EMA_ALPHA + ema * (1 - EMA_ALPHA))
+
+def test_same_time_candle_without_previous_needs_gap_fill():
+    state = EmaState()
+    state.series[('BTC', '15m')] = ((T0, 100.0), None)
+    assert state.next_ema('BTC', '15m', T0, 120.0, 15) is None
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    db = {'rows': [], 'inserted': []}
+    monkeypatch.setattr(worker, 'get_db_connection', lambda: FakeConnection(db))
+    monkeypatch.setattr(worker, 'update_ema_analysis', lambda symbol, tf: None)
+    monkeypatch.setattr(worker, 'notify_analysis_updated', lambda payload='': None)
+    monkeypatch.setattr(worker, 'candle_store', SimpleNamespace(enabled=False))
+    monkeypatch.setattr(kline_stream, 'bump_watermarks', lambda cur, names: None)
+    return db
+
+def closed_candle(start, close):
+    start_ms = int(start.timestamp() * 1000)
+    return [start_ms, '1', '2', '0.5', str(close), '10', start_ms + 899_999]
+
+def test_gap_fill_then_close_of_open_candle(fake_db, monkeypatch):
+    """REST gap-fill stores the open candle, its close on the stream gets a fresh EMA"""
+    partial = 105 * EMA_ALPHA + 100 * (1 - EMA_ALPHA)
+    fake_db['rows'] = [(T0 + STEP, partial), (T0, 100.0)]
+    filled = []
+    monkeypatch.setattr(worker, 'process_coin_incremental', lambda coin, tf: filled.append((coin['symbol'], tf['key'])))
+
+    writer = CandleWriter({'BTC': {'symbol': 'BTC'}})
+    writer.gap_filler.fill('BTC', '15m')
+    assert filled == [('BTC', '15m')]
+
+    # The fill hands the series back for an EMA state reload, ahead of the candle in the same batch
+    writer.process([('candle', 'BTC', '15m', closed_candle(T0 + STEP, 120)), writer.inbox.get_nowait()])
+
+    assert len(fake_db['inserted']) == 1
+    assert fake_db['inserted'][0][-1] == pytest.approx(120 * EMA_ALPHA + 100 * (1 - EMA_ALPHA))
+    assert writer.stats['candles_written'] == 1
+
+def test_candles_are_written_while_a_gap_fill_runs(fake_db, monkeypatch):
+    fake_db['rows'] = [(T0, 100.0)]
+    started, release = threading.Event(), threading.Event()
+
+    def slow_fill(coin, tf):
+        started.set()
+        release.wait(5)
+    monkeypatch.setattr(worker, 'process_coin_incremental', slow_fill)
+
+    writer = CandleWriter({'BTC': {'symbol': 'BTC'}, 'ETH': {'symbol': 'ETH'}}, batch_window_seconds=0.01)
+    writer.gap_filler.rate_limit_seconds = 0
+    writer.state.series[('BTC', '15m')] = ((T0, 100.0), None)
+    writer.start()
+
+    writer.submit_gap_fill([('ETH', '15m')])
+    assert started.wait(5)
+    writer.submit_candle('BTC', '15m', closed_candle(T0 + STEP, 110))
+    writer.submit_candle('BTC', '15m', closed_candle(T0 + 2 * STEP, 111))
+
+    deadline = time.monotonic() + 5
+    while len(fake_db['inserted']) < 2:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    # Both rows went in with the ETH fill still blocked
+    assert not release.is_set()
+    assert writer.stats['candles_written'] == 2
+
+    release.set()
+    while writer.gap_filler.stats['gap_fills'] < 1:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_gap_fill_requests_are_deduplicated():
+    filler = GapFiller({}, writer=None)
+    filler.submit([('BTC', '15m'), ('BTC', '15m'), ('ETH', '1h')])
+    filler.submit([('ETH', '1h')])
+    assert filler.inbox.qsize() == 2
+
+async def run_against_fake_server(sessions, writer, until):
+    """consume_group against a local server playing `sessions` (one message list per connection)"""
+    connections = []
+
+    async def handler(ws):
+        messages = sessions[min(len(connections), len(sessions) - 1)]
+        connections.append(ws)
+        for message in messages:
+            await ws.send(message)
+        if len(connections) < len(sessions):
+            return  # Dropping the connection makes the client reconnect
+        await ws.wait_closed()
+
+    async with websockets.serve(handler, '127.0.0.1', 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        group = {'url': f"ws://127.0.0.1:{port}/stream", 'streams': ['btcusdt@kline_15m']}
+        task = asyncio.create_task(consume_group(group, {'btcusdt@kline_15m': ('BTC', '15m')}, writer))
+        try:
+            for _ in range(100):
+                if until():
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    return connections
+
+def test_stream_forwards_closed_candles_only():
+    writer = RecordingWriter()
+    session = [kline('BTCUSDT', T0, 100, False), kline('BTCUSDT', T0, 101, True), kline('ETHUSDT', T0, 5, True)]
+
+    asyncio.run(run_against_fake_server([session], writer, until=lambda: writer.candles))
+
+    assert [(s, tf, c[4]) for s, tf, c in writer.candles] == [('BTC', '15m', '101')]
+    assert writer.gap_fills == 1
+
+def test_stream_reconnects_and_gap_fills_each_connection():
+    writer = RecordingWriter()
+    sessions = [[kline('BTCUSDT', T0, 101, True)], [kline('BTCUSDT', T0 + STEP, 102, True)]]
+
+    connections = asyncio.run(run_against_fake_server(sessions, writer, until=lambda: len(writer.candles) == 2))
+
+    assert len(connections) == 2
+    assert [c[4] for _, _, c in writer.candles] == ['101', '102']
+    assert writer.gap_fills == 2
@@ -0,0 +1,149 @@
+"""Retries, backoff, session reuse and market choice in the shared market data client"""
+
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import requests
+
+import market_data_client
+from market_data_client import MarketDataClient
+
+class FakeResponse:
+    def __init__(self, status_code, retry_after=None):
+        self.status_code = status_code
+        self.headers = {'Retry-After': retry_after} if retry_after is not None else {}
+
+class FakeSession:
+    """Answers with the queued responses (or raises the queued exceptions) in order"""
+
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.calls = 0
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.calls += 1
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(market_data_client.time, 'sleep', slept.append)
+    return slept
+
+def client_with(answers, **kwargs):
+    client = MarketDataClient(hedge=False, **kwargs)
+    session = FakeSession(answers)
+    client.session_for = lambda url: session
+    return client, session
+
+@pytest.mark.parametrize('retry_after, expected', [('2', 2.0), ('0', 0.0), ('30', 30.0)])
+def test_backoff_honours_retry_after(retry_after, expected):
+    assert MarketDataClient().backoff(0, FakeResponse(429, retry_after)) == expected
+
+@pytest.mark.parametrize('retry_after', ['86400', '-1', 'nan', 'Wed, 21 Oct 2026 07:28:00 GMT', 'soon'])
+def test_backoff_falls_back_to_jitter(retry_after):
+    client = MarketDataClient(backoff_base_seconds=0.25)
+    for attempt in range(3):
+        assert 0 <= client.backoff(attempt, FakeResponse(429, retry_after)) <= 0.25 * 2 ** attempt
+
+def test_backoff_is_capped():
+    client = MarketDataClient(backoff_base_seconds=10, max_backoff_seconds=5)
+    assert all(client.backoff(6) <= 5 for _ in range(50))
+
+def test_retries_retryable_statuses(sleeps):
+    client, session = client_with([FakeResponse(429, '1'), FakeResponse(503), FakeResponse(200)])
+    assert client.get('https://api.binance.com/api/v3/klines').status_code == 200
+    assert session.calls == 3
+    assert sleeps[0] == 1.0
+
+def test_returns_the_last_response_once_retries_run_out(sleeps):
+    client, session = client_with([FakeResponse(429, '86400')] * 3)
+    # A day-long Retry-After doesn't stall the scan, the caller gets the 429 back
+    assert client.get('https://api.binance.com/api/v3/klines').status_code == 429
+    assert session.calls == 3
+    assert all(delay <= client.max_backoff_seconds for delay in sleeps)
+
+def test_connection_errors_raise_after_retries(sleeps):
+    client, session = client_with([requests.ConnectionError()] * 3)
+    with pytest.raises(requests.ConnectionError):
+        client.get('https://api.binance.com/api/v3/klines')
+    assert session.calls == 3
+
+def test_one_session_per_host():
+    client = MarketDataClient()
+    spot = client.session_for('https://api.binance.com/api/v3/klines')
+    assert client.session_for('https://api.binance.com/api/v3/ticker') is spot
+    assert client.session_for('https://fapi.binance.com/fapi/v1/klines') is not spot
+
+def klines_client(answer, **kwargs):
+    """Client whose get_klines calls answer(market, call) and are recorded as (pair, market)"""
+    client = MarketDataClient(**kwargs)
+    calls = []
+
+    def get_klines(pair, interval, limit, market='spot', start_time=None, end_time=None, symbol=None):
+        calls.append((pair, market))
+        return answer(market, len(calls), end_time)
+    client.get_klines = get_klines
+    return client, calls
+
+def hours(count, end_time=None):
+    end_ms = int((end_time or datetime.now(timezone.utc)).timestamp() * 1000)
+    return [[end_ms - k * 3_600_000, '1', '1', '1', '1', '1'] for k in range(count, 0, -1)]
+
+def test_hedge_prefers_spot_when_both_qualify():
+    def answer(market, call, end_time):
+        if market == 'spot':
+            time.sleep(0.05)  # Futures answers first
+        return hours(20)
+    client, _ = klines_client(answer)
+    assert client.get_klines_hedged('BTCUSDT', '1h', 20, min_candles=10)[1] == 'spot'
+
+    client, _ = klines_client(lambda market, call, end_time: None if market == 'spot' else hours(20))
+    assert client.get_klines_hedged('BTCUSDT', '1h', 20, min_candles=10)[1] == 'futures'
+
+def test_known_market_is_the_only_one_asked():
+    client, calls = klines_client(lambda market, call, end_time: hours(2))
+    klines, pair, source = client.find_klines('BTC', ['USDT', 'BUSD'], '1h', 3, min_candles=10,
+                                              binance_symbol='BTCBUSD', data_source='Binance Futures')
+    # A couple of new candles is a valid incremental answer once the market is known
+    assert (len(klines), pair, source) == (2, 'BTCBUSD', 'Binance Futures')
+    assert calls == [('BTCBUSD', 'futures')]
+
+    client, calls = klines_client(lambda market, call, end_time: None)
+    assert client.find_klines('BTC', ['USDT'], '1h', 3, binance_symbol='BTCUSDT', data_source='Binance Spot') == (None, None, None)
+    assert calls == [('BTCUSDT', 'spot')]
+
+def test_backfill_stays_on_the_first_batch_market(monkeypatch):
+    import background_worker as worker
+
+    # Spot misses the first batch only, it must not take over the rest of the series
+    def answer(market, call, end_time):
+        if market == 'spot' and call == 1:
+            return None
+        return hours(1000, end_time)
+    client, calls = klines_client(answer, hedge=False)
+    monkeypatch.setattr(worker, 'market_data', client)
+    monkeypatch.setattr(worker.time, 'sleep', lambda seconds: None)
+
+    candles, pair, source = worker.fetch_historical_batches('BTC', {'binance': '1h'}, 2500)
+    assert (len(candles), pair, source) == (3000, 'BTCUSDT', 'Binance Futures')
+    assert calls == [('BTCUSDT', 'spot'), ('BTCUSDT', 'futures'), ('BTCUSDT', 'futures'), ('BTCUSDT', 'futures')]
+
+def test_incremental_fetch_uses_the_stored_market(monkeypatch):
+    import background_worker as worker
+
+    client, calls = klines_client(lambda market, call, end_time: hours(3), hedge=False)
+    stored = []
+    monkeypatch.setattr(worker, 'market_data', client)
+    monkeypatch.setattr(worker, 'get_last_candle_time', lambda symbol, timeframe: datetime.now(timezone.utc) - timedelta(hours=2))
+    monkeypatch.setattr(worker, 'get_coin_market', lambda symbol: ('BTCFDUSD', 'Binance Futures'))
+    monkeypatch.setattr(worker, 'store_candles', lambda *args: stored.append(args[2:]))
+    monkeypatch.setattr(worker, 'update_ema_analysis', lambda symbol, timeframe: None)
+
+    assert worker.process_coin_incremental({'symbol': 'btc'}, {'key': '1h', 'binance': '1h'})
+    assert calls == [('BTCFDUSD', 'futures')]
+    assert [(len(candles), pair, source) for candles, pair, source in stored] == [(3, 'BTCFDUSD', 'Binance Futures')]
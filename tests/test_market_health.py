@@ -0,0 +1,130 @@
+"""Negative cache of dead pairs, per-host circuit breakers and fetch_klines' bookkeeping"""
+
+import json
+
+import pytest
+import requests
+
+import market_health
+from market_health import CircuitBreaker, FailureCounters, NegativeCache, fetch_klines
+
+URL = 'https://api.binance.com/api/v3/klines'
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(self.status_code)
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(market_health.time, 'time', lambda: now[0])
+    return now
+
+@pytest.fixture
+def health(tmp_path, monkeypatch):
+    """Fresh module state: negative cache in tmp_path, no breakers, zeroed counters"""
+    cache = NegativeCache(str(tmp_path / 'negative_cache.json'), save_interval_seconds=0)
+    monkeypatch.setattr(market_health, 'negative_cache', cache)
+    monkeypatch.setattr(market_health, 'failure_counters', FailureCounters())
+    monkeypatch.setattr(market_health, '_breakers', {})
+    return cache
+
+def answer(*responses):
+    queue = list(responses)
+
+    def http_get(url, params=None, timeout=None):
+        response = queue.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+    return http_get
+
+def test_negative_ttl_doubles_and_persists(tmp_path, clock):
+    path = str(tmp_path / 'negative_cache.json')
+    cache = NegativeCache(path, save_interval_seconds=0)
+
+    cache.record_miss('FOOUSDT', 'spot')
+    assert cache.is_dead('FOOUSDT', 'spot')
+    assert not cache.is_dead('FOOUSDT', 'futures')
+
+    clock[0] += market_health.NEGATIVE_TTL_BASE_SECONDS
+    assert not cache.is_dead('FOOUSDT', 'spot')  # Due for a re-check
+
+    cache.record_miss('FOOUSDT', 'spot')
+    entry = json.load(open(path))['spot:FOOUSDT']
+    assert entry['misses'] == 2
+    assert entry['retry_after'] - clock[0] == 2 * market_health.NEGATIVE_TTL_BASE_SECONDS
+
+    # Survives a restart, and a hit clears it
+    reloaded = NegativeCache(path, save_interval_seconds=0)
+    assert reloaded.is_dead('FOOUSDT', 'spot')
+    reloaded.record_hit('FOOUSDT', 'spot')
+    assert not NegativeCache(path).is_dead('FOOUSDT', 'spot')
+
+def test_breaker_opens_half_opens_and_backs_off(clock):
+    breaker = CircuitBreaker('api.binance.com', failure_threshold=2, cooldown_seconds=10)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+    clock[0] += 10
+    assert breaker.allow()  # One trial request
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert breaker.cooldown == 20
+
+    clock[0] += 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.cooldown == 10
+
+def test_invalid_symbol_is_cached_as_dead(health):
+    invalid = FakeResponse(400, {'code': market_health.BINANCE_INVALID_SYMBOL, 'msg': 'Invalid symbol.'})
+    params = {'symbol': 'FOOUSDT', 'interval': '1d', 'limit': 60}
+
+    assert fetch_klines(URL, params, 'spot', symbol='FOO', http_get=answer(invalid)) is None
+    # Known dead: not asked again
+    assert fetch_klines(URL, params, 'spot', symbol='FOO', http_get=answer()) is None
+
+    counts = market_health.failure_counters.report()['FOO']
+    assert (counts['misses'], counts['skipped_dead']) == (1, 1)
+    # The host answered fine, its breaker stays closed
+    assert market_health.get_breaker(URL).state == 'closed'
+
+def test_outages_open_the_hosts_breaker(health, monkeypatch):
+    monkeypatch.setattr(market_health, '_breakers', {'api.binance.com': CircuitBreaker('api.binance.com', 2)})
+    params = {'symbol': 'BTCUSDT', 'interval': '1d', 'limit': 60}
+
+    fetch_klines(URL, params, 'spot', http_get=answer(FakeResponse(503, {})))
+    fetch_klines(URL, params, 'spot', http_get=answer(requests.ConnectionError()))
+    assert fetch_klines(URL, params, 'spot', http_get=answer()) is None
+
+    counts = market_health.failure_counters.report()['BTCUSDT']
+    assert (counts['errors'], counts['short_circuited']) == (2, 1)
+    assert not health.is_dead('BTCUSDT', 'spot')
+
+def test_empty_window_is_not_a_dead_pair(health):
+    params = {'symbol': 'BTCUSDT', 'interval': '1d', 'limit': 60, 'startTime': 0}
+    assert fetch_klines(URL, params, 'spot', http_get=answer(FakeResponse(200, []))) is None
+    assert not health.is_dead('BTCUSDT', 'spot')
+
+    del params['startTime']
+    assert fetch_klines(URL, params, 'spot', http_get=answer(FakeResponse(200, []))) is None
+    assert health.is_dead('BTCUSDT', 'spot')
+
+def test_klines_are_returned(health):
+    params = {'symbol': 'BTCUSDT', 'interval': '1d', 'limit': 1}
+    klines = [[0, '1', '2', '0.5', '1.5', '10']]
+    assert fetch_klines(URL, params, 'spot', http_get=answer(FakeResponse(200, klines))) == klines
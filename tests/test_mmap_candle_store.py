@@ -0,0 +1,79 @@
+"""Fixed-width memory-mapped candle files: appends, in-place updates, backfills and ranges"""
+
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from mmap_candle_store import DTYPE, MmapCandleStore, range_of, records_to_dicts, rows_to_records, to_ms
+
+HOUR_MS = 3_600_000
+
+def records(hours, close=1.0):
+    out = np.zeros(len(hours), dtype=DTYPE)
+    out['time'] = [h * HOUR_MS for h in hours]
+    out['close'] = close
+    out['ema50'] = np.nan
+    return out
+
+@pytest.fixture
+def store(tmp_path):
+    return MmapCandleStore(str(tmp_path))
+
+def test_disabled_without_a_directory():
+    store = MmapCandleStore(None)
+    assert not store.enabled
+    assert store.write('BTC', '1h', records([1])) == 0
+
+def test_append_and_read(store):
+    assert len(store.read('BTC', '1h')) == 0
+    store.write('BTC', '1h', records([1, 2, 3]))
+    store.write('btc', '1h', records([4, 5]))
+
+    stored = store.read('BTC', '1h')
+    assert isinstance(stored, np.memmap)
+    assert stored['time'].tolist() == [h * HOUR_MS for h in range(1, 6)]
+
+def test_existing_times_are_overwritten_in_place(store):
+    store.write('BTC', '1h', records([1, 2, 3]))
+    store.write('BTC', '1h', records([3], close=9.0))  # The open candle, updated
+
+    stored = store.read('BTC', '1h')
+    assert len(stored) == 3
+    assert stored['close'].tolist() == [1.0, 1.0, 9.0]
+
+def test_backfill_rewrites_the_file(store):
+    store.write('BTC', '1h', records([1, 4]))
+    reader = store.read('BTC', '1h')
+
+    store.write('BTC', '1h', records([2, 3], close=2.0))
+    assert store.read('BTC', '1h')['time'].tolist() == [h * HOUR_MS for h in (1, 2, 3, 4)]
+    # An open mapping keeps the old contents
+    assert reader['time'].tolist() == [HOUR_MS, 4 * HOUR_MS]
+
+def test_range_is_inclusive_and_limits_from_the_end(store):
+    store.write('BTC', '1h', records(range(10)))
+
+    assert store.range('BTC', '1h', 2 * HOUR_MS, 5 * HOUR_MS)['time'].tolist() == [h * HOUR_MS for h in (2, 3, 4, 5)]
+    assert store.range('BTC', '1h', limit=2)['time'].tolist() == [8 * HOUR_MS, 9 * HOUR_MS]
+    start = datetime.fromtimestamp(7 * HOUR_MS / 1000, tz=timezone.utc)
+    assert len(range_of(store.read('BTC', '1h'), start=start)) == 3
+
+def test_rejects_foreign_files(store):
+    path = store.path('BTC', '1h')
+    os.makedirs(os.path.dirname(path))
+    with open(path, 'wb') as f:
+        f.write(b'x' * 64)
+    with pytest.raises(ValueError):
+        store.read('BTC', '1h')
+
+def test_db_rows_round_trip():
+    time = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    converted = rows_to_records([(time, 1.0, 2.0, 0.5, 1.5, 10.0, None), (time.replace(hour=1), 1, 2, 0, 1, 5, 1.2)])
+    assert converted['time'][0] == to_ms(time)
+    assert np.isnan(converted['ema50'][0])
+
+    dicts = records_to_dicts(converted)
+    assert dicts[0] == {'time': time, 'open': 1.0, 'high': 2.0, 'low': 0.5, 'close': 1.5, 'volume': 10.0, 'ema50': None}
+    assert dicts[1]['ema50'] == 1.2
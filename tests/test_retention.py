@@ -0,0 +1,144 @@
+"""Retention policies, and a compaction run on an embedded SQLite database"""
+
+import importlib
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import retention
+from retention import aggregate_candles, compact_series, parse_policies, retention_cutoff
+from storage import SQLiteBackend
+
+NOW = datetime(2025, 6, 1, 12, 7, tzinfo=timezone.utc)
+
+INSERT = """
+    INSERT INTO candles (time, symbol, timeframe, open, high, low, close, volume, ema50)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+def test_retention_is_off_by_default(monkeypatch):
+    monkeypatch.delenv('CANDLE_RETENTION', raising=False)
+    importlib.reload(retention)
+    assert retention.RETENTION_POLICIES == {}
+    assert parse_policies('') == {}
+    assert parse_policies('off') == {}
+    assert parse_policies(None) == {}
+
+def test_parse_policies():
+    policies = parse_policies('15m:90:1h, 1h:1825:4h, 4h:30:15m, bogus:1')
+    assert policies['15m'] == {'keep_days': 90, 'rollup': '1h'}
+    assert policies['1h'] == {'keep_days': 1825, 'rollup': '4h'}
+    # Rolling up into a finer timeframe is refused, the policy only deletes
+    assert policies['4h'] == {'keep_days': 30, 'rollup': None}
+    assert 'bogus' not in policies
+
+def test_schedule_never_runs_without_policies(monkeypatch):
+    monkeypatch.setattr(retention, 'RETENTION_POLICIES', {})
+    assert not retention.RetentionSchedule().due(NOW.replace(hour=retention.RETENTION_HOUR, minute=30))
+
+def test_schedule_runs_once_a_day_even_when_checked_late(monkeypatch):
+    monkeypatch.setattr(retention, 'RETENTION_POLICIES', parse_policies('15m:90:1h'))
+    schedule = retention.RetentionSchedule()
+    at = NOW.replace(hour=retention.RETENTION_HOUR)
+
+    assert not schedule.due(at.replace(minute=29))
+    # The first check after :30, however late, then not again that day
+    assert schedule.due(at.replace(minute=34, second=40))
+    assert not schedule.due(at.replace(minute=35))
+    assert not schedule.due(at + timedelta(hours=5))
+    assert schedule.due(at.replace(minute=30) + timedelta(days=1))
+
+class FakeClock:
+    """Stands in for background_worker's time.sleep / datetime.now, advanced by the loop itself"""
+
+    def __init__(self, start, checks):
+        self.now = start
+        self.checks = checks
+
+    def sleep(self, seconds):
+        if self.checks == 0:
+            raise KeyboardInterrupt
+        self.checks -= 1
+        self.now += timedelta(seconds=seconds)
+
+    def datetime(self):
+        clock = self
+
+        class FakeDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return clock.now if tz else clock.now.replace(tzinfo=None)
+        return FakeDatetime
+
+def test_poll_worker_runs_retention_after_a_long_update(monkeypatch):
+    import background_worker
+
+    monkeypatch.setattr(retention, 'RETENTION_POLICIES', parse_policies('15m:90:1h'))
+    # Checks every minute over two days, starting just before the first retention window
+    clock = FakeClock(NOW.replace(hour=retention.RETENTION_HOUR, minute=25), checks=2 * 24 * 60)
+    runs = []
+
+    def run_smart_update(coins, force_all=False):
+        # The hh:30 15m update for 200 coins outlasts the minute it started in
+        if clock.now.minute == 30:
+            clock.now += timedelta(seconds=170)
+        return 0, 0
+
+    monkeypatch.setattr(background_worker.time, 'sleep', clock.sleep)
+    monkeypatch.setattr(background_worker, 'datetime', clock.datetime())
+    monkeypatch.setattr(background_worker, 'get_top_coins', lambda limit: [])
+    monkeypatch.setattr(background_worker, 'store_coins', lambda coins: None)
+    monkeypatch.setattr(background_worker, 'run_smart_update', run_smart_update)
+    monkeypatch.setattr(background_worker, 'run_retention', lambda: runs.append(clock.now))
+
+    background_worker.run_continuous_smart(top_n=200, check_interval_seconds=60)
+
+    # One run a day, each in the retention hour although every check at :30 ran past it
+    assert [run.day for run in runs] == [NOW.day, NOW.day + 1, NOW.day + 2]
+    assert all(run.hour == retention.RETENTION_HOUR and run.minute > 30 for run in runs)
+
+def test_cutoff_aligned_to_rollup_bucket():
+    cutoff = retention_cutoff('15m', {'keep_days': 1, 'rollup': '4h'}, NOW)
+    assert cutoff == datetime(2025, 5, 31, 12, 0, tzinfo=timezone.utc)
+
+def test_aggregate_candles():
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    rows = [(start + timedelta(minutes=15 * i), 10 + i, 20 + i, 5 - i, 11 + i, 1.0) for i in range(5)]
+    buckets = aggregate_candles(rows, '1h')
+    assert buckets[start] == [10, 23, 2, 14, 4.0]
+    assert buckets[start + timedelta(hours=1)] == [14, 24, 1, 15, 1.0]
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(retention, 'RETENTION_BATCH_PAUSE', 0)
+    backend = SQLiteBackend(str(tmp_path / 'retention.db'))
+    backend.setup()
+    return backend
+
+def test_compact_series_rolls_up_then_deletes(backend):
+    conn = backend.connect()
+    cur = conn.cursor()
+    start = datetime(2025, 5, 29, tzinfo=timezone.utc)
+    rows = []
+    for i in range(4 * 24 * 4):  # 4 days of 15m candles
+        price = 100 + i
+        rows.append((start + timedelta(minutes=15 * i), 'BTC', '15m', price, price + 1, price - 1, price + 0.5, 1.0, None))
+    cur.executemany(INSERT, rows)
+    # An exchange 1h candle already exists for the first hour and must be kept as is
+    cur.execute(INSERT, (start, 'BTC', '1h', 1, 1, 1, 1, 1, None))
+    conn.commit()
+
+    deleted, rolled_up = compact_series(conn, 'BTC', '15m', {'keep_days': 1, 'rollup': '1h'}, NOW)
+
+    cutoff = datetime(2025, 5, 31, 12, 0, tzinfo=timezone.utc)
+    expired_hours = int((cutoff - start).total_seconds() // 3600)
+    assert deleted == expired_hours * 4
+    assert rolled_up == expired_hours - 1
+
+    cur.execute("SELECT COUNT(*) FROM candles WHERE symbol = %s AND timeframe = %s", ('BTC', '15m'))
+    assert cur.fetchone()[0] == len(rows) - deleted
+    cur.execute("SELECT open, close FROM candles WHERE symbol = %s AND timeframe = %s ORDER BY time", ('BTC', '1h'))
+    hourly = cur.fetchall()
+    assert hourly[0] == (1, 1)
+    assert hourly[1] == (104, 107.5)
+    conn.close()
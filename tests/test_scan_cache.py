@@ -0,0 +1,91 @@
+"""Manifest-indexed scan results: TTL lookups, eviction and legacy files"""
+
+import json
+import time
+
+from scan_cache import ScanCache, make_key
+
+KEY = make_key('ema_scan', 10, ['1w', '1d', '4h'])
+
+def write_scan(cache, name, data=None, size=0):
+    with open(cache.path(name), 'w') as f:
+        json.dump(data or {'name': name, 'padding': 'x' * size}, f)
+    return name
+
+def test_make_key_ignores_timeframe_order():
+    assert make_key('ema_scan', 10, ['4h', '1w', '1d']) == KEY == 'ema_scan|top10|1d,1w,4h|binance'
+
+def test_lookup_and_ttl(tmp_path):
+    cache = ScanCache(str(tmp_path))
+    assert cache.lookup(key=KEY) is None
+
+    cache.put(KEY, 'ema_scan', 10, [write_scan(cache, 'a.json')])
+    assert cache.lookup(key=KEY)['filename'] == 'a.json'
+    assert cache.lookup(kind='ema_scan')['filename'] == 'a.json'
+    assert cache.lookup(key=KEY, max_age_minutes=5) is not None
+
+    cache.manifest['entries']['a.json']['created'] = time.time() - 600
+    assert cache.lookup(key=KEY, max_age_minutes=5) is None
+
+def test_manifest_is_shared_between_instances(tmp_path):
+    writer = ScanCache(str(tmp_path))
+    writer.put(KEY, 'ema_scan', 10, [write_scan(writer, 'a.json', {'coins': [1]})])
+
+    data, entry = ScanCache(str(tmp_path)).get(key=KEY)
+    assert data == {'coins': [1]}
+    assert entry['filename'] == 'a.json'
+
+def test_keeps_max_per_key(tmp_path):
+    cache = ScanCache(str(tmp_path), max_per_key=2)
+    cache.load()
+    for i in range(3):
+        cache.register(KEY, 'ema_scan', 10, [write_scan(cache, f"{i}.json")], created=1000 + i)
+    cache.evict()
+
+    assert sorted(cache.manifest['entries']) == ['1.json', '2.json']
+    assert not (tmp_path / '0.json').exists()
+
+def test_size_eviction_keeps_the_newest_of_each_key(tmp_path):
+    cache = ScanCache(str(tmp_path), max_bytes=1500)
+    other = make_key('multi_scan', 10, ['1h'])
+    cache.load()
+    cache.register(KEY, 'ema_scan', 10, [write_scan(cache, 'old.json', size=1000)], created=1000)
+    cache.register(KEY, 'ema_scan', 10, [write_scan(cache, 'new.json', size=1000)], created=2000)
+    cache.register(other, 'multi_scan', 10, [write_scan(cache, 'multi.json', size=100)], created=500)
+    cache.evict()
+
+    assert sorted(cache.manifest['entries']) == ['multi.json', 'new.json']
+
+def test_forget_repoints_latest(tmp_path):
+    cache = ScanCache(str(tmp_path))
+    cache.load()
+    cache.register(KEY, 'ema_scan', 10, [write_scan(cache, 'a.json')], created=1000)
+    cache.register(KEY, 'ema_scan', 10, [write_scan(cache, 'b.json')], created=2000)
+
+    cache.forget('b.json', delete_files=True)
+    assert cache.lookup(key=KEY)['filename'] == 'a.json'
+    assert not (tmp_path / 'b.json').exists()
+
+def test_missing_file_is_forgotten(tmp_path):
+    cache = ScanCache(str(tmp_path))
+    cache.put(KEY, 'ema_scan', 10, [write_scan(cache, 'a.json')])
+    (tmp_path / 'a.json').unlink()
+
+    assert cache.get(key=KEY) == (None, None)
+    assert cache.lookup(key=KEY) is None
+
+def test_body_is_encoded_once(tmp_path):
+    cache = ScanCache(str(tmp_path))
+    cache.put(KEY, 'ema_scan', 10, [write_scan(cache, 'a.json', {'coins': [1]})])
+
+    body, entry = cache.body(key=KEY)
+    assert json.loads(body) == {'coins': [1]}
+    assert cache.body(key=KEY)[0] is body
+
+def test_registers_legacy_files(tmp_path):
+    (tmp_path / 'crypto_ema_scan_top10_20250101_120000.json').write_text('{}')
+    (tmp_path / 'coins_AVOID_top10_20250101_120000.csv').write_text('')
+
+    entry = ScanCache(str(tmp_path)).lookup(key=KEY)
+    assert entry['filename'] == 'crypto_ema_scan_top10_20250101_120000.json'
+    assert entry['files'][1:] == ['coins_AVOID_top10_20250101_120000.csv']
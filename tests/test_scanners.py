@@ -0,0 +1,123 @@
+"""Incremental rescans shared by the single- and multi-timeframe scanners (see scanner_base)"""
+
+from datetime import datetime, timezone
+
+import pytest
+
+from crypto_ema_scanner import CryptoEMAScanner
+from multi_timeframe_scanner import MultiTimeframeEMAScanner
+
+# Wednesday 10:20 UTC, the last fetch was 10:05: the 15m candle closed since, the rest didn't
+NOW = datetime(2025, 1, 8, 10, 20, tzinfo=timezone.utc)
+LAST_FETCH = datetime(2025, 1, 8, 10, 5, tzinfo=timezone.utc).isoformat()
+
+COIN = {'symbol': 'btc', 'name': 'Bitcoin', 'market_cap_rank': 1, 'market_cap': 2000}
+
+def make(scanner_class, monkeypatch):
+    scanner = scanner_class(top_n=5, client=object(), cache=object(), data_source='rest', kline_store=object())
+    fetched = []
+
+    def analyze(coin_data, verbose=False, reuse=None):
+        results = {}
+        for key in scanner.timeframes:
+            if key in reuse:
+                results[key] = reuse[key]
+            else:
+                fetched.append(key)
+                results[key] = {'symbol': 'BTC', 'pct_from_ema50': 1.0, 'rank': 1}
+        return results
+
+    monkeypatch.setattr(scanner, 'analyze_coin_all_timeframes', analyze)
+    return scanner, fetched
+
+def test_cache_keys():
+    crypto = CryptoEMAScanner(top_n=5, client=object(), cache=object(), data_source='rest', kline_store=object())
+    multi = MultiTimeframeEMAScanner(top_n=5, client=object(), cache=object(), data_source='rest', kline_store=object())
+    assert crypto.cache_key() == 'ema_scan|top5|1d,1w,4h|binance'
+    assert multi.cache_key() == 'multi_scan|top5|12h,15m,1d,1h,1w,30m,4h|binance'
+
+@pytest.mark.parametrize('scanner_class', [CryptoEMAScanner, MultiTimeframeEMAScanner])
+def test_first_scan_fetches_everything(scanner_class, monkeypatch):
+    scanner, fetched = make(scanner_class, monkeypatch)
+    coin_result, refetched = scanner.scan_coin(COIN, now=NOW)
+    assert refetched == len(scanner.timeframes)
+    assert fetched == list(scanner.timeframes)
+    assert set(coin_result['fetched_at']) == set(scanner.timeframes)
+
+def test_crypto_rescan_reuses_open_candles(monkeypatch):
+    scanner, fetched = make(CryptoEMAScanner, monkeypatch)
+    previous = {
+        'coin_info': COIN,
+        'weekly': {'pct_from_ema50': 5.0, 'rank': 3},
+        'daily': None,  # Failed last time, retried
+        '4h': {'pct_from_ema50': -1.0, 'rank': 3},
+        'fetched_at': {key: LAST_FETCH for key in scanner.timeframes}
+    }
+    index = scanner.index_previous_scan({'coin_results': [previous]})
+
+    coin_result, refetched = scanner.scan_coin(COIN, index, now=NOW)
+    assert fetched == ['daily']
+    assert refetched == 1
+    # Reused results take the coin's current rank
+    assert coin_result['weekly'] == {'pct_from_ema50': 5.0, 'rank': 1, 'market_cap': 2000}
+    assert coin_result['fetched_at']['weekly'] == LAST_FETCH
+    assert coin_result['fetched_at']['daily'] == NOW.isoformat()
+
+def test_multi_rescan_refetches_closed_candles(monkeypatch):
+    scanner, fetched = make(MultiTimeframeEMAScanner, monkeypatch)
+    previous = {
+        'coin_info': COIN,
+        'timeframes': {key: {'pct_from_ema50': 2.0, 'rank': 1} for key in scanner.timeframes},
+        'fetched_at': {key: LAST_FETCH for key in scanner.timeframes}
+    }
+    index = scanner.index_previous_scan({'coins': [previous]})
+
+    coin_result, refetched = scanner.scan_coin(COIN, index, now=NOW)
+    assert fetched == ['15m']
+    assert refetched == 1
+    assert coin_result['timeframes']['1w']['pct_from_ema50'] == 2.0
+
+@pytest.mark.parametrize('scanner_class', [CryptoEMAScanner, MultiTimeframeEMAScanner])
+def test_database_results_are_never_fetched(scanner_class, monkeypatch):
+    scanner, fetched = make(scanner_class, monkeypatch)
+    db_results = {'BTC': {key: {'data_source': 'Database'} for key in scanner.timeframes}}
+
+    _, refetched = scanner.scan_coin(COIN, now=NOW, db_results=db_results)
+    assert fetched == []
+    assert refetched == 0
+
+class FakeCandleSource:
+    """get_latest_candles over fixed series, recording each call"""
+
+    def __init__(self, series):
+        self.series = series
+        self.calls = []
+
+    def get_latest_candles(self, symbols, limits, now=None):
+        self.calls.append((symbols, limits))
+        return self.series
+
+def candles(closes):
+    """(time, close, ema50) rows with the worker's EMA stored"""
+    return [(NOW, close, 100.0) for close in closes]
+
+@pytest.mark.parametrize('scanner_class, key, fields', [
+    (CryptoEMAScanner, 'weekly', {'timeframe': 'Weekly'}),
+    (MultiTimeframeEMAScanner, '1w', {'timeframe': '1w', 'timeframe_label': 'Weekly'})
+])
+def test_load_db_results_in_one_query(scanner_class, key, fields, monkeypatch):
+    scanner, _ = make(scanner_class, monkeypatch)
+    scanner.db_source = FakeCandleSource({('BTC', '1w'): candles([110.0] * 60)})
+
+    db_results = scanner.load_db_results([COIN, {**COIN, 'symbol': 'eth'}], now=NOW)
+
+    assert len(scanner.db_source.calls) == 1
+    symbols, limits = scanner.db_source.calls[0]
+    assert symbols == ['BTC', 'ETH']
+    assert limits == {tf['binance']: tf['limit'] for tf in scanner.timeframes.values()}
+
+    result = db_results['BTC'][key]
+    assert result['pct_from_ema50'] == pytest.approx(10.0)
+    assert result['data_source'] == 'Database'
+    assert {name: result[name] for name in fields} == fields
+    assert 'ETH' not in db_results
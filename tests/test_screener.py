@@ -0,0 +1,142 @@
+"""Screener expressions: parsing, SQL and NumPy evaluation agreeing, presets and the strategic summary"""
+
+import pytest
+
+from analysis_snapshot import AnalysisSnapshotStore
+from conftest import CANDLES_START, insert_market
+from screener import PRESETS, SCREEN_TABLE_SQL, ScreenError, ScreenTable, parse, parse_sort, strategic_summary
+
+SCREENS = [
+    ('pct_1w >= -10', ''),
+    ('above_1w and (pct_4h between -5 and 5 or aligned >= 3)', '-pct_1w'),
+    ('rank <= 2 or below >= 2', 'rank'),
+    ('has_1d and pct_1d != 4', '-rank'),
+    ('price > 50 and below_4h', ''),
+    ('pct_15m < 0 or pct_1h > 0', ''),  # Nobody analysed there
+    ('rank >= 1', '-pct_4h'),
+]
+
+def test_parse():
+    assert parse('pct_1w >= -10') == ('cmp', 'pct_1w', '>=', -10.0)
+    assert parse('above_1w or rank < 5 and has_4h') == (
+        'or', [('flag', 'above_1w'), ('and', [('cmp', 'rank', '<', 5.0), ('flag', 'has_4h')])]
+    )
+    assert parse('(above_1w OR rank < 5) and pct_4h between -5 and 5.5') == (
+        'and', [('or', [('flag', 'above_1w'), ('cmp', 'rank', '<', 5.0)]), ('between', 'pct_4h', -5.0, 5.5)]
+    )
+
+@pytest.mark.parametrize('text, message', [
+    ('', 'Empty expression'),
+    ('volume > 3', "Unknown field 'volume'"),
+    ('rank >', 'Expected number, found end of expression'),
+    ('rank > 3 rank', 'Unexpected rank'),
+    ('(rank > 3', r'Expected \), found end of expression'),
+    ('rank ; 3', 'Unexpected input at position 4'),
+    ('rank between 1 or 2', 'Expected and, found or'),
+])
+def test_parse_errors(text, message):
+    with pytest.raises(ScreenError, match=message):
+        parse(text)
+
+def test_parse_sort():
+    assert parse_sort(' -PCT_1w, rank,') == [('pct_1w', True), ('rank', False)]
+    assert parse_sort(None) == []
+    with pytest.raises(ScreenError, match="Unknown sort field 'volume'"):
+        parse_sort('volume')
+
+def insert_screen_coins(backend):
+    """COINS plus XRP (far below the weekly EMA) and DOGE (never analysed)"""
+    insert_market(backend)
+    conn = backend.connect()
+    cur = conn.cursor()
+    for symbol, rank, price in (('XRP', 4, 0.5), ('DOGE', 5, 0.1)):
+        cur.execute("INSERT INTO coins (symbol, name, market_cap_rank, current_price) VALUES (%s, %s, %s, %s)",
+                    (symbol, symbol.title(), rank, price))
+    for timeframe, pct in (('1w', -20.0), ('4h', -2.0)):
+        cur.execute(
+            "INSERT INTO ema_analysis (symbol, timeframe, current_price, ema50, pct_from_ema50, above_ema50, analysis_date) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            ('XRP', timeframe, 0.5, 0.625, pct, False, CANDLES_START)
+        )
+    conn.commit()
+    conn.close()
+
+@pytest.fixture
+def screened(sqlite_api):
+    api, backend = sqlite_api
+    insert_screen_coins(backend)
+    return api, backend
+
+def screen(client, where, sort):
+    response = client.get('/api/screener', query_string={'where': where, 'sort': sort})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+def test_sql_and_snapshot_agree(screened, monkeypatch):
+    api, backend = screened
+    client = api.app.test_client()
+    from_database = [screen(client, where, sort) for where, sort in SCREENS]
+
+    store = AnalysisSnapshotStore(backend)
+    store.refresh('test')
+    monkeypatch.setattr(api, 'analysis_snapshot', store)
+    assert [screen(client, where, sort) for where, sort in SCREENS] == from_database
+
+    symbols = [[coin['symbol'] for coin in body['coins']] for body in from_database]
+    assert symbols[0] == ['BTC', 'ETH', 'SOL']
+    assert symbols[1] == ['SOL', 'BTC']
+    assert symbols[2] == ['BTC', 'ETH', 'XRP']
+    assert symbols[3] == ['SOL', 'ETH']
+    assert symbols[4] == ['BTC']
+    assert symbols[5] == []
+    # Missing values sort last, then by symbol
+    assert symbols[6] == ['SOL', 'ETH', 'BTC', 'XRP', 'DOGE']
+
+def test_strategic_summary_is_the_presets(screened):
+    api, backend = screened
+    conn = backend.connect(dict_rows=True)
+    cur = conn.cursor()
+    cur.execute(SCREEN_TABLE_SQL)
+    summary = strategic_summary(ScreenTable(cur.fetchall()))
+    conn.close()
+
+    def symbols(section):
+        return [coin['symbol'] for coin in summary[section]['coins']]
+    assert symbols('evaluate_long_term') == ['BTC', 'ETH', 'SOL']
+    assert symbols('trade_now_short_term') == ['BTC', 'ETH', 'SOL', 'XRP']
+    assert symbols('avoid') == ['XRP']
+    assert summary['avoid']['coins'][0] == {
+        'symbol': 'XRP', 'name': 'Xrp', 'market_cap_rank': 4, 'current_price': 0.5,
+        'ema50': 0.625, 'pct_from_ema50': -20.0, 'above_ema50': False
+    }
+    assert summary['trade_now_short_term']['coins'][0]['four_h_pct_from_ema'] == -1.0
+    assert summary['avoid']['description'] == PRESETS['avoid']['description']
+
+    assert api.app.test_client().get('/api/strategic-summary').get_json() == summary
+
+def test_presets_and_errors(screened):
+    api, _ = screened
+    client = api.app.test_client()
+    assert client.get('/api/screener/presets').get_json() == PRESETS
+
+    body = client.get('/api/screener?preset=avoid').get_json()
+    assert (body['preset'], body['where'], body['count']) == ('avoid', PRESETS['avoid']['where'], 1)
+
+    assert client.get('/api/screener?where=rank%3C2&limit=0').get_json()['coins'] == []
+    for query in ('preset=moon', 'where=volume>1', 'where=rank<2&limit=x', 'where=rank<2&sort=volume'):
+        response = client.get(f'/api/screener?{query}')
+        assert response.status_code == 400
+        assert response.get_json()['error']
+
+def test_postgres_runs_the_same_screens(screened, postgres_url, monkeypatch):
+    api, _ = screened
+    client = api.app.test_client()
+    on_sqlite = [screen(client, where, sort) for where, sort in SCREENS]
+
+    from storage import PostgresBackend
+    from watermarks import WatermarkReader
+    backend = PostgresBackend(postgres_url)
+    insert_screen_coins(backend)
+    monkeypatch.setattr(api, 'storage_backend', backend)
+    monkeypatch.setattr(api, 'watermark_reader', WatermarkReader(backend, cache_seconds=0))
+    assert [screen(client, where, sort) for where, sort in SCREENS] == on_sqlite
@@ -0,0 +1,133 @@
+"""Single-flight coalescing: one execution per burst of identical calls, in the API too"""
+
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+def run_burst(flight, key, fn, callers):
+    """Start one leader, then `callers - 1` followers once it's running; [(result, shared)]"""
+    results = [None] * callers
+
+    def call(i):
+        try:
+            results[i] = flight.do(key, fn, group='test')
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    threads[0].start()
+    wait_for(lambda: key in flight.calls)
+    for thread in threads[1:]:
+        thread.start()
+    return threads, results
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    executions = []
+
+    def fn():
+        executions.append(1)
+        release.wait(5)
+        return object()
+
+    threads, results = run_burst(flight, 'k', fn, 5)
+    wait_for(lambda: flight.stats['test']['coalesced'] == 4)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(executions) == 1
+    assert len({id(result) for result, _ in results}) == 1
+    assert [shared for _, shared in results] == [False, True, True, True, True]
+
+    stats = flight.get_stats()
+    assert (stats['requests'], stats['executions'], stats['coalesced']) == (5, 1, 4)
+    assert stats['coalesced_pct'] == 80.0
+    assert stats['max_waiters'] == 4
+    assert stats['in_flight'] == 0
+
+def test_error_reaches_every_waiter_and_is_not_cached():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise ValueError("boom")
+
+    threads, results = run_burst(flight, 'k', fail, 3)
+    wait_for(lambda: flight.stats['test']['coalesced'] == 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert all(isinstance(result, ValueError) for result in results)
+
+    # Finished calls are forgotten, the next caller runs again
+    assert flight.do('k', lambda: 42) == (42, False)
+
+def test_sequential_and_distinct_calls_run_separately():
+    flight = SingleFlight()
+    assert flight.do('a', lambda: 1, group='g') == (1, False)
+    assert flight.do('a', lambda: 2, group='g') == (2, False)
+    assert flight.do('b', lambda: 3, group='g') == (3, False)
+    assert flight.get_stats()['by_route'] == {'g': {'requests': 3, 'executions': 3, 'coalesced': 0}}
+
+def test_identical_api_requests_share_one_query(sqlite_api, monkeypatch):
+    api, backend = sqlite_api
+    flight = SingleFlight()
+    monkeypatch.setattr(api, 'single_flight', flight)
+    path = '/api/candles/BTC?timeframe=1h&limit=10'
+    expected = api.app.test_client().get(path).get_data()  # Also connects the watermark reader
+
+    release = threading.Event()
+    connects = []
+    connect = backend.connect
+
+    def slow_connect(*args, **kwargs):
+        connects.append(1)
+        release.wait(5)
+        return connect(*args, **kwargs)
+    monkeypatch.setattr(backend, 'connect', slow_connect)
+
+    bodies = []
+
+    def get():
+        bodies.append(api.app.test_client().get(path).get_data())
+
+    threads = [threading.Thread(target=get) for _ in range(4)]
+    threads[0].start()
+    wait_for(lambda: connects)
+    for thread in threads[1:]:
+        thread.start()
+    wait_for(lambda: flight.stats['get_candles']['coalesced'] == 3)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(connects) == 1
+    assert bodies == [expected] * 4
+
+    stats = api.app.test_client().get('/api/coalescing-stats').get_json()
+    assert stats['by_route']['get_candles'] == {'requests': 5, 'executions': 2, 'coalesced': 3}
+
+@pytest.mark.parametrize('other', [
+    '/api/candles/BTC?timeframe=1h&limit=11',
+    '/api/candles/ETH?timeframe=1h&limit=10',
+])
+def test_different_requests_are_not_coalesced(sqlite_api, monkeypatch, other):
+    api, _ = sqlite_api
+    flight = SingleFlight()
+    monkeypatch.setattr(api, 'single_flight', flight)
+    client = api.app.test_client()
+    client.get('/api/candles/BTC?timeframe=1h&limit=10')
+    client.get(other)
+    assert flight.get_stats()['executions'] == 2
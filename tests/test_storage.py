@@ -0,0 +1,70 @@
+"""The SQLite backend running the Postgres queries: placeholders, NOW(), timestamps, upserts"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import storage
+from storage import PostgresBackend, SQLiteBackend, SQLiteCursor, get_backend
+
+UPSERT = """
+    INSERT INTO candles (time, symbol, timeframe, open, high, low, close, volume, ema50)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (time, symbol, timeframe) DO UPDATE SET
+        close = EXCLUDED.close
+"""
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'scanner.db'))
+    backend.setup()
+    return backend
+
+def test_translate():
+    query = "SELECT * FROM candles WHERE symbol = %s AND time < NOW()"
+    translated = SQLiteCursor.translate(query)
+    assert translated.startswith("SELECT * FROM candles WHERE symbol = ? AND time < (strftime(")
+    assert SQLiteCursor.translate(query) is translated
+
+def test_setup_is_idempotent(backend):
+    backend.setup()
+
+def test_upsert_and_timestamps(backend):
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    conn = backend.connect()
+    cur = conn.cursor()
+    cur.executemany(UPSERT, [(start + timedelta(hours=h), 'BTC', '1h', 1, 2, 0, 1, 1, None) for h in range(3)])
+    cur.execute(UPSERT, (start, 'BTC', '1h', 1, 2, 0, 9, 1, None))
+    conn.commit()
+
+    cur.execute("SELECT time, close FROM candles WHERE symbol = %s ORDER BY time", ('BTC',))
+    rows = cur.fetchall()
+    assert rows[0] == (start, 9)
+    assert [row[0] for row in rows] == [start + timedelta(hours=h) for h in range(3)]
+
+    # Aggregates lose the column type, they still come back as datetimes
+    cur.execute("SELECT MIN(time), MAX(time) FROM candles")
+    assert cur.fetchone() == (start, start + timedelta(hours=2))
+
+    # Stored as fixed-width UTC text, so comparisons against NOW() and parameters work
+    cur.execute("SELECT COUNT(*) FROM candles WHERE time < NOW() AND time >= %s", (start + timedelta(hours=1),))
+    assert cur.fetchone() == (2,)
+    conn.close()
+
+def test_dict_rows(backend):
+    conn = backend.connect(dict_rows=True)
+    cur = conn.cursor()
+    cur.execute("SELECT 1 AS one, 'x' AS name")
+    assert cur.fetchone() == {'one': 1, 'name': 'x'}
+    conn.close()
+
+def test_get_backend(monkeypatch):
+    monkeypatch.setattr(storage, 'STORAGE_BACKEND', None)
+    monkeypatch.setattr(storage, 'DATABASE_URL', 'sqlite:////tmp/scanner.db')
+    backend = get_backend()
+    assert isinstance(backend, SQLiteBackend)
+    assert backend.path == '/tmp/scanner.db'
+
+    monkeypatch.setattr(storage, 'DATABASE_URL', 'postgresql://localhost/crypto')
+    assert isinstance(get_backend(), PostgresBackend)
+    assert isinstance(get_backend('sqlite'), SQLiteBackend)
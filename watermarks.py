@@ -0,0 +1,118 @@
+"""
+Data Watermarks
+One versioned row per resource the worker writes ('coins', 'ema_analysis:1w', 'candles:15m', ...),
+bumped in the same transaction as the data. The API derives ETag / Last-Modified from them
+and answers conditional requests without running the heavy queries
+"""
+
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+# Seconds the API reuses watermark reads (polls within this window share one lookup)
+WATERMARK_CACHE_SECONDS = float(os.getenv('WATERMARK_CACHE_SECONDS', 1.0))
+
+# Postgres NOTIFY channel the worker signals after each tick (API snapshots LISTEN on it)
+ANALYSIS_CHANNEL = os.getenv('ANALYSIS_CHANNEL', 'analysis_updated')
+
+TIMEFRAMES = ['15m', '1h', '4h', '1d', '1w']
+
+WATERMARKS_TABLE = """
+    CREATE TABLE IF NOT EXISTS data_watermarks (
+        name TEXT PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMPTZ NOT NULL
+    )
+"""
+
+def ensure_table(conn):
+    """Create the watermarks table on databases set up before it existed"""
+    cur = conn.cursor()
+    cur.execute(WATERMARKS_TABLE)
+    conn.commit()
+    cur.close()
+
+def bump_watermarks(cur, names):
+    """Advance each watermark, call inside the transaction that changed the data"""
+    if not names:
+        return
+    now = datetime.now(timezone.utc)
+    cur.executemany("""
+        INSERT INTO data_watermarks (name, version, updated_at)
+        VALUES (%s, 1, %s)
+        ON CONFLICT (name) DO UPDATE SET
+            version = data_watermarks.version + 1,
+            updated_at = EXCLUDED.updated_at
+    """, [(name, now) for name in sorted(set(names))])
+
+def read_watermarks(conn, names=None):
+    """{name: (version, updated_at)}, every watermark or only `names`"""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT name, version, updated_at FROM data_watermarks")
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+        conn.commit()
+
+    watermarks = {}
+    for row in rows:
+        if isinstance(row, dict):
+            row = (row['name'], row['version'], row['updated_at'])
+        if names is None or row[0] in names:
+            watermarks[row[0]] = (row[1], row[2])
+    return watermarks
+
+class WatermarkReader:
+    """Cached watermark lookups over one long-lived connection"""
+
+    def __init__(self, backend, cache_seconds=WATERMARK_CACHE_SECONDS):
+        self.backend = backend
+        self.cache_seconds = cache_seconds
+        self.conn = None
+        self.lock = threading.Lock()
+        self.cached = {}
+        self.cached_at = 0
+
+    def read_all(self):
+        if self.conn is None:
+            self.conn = self.backend.connect()
+        return read_watermarks(self.conn)
+
+    def get(self, names):
+        """{name: (version, updated_at)} for the names that exist, None when unavailable"""
+        with self.lock:
+            if time.monotonic() - self.cached_at > self.cache_seconds:
+                try:
+                    self.cached = self.read_all()
+                except Exception as e:
+                    # Table missing (setup_database not re-run) or connection dropped
+                    print(f"⚠️  Watermarks unavailable: {e}")
+                    if self.conn is not None:
+                        try:
+                            self.conn.close()
+                        except Exception:
+                            pass
+                    self.conn = None
+                    self.cached = {}
+                self.cached_at = time.monotonic()
+
+            return {name: self.cached[name] for name in names if name in self.cached}
+
+def validators(watermarks, names, key):
+    """
+    (etag, last_modified) for a response built from `names`, (None, None) when any
+    watermark is missing so the response is served without conditional headers
+    `key` distinguishes representations of the same data (path and query string)
+    """
+    if not watermarks or any(name not in watermarks for name in names):
+        return None, None
+
+    digest = hashlib.sha1(key.encode())
+    for name in sorted(names):
+        digest.update(f"|{name}={watermarks[name][0]}".encode())
+
+    last_modified = max(watermarks[name][1] for name in names)
+    return digest.hexdigest()[:20], last_modified